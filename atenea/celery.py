@@ -3,6 +3,7 @@ Celery configuration for Atenea
 """
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 # Set default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'atenea.settings')
@@ -16,6 +17,15 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_process_init.connect
+def warm_up_background_removal(**kwargs):
+    """Precarga la sesión de BiRefNet en los procesos del worker de eliminación de fondo"""
+    from django.conf import settings
+    if settings.BG_REMOVAL_WARMUP:
+        from core.services.bgremover import warm_up
+        warm_up()
+
+
 @app.task(bind=True)
 def debug_task(self):
     """Task de debug para verificar que Celery funciona"""
@@ -249,6 +249,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Google Cloud Storage Configuration
 GCS_BUCKET_NAME = config('GCS_BUCKET_NAME', default='devid-bucket-0001')
 GCS_PROJECT_ID = config('GCS_PROJECT_ID', default='proeduca-472312')
+
+# Clave HMAC de GCS para firmar URLs localmente (sin RSA ni llamadas de red).
+# Si no se configura, se firma con las credenciales de la cuenta de servicio.
+GCS_HMAC_ACCESS_ID = config('GCS_HMAC_ACCESS_ID', default='')
+GCS_HMAC_SECRET = config('GCS_HMAC_SECRET', default='')
 GOOGLE_APPLICATION_CREDENTIALS = config(
     'GOOGLE_APPLICATION_CREDENTIALS',
     default=str(BASE_DIR / 'credentials.json')
@@ -432,6 +437,16 @@ LLM_MAX_RETRIES = config('LLM_MAX_RETRIES', default=2, cast=int)
 AGENT_CACHE_TTL = config('AGENT_CACHE_TTL', default=86400, cast=int)  # 24 horas en segundos
 AGENT_CACHE_ENABLED = config('AGENT_CACHE_ENABLED', default=True, cast=bool)
 
+# Pre-generación especulativa del paso Configurar del agente (ver core/services/prefetch.py)
+PREFETCH_ENABLED = config('PREFETCH_ENABLED', default=True, cast=bool)
+PREFETCH_CREDIT_BUDGET = config('PREFETCH_CREDIT_BUDGET', default=20, cast=float)  # Créditos por usuario y día
+PREFETCH_PRIORITY = config('PREFETCH_PRIORITY', default=1, cast=int)  # Por debajo de las previews pedidas (10)
+
+# Prompt Templates: caché de remixes LLM (ver core/services/prompt_remix.py)
+PROMPT_REMIX_CACHE_ENABLED = config('PROMPT_REMIX_CACHE_ENABLED', default=True, cast=bool)
+PROMPT_REMIX_CACHE_TTL = config('PROMPT_REMIX_CACHE_TTL', default=604800, cast=int)  # 7 días en segundos
+PROMPT_REMIX_CACHE_SIZE = config('PROMPT_REMIX_CACHE_SIZE', default=1024, cast=int)  # Remixes en memoria por proceso
+
 # Stock Search Cache Configuration
 # Manejar caso donde STOCK_CACHE_TTL está vacío en .env
 try:
@@ -440,6 +455,21 @@ try:
 except (ValueError, TypeError):
     STOCK_CACHE_TTL = 3600  # 1 hora en segundos
 
+# Búsqueda de stock en paralelo: presupuesto de latencia global (segundos),
+# tamaño del pool de threads y circuit breaker por fuente
+STOCK_SEARCH_DEADLINE = config('STOCK_SEARCH_DEADLINE', default=8, cast=float)
+STOCK_SEARCH_MAX_WORKERS = config('STOCK_SEARCH_MAX_WORKERS', default=16, cast=int)
+STOCK_CIRCUIT_FAILURE_THRESHOLD = config('STOCK_CIRCUIT_FAILURE_THRESHOLD', default=3, cast=int)
+STOCK_CIRCUIT_RESET_TIMEOUT = config('STOCK_CIRCUIT_RESET_TIMEOUT', default=60, cast=int)
+
+# Pool de clientes de proveedores de IA: hosts distintos por sesión y
+# conexiones keep-alive por host
+PROVIDER_POOL_CONNECTIONS = config('PROVIDER_POOL_CONNECTIONS', default=4, cast=int)
+PROVIDER_POOL_MAXSIZE = config('PROVIDER_POOL_MAXSIZE', default=32, cast=int)
+
+# Composición del video final del agente: descargas de escenas en paralelo
+COMPOSITION_DOWNLOAD_WORKERS = config('COMPOSITION_DOWNLOAD_WORKERS', default=4, cast=int)
+
 # Feature Flag: Usar LangChain en lugar de n8n
 USE_LANGCHAIN_AGENT = config('USE_LANGCHAIN_AGENT', default=False, cast=bool)
 
@@ -463,6 +493,10 @@ RAG_CHUNK_SIZE = config('RAG_CHUNK_SIZE', default=1000, cast=int)
 RAG_CHUNK_OVERLAP = config('RAG_CHUNK_OVERLAP', default=200, cast=int)
 RAG_VECTOR_STORE_PATH = config('RAG_VECTOR_STORE_PATH', default='.rag_store')  # Carpeta para guardar índices
 RAG_PROJECT_NAME = config('RAG_PROJECT_NAME', default='atenea-doc-assistant')  # Para LangSmith
+RAG_GENERATION_CHECK_INTERVAL = config('RAG_GENERATION_CHECK_INTERVAL', default=5, cast=int)  # Segundos entre comprobaciones de índice nuevo
+RAG_QUERY_CACHE_SIZE = config('RAG_QUERY_CACHE_SIZE', default=512, cast=int)  # Embeddings de consultas en memoria por proceso
+RAG_STREAM_FLUSH_SECONDS = config('RAG_STREAM_FLUSH_SECONDS', default=0.1, cast=float)  # Agrupación de fragmentos en streaming
+RAG_EMBED_BATCH_SIZE = config('RAG_EMBED_BATCH_SIZE', default=64, cast=int)  # Chunks por llamada de embeddings al re-indexar
 AGENT_RATE_LIMIT_GLOBAL = config('AGENT_RATE_LIMIT_GLOBAL', default=100, cast=int)  # requests/hora
 
 # ====================================
@@ -494,10 +528,17 @@ CELERY_TASK_ROUTES = {
     'core.tasks.generate_audio_task': {'queue': 'audio_generation'},
     'core.tasks.generate_scene_preview_task': {'queue': 'scene_processing'},
     'core.tasks.combine_video_audio_task': {'queue': 'scene_processing'},
+    'core.tasks.generate_scene_video_task': {'queue': 'scene_processing'},
+    'core.tasks.generate_scene_audio_task': {'queue': 'audio_generation'},
+    'core.tasks.finalize_storyboard_batch_task': {'queue': 'default'},
     'core.tasks.poll_video_status_task': {'queue': 'default'},
+    'core.tasks.watch_provider_status_task': {'queue': 'default'},
     'core.tasks.poll_image_status_task': {'queue': 'default'},
     'core.tasks.poll_audio_status_task': {'queue': 'default'},
-    'core.tasks.remove_image_background_task': {'queue': 'image_generation'},
+    'core.tasks.remove_image_background_task': {'queue': 'background_removal'},
+    'core.tasks.stream_documentation_answer_task': {'queue': 'default'},
+    'core.tasks.generate_media_derivatives_task': {'queue': 'default'},
+    'core.tasks.prefetch_script_task': {'queue': 'default'},
 }
 
 # Prioridades por tipo (dentro de cada cola)
@@ -541,12 +582,110 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(hour=2, minute=0),
     },
     
+    # Limpiar spans de telemetría de generación (diario a las 2:30 AM)
+    'cleanup-generation-spans': {
+        'task': 'core.tasks.cleanup_generation_spans',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    
     # Verificar tareas atascadas (cada hora)
     'check-stuck-tasks': {
         'task': 'core.tasks.check_stuck_tasks',
         'schedule': crontab(minute=0),
     },
+    
+    # Ronda del watcher de estado de proveedores (cada 10 segundos)
+    # Cada proveedor aplica su propio intervalo adaptativo dentro de la ronda
+    'watch-provider-status': {
+        'task': 'core.tasks.watch_provider_status_task',
+        'schedule': 10.0,
+    },
+    
+    # Reconciliador de escenas: consultas al proveedor y cobros pendientes (cada 10 segundos)
+    'reconcile-scenes': {
+        'task': 'core.tasks.reconcile_scenes_task',
+        'schedule': 10.0,
+    },
+    
+    # Despacho de tareas retenidas por el límite de concurrencia del plan (cada 10 segundos)
+    'admit-held-tasks': {
+        'task': 'core.tasks.admit_held_tasks_task',
+        'schedule': 10.0,
+    },
+    
+    # Volcado de usos de prompt templates acumulados en Redis
+    'flush-prompt-template-usage': {
+        'task': 'core.tasks.flush_prompt_template_usage_task',
+        'schedule': float(config('PROMPT_TEMPLATE_USAGE_FLUSH_SECONDS', default=60, cast=int)),
+    },
+}
+
+# Provider Status Watcher
+# True: un único watcher consulta por lotes los videos en curso (ver core/services/status_watcher.py)
+# False: cada video encadena su propio poll_video_status_task cada 30 segundos
+STATUS_WATCHER_ENABLED = config('STATUS_WATCHER_ENABLED', default=True, cast=bool)
+# Token compartido para los webhooks de proveedores (/webhooks/providers/<provider>/?token=...)
+# Vacío = webhooks desactivados, solo polling
+PROVIDER_WEBHOOK_SECRET = config('PROVIDER_WEBHOOK_SECRET', default='')
+# URL pública de la app para registrar el webhook al enviar trabajos (HeyGen, Kling)
+# Vacío = no se registra callback, solo polling
+PROVIDER_WEBHOOK_BASE_URL = config('PROVIDER_WEBHOOK_BASE_URL', default='')
+
+# Scene Reconciler (ver core/services/scene_reconciler.py)
+# Segundos mínimos entre dos consultas al proveedor de la misma escena
+SCENE_RECONCILER_CHECK_INTERVAL = config('SCENE_RECONCILER_CHECK_INTERVAL', default=20, cast=int)
+# Escenas procesadas por ronda (consultas y cobros)
+SCENE_RECONCILER_BATCH_SIZE = config('SCENE_RECONCILER_BATCH_SIZE', default=50, cast=int)
+
+# Provider Scheduler (ver core/services/scheduler.py)
+# Redis para token buckets y slots de concurrencia por proveedor
+SCHEDULER_REDIS_URL = config('SCHEDULER_REDIS_URL', default=cache_redis_url)
+# Tareas en curso simultáneas por plan (grupo de Django o 'staff'); el resto queda retenido en cola
+PLAN_CONCURRENCY = {
+    'default': config('USER_MAX_CONCURRENT_TASKS', default=10, cast=int),
+    'pro': config('PRO_MAX_CONCURRENT_TASKS', default=25, cast=int),
+    'staff': 50,
 }
+# Máximo de tareas activas (en curso + retenidas) por usuario antes de rechazar nuevas
+USER_MAX_QUEUED_TASKS = config('USER_MAX_QUEUED_TASKS', default=40, cast=int)
+
+# Telemetría de generaciones (ver core/monitoring/telemetry.py)
+GENERATION_TELEMETRY_ENABLED = config('GENERATION_TELEMETRY_ENABLED', default=True, cast=bool)
+GENERATION_TELEMETRY_RETENTION_DAYS = config('GENERATION_TELEMETRY_RETENTION_DAYS', default=30, cast=int)
+
+# Videos de cita (Manim): preview 480p15 publicado antes del render final
+MANIM_PREVIEW_ENABLED = config('MANIM_PREVIEW_ENABLED', default=True, cast=bool)
+# Render de Manim en cola propia y subproceso aislado (ver core/ai_services/manim/render_pool.py)
+MANIM_RENDER_QUEUE = config('MANIM_RENDER_QUEUE', default='manim_render')
+MANIM_RENDER_ISOLATED = config('MANIM_RENDER_ISOLATED', default=True, cast=bool)
+MANIM_RENDER_CONCURRENCY = config('MANIM_RENDER_CONCURRENCY', default=2, cast=int)
+MANIM_RENDER_MEMORY_MB = config('MANIM_RENDER_MEMORY_MB', default=3072, cast=int)
+MANIM_RENDER_CPU_SECONDS = config('MANIM_RENDER_CPU_SECONDS', default=900, cast=int)
+MANIM_RENDER_TIMEOUT = config('MANIM_RENDER_TIMEOUT', default=1200, cast=int)
+MANIM_SCRATCH_DIR = config('MANIM_SCRATCH_DIR', default='')
+
+# Eliminación de fondo (BiRefNet) en worker dedicado (ver core/services/bgremover.py)
+BG_REMOVAL_MODEL = config('BG_REMOVAL_MODEL', default='birefnet-general')
+BG_REMOVAL_MODE = config('BG_REMOVAL_MODE', default='adaptive')  # adaptive | full
+BG_REMOVAL_MAX_SIDE = config('BG_REMOVAL_MAX_SIDE', default=1536, cast=int)
+BG_REMOVAL_MATTING_BASE_SIZE = config('BG_REMOVAL_MATTING_BASE_SIZE', default=2048, cast=int)
+BG_REMOVAL_BATCH_SIZE = config('BG_REMOVAL_BATCH_SIZE', default=4, cast=int)
+BG_REMOVAL_INTRA_OP_THREADS = config('BG_REMOVAL_INTRA_OP_THREADS', default=4, cast=int)
+BG_REMOVAL_INTER_OP_THREADS = config('BG_REMOVAL_INTER_OP_THREADS', default=1, cast=int)
+BG_REMOVAL_WARMUP = config('BG_REMOVAL_WARMUP', default=False, cast=bool)
+
+# Derivados para listados: miniaturas WebP, portada y preview de videos, picos de audio
+# (ver core/services/derivatives.py)
+DERIVATIVES_ENABLED = config('DERIVATIVES_ENABLED', default=True, cast=bool)
+DERIVATIVE_THUMBNAIL_WIDTHS = config(
+    'DERIVATIVE_THUMBNAIL_WIDTHS', default='320,640,1280',
+    cast=lambda v: [int(w) for w in v.split(',') if w.strip()]
+)
+DERIVATIVE_CARD_WIDTH = config('DERIVATIVE_CARD_WIDTH', default=640, cast=int)
+DERIVATIVE_PREVIEW_SECONDS = config('DERIVATIVE_PREVIEW_SECONDS', default=6, cast=int)
+DERIVATIVE_PREVIEW_WIDTH = config('DERIVATIVE_PREVIEW_WIDTH', default=480, cast=int)
+DERIVATIVE_PREVIEW_MAXRATE = config('DERIVATIVE_PREVIEW_MAXRATE', default='400k')
+DERIVATIVE_WAVEFORM_PEAKS = config('DERIVATIVE_WAVEFORM_PEAKS', default=200, cast=int)
 
 # ====================================
 # CHANNELS CONFIGURATION (WebSockets)
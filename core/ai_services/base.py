@@ -9,10 +9,17 @@ from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# Un 429 con Retry-After mayor que esto no se espera dentro del worker: se
+# propaga y la tarea se re-programa a través del planificador
+MAX_INLINE_RETRY_AFTER = 10
+
 
 class BaseAIClient(ABC):
     """Clase base abstracta para clientes de APIs de IA"""
     
+    # Clave del proveedor en el ProviderScheduler (None = sin control de ritmo)
+    provider_name: Optional[str] = None
+    
     def __init__(self, api_key: str, base_url: str, timeout: int = 30):
         self.api_key = api_key
         self.base_url = base_url
@@ -92,6 +99,15 @@ class BaseAIClient(ABC):
                 should_retry = False
                 if hasattr(e, 'response') and e.response is not None:
                     status_code = e.response.status_code
+                    if status_code == 429:
+                        retry_after = self._handle_rate_limit(e.response)
+                        if retry_after > MAX_INLINE_RETRY_AFTER:
+                            logger.warning(
+                                f"429 en petición a {url} con Retry-After={retry_after:.0f}s, "
+                                f"se re-programa fuera del worker"
+                            )
+                            raise
+                        retry_delay = max(retry_delay, retry_after)
                     if status_code in RETRY_STATUS_CODES:
                         should_retry = True
                         logger.warning(
@@ -130,6 +146,23 @@ class BaseAIClient(ABC):
         if last_exception:
             raise last_exception
     
+    def _handle_rate_limit(self, response) -> float:
+        """
+        Lee Retry-After de un 429 y frena al resto de workers del proveedor
+        
+        Returns:
+            Segundos indicados por Retry-After (0 si no viene o no es numérico)
+        """
+        try:
+            retry_after = float(response.headers.get('Retry-After', 0))
+        except (TypeError, ValueError):
+            retry_after = 0
+        
+        if self.provider_name:
+            from core.services.scheduler import provider_scheduler
+            provider_scheduler.penalize(self.provider_name, retry_after)
+        return retry_after
+    
     @abstractmethod
     def generate_video(self, **kwargs) -> dict:
         """Método abstracto para generar video"""
@@ -0,0 +1,269 @@
+"""
+Registro de clientes de proveedores compartido por todo el proceso
+
+Los servicios (VideoService, ImageService, AudioService...) se instancian en
+cada petición y antes creaban sus clientes de nuevo, cada uno con su propio
+requests.Session (nuevo handshake TLS) y, en Vertex AI, una llamada a
+google.auth.default() por cliente. Este módulo mantiene:
+
+    - Un cliente por (proveedor, configuración) reutilizado entre peticiones
+    - Una sesión HTTP por proveedor con HTTPAdapter dimensionado y keep-alive
+    - Credenciales de Google compartidas, refrescadas bajo lock
+
+Fork-safety: con Celery prefork los workers se crean con fork() desde el
+proceso padre. Los sockets de un pool heredado no se pueden compartir entre
+procesos, así que el registro se vacía en el hijo (os.register_at_fork) y,
+por si acaso, cuando cambia el PID.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name: str, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+class ProviderClientPool:
+    """Clientes, sesiones HTTP y credenciales compartidas por proceso"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._clients: Dict[Hashable, Any] = {}
+        self._client_stats: Dict[Hashable, Dict] = {}
+        self._sessions: Dict[str, Tuple[requests.Session, HTTPAdapter]] = {}
+        self._credentials: Dict[Tuple[str, ...], Any] = {}
+        self._credentials_locks: Dict[Tuple[str, ...], threading.Lock] = {}
+
+    def reset(self):
+        """Descarta todo lo cacheado (se llama en el hijo tras un fork)"""
+        self._lock = threading.RLock()
+        self._reset_state()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            logger.info("[ClientPool] PID cambiado (fork), reiniciando registro de clientes")
+            self.reset()
+
+    # ----------------
+    # SESIONES HTTP
+    # ----------------
+
+    def session(self, provider: str) -> requests.Session:
+        """
+        Sesión HTTP compartida para un proveedor
+
+        El HTTPAdapter mantiene hasta PROVIDER_POOL_MAXSIZE conexiones keep-alive
+        por host; max_retries=0 porque los clientes ya tienen su propia lógica
+        de reintentos.
+        """
+        self._check_pid()
+        entry = self._sessions.get(provider)
+        if entry:
+            return entry[0]
+
+        with self._lock:
+            entry = self._sessions.get(provider)
+            if entry:
+                return entry[0]
+
+            adapter = HTTPAdapter(
+                pool_connections=_setting('PROVIDER_POOL_CONNECTIONS', 4),
+                pool_maxsize=_setting('PROVIDER_POOL_MAXSIZE', 32),
+                max_retries=0,
+                pool_block=False,
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._sessions[provider] = (session, adapter)
+            return session
+
+    # ----------------
+    # CLIENTES
+    # ----------------
+
+    def get(self, key: Hashable, factory: Callable[[], Any], session_provider: Optional[str] = None):
+        """
+        Devuelve el cliente registrado con key o lo crea con factory
+
+        Args:
+            key: Identificador del cliente, p.ej. ('veo', model_name)
+            factory: Función sin argumentos que construye el cliente
+            session_provider: Si se indica y el cliente tiene atributo session,
+                se sustituye por la sesión compartida de ese proveedor
+        """
+        self._check_pid()
+        client = self._clients.get(key)
+        if client is not None:
+            self._client_stats[key]['hits'] += 1
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._client_stats[key]['hits'] += 1
+                return client
+
+            client = factory()
+            if session_provider and hasattr(client, 'session'):
+                shared = self.session(session_provider)
+                # Conservar headers por defecto que el cliente haya configurado en su sesión
+                if isinstance(client.session, requests.Session):
+                    own_headers = dict(client.session.headers)
+                    client.session.close()
+                    client.session = _HeaderedSession(shared, own_headers)
+                else:
+                    client.session = shared
+
+            self._clients[key] = client
+            self._client_stats[key] = {'created_at': time.time(), 'hits': 0}
+            logger.info(f"[ClientPool] Cliente creado: {key}")
+            return client
+
+    def invalidate(self, key: Hashable):
+        """Elimina un cliente del registro (p.ej. tras rotar credenciales)"""
+        with self._lock:
+            self._clients.pop(key, None)
+            self._client_stats.pop(key, None)
+
+    # ----------------
+    # CREDENCIALES DE GOOGLE
+    # ----------------
+
+    def google_credentials(self, scopes: Tuple[str, ...] = ('https://www.googleapis.com/auth/cloud-platform',)):
+        """Credenciales de google.auth.default() compartidas por scopes"""
+        self._check_pid()
+        scopes = tuple(scopes)
+        credentials = self._credentials.get(scopes)
+        if credentials is not None:
+            return credentials
+
+        with self._lock:
+            credentials = self._credentials.get(scopes)
+            if credentials is None:
+                from google.auth import default
+                credentials, _ = default(scopes=list(scopes))
+                self._credentials[scopes] = credentials
+                self._credentials_locks[scopes] = threading.Lock()
+            return credentials
+
+    def google_access_token(self, credentials) -> str:
+        """Access token válido; solo un thread refresca a la vez"""
+        if credentials.valid:
+            return credentials.token
+
+        lock = next(
+            (lock for scopes, lock in self._credentials_locks.items() if self._credentials.get(scopes) is credentials),
+            self._lock
+        )
+        with lock:
+            if not credentials.valid:
+                from google.auth.transport.requests import Request
+                credentials.refresh(Request(session=self.session('google_auth')))
+        return credentials.token
+
+    # ----------------
+    # MÉTRICAS
+    # ----------------
+
+    def stats(self) -> Dict:
+        """
+        Utilización del pool
+
+        Returns:
+            Dict con los clientes registrados (hits desde su creación) y, por
+            proveedor, los pools de conexiones por host: conexiones creadas,
+            peticiones servidas y conexiones ociosas disponibles.
+        """
+        self._check_pid()
+        sessions = {}
+        for provider, (_, adapter) in list(self._sessions.items()):
+            hosts = {}
+            pools = adapter.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                idle = pool.pool.qsize() if pool.pool is not None else 0
+                hosts[f"{pool.scheme}://{pool.host}"] = {
+                    'connections_created': pool.num_connections,
+                    'requests': pool.num_requests,
+                    'idle': idle,
+                    'maxsize': pool.pool.maxsize if pool.pool is not None else 0,
+                }
+            sessions[provider] = hosts
+
+        return {
+            'pid': self._pid,
+            'clients': {
+                str(key): dict(stats) for key, stats in self._client_stats.items()
+            },
+            'sessions': sessions,
+        }
+
+
+class _HeaderedSession:
+    """
+    Vista sobre una sesión compartida que añade los headers propios del cliente
+
+    Algunos clientes configuran session.headers en su __init__ (Authorization,
+    Content-Type). Al compartir la sesión entre clientes esos headers no pueden
+    ir a la sesión común, así que se aplican en cada petición.
+    """
+
+    def __init__(self, session: requests.Session, headers: Dict[str, str]):
+        self._session = session
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+
+    def request(self, method, url, **kwargs):
+        headers = dict(self.headers)
+        headers.update(kwargs.pop('headers', None) or {})
+        return self._session.request(method, url, headers=headers, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def close(self):
+        # La sesión compartida la cierra el pool, no el cliente
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+# Instancia global
+client_pool = ProviderClientPool()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=client_pool.reset)
@@ -1,9 +1,8 @@
 """Cliente para Gemini Veo API (Vertex AI) - Todos los modelos"""
 import logging
 from typing import Dict, Optional, List
-import requests
-from google.auth import default
-from google.auth.transport.requests import Request
+
+from .client_pool import client_pool
 
 logger = logging.getLogger(__name__)
 
@@ -157,7 +156,8 @@ class GeminiVeoClient:
         
         # Obtener credenciales con los scopes correctos para Vertex AI
         scopes = ['https://www.googleapis.com/auth/cloud-platform']
-        self.credentials, _ = default(scopes=scopes)
+        # Credenciales compartidas por proceso (evita google.auth.default() por cliente)
+        self.credentials = client_pool.google_credentials(tuple(scopes))
         
         logger.info(f"Cliente Veo inicializado: {project_id} @ {location}")
         logger.info(f"Modelo: {model_name} - {self.model_config['description']}")
@@ -165,9 +165,7 @@ class GeminiVeoClient:
     
     def _get_access_token(self) -> str:
         """Obtiene un access token válido de Google Cloud"""
-        if not self.credentials.valid:
-            self.credentials.refresh(Request())
-        return self.credentials.token
+        return client_pool.google_access_token(self.credentials)
     
     def _validate_parameters(
         self, 
@@ -538,7 +536,7 @@ class GeminiVeoClient:
             logger.info(f"📤 Enviando request a: {endpoint}")
             
             # Hacer la request
-            response = requests.post(endpoint, json=payload, headers=headers, timeout=60)
+            response = client_pool.session('vertex_ai').post(endpoint, json=payload, headers=headers, timeout=60)
             
             logger.info(f"📥 Response status: {response.status_code}")
             logger.info(f"   Response body: {response.text[:500]}")
@@ -641,7 +639,7 @@ class GeminiVeoClient:
                 "Content-Type": "application/json"
             }
             
-            response = requests.post(endpoint, json=payload, headers=headers, timeout=30)
+            response = client_pool.session('vertex_ai').post(endpoint, json=payload, headers=headers, timeout=30)
             
             if response.status_code == 200:
                 operation_data = response.json()
@@ -1,10 +1,9 @@
 """Cliente para Google Lyria Music Generation API (Vertex AI)"""
 import logging
 from typing import Dict, Optional, List
-import requests
+
+from .client_pool import client_pool
 import base64
-from google.auth import default
-from google.auth.transport.requests import Request
 
 logger = logging.getLogger(__name__)
 
@@ -72,16 +71,15 @@ class GoogleLyriaClient:
         
         # Obtener credenciales con los scopes correctos para Vertex AI
         scopes = ['https://www.googleapis.com/auth/cloud-platform']
-        self.credentials, _ = default(scopes=scopes)
+        # Credenciales compartidas por proceso (evita google.auth.default() por cliente)
+        self.credentials = client_pool.google_credentials(tuple(scopes))
         
         logger.info(f"Cliente Lyria inicializado: {self.project_id} @ {location}")
         logger.info(f"Modelo: {model_name} - {self.model_config['description']}")
     
     def _get_access_token(self) -> str:
         """Obtiene un access token válido de Google Cloud"""
-        if not self.credentials.valid:
-            self.credentials.refresh(Request())
-        return self.credentials.token
+        return client_pool.google_access_token(self.credentials)
     
     def _translate_to_english(self, text: str) -> str:
         """
@@ -244,7 +242,7 @@ class GoogleLyriaClient:
             logger.info(f"📤 Enviando request a: {endpoint}")
             
             # Hacer la request (síncrona)
-            response = requests.post(endpoint, json=payload, headers=headers, timeout=120)
+            response = client_pool.session('vertex_ai').post(endpoint, json=payload, headers=headers, timeout=120)
             
             logger.info(f"📥 Response status: {response.status_code}")
             logger.debug(f"📥 Response headers: {dict(response.headers)}")
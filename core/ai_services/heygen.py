@@ -45,6 +45,8 @@ def detect_image_type(image_data: bytes) -> str:
 class HeyGenClient(BaseAIClient):
     """Cliente para interactuar con HeyGen API"""
     
+    provider_name = 'heygen'
+    
     def __init__(self, api_key: str):
         super().__init__(
             api_key=api_key,
@@ -167,9 +169,14 @@ class HeyGenClient(BaseAIClient):
         voice_speed: float = 1.0,
         voice_pitch: int = 50,
         voice_emotion: str = "Excited",
+        callback_url: Optional[str] = None,
         **kwargs
     ) -> dict:
-        """Genera un video con avatar en HeyGen"""
+        """
+        Genera un video con avatar en HeyGen
+        
+        Con callback_url, HeyGen avisa a esa URL cuando el video termina.
+        """
         if dimension is None:
             dimension = {"width": 1280, "height": 720}
         
@@ -230,6 +237,9 @@ class HeyGenClient(BaseAIClient):
                     "src": background_url if background_url.startswith('http') else f"https://{background_url}"
                 }
         
+        if callback_url:
+            payload["callback_url"] = callback_url
+        
         try:
             logger.info(f"Generando video en HeyGen: {title}")
             logger.info(f"Payload completo: {payload}")
@@ -4,6 +4,8 @@ import time
 from typing import Dict, Optional
 import requests
 
+from .polling import wait_for_job
+
 logger = logging.getLogger(__name__)
 
 # Modelos disponibles de Higgsfield
@@ -323,49 +325,36 @@ class HiggsfieldClient:
         self,
         request_id: str,
         max_wait_seconds: int = 600,
-        poll_interval: int = 10
+        poll_interval: Optional[int] = None,
+        model_id: Optional[str] = None
     ) -> dict:
         """
-        Espera a que un video se complete con polling
+        Espera a que un video se complete con polling (bloqueante)
+        
+        Solo para scripts y ejemplos: en workers de Celery el estado se consulta
+        re-programando la tarea (ver core/ai_services/polling.py).
         
         Args:
             request_id: ID de la solicitud
             max_wait_seconds: Máximo tiempo de espera (default: 10 min)
-            poll_interval: Intervalo entre consultas en segundos (default: 10s)
+            poll_interval: Intervalo fijo en segundos (default: calendario adaptado al modelo)
+            model_id: Modelo del trabajo, para ajustar el calendario a su tiempo de render
         
         Returns:
             dict con el estado final del video
         """
-        logger.info(f"⏳ Esperando a que el request {request_id} se complete...")
-        logger.info(f"   Tiempo máximo: {max_wait_seconds}s, Intervalo: {poll_interval}s")
-        start_time = time.time()
-        
-        while True:
-            elapsed = time.time() - start_time
-            
-            if elapsed > max_wait_seconds:
-                logger.error(f"❌ Timeout esperando video después de {elapsed:.1f}s")
-                return {
-                    'request_id': request_id,
-                    'status': 'timeout',
-                    'error': f'Timeout after {elapsed:.1f}s'
-                }
-            
-            status_data = self.get_request_status(request_id)
-            status = status_data.get('status')
-            
-            if status == 'completed':
-                logger.info(f"✅ Video completado en {elapsed:.1f}s!")
-                return status_data
-            elif status in ['failed', 'nsfw']:
-                logger.error(f"❌ Video falló después de {elapsed:.1f}s")
-                return status_data
-            elif status in ['queued', 'in_progress']:
-                logger.info(f"⏳ Procesando... ({elapsed:.1f}s transcurridos)")
-                time.sleep(poll_interval)
-            else:
-                logger.warning(f"⚠️  Estado desconocido: {status}")
-                time.sleep(poll_interval)
+        logger.info(f"⏳ Esperando a que {request_id} se complete (máximo {max_wait_seconds}s)...")
+        return wait_for_job(
+            self.get_request_status,
+            request_id,
+            provider='higgsfield',
+            model_id=model_id,
+            max_wait_seconds=max_wait_seconds,
+            poll_interval=poll_interval,
+            done_states=('completed',),
+            failed_states=('failed', 'nsfw'),
+            id_key='request_id',
+        )
     
     def _parse_error(self, response: requests.Response) -> str:
         """Parsea el mensaje de error de la API"""
@@ -9,8 +9,11 @@ Uso básico:
     result = client.generate_video(
         animation_type='quote',
         config={'text': 'Mi cita', 'author': 'Autor'},
-        quality='k'
+        quality='h'
     )
+
+Para renderizar en un subproceso aislado (límites de CPU/memoria, tmpfs):
+    client = ManimClient(isolated=True)
 """
 # Importar animaciones para que se registren automáticamente
 from . import animations  # noqa: F401
@@ -2,10 +2,10 @@
 Cliente Manim para generar videos animados
 Soporta múltiples tipos de animaciones mediante sistema de registro
 
-Ejecuta Manim directamente desde Python sin subprocess ni archivos temporales.
-Los parámetros se pasan directamente al constructor de la animación (thread-safe).
-
-Soporta múltiples usuarios simultáneos usando paths únicos por request.
+Por defecto ejecuta Manim directamente desde Python: los parámetros se pasan
+al constructor de la animación (thread-safe) y se usan paths únicos por request.
+Con isolated=True el render se delega en render_pool (subproceso con límites
+de recursos y directorio de trabajo temporal en tmpfs).
 """
 import logging
 import os
@@ -26,6 +26,53 @@ logger = logging.getLogger(__name__)
 # Lock global para operaciones críticas de Manim (si es necesario)
 _manim_lock = threading.Lock()
 
+# Tiers de render: (lado corto en píxeles, fps)
+# Los videos de cita son tarjetas de texto: 30 fps bastan y el tier por defecto
+# coincide con la salida de los proyectos (1080p); 'l' se usa como preview rápido
+RENDER_TIERS = {
+    'l': (480, 15),
+    'm': (720, 30),
+    'h': (1080, 30),
+    'k': (2160, 30),
+}
+DEFAULT_QUALITY = 'h'
+PREVIEW_QUALITY = 'l'
+
+# Ancho del frame de Manim (unidades de escena) con el que están diseñadas las animaciones
+FRAME_WIDTH = 128 / 9
+
+# Relaciones de aspecto soportadas: (ancho, alto)
+ASPECT_RATIOS = {
+    '16:9': (16, 9),
+    '9:16': (9, 16),
+    '1:1': (1, 1),
+}
+
+
+def render_settings(quality: str, aspect_ratio: str = '16:9') -> Dict[str, Any]:
+    """
+    Parámetros de Manim para un tier y una relación de aspecto
+
+    El lado corto del video es el del tier. El ancho del frame se mantiene
+    fijo para que las animaciones (diseñadas en horizontal) conserven su
+    escala; en vertical crece la altura del frame.
+    """
+    short_side, fps = RENDER_TIERS[quality]
+    ratio_w, ratio_h = ASPECT_RATIOS.get(aspect_ratio, ASPECT_RATIOS['16:9'])
+    if ratio_w >= ratio_h:
+        pixel_height = short_side
+        pixel_width = round(short_side * ratio_w / ratio_h / 2) * 2
+    else:
+        pixel_width = short_side
+        pixel_height = round(short_side * ratio_h / ratio_w / 2) * 2
+    return {
+        'pixel_width': pixel_width,
+        'pixel_height': pixel_height,
+        'frame_rate': fps,
+        'frame_width': FRAME_WIDTH,
+        'frame_height': FRAME_WIDTH * pixel_height / pixel_width,
+    }
+
 
 class ManimClient:
     """
@@ -37,17 +84,24 @@ class ManimClient:
     Ejecuta Manim directamente desde Python sin necesidad de subprocess.
     """
     
-    def __init__(self):
-        """Inicializa el cliente Manim"""
+    def __init__(self, isolated: bool = False):
+        """
+        Inicializa el cliente Manim
+
+        Args:
+            isolated: Renderizar en un subproceso aislado (ver render_pool)
+        """
         self.module_path = Path(__file__).parent
+        self.isolated = isolated
     
     def generate_video(
         self,
         animation_type: str,
         config: Dict[str, Any],
-        quality: str = "k",
+        quality: str = DEFAULT_QUALITY,
         scene_name: Optional[str] = None,
-        unique_id: Optional[str] = None
+        unique_id: Optional[str] = None,
+        aspect_ratio: str = '16:9'
     ) -> Dict[str, str]:
         """
         Genera un video usando Manim con el tipo de animación especificado
@@ -55,13 +109,16 @@ class ManimClient:
         Args:
             animation_type: Tipo de animación (ej: 'quote', 'bar_chart', 'histogram')
             config: Configuración específica del tipo de animación
-            quality: Calidad de renderizado (l/m/h/k, default: k)
+            quality: Tier de render (l/m/h/k = 480p15/720p30/1080p30/2160p30, default: h)
             scene_name: Nombre de la escena (opcional, usa el nombre de la clase por defecto)
             unique_id: ID único para este render (opcional, se genera automáticamente si no se proporciona)
-                      Útil para evitar colisiones cuando múltiples usuarios renderizan simultáneamente
+                      Útil para evitar colisiones cuando múltiples usuarios renderizan simultáneamente.
+                      Con el mismo unique_id Manim reutiliza sus archivos parciales en caché.
+            aspect_ratio: '16:9', '9:16' o '1:1'
         
         Returns:
-            Dict con 'video_path' (ruta local del video generado)
+            Dict con 'video_path' (ruta local del video generado); en modo
+            aislado también 'scratch_dir' (borrar con render_pool.cleanup)
         
         Raises:
             ValueError: Si el tipo de animación no está registrado o calidad inválida
@@ -69,10 +126,9 @@ class ManimClient:
             Exception: Si falla la generación
         """
         # Validar calidad
-        valid_qualities = ['l', 'm', 'h', 'k']
-        if quality not in valid_qualities:
+        if quality not in RENDER_TIERS:
             raise ValueError(
-                f"Calidad inválida: '{quality}'. Debe ser una de: {valid_qualities}"
+                f"Calidad inválida: '{quality}'. Debe ser una de: {list(RENDER_TIERS)}"
             )
         
         # Verificar que el tipo de animación esté registrado
@@ -104,15 +160,16 @@ class ManimClient:
         if not project_root.exists():
             raise FileNotFoundError(f"Directorio raíz del proyecto no encontrado: {project_root}")
         
-        # Mapear calidad corta a nombres de calidad de Manim
-        quality_mapping = {
-            'l': 'low_quality',        # 480p15
-            'm': 'medium_quality',      # 720p30
-            'h': 'high_quality',        # 1080p60
-            'k': 'fourk_quality',       # 2160p60
-        }
+        settings = render_settings(quality, aspect_ratio)
         
-        manim_quality = quality_mapping.get(quality, 'fourk_quality')
+        if self.isolated:
+            from . import render_pool
+            logger.info(
+                f"Renderizando video tipo '{animation_type}' en subproceso aislado "
+                f"({settings['pixel_width']}x{settings['pixel_height']}@{settings['frame_rate']})"
+            )
+            result = render_pool.render(animation_type, config, scene_name, settings)
+            return {**result, 'unique_id': unique_id}
         
         # Configurar paths de salida ÚNICOS por request
         # Usar unique_id para evitar colisiones entre renders simultáneos
@@ -121,7 +178,9 @@ class ManimClient:
         
         # Log de depuración
         logger.info(f"Renderizando video tipo '{animation_type}' con Manim...")
-        logger.info(f"Calidad: {quality} -> {manim_quality}")
+        logger.info(
+            f"Calidad: {quality} -> {settings['pixel_width']}x{settings['pixel_height']}@{settings['frame_rate']}"
+        )
         logger.info(f"Directorio de salida único: {media_dir}")
         logger.info(f"ID único del render: {unique_id}")
         if logger.isEnabledFor(logging.DEBUG):
@@ -136,10 +195,9 @@ class ManimClient:
         # tempconfig es thread-safe (usa contextvars internamente)
         # Cada thread/request tiene su propia configuración temporal
         with tempconfig({
-            'quality': manim_quality,  # Usar nombre de calidad de Manim
+            **settings,
             'media_dir': str(media_dir),
             'preview': False,  # No mostrar preview
-            'disable_caching': True,  # Forzar regeneración completa
         }):
             # Crear instancia de la animación con configuración
             # Cada instancia es independiente y thread-safe
@@ -151,12 +209,7 @@ class ManimClient:
         
         # Determinar ruta del video generado
         # Manim genera videos en media_dir/{scene_name}/{quality_folder}/{scene_name}.mp4
-        quality_folder = {
-            "l": "480p15",
-            "m": "720p30",
-            "h": "1080p60",
-            "k": "2160p60"
-        }.get(quality, "2160p60")
+        quality_folder = f"{settings['pixel_height']}p{settings['frame_rate']}"
         
         video_path = media_dir / scene_name / quality_folder / f"{scene_name}.mp4"
         
@@ -196,12 +249,13 @@ class ManimClient:
         quote: str,
         author: Optional[str] = None,
         duration: Optional[float] = None,
-        quality: str = "k",
+        quality: str = DEFAULT_QUALITY,
         container_color: Optional[str] = None,
         text_color: Optional[str] = None,
         font_family: Optional[str] = None,
         display_time: Optional[float] = None,
-        unique_id: Optional[str] = None
+        unique_id: Optional[str] = None,
+        aspect_ratio: str = '16:9'
     ) -> Dict[str, str]:
         """
         Genera un video de cita usando Manim (método de conveniencia)
@@ -210,11 +264,13 @@ class ManimClient:
             quote: Texto de la cita
             author: Nombre del autor (opcional)
             duration: Duración en segundos (opcional, debe ser positivo)
-            quality: Calidad de renderizado (l/m/h/k, default: k)
+            quality: Tier de render (l/m/h/k, default: h)
             container_color: Color del contenedor en formato hex (ej: #0066CC)
             text_color: Color del texto en formato hex (ej: #FFFFFF)
             font_family: Tipo de fuente (normal/bold/italic/bold_italic)
             display_time: Tiempo de visualización en pantalla (segundos)
+            unique_id: ID único del render (directorio de trabajo de Manim)
+            aspect_ratio: '16:9', '9:16' o '1:1'
         
         Returns:
             Dict con 'video_path'
@@ -227,9 +283,8 @@ class ManimClient:
             raise ValueError("El texto de la cita es requerido")
         
         # Validar calidad
-        valid_qualities = ['l', 'm', 'h', 'k']
-        if quality not in valid_qualities:
-            raise ValueError(f"Calidad inválida: '{quality}'. Debe ser una de: {valid_qualities}")
+        if quality not in RENDER_TIERS:
+            raise ValueError(f"Calidad inválida: '{quality}'. Debe ser una de: {list(RENDER_TIERS)}")
         
         # Validar duración si se proporciona
         if duration is not None and duration <= 0:
@@ -279,25 +334,24 @@ class ManimClient:
             config=config,
             quality=quality,
             scene_name='QuoteAnimation',
-            unique_id=unique_id
+            unique_id=unique_id,
+            aspect_ratio=aspect_ratio
         )
 
 
-    def _clean_manim_cache(self, project_root: Path, quality: str):
+    def _clean_manim_cache(self, project_root: Path, quality: str, aspect_ratio: str = '16:9'):
         """
         Limpia el caché de Manim para forzar regeneración completa
         
         Args:
             project_root: Directorio raíz del proyecto
             quality: Calidad del video (l/m/h/k)
+            aspect_ratio: '16:9', '9:16' o '1:1'
         """
         try:
-            quality_folder = {
-                "l": "480p15",
-                "m": "720p30",
-                "h": "1080p60",
-                "k": "2160p60"
-            }.get(quality, "2160p60")
+            # Manim nombra la carpeta por la altura en píxeles (1920p30 en vertical)
+            settings = render_settings(quality if quality in RENDER_TIERS else DEFAULT_QUALITY, aspect_ratio)
+            quality_folder = f"{settings['pixel_height']}p{settings['frame_rate']}"
             
             # Limpiar archivos de video anteriores
             cache_paths = [
@@ -0,0 +1,182 @@
+"""
+Render aislado de animaciones Manim
+
+Cada render se ejecuta en un subproceso (render_wrapper.py + config JSON) con:
+
+    - Directorio de trabajo propio en tmpfs (/dev/shm si existe), que se
+      borra entero al terminar: no quedan árboles media/ en el proyecto.
+    - Límites de CPU (RLIMIT_CPU), memoria (RLIMIT_AS) y tiempo de pared.
+    - Un máximo de renders simultáneos por proceso (semáforo).
+
+Así un render de Manim (CPU intensivo, retiene el GIL) no bloquea el proceso
+que lo lanza. Los videos de cita se encolan además en una cola de Celery
+propia (MANIM_RENDER_QUEUE) atendida por un worker dedicado, de modo que no
+compiten con las demás colas de generación.
+"""
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+WRAPPER_PATH = Path(__file__).parent / 'render_wrapper.py'
+
+DEFAULT_CONCURRENCY = 2
+DEFAULT_MEMORY_MB = 3072
+DEFAULT_CPU_SECONDS = 900
+DEFAULT_TIMEOUT = 1200
+
+_slots: Optional[threading.BoundedSemaphore] = None
+_slots_lock = threading.Lock()
+
+
+class ManimRenderError(Exception):
+    """El subproceso de render falló o superó sus límites"""
+    pass
+
+
+def _setting(name: str, default):
+    """Lee un setting de Django si está disponible (el cliente también se usa en scripts)"""
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def _get_slots() -> threading.BoundedSemaphore:
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(max(1, _setting('MANIM_RENDER_CONCURRENCY', DEFAULT_CONCURRENCY)))
+        return _slots
+
+
+def _reset_slots():
+    global _slots
+    _slots = None
+
+
+# Los workers prefork heredan el semáforo del padre: cada hijo crea el suyo
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_slots)
+
+
+def scratch_root() -> str:
+    """Directorio base para los renders: MANIM_SCRATCH_DIR, /dev/shm (tmpfs) o el temporal del sistema"""
+    configured = _setting('MANIM_SCRATCH_DIR', '')
+    if configured:
+        return configured
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def _limit_resources(memory_mb: int, cpu_seconds: int):
+    """preexec_fn del subproceso: límites de memoria/CPU y prioridad baja"""
+    import resource
+
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    os.nice(5)
+
+
+def render(
+    animation_type: str,
+    config: Dict[str, Any],
+    scene_name: str,
+    render_settings: Dict[str, Any],
+) -> Dict[str, str]:
+    """
+    Renderiza una animación en un subproceso aislado
+
+    Args:
+        animation_type: Tipo registrado en AnimationRegistry
+        config: Configuración de la animación
+        scene_name: Nombre de la clase de la escena (nombre del MP4 de salida)
+        render_settings: Parámetros de Manim (pixel_width, frame_rate...)
+
+    Returns:
+        Dict con 'video_path' y 'scratch_dir' (el llamador debe borrar
+        scratch_dir con cleanup() cuando haya subido el video)
+
+    Raises:
+        ManimRenderError: Si el render falla, se agota el tiempo o no hay salida
+    """
+    memory_mb = _setting('MANIM_RENDER_MEMORY_MB', DEFAULT_MEMORY_MB)
+    cpu_seconds = _setting('MANIM_RENDER_CPU_SECONDS', DEFAULT_CPU_SECONDS)
+    timeout = _setting('MANIM_RENDER_TIMEOUT', DEFAULT_TIMEOUT)
+
+    scratch_dir = tempfile.mkdtemp(prefix=f'manim_{uuid.uuid4().hex[:8]}_', dir=scratch_root())
+    media_dir = os.path.join(scratch_dir, 'media')
+    config_path = os.path.join(scratch_dir, 'config.json')
+
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            **config,
+            'animation_type': animation_type,
+            'render': {**render_settings, 'media_dir': media_dir, 'preview': False},
+        }, f)
+
+    env = {
+        **os.environ,
+        # Un hilo por librería numérica: menos memoria virtual reservada bajo RLIMIT_AS
+        'OMP_NUM_THREADS': '1',
+        'OPENBLAS_NUM_THREADS': '1',
+        'MKL_NUM_THREADS': '1',
+    }
+
+    with _get_slots():
+        logger.info(f"Render Manim aislado '{animation_type}' en {scratch_dir}")
+        process = subprocess.Popen(
+            [sys.executable, str(WRAPPER_PATH), config_path],
+            cwd=scratch_dir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            preexec_fn=lambda: _limit_resources(memory_mb, cpu_seconds),
+            start_new_session=True,
+        )
+        try:
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # Matar el grupo completo (Manim lanza ffmpeg como hijo)
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            cleanup(scratch_dir)
+            raise ManimRenderError(f"Render de Manim superó el tiempo máximo ({timeout}s)")
+
+    if process.returncode != 0:
+        cleanup(scratch_dir)
+        error = stderr.decode('utf-8', errors='replace').strip().splitlines()[-5:]
+        if process.returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+            error.insert(0, f"Límite de recursos alcanzado (señal {-process.returncode})")
+        raise ManimRenderError('\n'.join(error) or f"Render de Manim falló (código {process.returncode})")
+
+    for root, _, files in os.walk(media_dir):
+        if f"{scene_name}.mp4" in files and 'partial_movie_files' not in root:
+            video_path = os.path.join(root, f"{scene_name}.mp4")
+            logger.info(f"✅ Render Manim aislado completado: {video_path}")
+            return {'video_path': video_path, 'scratch_dir': scratch_dir}
+
+    cleanup(scratch_dir)
+    raise ManimRenderError(f"Video generado no encontrado en {media_dir}")
+
+
+def cleanup(scratch_dir: Optional[str]):
+    """Borra el directorio de trabajo de un render"""
+    if scratch_dir:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
@@ -77,13 +77,17 @@ if not animation_class:
     print(f"Tipos disponibles: {available}", file=sys.stderr)
     sys.exit(1)
 
-# Extraer configuración específica de la animación (sin animation_type)
-animation_config = {k: v for k, v in config_data.items() if k != 'animation_type'}
+# Parámetros de Manim (resolución, fps, media_dir...) si los envía el pool de render
+render_config = config_data.get('render') or {}
+
+# Extraer configuración específica de la animación (sin animation_type ni render)
+animation_config = {k: v for k, v in config_data.items() if k not in ('animation_type', 'render')}
 
 # Crear y ejecutar la animación con configuración
 try:
-    scene = animation_class(config=animation_config)
-    scene.render()
+    with tempconfig(render_config):
+        scene = animation_class(config=animation_config)
+        scene.render()
 except Exception as e:
     print(f"Error al ejecutar animación '{animation_type}': {e}", file=sys.stderr)
     import traceback
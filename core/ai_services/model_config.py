@@ -705,7 +705,7 @@ MODEL_CAPABILITIES: Dict[str, Dict] = {
             'text_to_video': True,
             'image_to_video': False,
             'duration': {'min': 5, 'max': 12, 'variable': True},
-            'aspect_ratio': ['16:9'],
+            'aspect_ratio': ['16:9', '9:16', '1:1'],
             'resolution': False,
             'audio': False,
             'references': {
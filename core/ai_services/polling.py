@@ -0,0 +1,141 @@
+"""
+Calendario de polling de trabajos asíncronos de proveedores (Kling, Sora, Higgsfield)
+
+En lugar de consultar cada N segundos fijos, la primera consulta se hace hacia
+la mitad del tiempo típico de render del modelo y las siguientes crecen con
+backoff exponencial (con jitter) hasta un techo proporcional a ese tiempo.
+
+Las tareas de Celery usan next_poll_delay() como countdown de self.retry() para
+aparcar la espera sin ocupar el worker; wait_for_job() es la versión bloqueante
+para scripts y ejemplos.
+"""
+import logging
+import random
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Tiempo típico de render por proveedor (segundos)
+PROVIDER_RENDER_SECONDS = {
+    'kling': 180,
+    'sora': 240,
+    'higgsfield': 90,
+}
+
+# Modelos que se desvían mucho del tiempo de su proveedor
+MODEL_RENDER_SECONDS = {
+    'kling-v2-master': 300,
+    'kling-v2-5-turbo': 90,
+    'sora-2-pro': 480,
+    'higgsfield-ai/dop/preview': 45,
+    'bytedance/seedance/v1/pro/image-to-video': 150,
+    'kling-video/v2.1/pro/image-to-video': 240,
+    # Imágenes
+    'higgsfield-ai/soul/standard': 20,
+    'reve/text-to-image': 15,
+    'flux-pro/kontext/max/text-to-image': 20,
+}
+
+DEFAULT_RENDER_SECONDS = 120
+
+# Intervalo mínimo entre consultas y factor de crecimiento del backoff
+MIN_POLL_INTERVAL = 3
+BACKOFF_FACTOR = 1.5
+# Techo del intervalo como fracción del tiempo típico de render
+MAX_INTERVAL_RATIO = 0.5
+# Espera máxima por defecto: varias veces el tiempo típico
+TIMEOUT_RATIO = 6
+
+
+def typical_render_seconds(provider: Optional[str], model_id: Optional[str] = None) -> float:
+    """Tiempo típico de render de un modelo (o de su proveedor si no tiene perfil propio)"""
+    if model_id and model_id in MODEL_RENDER_SECONDS:
+        return MODEL_RENDER_SECONDS[model_id]
+    return PROVIDER_RENDER_SECONDS.get(provider, DEFAULT_RENDER_SECONDS)
+
+
+def next_poll_delay(provider: Optional[str], model_id: Optional[str], attempt: int) -> float:
+    """
+    Segundos hasta la siguiente consulta de estado
+
+    Args:
+        provider: 'kling', 'sora' o 'higgsfield'
+        model_id: Modelo del trabajo (ajusta el calendario al tiempo típico)
+        attempt: Consultas ya realizadas (0 = primera consulta tras el envío)
+    """
+    typical = typical_render_seconds(provider, model_id)
+    if attempt == 0:
+        base = typical * 0.5
+    else:
+        base = typical * 0.1 * (BACKOFF_FACTOR ** (attempt - 1))
+    base = min(max(base, MIN_POLL_INTERVAL), max(typical * MAX_INTERVAL_RATIO, MIN_POLL_INTERVAL))
+    # Jitter ±20% para que los trabajos enviados a la vez no se consulten a la vez
+    return round(base * random.uniform(0.8, 1.2), 1)
+
+
+def poll_timeout(provider: Optional[str], model_id: Optional[str] = None) -> float:
+    """Espera máxima razonable para un trabajo antes de darlo por perdido"""
+    return typical_render_seconds(provider, model_id) * TIMEOUT_RATIO
+
+
+def wait_for_job(
+    get_status: Callable[[str], Dict],
+    job_id: str,
+    provider: str,
+    model_id: Optional[str] = None,
+    max_wait_seconds: Optional[float] = None,
+    poll_interval: Optional[float] = None,
+    done_states: Iterable[str] = ('completed',),
+    failed_states: Iterable[str] = ('failed',),
+    id_key: str = 'id',
+) -> Dict:
+    """
+    Espera de forma bloqueante a que termine un trabajo (solo scripts/ejemplos)
+
+    En workers de Celery no se debe usar: hay que re-programar la tarea con
+    next_poll_delay() como countdown.
+
+    Args:
+        get_status: Función del cliente que consulta el estado del trabajo
+        job_id: ID del trabajo en el proveedor
+        provider: Proveedor (para el calendario de polling)
+        model_id: Modelo del trabajo
+        max_wait_seconds: Espera máxima (por defecto, poll_timeout())
+        poll_interval: Intervalo fijo; None = calendario adaptativo
+        done_states / failed_states: Estados finales del proveedor
+        id_key: Clave del ID en el dict de timeout
+
+    Returns:
+        dict con el estado final del trabajo (status 'timeout' si se agota la espera)
+    """
+    max_wait_seconds = max_wait_seconds or poll_timeout(provider, model_id)
+    start_time = time.time()
+    attempt = 0
+
+    while True:
+        elapsed = time.time() - start_time
+        if elapsed > max_wait_seconds:
+            logger.error(f"❌ Timeout esperando {job_id} después de {elapsed:.1f}s")
+            return {
+                id_key: job_id,
+                'status': 'timeout',
+                'error': f'Timeout after {elapsed:.1f}s'
+            }
+
+        delay = poll_interval or next_poll_delay(provider, model_id, attempt)
+        time.sleep(min(delay, max(max_wait_seconds - elapsed, 0)))
+        attempt += 1
+
+        status_data = get_status(job_id)
+        status = status_data.get('status')
+        elapsed = time.time() - start_time
+
+        if status in done_states:
+            logger.info(f"✅ {job_id} completado en {elapsed:.1f}s!")
+            return status_data
+        if status in failed_states:
+            logger.error(f"❌ {job_id} falló después de {elapsed:.1f}s")
+            return status_data
+        logger.info(f"⏳ {job_id}: {status} ({elapsed:.1f}s transcurridos)")
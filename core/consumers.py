@@ -33,6 +33,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
         
+        # Grupos de proyecto a los que se ha suscrito esta conexión
+        self.project_groups = set()
+        
         await self.accept()
         
         # Enviar notificaciones pendientes al reconectar
@@ -47,6 +50,8 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 self.group_name,
                 self.channel_name
             )
+        for project_group in getattr(self, 'project_groups', set()):
+            await self.channel_layer.group_discard(project_group, self.channel_name)
         if hasattr(self, 'user') and self.user.is_authenticated:
             logger.info(f"Usuario {self.user.id} desconectado de notificaciones")
     
@@ -66,6 +71,13 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 # Marcar todas como leídas
                 await self.mark_all_notifications_read()
             
+            elif message_type == 'subscribe_project':
+                # Recibir el progreso de todas las tareas de un proyecto
+                await self.subscribe_project(data.get('project_id'))
+            
+            elif message_type == 'unsubscribe_project':
+                await self.unsubscribe_project(data.get('project_id'))
+            
         except json.JSONDecodeError:
             logger.error("Error decodificando mensaje WebSocket")
         except Exception as e:
@@ -89,6 +101,41 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'progress': progress_data
         }))
     
+    async def task_progress(self, event):
+        """Enviar evento del bus de progreso (cambio de estado o porcentaje) al cliente"""
+        await self.send(text_data=json.dumps({
+            'type': 'task_progress',
+            'event': event['event']
+        }))
+    
+    async def assistant_stream(self, event):
+        """Enviar fragmento de respuesta del asistente de documentación al cliente"""
+        await self.send(text_data=json.dumps({
+            'type': 'assistant_stream',
+            'event': event['event']
+        }))
+    
+    async def subscribe_project(self, project_id):
+        """Unirse al grupo de progreso de un proyecto si el usuario tiene acceso"""
+        if not project_id or not self.channel_layer:
+            return
+        if not await self.can_access_project(project_id):
+            logger.warning(f"Usuario {self.user.id} sin acceso al proyecto {project_id}")
+            return
+        
+        from core.services.progress_bus import ProgressBus
+        group = ProgressBus.project_group(project_id)
+        await self.channel_layer.group_add(group, self.channel_name)
+        self.project_groups.add(group)
+    
+    async def unsubscribe_project(self, project_id):
+        """Salir del grupo de progreso de un proyecto"""
+        from core.services.progress_bus import ProgressBus
+        group = ProgressBus.project_group(project_id)
+        if group in self.project_groups and self.channel_layer:
+            await self.channel_layer.group_discard(group, self.channel_name)
+            self.project_groups.discard(group)
+    
     async def send_pending_notifications(self):
         """Enviar solo el contador de notificaciones pendientes al reconectar (sin crear toasts)"""
         count = await self.get_unread_count()
@@ -122,6 +169,13 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             for n in notifications
         ]
     
+    @database_sync_to_async
+    def can_access_project(self, project_id):
+        """Comprobar acceso del usuario al proyecto"""
+        from core.models import Project
+        project = Project.objects.filter(id=project_id).first()
+        return bool(project and project.has_access(self.user))
+    
     @database_sync_to_async
     def get_unread_count(self):
         """Obtener conteo de notificaciones no leídas"""
@@ -188,4 +242,3 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             )
         except Exception as e:
             logger.warning(f"Error enviando notificación via WebSocket: {e}")
-
@@ -0,0 +1,60 @@
+"""
+Comando para mostrar tiempos y coste de generación por proveedor, modelo y etapa
+Uso: python manage.py generation_stats [--days N] [--provider P] [--stage S] [--json]
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.monitoring.telemetry import GenerationTelemetry
+
+
+def _format_ms(value):
+    if value is None:
+        return '-'
+    if value >= 60000:
+        return f'{value / 60000:.1f}m'
+    if value >= 1000:
+        return f'{value / 1000:.1f}s'
+    return f'{value}ms'
+
+
+class Command(BaseCommand):
+    help = 'Muestra p50/p95 de duración y coste medio de generación por proveedor, modelo y etapa'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Ventana en días (default: 7)')
+        parser.add_argument('--provider', type=str, help='Filtrar por proveedor (heygen, veo, sora, kling...)')
+        parser.add_argument('--stage', type=str, help='Filtrar por etapa (queue_wait, processing, end_to_end, submit, poll, upload, ffmpeg...)')
+        parser.add_argument('--json', action='store_true', help='Salida en JSON')
+
+    def handle(self, *args, **options):
+        rows = GenerationTelemetry.summary(
+            days=options['days'],
+            provider=options.get('provider'),
+            stage=options.get('stage'),
+            use_cache=False,
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'\n⏱️  Telemetría de generación (últimos {options["days"]} días)'))
+        self.stdout.write('=' * 100)
+
+        if not rows:
+            self.stdout.write(self.style.WARNING('No hay spans registrados en el período'))
+            return
+
+        header = f'{"Proveedor":<12} {"Modelo":<32} {"Etapa":<12} {"N":>6} {"Err":>5} {"p50":>8} {"p95":>8} {"máx":>8} {"Créditos":>9}'
+        self.stdout.write(header)
+        self.stdout.write('-' * 100)
+        for row in rows:
+            credits = f'{row["avg_credits"]:.2f}' if row['avg_credits'] is not None else '-'
+            self.stdout.write(
+                f'{(row["provider"] or "-"):<12} {(row["model"] or "-")[:32]:<32} {row["stage"]:<12} '
+                f'{row["count"]:>6} {row["errors"]:>5} {_format_ms(row["p50_ms"]):>8} '
+                f'{_format_ms(row["p95_ms"]):>8} {_format_ms(row["max_ms"]):>8} {credits:>9}'
+            )
+        self.stdout.write('')
@@ -3,7 +3,7 @@ Comando de management para re-indexar la documentación RAG
 """
 
 from django.core.management.base import BaseCommand
-from core.rag.assistant import DocumentationAssistant
+from core.rag.indexer import IncrementalIndexer
 from core.rag.vector_store import VectorStoreManager
 import logging
 
@@ -11,13 +11,13 @@ logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = 'Re-indexa la documentación para el asistente RAG'
+    help = 'Re-indexa la documentación para el asistente RAG (solo los archivos modificados)'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Fuerza la re-indexación incluso si el índice existe',
+            help='Reconstruye el índice completo (re-embebe todos los chunks)',
         )
 
     def handle(self, *args, **options):
@@ -26,24 +26,27 @@ class Command(BaseCommand):
         self.stdout.write(self.style.WARNING('🔄 Re-indexando documentación RAG...'))
         
         try:
-            # Eliminar índice anterior si existe
+            # Los procesos en marcha siguen usando el índice anterior hasta que
+            # se guarda la nueva generación (intercambio atómico)
             vector_store_manager = VectorStoreManager()
-            deleted = vector_store_manager.delete_index()
-            
-            if deleted:
-                self.stdout.write(self.style.SUCCESS('✓ Índice anterior eliminado'))
-            else:
-                self.stdout.write(self.style.WARNING('⚠ No había índice anterior'))
-            
-            # Crear nuevo índice
             self.stdout.write('📚 Cargando documentos desde docs/api...')
-            assistant = DocumentationAssistant(reindex=True)
+            stats = IncrementalIndexer(vector_store_manager).run(full=force)
             
             self.stdout.write(self.style.SUCCESS('✅ Documentación re-indexada exitosamente'))
+            if stats['full_rebuild']:
+                self.stdout.write('   Reconstrucción completa')
+            self.stdout.write(
+                f"   Archivos: {stats['files']} ({stats['files_changed']} modificados, "
+                f"{stats['files_removed']} eliminados)"
+            )
+            self.stdout.write(
+                f"   Chunks: {stats['chunks_added']} nuevos, {stats['chunks_removed']} eliminados, "
+                f"{stats['chunks_kept']} reutilizados"
+            )
             self.stdout.write(f'   Ubicación: {vector_store_manager.index_path}')
+            self.stdout.write(f"   Generación: {stats['generation']}")
             
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'❌ Error al re-indexar: {str(e)}'))
             logger.error(f"Error al re-indexar: {e}", exc_info=True)
             raise
-
@@ -0,0 +1,46 @@
+"""
+Comando Django para ejecutar el watcher de estado de proveedores como proceso dedicado.
+
+Uso: python manage.py run_status_watcher [--once]
+
+Alternativa a la tarea periódica watch_provider_status_task: mantiene la tabla
+de videos pendientes en memoria durante toda la vida del proceso y consulta a
+cada proveedor por lotes según su intervalo adaptativo.
+
+Opciones:
+  --once: Ejecutar una sola ronda (sincronizar + consultar) y salir
+"""
+
+from django.core.management.base import BaseCommand
+from core.services.status_watcher import status_watcher
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta el watcher de estado de proveedores de video'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Ejecutar una sola ronda y salir',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            pending = status_watcher.sync(force=True)
+            self.stdout.write(f'Videos pendientes: {pending}')
+            for provider, count in status_watcher.pending_count().items():
+                if count:
+                    self.stdout.write(f'  {provider}: {count}')
+
+            results = status_watcher.tick()
+            for provider, transitions in results.items():
+                self.stdout.write(f'  {provider}: {transitions} transiciones')
+            self.stdout.write(self.style.SUCCESS('✅ Ronda completada'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('👀 Watcher de estado de proveedores iniciado (Ctrl+C para salir)'))
+        try:
+            status_watcher.run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nWatcher detenido'))
@@ -46,6 +46,10 @@ class LoginRequiredMiddleware:
         if request.path.startswith('/ws/'):
             return self.get_response(request)
 
+        # Allow provider webhooks (autenticados con token compartido en la vista)
+        if request.path.startswith('/webhooks/providers/'):
+            return self.get_response(request)
+
         # Allow exempt urls for everyone (important so logout isn't blocked for no-perm users)
         if request.path in exempt_urls:
             return self.get_response(request)
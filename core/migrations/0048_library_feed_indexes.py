@@ -0,0 +1,30 @@
+# Índices para el feed unificado de la biblioteca (LibraryFeed):
+# cada parte del UNION ALL filtra por created_by y ordena por -created_at
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_add_generation_task_if_missing'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='video_library_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='image_library_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audio',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='audio_library_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='script',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='script_library_feed_idx'),
+        ),
+    ]
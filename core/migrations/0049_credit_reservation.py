@@ -0,0 +1,45 @@
+# Reservas de créditos (reserve/commit/refund) para generaciones largas
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0048_library_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(db_index=True, default=uuid.uuid4, editable=False, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Créditos reservados', max_digits=10)),
+                ('service_name', models.CharField(blank=True, max_length=50)),
+                ('operation_type', models.CharField(blank=True, max_length=50)),
+                ('status', models.CharField(choices=[('reserved', 'Reservado'), ('committed', 'Confirmado'), ('refunded', 'Reembolsado')], default='reserved', max_length=20)),
+                ('object_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('settled_at', models.DateTimeField(blank=True, null=True)),
+                ('content_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='contenttypes.contenttype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_reservations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reserva de Créditos',
+                'verbose_name_plural': 'Reservas de Créditos',
+                'ordering': ['-created_at'],
+                'indexes': [
+                    models.Index(fields=['status', 'created_at'], name='core_credit_status_e65352_idx'),
+                    models.Index(fields=['user', 'status'], name='core_credit_user_id_0913b0_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Telemetría de generaciones: duración por etapa, proveedor y modelo
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0049_credit_reservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_type', models.CharField(blank=True, help_text='video, image, audio o scene', max_length=20)),
+                ('provider', models.CharField(blank=True, max_length=50)),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('stage', models.CharField(help_text='Etapa medida (queue_wait, submit, poll, upload...)', max_length=30)),
+                ('duration_ms', models.PositiveIntegerField()),
+                ('success', models.BooleanField(default=True)),
+                ('credits', models.DecimalField(blank=True, decimal_places=2, help_text='Coste en créditos (solo en la etapa end_to_end)', max_digits=10, null=True)),
+                ('task_uuid', models.UUIDField(blank=True, null=True)),
+                ('item_ref', models.CharField(blank=True, help_text='UUID del item (o id para escenas)', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Span de Generación',
+                'verbose_name_plural': 'Spans de Generación',
+                'db_table': 'generation_span',
+                'ordering': ['-created_at'],
+                'indexes': [
+                    models.Index(fields=['stage', 'provider', 'model', 'created_at'], name='generation__stage_b8214b_idx'),
+                ],
+            },
+        ),
+    ]
@@ -203,6 +203,15 @@ class Project(models.Model):
         return self.scenes.filter(video_status='completed').count()
 
 
+def schedule_derivatives(item):
+    """Encola los derivados para listados de un Video, Image o Audio (miniaturas, preview, picos de audio)"""
+    try:
+        from core.services.derivatives import DerivativeService
+        DerivativeService.schedule(item=item)
+    except Exception as e:
+        logger.warning(f"No se pudieron encolar derivados de {item._meta.model_name} {item.id}: {e}")
+
+
 class Video(models.Model):
     """Modelo para videos generados por IA"""
     
@@ -289,6 +298,10 @@ class Video(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Video'
         verbose_name_plural = 'Videos'
+        indexes = [
+            # Feed unificado de la biblioteca (LibraryFeed)
+            models.Index(fields=['created_by', '-created_at', '-id'], name='video_library_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.get_type_display()})"
@@ -328,6 +341,7 @@ class Video(models.Model):
         
         # Guardar primero para tener la duración disponible
         self.save(update_fields=['status', 'completed_at', 'gcs_path', 'duration', 'metadata', 'updated_at'])
+        schedule_derivatives(self)
         
         # AHORA intentar cobrar créditos DESPUÉS de tener la metadata y duración guardadas
         if charge_credits:
@@ -360,10 +374,22 @@ class Video(models.Model):
                     self.save(update_fields=['metadata'])
 
     def mark_as_error(self, error_message):
-        """Marca el video con error"""
+        """Marca el video con error y devuelve los créditos reservados"""
         self.status = 'error'
         self.error_message = error_message
-        self.save(update_fields=['status', 'error_message', 'updated_at'])
+        update_fields = ['status', 'error_message', 'updated_at']
+        
+        reservation_uuid = (self.metadata or {}).get('credit_reservation')
+        if reservation_uuid and not self.metadata.get('credits_charged'):
+            try:
+                from core.services.credits import CreditService
+                CreditService.refund_reservation(reservation_uuid, reason=f"Video {self.id} con error")
+                self.metadata.pop('credit_reservation', None)
+                update_fields.append('metadata')
+            except Exception as e:
+                logger.error(f"Error al reembolsar reserva de créditos del video {self.id}: {e}", exc_info=True)
+        
+        self.save(update_fields=update_fields)
 
 
 class Image(models.Model):
@@ -457,6 +483,10 @@ class Image(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Imagen'
         verbose_name_plural = 'Imágenes'
+        indexes = [
+            # Feed unificado de la biblioteca (LibraryFeed)
+            models.Index(fields=['created_by', '-created_at', '-id'], name='image_library_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.get_type_display()})"
@@ -482,6 +512,7 @@ class Image(models.Model):
             self.metadata.update(metadata)
         
         self.save(update_fields=['status', 'completed_at', 'gcs_path', 'metadata', 'updated_at'])
+        schedule_derivatives(self)
         
         # Cobrar créditos automáticamente
         if charge_credits:
@@ -697,6 +728,10 @@ class Audio(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Audio'
         verbose_name_plural = 'Audios'
+        indexes = [
+            # Feed unificado de la biblioteca (LibraryFeed)
+            models.Index(fields=['created_by', '-created_at', '-id'], name='audio_library_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.voice_name or self.voice_id})"
@@ -730,6 +765,7 @@ class Audio(models.Model):
             'status', 'completed_at', 'gcs_path', 'duration', 
             'metadata', 'alignment', 'updated_at'
         ])
+        schedule_derivatives(self)
         
         # Cobrar créditos automáticamente
         if charge_credits:
@@ -919,6 +955,10 @@ class Script(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Guión'
         verbose_name_plural = 'Guiones'
+        indexes = [
+            # Feed unificado de la biblioteca (LibraryFeed)
+            models.Index(fields=['created_by', '-created_at', '-id'], name='script_library_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
@@ -1322,6 +1362,7 @@ class Scene(models.Model):
             self.metadata.update(metadata)
         
         self.save(update_fields=['video_status', 'completed_at', 'video_gcs_path', 'metadata', 'updated_at'])
+        self._release_provider_slot()
         
         # Cobrar créditos automáticamente
         if charge_credits:
@@ -1344,10 +1385,23 @@ class Scene(models.Model):
                     # No fallar la operación si falla el cobro
 
     def mark_video_as_error(self, error_message):
-        """Marca el video con error"""
+        """Marca el video con error y devuelve los créditos reservados"""
         self.video_status = 'error'
         self.error_message = error_message
-        self.save(update_fields=['video_status', 'error_message', 'updated_at'])
+        update_fields = ['video_status', 'error_message', 'updated_at']
+        
+        reservation_uuid = (self.metadata or {}).get('credit_reservation')
+        if reservation_uuid and not self.metadata.get('credits_charged'):
+            try:
+                from core.services.credits import CreditService
+                CreditService.refund_reservation(reservation_uuid, reason=f"Escena {self.id} con error")
+                self.metadata.pop('credit_reservation', None)
+                update_fields.append('metadata')
+            except Exception as e:
+                logger.error(f"Error al reembolsar reserva de créditos de la escena {self.id}: {e}", exc_info=True)
+        
+        self.save(update_fields=update_fields)
+        self._release_provider_slot()
     
     def mark_audio_as_processing(self):
         """Marca el audio como procesando"""
@@ -1431,9 +1485,22 @@ class Scene(models.Model):
         self.error_message = error_message
         self.save(update_fields=['final_video_status', 'error_message', 'updated_at'])
     
+    def _release_provider_slot(self):
+        """Libera el slot de concurrencia del proveedor ocupado al enviar la escena"""
+        try:
+            from core.services.scheduler import provider_scheduler
+            provider, model = provider_scheduler.classify(self, 'scene_video')
+            provider_scheduler.release(provider, f"scene:{self.id}", model)
+        except Exception:
+            pass
+    
+    def uses_tts_audio(self) -> bool:
+        """Indica si el audio de la escena se genera aparte con TTS (Veo/Sora sin avatar)"""
+        return self.ai_service in ['gemini_veo', 'sora', 'vuela_ai']
+    
     def needs_audio(self) -> bool:
         """Determina si esta escena necesita audio (Veo/Sora sin avatar)"""
-        return self.ai_service in ['gemini_veo', 'sora', 'vuela_ai'] and self.video_status == 'completed'
+        return self.uses_tts_audio() and self.video_status == 'completed'
     
     def needs_combination(self) -> bool:
         """Determina si esta escena necesita combinar video+audio"""
@@ -1812,6 +1879,67 @@ class ServiceUsage(models.Model):
         return f"{self.user.username}: {self.service_name} - {self.credits_spent} créditos"
 
 
+class CreditReservation(models.Model):
+    """
+    Reserva de créditos para una generación de larga duración
+    
+    Los créditos se descuentan del saldo al reservar; al terminar la generación
+    la reserva se confirma (committed) con el coste real o se devuelve (refunded)
+    si falla. Las transiciones de estado son UPDATE condicionales sobre status.
+    """
+    STATUS_CHOICES = [
+        ('reserved', 'Reservado'),
+        ('committed', 'Confirmado'),
+        ('refunded', 'Reembolsado'),
+    ]
+    
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='credit_reservations'
+    )
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text='Créditos reservados'
+    )
+    service_name = models.CharField(max_length=50, blank=True)
+    operation_type = models.CharField(max_length=50, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='reserved'
+    )
+    
+    # Recurso que se está generando
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    resource = GenericForeignKey('content_type', 'object_id')
+    
+    metadata = models.JSONField(default=dict, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    settled_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', 'status']),
+        ]
+        verbose_name = 'Reserva de Créditos'
+        verbose_name_plural = 'Reservas de Créditos'
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.status} {self.amount} créditos"
+
+
 class GenerationTask(models.Model):
     """Tracking de tareas de generación en cola"""
     
@@ -1925,23 +2053,27 @@ class GenerationTask(models.Model):
         self._dispatch_status_change()
     
     def _dispatch_status_change(self):
-        """Dispara evento JavaScript para actualizar UI (solo si hay canales configurados)"""
+        """Publica el cambio de estado en el bus de progreso (WebSocket + snapshot en caché)"""
+        # Cada paso por separado: un fallo en uno no impide los demás
+        if self.status in ['completed', 'failed', 'cancelled']:
+            try:
+                # Liberar el slot de concurrencia del proveedor
+                from core.services.scheduler import provider_scheduler
+                provider_scheduler.release_task(self)
+            except Exception:
+                logger.exception(f"No se pudo liberar el slot de concurrencia de la tarea {self.uuid}")
+            
+            try:
+                from core.monitoring.telemetry import GenerationTelemetry
+                GenerationTelemetry.record_task_lifecycle(self)
+            except Exception:
+                logger.exception(f"No se pudo registrar la telemetría de la tarea {self.uuid}")
+        
         try:
-            from channels.layers import get_channel_layer
-            from asgiref.sync import async_to_sync
-            channel_layer = get_channel_layer()
-            if channel_layer:
-                async_to_sync(channel_layer.group_send)(
-                    f'user_{self.user.id}',
-                    {
-                        'type': 'task_status_changed',
-                        'task_uuid': str(self.uuid),
-                        'status': self.status,
-                    }
-                )
+            from core.services.progress_bus import ProgressBus
+            ProgressBus.publish_task(self)
         except Exception:
-            # Si no hay canales configurados o hay error, no hacer nada
-            pass
+            logger.exception(f"No se pudo publicar el estado {self.status} de la tarea {self.uuid}")
     
     def mark_as_completed(self, gcs_path=None, duration=None, metadata=None, alignment=None):
         """Marca la tarea como completada"""
@@ -1980,6 +2112,44 @@ class GenerationTask(models.Model):
         self._dispatch_status_change()
 
 
+class GenerationSpan(models.Model):
+    """
+    Duración de una etapa de una generación (telemetría)
+    
+    Una fila por etapa medida: espera en cola, envío al proveedor, consultas de
+    estado, subida a GCS, FFmpeg... Se agregan en p50/p95 por proveedor, modelo
+    y etapa (ver core/monitoring/telemetry.py).
+    """
+    task_type = models.CharField(max_length=20, blank=True, help_text='video, image, audio o scene')
+    provider = models.CharField(max_length=50, blank=True)
+    model = models.CharField(max_length=100, blank=True)
+    stage = models.CharField(max_length=30, help_text='Etapa medida (queue_wait, submit, poll, upload...)')
+    duration_ms = models.PositiveIntegerField()
+    success = models.BooleanField(default=True)
+    credits = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text='Coste en créditos (solo en la etapa end_to_end)'
+    )
+    task_uuid = models.UUIDField(null=True, blank=True)
+    item_ref = models.CharField(max_length=64, blank=True, help_text='UUID del item (o id para escenas)')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        db_table = 'generation_span'
+        verbose_name = 'Span de Generación'
+        verbose_name_plural = 'Spans de Generación'
+        indexes = [
+            models.Index(fields=['stage', 'provider', 'model', 'created_at']),
+        ]
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.provider}/{self.model} {self.stage}: {self.duration_ms}ms"
+
+
 class Notification(models.Model):
     """Notificaciones del sistema"""
     
@@ -2265,10 +2435,28 @@ class PromptTemplate(models.Model):
             return 0.0
         return (self.upvotes / total) * 5.0
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._invalidate_remix_cache()
+    
+    def delete(self, *args, **kwargs):
+        template_uuid = self.uuid
+        result = super().delete(*args, **kwargs)
+        self._invalidate_remix_cache(template_uuid)
+        return result
+    
+    def _invalidate_remix_cache(self, template_uuid=None):
+        """Descarta los datos cacheados del template (texto, versión, activo) tras cambiarlo"""
+        try:
+            from core.services.prompt_remix import prompt_remix_cache
+            prompt_remix_cache.invalidate_template(template_uuid or self.uuid)
+        except Exception as e:
+            logger.warning(f"No se pudo invalidar la caché del template {template_uuid or self.uuid}: {e}")
+    
     def increment_usage(self):
-        """Incrementa el contador de uso"""
-        self.usage_count += 1
-        self.save(update_fields=['usage_count'])
+        """Incrementa el contador de uso (acumulado en Redis, ver TemplateUsageCounter)"""
+        from core.services.prompt_remix import template_usage
+        template_usage.incr(self.uuid)
     
     def is_accessible_by(self, user):
         """Verifica si un usuario puede acceder a esta plantilla"""
@@ -4,6 +4,7 @@ Sistema de observabilidad y monitoreo
 
 from .langsmith_config import setup_langsmith
 from .metrics import AgentMetrics
+from .telemetry import GenerationTelemetry
 
-__all__ = ['setup_langsmith', 'AgentMetrics']
+__all__ = ['setup_langsmith', 'AgentMetrics', 'GenerationTelemetry']
 
@@ -0,0 +1,296 @@
+"""
+Telemetría de generaciones (tiempos y coste por proveedor, modelo y etapa)
+
+Cada etapa medida se guarda como un GenerationSpan:
+
+    queue_wait   encolado → el worker empieza (GenerationTask)
+    processing   el worker empieza → estado final (GenerationTask)
+    end_to_end   encolado → estado final, con el coste en créditos
+    submit       envío del trabajo al proveedor
+    generate     generación síncrona completa (proveedores de imagen)
+    poll         consulta de estado al proveedor (_check_*_status)
+    upload       subida del resultado a GCS
+    ffmpeg       mezcla/composición con FFmpeg
+
+Los spans se anidan con span(): los atributos (task_type, provider, model...)
+del span exterior se heredan en los interiores a través de un ContextVar, de
+modo que una subida a GCS dentro de una consulta de estado queda atribuida al
+modelo correcto sin pasarle nada.
+
+summary() agrega p50/p95 por (provider, model, stage) en la propia BD
+(percentile_disc en PostgreSQL); lo usan el comando generation_stats, el
+endpoint JSON y las estimaciones del ProviderScheduler.
+"""
+import logging
+import math
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Aggregate, Avg, Count, IntegerField, Max, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# Fracción de spans que se guardan por etapa (las consultas de estado son muy
+# frecuentes); los spans fallidos se guardan siempre
+STAGE_SAMPLE_RATES = {
+    'poll': 0.2,
+}
+
+SUMMARY_CACHE_PREFIX = 'generation_telemetry:summary:'
+SUMMARY_TTL = 60
+
+_context: ContextVar[Dict] = ContextVar('generation_telemetry', default={})
+
+
+def _enabled() -> bool:
+    return getattr(settings, 'GENERATION_TELEMETRY_ENABLED', True)
+
+
+def _percentile(sorted_values: List[int], fraction: float) -> Optional[int]:
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class PercentileDisc(Aggregate):
+    """Percentil por rango más cercano calculado en PostgreSQL"""
+    function = 'PERCENTILE_DISC'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = IntegerField()
+
+    def __init__(self, expression, fraction: float, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+class GenerationTelemetry:
+    """Registro de spans de generación y agregados por modelo"""
+
+    # ----------------
+    # REGISTRO
+    # ----------------
+
+    @staticmethod
+    @contextmanager
+    def span(stage: str, ok_exceptions: tuple = (), **attributes):
+        """
+        Mide la duración de un bloque y la guarda como GenerationSpan
+
+        Los atributos no indicados se heredan del span exterior. Si el bloque
+        lanza una excepción el span se guarda con success=False (salvo las de
+        ok_exceptions, que no son fallos) y la excepción se propaga.
+
+        Uso:
+            with GenerationTelemetry.span('submit', task_type='video', provider='sora', model='sora-2'):
+                ...
+        """
+        context = {**_context.get(), **{k: v for k, v in attributes.items() if v is not None}}
+        token = _context.set(context)
+        start = time.monotonic()
+        success = True
+        try:
+            yield context
+        except Exception as e:
+            success = isinstance(e, ok_exceptions)
+            raise
+        finally:
+            _context.reset(token)
+            GenerationTelemetry.record(stage, (time.monotonic() - start) * 1000, success=success, **context)
+
+    @staticmethod
+    def record(stage: str, duration_ms: float, success: bool = True, credits=None, **attributes):
+        """Guarda un span ya medido (nunca lanza excepciones)"""
+        if not _enabled():
+            return
+        if success and random.random() >= STAGE_SAMPLE_RATES.get(stage, 1.0):
+            return
+        try:
+            from core.models import GenerationSpan
+            GenerationSpan.objects.create(
+                stage=stage,
+                duration_ms=max(int(duration_ms), 0),
+                success=success,
+                credits=credits,
+                task_type=attributes.get('task_type') or '',
+                provider=attributes.get('provider') or '',
+                model=str(attributes.get('model') or '')[:100],
+                task_uuid=attributes.get('task_uuid'),
+                item_ref=str(attributes.get('item_ref') or '')[:64],
+            )
+        except Exception as e:
+            logger.debug(f"No se pudo guardar span de telemetría {stage}: {e}")
+
+    @staticmethod
+    def task_attributes(task) -> Dict:
+        """Atributos de span de una GenerationTask (proveedor y modelo los fija QueueService)"""
+        metadata = task.metadata or {}
+        return {
+            'task_type': task.task_type,
+            'provider': metadata.get('provider'),
+            'model': metadata.get('model'),
+            'task_uuid': task.uuid,
+            'item_ref': metadata.get('item_id') or metadata.get('item_uuid') or task.item_uuid,
+        }
+
+    @classmethod
+    def record_task_lifecycle(cls, task):
+        """
+        Registra los tiempos de una GenerationTask al llegar a un estado final
+
+        queue_wait y processing solo si la tarea llegó a empezar; end_to_end
+        lleva el coste en créditos del item si se completó.
+        """
+        if task.status not in ('completed', 'failed') or not task.completed_at:
+            return
+        attributes = cls.task_attributes(task)
+        success = task.status == 'completed'
+
+        if task.started_at:
+            cls.record('queue_wait', (task.started_at - task.created_at).total_seconds() * 1000, **attributes)
+            cls.record(
+                'processing', (task.completed_at - task.started_at).total_seconds() * 1000,
+                success=success, **attributes
+            )
+        cls.record(
+            'end_to_end', (task.completed_at - task.created_at).total_seconds() * 1000,
+            success=success, credits=cls._task_cost(task) if success else None, **attributes
+        )
+
+    @staticmethod
+    def _task_cost(task):
+        """Coste en créditos del item de una tarea completada (None si no se puede calcular)"""
+        from core.models import Video, Image, Audio, Scene
+        from core.services.credits import CreditService
+
+        metadata = task.metadata or {}
+        try:
+            if task.task_type == 'video':
+                return CreditService.calculate_video_cost(Video.objects.get(uuid=metadata.get('item_uuid') or task.item_uuid))
+            if task.task_type == 'image':
+                return CreditService.calculate_image_cost(Image.objects.get(uuid=metadata.get('item_uuid') or task.item_uuid))
+            if task.task_type == 'audio':
+                return CreditService.calculate_audio_cost(Audio.objects.get(uuid=metadata.get('item_uuid') or task.item_uuid))
+            if task.task_type == 'scene' and metadata.get('item_id'):
+                return CreditService.calculate_scene_video_cost(Scene.objects.get(id=metadata['item_id']))
+        except Exception as e:
+            logger.debug(f"No se pudo calcular el coste de la tarea {task.uuid}: {e}")
+        return None
+
+    # ----------------
+    # AGREGADOS
+    # ----------------
+
+    @classmethod
+    def summary(
+        cls,
+        days: int = 7,
+        provider: Optional[str] = None,
+        stage: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> List[Dict]:
+        """
+        p50/p95 por (provider, model, stage) en los últimos `days` días
+
+        Returns:
+            Lista de dicts con provider, model, stage, count, errors, p50_ms,
+            p95_ms, max_ms y avg_credits, ordenada por provider/model/stage
+        """
+        cache_key = f"{SUMMARY_CACHE_PREFIX}{days}:{provider or ''}:{stage or ''}"
+        if use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        from core.models import GenerationSpan
+
+        spans = GenerationSpan.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+        if provider:
+            spans = spans.filter(provider=provider)
+        if stage:
+            spans = spans.filter(stage=stage)
+
+        ok = Q(success=True)
+        aggregates = {
+            'count': Count('id'),
+            'errors': Count('id', filter=Q(success=False)),
+            'max_ms': Max('duration_ms', filter=ok),
+            'avg_credits': Avg('credits'),
+        }
+        if connection.vendor == 'postgresql':
+            aggregates['p50_ms'] = PercentileDisc('duration_ms', 0.50, filter=ok)
+            aggregates['p95_ms'] = PercentileDisc('duration_ms', 0.95, filter=ok)
+
+        rows = spans.order_by().values('provider', 'model', 'stage').annotate(**aggregates)
+        rows = sorted(rows, key=lambda row: (row['provider'], row['model'], row['stage']))
+        if connection.vendor != 'postgresql':
+            cls._python_percentiles(spans, rows)
+
+        result = [{
+            'provider': row['provider'],
+            'model': row['model'],
+            'stage': row['stage'],
+            'count': row['count'],
+            'errors': row['errors'],
+            'p50_ms': row['p50_ms'],
+            'p95_ms': row['p95_ms'],
+            'max_ms': row['max_ms'],
+            'avg_credits': round(float(row['avg_credits']), 2) if row['avg_credits'] is not None else None,
+        } for row in rows]
+
+        cache.set(cache_key, result, SUMMARY_TTL)
+        return result
+
+    @staticmethod
+    def _python_percentiles(spans, rows: List[Dict]):
+        """p50/p95 en Python para bases de datos sin percentiles (SQLite en desarrollo)"""
+        durations: Dict[tuple, List[int]] = {}
+        successful = spans.filter(success=True).order_by().values_list('provider', 'model', 'stage', 'duration_ms')
+        for row_provider, row_model, row_stage, duration_ms in successful.iterator(chunk_size=5000):
+            durations.setdefault((row_provider, row_model, row_stage), []).append(duration_ms)
+        for row in rows:
+            values = sorted(durations.get((row['provider'], row['model'], row['stage']), []))
+            row['p50_ms'] = _percentile(values, 0.50)
+            row['p95_ms'] = _percentile(values, 0.95)
+
+    @classmethod
+    def typical_seconds(cls, stage: str = 'processing', days: int = 7) -> Dict[str, Dict[str, float]]:
+        """
+        p50 (segundos) de una etapa por proveedor y por modelo
+
+        Returns:
+            {'providers': {provider: s}, 'models': {model: s}}; el valor por
+            proveedor es la mediana de los p50 de sus modelos
+        """
+        providers: Dict[str, List[float]] = {}
+        models: Dict[str, float] = {}
+        for row in cls.summary(days=days, stage=stage):
+            if row['p50_ms'] is None:
+                continue
+            seconds = row['p50_ms'] / 1000
+            if row['model']:
+                models[row['model']] = seconds
+            if row['provider']:
+                providers.setdefault(row['provider'], []).append(seconds)
+        return {
+            'providers': {name: sorted(values)[len(values) // 2] for name, values in providers.items()},
+            'models': models,
+        }
+
+    @staticmethod
+    def purge(retention_days: int) -> int:
+        """Borra los spans más antiguos que retention_days"""
+        from core.models import GenerationSpan
+        deleted, _ = GenerationSpan.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=retention_days)
+        ).delete()
+        return deleted
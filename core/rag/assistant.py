@@ -4,16 +4,17 @@ Compatible con LangChain 1.0+
 """
 
 import logging
-from typing import Dict, Optional, List
+import os
+import threading
+from typing import Dict, Iterator, Optional, List
 from django.conf import settings
 
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 
-from .document_loader import DocumentationLoader
-from .vector_store import VectorStoreManager
+from .indexer import IncrementalIndexer
+from .retriever import get_shared_index
 from .prompts import SYSTEM_PROMPT, WELCOME_MESSAGE
 from ..llm.factory import LLMFactory
 from ..monitoring.langsmith_config import setup_langsmith
@@ -23,6 +24,19 @@ setup_langsmith()
 
 logger = logging.getLogger(__name__)
 
+_shared_assistant = None
+_shared_lock = threading.Lock()
+
+
+def _reset_shared_assistant():
+    global _shared_assistant, _shared_lock
+    _shared_assistant = None
+    _shared_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_shared_assistant)
+
 
 class DocumentationAssistant:
     """Asistente RAG para consultar la documentación usando LCEL"""
@@ -45,7 +59,7 @@ class DocumentationAssistant:
             embedding_provider: 'openai' o 'google'
             embedding_model: Modelo de embeddings
             top_k: Número de documentos a recuperar
-            reindex: Si True, fuerza la re-indexación
+            reindex: Si True, re-indexa la documentación (incremental)
         """
         # Configuración
         if llm_provider is None:
@@ -58,6 +72,7 @@ class DocumentationAssistant:
             top_k = getattr(settings, 'RAG_TOP_K', 5)
         
         self.top_k = top_k
+        self.reindex_stats = None
         
         # Crear LLM
         self.llm = LLMFactory.get_llm(
@@ -66,43 +81,20 @@ class DocumentationAssistant:
             temperature=0.7
         )
         
-        # Cargar o crear índice
-        self.vector_store_manager = VectorStoreManager(
-            embedding_provider=embedding_provider,
-            embedding_model=embedding_model
-        )
+        # Índice compartido por el proceso (se recarga solo si cambia su generación)
+        self.index = get_shared_index(embedding_provider, embedding_model)
+        self.vector_store_manager = self.index.manager
         
-        # Cargar documentos si es necesario
-        vectorstore = self.vector_store_manager.load_index()
+        vectorstore = None if reindex else self.index.vectorstore()
         
-        if vectorstore is None or reindex:
-            if reindex:
-                # Eliminar índice anterior si existe
-                self.vector_store_manager.delete_index()
-                logger.info("Índice anterior eliminado, creando nuevo índice...")
-            
-            docs_path = getattr(settings, 'RAG_DOCS_PATH', 'docs/api')
-            logger.info(f"Cargando documentos desde {docs_path}...")
-            loader = DocumentationLoader()
-            documents = loader.load_all_documents()
-            
-            if not documents:
-                raise ValueError(f"No se encontraron documentos en {docs_path}. Verifica que la carpeta existe y contiene archivos .md")
-            
-            chunks = loader.split_documents(documents)
-            vectorstore = self.vector_store_manager.create_index(chunks, force=reindex)
-        
-        self.vectorstore = vectorstore
-        
-        # Crear retriever
-        self.retriever = self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": self.top_k}
-        )
+        if vectorstore is None:
+            # Re-indexación incremental: solo se embeben los chunks que han cambiado
+            # y la nueva generación reemplaza a la anterior de forma atómica
+            self.reindex_stats = IncrementalIndexer(self.vector_store_manager).run()
+            self.index.invalidate()
         
         # Configurar proyecto de LangSmith para RAG
         rag_project = getattr(settings, 'RAG_PROJECT_NAME', 'atenea-doc-assistant')
-        import os
         langsmith_key = getattr(settings, 'LANGSMITH_API_KEY', None) or os.getenv('LANGSMITH_API_KEY')
         if langsmith_key:
             os.environ['LANGCHAIN_PROJECT'] = rag_project
@@ -113,37 +105,45 @@ class DocumentationAssistant:
             ("human", "Pregunta: {question}")
         ])
         
-        # Crear chain usando LCEL
-        def format_context_and_question(inputs):
-            """Formatea el contexto y la pregunta para el prompt"""
-            if isinstance(inputs, dict):
-                question = inputs.get("question", "")
-            else:
-                question = str(inputs)
-            
-            # Usar invoke en lugar de get_relevant_documents para LangChain 1.0+
-            try:
-                docs = self.retriever.invoke(question)
-            except AttributeError:
-                # Fallback para versiones anteriores
-                docs = self.retriever.get_relevant_documents(question)
-            
-            context = self._format_docs(docs)
-            return {
-                "context": context,
-                "question": question
-            }
-        
+        # Crear chain usando LCEL (el contexto se recupera una vez por pregunta en ask/stream)
         self.chain = (
-            RunnablePassthrough()
-            | format_context_and_question
-            | self.qa_prompt
+            self.qa_prompt
             | self.llm
             | StrOutputParser()
         )
         
         logger.info(f"DocumentationAssistant inicializado (LLM: {llm_provider}, Top-K: {top_k})")
     
+    @classmethod
+    def shared(cls) -> 'DocumentationAssistant':
+        """
+        Instancia del proceso con la configuración por defecto
+        
+        Reutiliza el cliente del LLM y el índice entre peticiones; el índice
+        se recarga por sí solo cuando cambia su generación.
+        """
+        global _shared_assistant
+        if _shared_assistant is None:
+            with _shared_lock:
+                if _shared_assistant is None:
+                    _shared_assistant = cls()
+        return _shared_assistant
+    
+    @property
+    def retriever(self):
+        """Retriever sobre la generación actual del índice"""
+        return self.index.vectorstore().as_retriever(
+            search_type="similarity",
+            search_kwargs={"k": self.top_k}
+        )
+    
+    def retrieve(self, question: str) -> List:
+        """Documentos relevantes para la pregunta (embedding de la consulta cacheado)"""
+        vectorstore = self.index.vectorstore()
+        if vectorstore is None:
+            raise ValueError('No hay índice de documentación. Ejecuta manage.py reindex_rag')
+        return vectorstore.similarity_search(question, k=self.top_k)
+    
     def _format_docs(self, docs):
         """Formatea los documentos recuperados para el prompt"""
         return "\n\n".join([f"Documento: {doc.page_content}\nFuente: {doc.metadata.get('source', 'Desconocido')}" for doc in docs])
@@ -160,16 +160,13 @@ class DocumentationAssistant:
             Dict con 'answer' y 'sources'
         """
         try:
-            # Obtener documentos primero para tener las fuentes
-            try:
-                docs = self.retriever.invoke(question)
-            except AttributeError:
-                docs = self.retriever.get_relevant_documents(question)
+            docs = self.retrieve(question)
+            sources = self._sources(docs)
             
-            sources = list(set([doc.metadata.get('source', 'Desconocido') for doc in docs]))
-            
-            # Ejecutar chain (pasa la pregunta como string)
-            answer = self.chain.invoke(question)
+            answer = self.chain.invoke({
+                'context': self._format_docs(docs),
+                'question': question,
+            })
             
             return {
                 'answer': answer,
@@ -185,6 +182,28 @@ class DocumentationAssistant:
                 'question': question
             }
     
+    def stream(self, question: str) -> Iterator[Dict]:
+        """
+        Responde a una pregunta en streaming
+        
+        Yields:
+            Primero {'sources': [...]} y después {'delta': texto} por cada
+            fragmento que genera el LLM
+        """
+        docs = self.retrieve(question)
+        yield {'sources': self._sources(docs)}
+        
+        for chunk in self.chain.stream({
+            'context': self._format_docs(docs),
+            'question': question,
+        }):
+            if chunk:
+                yield {'delta': chunk}
+    
+    @staticmethod
+    def _sources(docs) -> List[str]:
+        return list(set([doc.metadata.get('source', 'Desconocido') for doc in docs]))
+    
     def get_welcome_message(self) -> str:
         """Retorna el mensaje de bienvenida"""
         return WELCOME_MESSAGE
@@ -0,0 +1,214 @@
+"""
+Re-indexación incremental de la documentación
+
+El índice guarda junto a sus archivos un manifest.json:
+
+    {
+        "params": {"embedding": "openai:text-embedding-3-small", "chunk_size": 1000, ...},
+        "files": {
+            "guides/videos.md": {
+                "hash": "<sha256 del archivo>",
+                "chunks": [{"id": "<id en el docstore>", "hash": "<sha256 del chunk>"}, ...]
+            }
+        }
+    }
+
+Al re-indexar:
+
+    - Archivos con el mismo hash: se conservan sus vectores tal cual.
+    - Archivos modificados: se trocean de nuevo; los chunks cuyo hash ya
+      existía conservan su vector y solo los nuevos se embeben (en lotes).
+    - Archivos eliminados y chunks que ya no existen: se borran sus vectores.
+
+El resultado se guarda como una nueva generación con VectorStoreManager.save_index
+(intercambio atómico): mientras se re-indexa, el índice anterior sigue
+sirviendo consultas.
+
+Si cambian los parámetros (modelo de embeddings, tamaño de chunk) o no hay
+manifest, se reconstruye entero.
+"""
+import hashlib
+import json
+import logging
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .document_loader import DocumentationLoader
+from .vector_store import MANIFEST_FILE, VectorStoreManager
+
+logger = logging.getLogger(__name__)
+
+
+LOCK_KEY = 'rag:reindex:lock'
+LOCK_TIMEOUT = 60 * 30
+
+
+class ReindexInProgressError(Exception):
+    """Ya hay una re-indexación en curso"""
+    pass
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class IncrementalIndexer:
+    """Actualiza el índice FAISS re-embebiendo solo los chunks que han cambiado"""
+
+    def __init__(self, manager: VectorStoreManager, loader: DocumentationLoader = None):
+        self.manager = manager
+        self.loader = loader or DocumentationLoader(
+            chunk_size=getattr(settings, 'RAG_CHUNK_SIZE', 1000),
+            chunk_overlap=getattr(settings, 'RAG_CHUNK_OVERLAP', 200),
+        )
+        self.batch_size = getattr(settings, 'RAG_EMBED_BATCH_SIZE', 64)
+
+    @property
+    def params(self) -> Dict:
+        """Parámetros que, si cambian, invalidan todos los vectores"""
+        return {
+            'embedding': f"{self.manager.embedding_provider}:{self.manager.embedding_model}",
+            'chunk_size': self.loader.chunk_size,
+            'chunk_overlap': self.loader.chunk_overlap,
+        }
+
+    def load_manifest(self) -> Optional[Dict]:
+        """Manifest de la generación actual (None si no hay o es ilegible)"""
+        try:
+            with open(self.manager.index_path / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def run(self, full: bool = False) -> Dict:
+        """
+        Re-indexa la documentación
+
+        Args:
+            full: Ignorar el índice actual y reconstruirlo entero
+
+        Returns:
+            Estadísticas: files, files_changed, files_removed, chunks_added,
+            chunks_removed, chunks_kept, full_rebuild, generation
+
+        Raises:
+            ReindexInProgressError: Si otra re-indexación tiene el lock
+            ValueError: Si no hay documentos
+        """
+        if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+            raise ReindexInProgressError('Ya hay una re-indexación de la documentación en curso')
+        try:
+            return self._run(full)
+        finally:
+            cache.delete(LOCK_KEY)
+
+    def _run(self, full: bool) -> Dict:
+        documents = self.loader.load_all_documents()
+        if not documents:
+            raise ValueError(
+                f"No se encontraron documentos en {self.loader.docs_path}. "
+                "Verifica que la carpeta existe y contiene archivos .md"
+            )
+
+        # Un documento por archivo (TextLoader), agrupado por ruta relativa
+        by_source: Dict[str, List] = defaultdict(list)
+        for doc in documents:
+            by_source[doc.metadata['source']].append(doc)
+        file_hashes = {
+            source: _sha256(''.join(doc.page_content for doc in docs))
+            for source, docs in by_source.items()
+        }
+
+        manifest = None if full else self.load_manifest()
+        vectorstore = None
+        if manifest and manifest.get('params') == self.params:
+            vectorstore = self.manager.load_index()
+        if vectorstore is None:
+            manifest = {'files': {}}
+        full_rebuild = vectorstore is None
+
+        old_files = manifest.get('files', {})
+        new_files: Dict[str, Dict] = {}
+        to_remove: List[str] = []
+        pending = []  # (id, chunk) a embeber
+        stats = {'files': len(by_source), 'files_changed': 0, 'files_removed': 0, 'chunks_kept': 0}
+
+        for source, docs in sorted(by_source.items()):
+            old_entry = old_files.get(source)
+            if old_entry and old_entry.get('hash') == file_hashes[source]:
+                new_files[source] = old_entry
+                stats['chunks_kept'] += len(old_entry['chunks'])
+                continue
+
+            stats['files_changed'] += 1
+            # Vectores del archivo anterior reutilizables por hash de chunk
+            reusable: Dict[str, List[str]] = defaultdict(list)
+            for chunk_entry in (old_entry or {}).get('chunks', []):
+                reusable[chunk_entry['hash']].append(chunk_entry['id'])
+
+            entries = []
+            for chunk in self.loader.split_documents(docs):
+                chunk_hash = _sha256(chunk.page_content)
+                if reusable.get(chunk_hash):
+                    chunk_id = reusable[chunk_hash].pop()
+                    stats['chunks_kept'] += 1
+                else:
+                    chunk_id = uuid.uuid4().hex
+                    pending.append((chunk_id, chunk))
+                entries.append({'id': chunk_id, 'hash': chunk_hash})
+
+            to_remove.extend(chunk_id for ids in reusable.values() for chunk_id in ids)
+            new_files[source] = {'hash': file_hashes[source], 'chunks': entries}
+
+        for source, old_entry in old_files.items():
+            if source not in by_source:
+                stats['files_removed'] += 1
+                to_remove.extend(chunk_entry['id'] for chunk_entry in old_entry['chunks'])
+
+        if not full_rebuild and not pending and not to_remove:
+            logger.info("Índice RAG al día: no hay cambios en la documentación")
+            return {**stats, 'chunks_added': 0, 'chunks_removed': 0, 'full_rebuild': False,
+                    'generation': self.manager.current_generation()}
+
+        if to_remove:
+            vectorstore.delete(ids=to_remove)
+
+        vectorstore = self._embed_and_add(vectorstore, pending)
+
+        generation = self.manager.save_index(vectorstore, manifest={'params': self.params, 'files': new_files})
+        stats.update({
+            'chunks_added': len(pending),
+            'chunks_removed': len(to_remove),
+            'full_rebuild': full_rebuild,
+            'generation': generation,
+        })
+        logger.info(f"Índice RAG actualizado: {stats}")
+        return stats
+
+    def _embed_and_add(self, vectorstore, pending: List):
+        """Embebe los chunks nuevos en lotes y los añade al índice (lo crea si no existe)"""
+        from langchain_community.vectorstores import FAISS
+
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            texts = [chunk.page_content for _, chunk in batch]
+            vectors = self.manager.embeddings.embed_documents(texts)
+            text_embeddings = list(zip(texts, vectors))
+            metadatas = [chunk.metadata for _, chunk in batch]
+            ids = [chunk_id for chunk_id, _ in batch]
+
+            if vectorstore is None:
+                vectorstore = FAISS.from_embeddings(
+                    text_embeddings, self.manager.embeddings, metadatas=metadatas, ids=ids
+                )
+            else:
+                vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            logger.info(f"Embebidos {start + len(batch)}/{len(pending)} chunks")
+
+        if vectorstore is None:
+            raise ValueError('La documentación no produjo ningún chunk que indexar')
+        return vectorstore
@@ -0,0 +1,103 @@
+"""
+Índice FAISS compartido por proceso para el asistente de documentación
+
+Cada proceso (web o worker) carga el índice una sola vez, mapeado en memoria,
+junto con el cliente de embeddings. Antes de cada consulta se comprueba (como
+mucho cada RAG_GENERATION_CHECK_INTERVAL segundos) si en disco hay una
+generación nueva del índice; solo entonces se recarga.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .vector_store import VectorStoreManager
+
+logger = logging.getLogger(__name__)
+
+
+class SharedIndex:
+    """Índice FAISS de un proceso, recargado solo cuando cambia su generación"""
+
+    def __init__(self, embedding_provider: str = None, embedding_model: str = None):
+        self._embedding_provider = embedding_provider
+        self._embedding_model = embedding_model
+        self._lock = threading.Lock()
+        self._manager: Optional[VectorStoreManager] = None
+        self._vectorstore = None
+        self._generation: Optional[str] = None
+        self._checked_at = 0.0
+        self.loads = 0
+
+    @property
+    def manager(self) -> VectorStoreManager:
+        """VectorStoreManager (y cliente de embeddings) del proceso"""
+        if self._manager is None:
+            with self._lock:
+                if self._manager is None:
+                    self._manager = VectorStoreManager(
+                        embedding_provider=self._embedding_provider,
+                        embedding_model=self._embedding_model
+                    )
+        return self._manager
+
+    def vectorstore(self):
+        """
+        Índice actual (None si no hay índice en disco)
+
+        Si la recarga de una generación nueva falla se sigue sirviendo la
+        anterior.
+        """
+        interval = getattr(settings, 'RAG_GENERATION_CHECK_INTERVAL', 5)
+        if self._vectorstore is not None and time.monotonic() - self._checked_at < interval:
+            return self._vectorstore
+
+        manager = self.manager
+        with self._lock:
+            self._checked_at = time.monotonic()
+            generation = manager.current_generation()
+            if generation is None:
+                self._vectorstore, self._generation = None, None
+            elif generation != self._generation or self._vectorstore is None:
+                vectorstore = manager.load_index(mmap=True)
+                if vectorstore is not None:
+                    self._vectorstore, self._generation = vectorstore, generation
+                    self.loads += 1
+                    logger.info(f"Índice RAG cargado (generación {generation})")
+            return self._vectorstore
+
+    def invalidate(self):
+        """Fuerza la comprobación de generación en la próxima consulta"""
+        self._checked_at = 0.0
+
+    @property
+    def generation(self) -> Optional[str]:
+        return self._generation
+
+
+_indexes: Dict[Tuple[Optional[str], Optional[str]], SharedIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_shared_index(embedding_provider: str = None, embedding_model: str = None) -> SharedIndex:
+    """Índice compartido del proceso para un proveedor/modelo de embeddings"""
+    key = (embedding_provider, embedding_model)
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(key, SharedIndex(embedding_provider, embedding_model))
+    return index
+
+
+def _reset_after_fork():
+    global _indexes_lock
+    _indexes.clear()
+    _indexes_lock = threading.Lock()
+
+
+# Los workers prefork no deben compartir locks ni mapeos del proceso padre
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,19 +1,79 @@
 """
 Gestión del vector store usando FAISS con LangChain
+
+Cada índice guardado lleva un identificador de generación (archivo GENERATION)
+que los procesos usan para saber si deben recargarlo. El índice se escribe en
+un directorio temporal y se intercambia con un rename, de modo que un proceso
+que lo tiene mapeado en memoria nunca ve archivos a medio escribir.
 """
 
 import os
+import hashlib
 import logging
+import threading
+import uuid
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from django.conf import settings
+from django.core.cache import cache
 
 from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
 logger = logging.getLogger(__name__)
 
+GENERATION_FILE = 'GENERATION'
+MANIFEST_FILE = 'manifest.json'
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings con caché de consultas
+
+    embed_query se cachea en memoria del proceso (LRU) y en la caché de Django
+    (compartida entre procesos); embed_documents pasa directo al proveedor.
+    """
+    
+    CACHE_PREFIX = 'rag:query_embedding:'
+    CACHE_TTL = 60 * 60 * 24
+    
+    def __init__(self, embeddings: Embeddings, namespace: str, max_size: int = None):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.max_size = max_size or getattr(settings, 'RAG_QUERY_CACHE_SIZE', 512)
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _key(self, text: str) -> str:
+        normalized = ' '.join(text.split())
+        digest = hashlib.sha256(f"{self.namespace}:{normalized}".encode('utf-8')).hexdigest()
+        return f"{self.CACHE_PREFIX}{digest}"
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        with self._lock:
+            vector = self._local.get(key)
+            if vector is not None:
+                self._local.move_to_end(key)
+                return vector
+        
+        vector = cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            cache.set(key, vector, self.CACHE_TTL)
+        
+        with self._lock:
+            self._local[key] = vector
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+        return vector
+
 
 class VectorStoreManager:
     """Gestiona el vector store FAISS para la documentación"""
@@ -34,13 +94,17 @@ class VectorStoreManager:
         
         self.embedding_provider = embedding_provider
         self.embedding_model = embedding_model
-        self.embeddings = self._create_embeddings()
+        self.embeddings = CachedQueryEmbeddings(
+            self._create_embeddings(),
+            namespace=f"{embedding_provider}:{embedding_model}"
+        )
         
         # Path para guardar el índice
         store_path = getattr(settings, 'RAG_VECTOR_STORE_PATH', '.rag_store')
         self.base_dir = Path(settings.BASE_DIR)
         self.store_path = self.base_dir / store_path
         self.index_path = self.store_path / 'faiss_index'
+        self.generation_path = self.index_path / GENERATION_FILE
     
     def _create_embeddings(self):
         """Crea el objeto de embeddings según el proveedor"""
@@ -91,16 +155,71 @@ class VectorStoreManager:
         vectorstore = FAISS.from_documents(documents, self.embeddings)
         
         # Guardar
+        self.save_index(vectorstore)
+        return vectorstore
+    
+    def save_index(self, vectorstore: FAISS, manifest: Optional[dict] = None) -> str:
+        """
+        Guarda el índice con una nueva generación (escritura atómica)
+        
+        Se escribe en un directorio temporal y se intercambia con rename: los
+        archivos del índice anterior solo se desenlazan, nunca se truncan, así
+        que los procesos que los tienen mapeados siguen leyéndolos sin errores.
+        
+        Args:
+            vectorstore: Índice a guardar
+            manifest: Manifest de archivos/chunks del indexador incremental
+        
+        Returns:
+            Identificador de la nueva generación
+        """
+        import shutil
+        
+        generation = uuid.uuid4().hex
         self.store_path.mkdir(parents=True, exist_ok=True)
-        vectorstore.save_local(str(self.index_path))
+        staging_path = self.store_path / f'faiss_index.{generation}.tmp'
+        vectorstore.save_local(str(staging_path))
+        if manifest is not None:
+            import json
+            with open(staging_path / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+        (staging_path / GENERATION_FILE).write_text(generation)
         
-        logger.info(f"Índice guardado en {self.index_path}")
-        return vectorstore
+        retired_path = None
+        if self.index_path.exists():
+            retired_path = self.store_path / f'faiss_index.{generation}.old'
+            os.rename(self.index_path, retired_path)
+        os.rename(staging_path, self.index_path)
+        if retired_path:
+            shutil.rmtree(retired_path, ignore_errors=True)
+        
+        logger.info(f"Índice guardado en {self.index_path} (generación {generation})")
+        return generation
+    
+    def current_generation(self) -> Optional[str]:
+        """
+        Generación del índice en disco (None si no hay índice)
+        
+        Los índices guardados antes de existir GENERATION usan la fecha de
+        modificación de index.faiss.
+        """
+        try:
+            return self.generation_path.read_text().strip()
+        except OSError:
+            pass
+        try:
+            return f"mtime:{(self.index_path / 'index.faiss').stat().st_mtime_ns}"
+        except OSError:
+            return None
     
-    def load_index(self) -> Optional[FAISS]:
+    def load_index(self, mmap: bool = False) -> Optional[FAISS]:
         """
         Carga el índice existente
         
+        Args:
+            mmap: Mapear index.faiss en memoria en lugar de leerlo entero
+                  (si la versión de faiss no lo soporta se lee normalmente)
+        
         Returns:
             Instancia de FAISS o None si no existe
         """
@@ -108,6 +227,12 @@ class VectorStoreManager:
             logger.warning(f"El índice no existe en {self.index_path}")
             return None
         
+        if mmap:
+            try:
+                return self._load_index_mmap()
+            except Exception as e:
+                logger.warning(f"No se pudo mapear el índice en memoria, se carga completo: {e}")
+        
         try:
             logger.info(f"Cargando índice desde {self.index_path}")
             vectorstore = FAISS.load_local(
@@ -121,6 +246,24 @@ class VectorStoreManager:
             logger.error(f"Error al cargar el índice: {e}")
             return None
     
+    def _load_index_mmap(self) -> FAISS:
+        """Carga el índice con faiss.IO_FLAG_MMAP (mismo formato que save_local)"""
+        import pickle
+        import faiss
+        
+        flags = faiss.IO_FLAG_MMAP | getattr(faiss, 'IO_FLAG_READ_ONLY', 0)
+        index = faiss.read_index(str(self.index_path / 'index.faiss'), flags)
+        with open(self.index_path / 'index.pkl', 'rb') as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        
+        logger.info(f"Índice mapeado en memoria desde {self.index_path}")
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+        )
+    
     def get_or_create_index(self, documents: list = None) -> FAISS:
         """
         Obtiene el índice existente o lo crea si no existe
@@ -5,7 +5,6 @@ Capa de servicios para manejar la lógica de negocio
 import logging
 import json
 import redis
-import requests
 import shutil
 from pathlib import Path
 from typing import Dict, Optional, List
@@ -22,7 +21,10 @@ from .ai_services.gemini_imagen_upscale import GeminiImagenUpscaleClient
 from .ai_services.seedream import SeaDreamImageClient
 from .ai_services.openai_image import OpenAIImageClient
 from .ai_services.sora import SoraClient
+from .ai_services.client_pool import client_pool
 from .storage.gcs import gcs_storage
+from .monitoring.telemetry import GenerationTelemetry
+from .services.media_probe import MediaProbe
 from core.utils.prompt_templates import apply_prompt_template
 
 logger = logging.getLogger(__name__)
@@ -57,6 +59,16 @@ class ValidationException(ServiceException):
     pass
 
 
+class GenerationPendingException(ServiceException):
+    """El proveedor aceptó el trabajo pero aún no ha terminado (hay que consultar su estado más tarde)"""
+    
+    def __init__(self, provider: str, external_id: str, model_id: str = None):
+        super().__init__(f"Trabajo {external_id} pendiente en {provider}")
+        self.provider = provider
+        self.external_id = external_id
+        self.model_id = model_id
+
+
 # Importar excepciones de créditos para uso en servicios
 try:
     from .services.credits import InsufficientCreditsException, RateLimitExceededException
@@ -468,6 +480,79 @@ class InvitationService:
         return ProjectInvitation.objects.filter(project=project).order_by('-created_at')
 
 
+# ====================
+# PROVIDER CLIENTS
+# ====================
+# Clientes compartidos por proceso (ver core/ai_services/client_pool.py)
+
+def get_heygen_client() -> HeyGenClient:
+    if not settings.HEYGEN_API_KEY:
+        raise ValidationException('HEYGEN_API_KEY no está configurada')
+    return client_pool.get(
+        'heygen',
+        lambda: HeyGenClient(api_key=settings.HEYGEN_API_KEY),
+        session_provider='heygen'
+    )
+
+
+def get_veo_client(model_name: str = 'veo-2.0-generate-001') -> GeminiVeoClient:
+    if not settings.GEMINI_API_KEY:
+        raise ValidationException('GEMINI_API_KEY no está configurada')
+    return client_pool.get(
+        ('veo', model_name),
+        lambda: GeminiVeoClient(api_key=settings.GEMINI_API_KEY, model_name=model_name)
+    )
+
+
+def get_sora_client() -> SoraClient:
+    if not settings.OPENAI_API_KEY:
+        raise ValidationException('OPENAI_API_KEY no está configurada')
+    return client_pool.get(
+        'sora',
+        lambda: SoraClient(api_key=settings.OPENAI_API_KEY),
+        session_provider='openai'
+    )
+
+
+def get_higgsfield_client():
+    from .ai_services.higgsfield import HiggsfieldClient
+    if not settings.HIGGSFIELD_API_KEY_ID or not settings.HIGGSFIELD_API_KEY:
+        raise ValidationException('HIGGSFIELD_API_KEY_ID y HIGGSFIELD_API_KEY deben estar configuradas')
+    return client_pool.get(
+        'higgsfield',
+        lambda: HiggsfieldClient(
+            api_key_id=settings.HIGGSFIELD_API_KEY_ID,
+            api_key_secret=settings.HIGGSFIELD_API_KEY
+        ),
+        session_provider='higgsfield'
+    )
+
+
+def get_kling_client():
+    from .ai_services.kling import KlingClient
+    if not settings.KLING_ACCESS_KEY or not settings.KLING_SECRET_KEY:
+        raise ValidationException('KLING_ACCESS_KEY y KLING_SECRET_KEY deben estar configuradas')
+    return client_pool.get(
+        'kling',
+        lambda: KlingClient(
+            access_key=settings.KLING_ACCESS_KEY,
+            secret_key=settings.KLING_SECRET_KEY
+        ),
+        session_provider='kling'
+    )
+
+
+def get_elevenlabs_client():
+    from .ai_services import ElevenLabsClient
+    if not settings.ELEVENLABS_API_KEY:
+        raise ServiceException('ELEVENLABS_API_KEY no configurada')
+    return client_pool.get(
+        'elevenlabs',
+        lambda: ElevenLabsClient(api_key=settings.ELEVENLABS_API_KEY),
+        session_provider='elevenlabs'
+    )
+
+
 # ====================
 # VIDEO SERVICE
 # ====================
@@ -475,58 +560,28 @@ class InvitationService:
 class VideoService:
     """Servicio principal para manejar videos"""
     
-    def __init__(self):
-        self.heygen_client = None
-        self.veo_client = None
-        self.sora_client = None
-        self.higgsfield_client = None
-        self.kling_client = None
+    # Los clientes viven en client_pool (uno por proceso), así que crear un
+    # VideoService por petición no abre sesiones HTTP ni busca credenciales
     
     def _get_heygen_client(self) -> HeyGenClient:
-        """Lazy initialization de HeyGen client"""
-        if not self.heygen_client:
-            if not settings.HEYGEN_API_KEY:
-                raise ValidationException('HEYGEN_API_KEY no está configurada')
-            self.heygen_client = HeyGenClient(api_key=settings.HEYGEN_API_KEY)
-        return self.heygen_client
+        """Cliente de HeyGen compartido"""
+        return get_heygen_client()
     
     def _get_veo_client(self, model_name: str = 'veo-2.0-generate-001') -> GeminiVeoClient:
-        """Lazy initialization de Veo client"""
-        if not settings.GEMINI_API_KEY:
-            raise ValidationException('GEMINI_API_KEY no está configurada')
-        return GeminiVeoClient(api_key=settings.GEMINI_API_KEY, model_name=model_name)
+        """Cliente de Veo compartido (uno por modelo)"""
+        return get_veo_client(model_name)
     
     def _get_sora_client(self) -> SoraClient:
-        """Lazy initialization de Sora client"""
-        if not self.sora_client:
-            if not settings.OPENAI_API_KEY:
-                raise ValidationException('OPENAI_API_KEY no está configurada')
-            self.sora_client = SoraClient(api_key=settings.OPENAI_API_KEY)
-        return self.sora_client
+        """Cliente de Sora compartido"""
+        return get_sora_client()
     
     def _get_higgsfield_client(self):
-        """Lazy initialization de Higgsfield client"""
-        if not self.higgsfield_client:
-            from .ai_services.higgsfield import HiggsfieldClient
-            if not settings.HIGGSFIELD_API_KEY_ID or not settings.HIGGSFIELD_API_KEY:
-                raise ValidationException('HIGGSFIELD_API_KEY_ID y HIGGSFIELD_API_KEY deben estar configuradas')
-            self.higgsfield_client = HiggsfieldClient(
-                api_key_id=settings.HIGGSFIELD_API_KEY_ID,
-                api_key_secret=settings.HIGGSFIELD_API_KEY
-            )
-        return self.higgsfield_client
+        """Cliente de Higgsfield compartido"""
+        return get_higgsfield_client()
     
     def _get_kling_client(self):
-        """Lazy initialization de Kling client"""
-        if not self.kling_client:
-            from .ai_services.kling import KlingClient
-            if not settings.KLING_ACCESS_KEY or not settings.KLING_SECRET_KEY:
-                raise ValidationException('KLING_ACCESS_KEY y KLING_SECRET_KEY deben estar configuradas')
-            self.kling_client = KlingClient(
-                access_key=settings.KLING_ACCESS_KEY,
-                secret_key=settings.KLING_SECRET_KEY
-            )
-        return self.kling_client
+        """Cliente de Kling compartido"""
+        return get_kling_client()
     
     # ----------------
     # CREAR VIDEO
@@ -784,8 +839,8 @@ class VideoService:
         if video.status in ['processing', 'completed']:
             raise ValidationException(f'El video ya está en estado: {video.get_status_display()}')
         
-        # Validar créditos ANTES de generar
-        if video.created_by:
+        # Validar créditos ANTES de generar (si se encoló con reserva, ya están apartados)
+        if video.created_by and not (video.metadata or {}).get('credit_reservation'):
             from core.services.credits import CreditService, InsufficientCreditsException, RateLimitExceededException
             
             estimated_cost = CreditService.estimate_video_cost(
@@ -858,7 +913,9 @@ class VideoService:
         if video.status in ['processing', 'completed']:
             raise ValidationException(f'El video ya está en estado: {video.get_status_display()}')
         
-        # Validar créditos ANTES de encolar
+        # Reservar créditos ANTES de encolar: el saldo se aparta con un UPDATE
+        # condicional y se confirma (o devuelve) cuando termina la generación
+        reservation = None
         if video.created_by:
             from core.services.credits import CreditService, InsufficientCreditsException, RateLimitExceededException
             
@@ -869,16 +926,25 @@ class VideoService:
             )
             
             if estimated_cost > 0:
-                if not CreditService.has_enough_credits(video.created_by, estimated_cost):
+                try:
+                    reservation = CreditService.reserve_credits(
+                        user=video.created_by,
+                        amount=estimated_cost,
+                        service_name=video.type,
+                        operation_type='video_generation',
+                        resource=video,
+                        metadata={'video_type': video.type}
+                    )
+                except InsufficientCreditsException as e:
                     raise InsufficientCreditsException(
-                        f"No tienes suficientes créditos. Necesitas aproximadamente {estimated_cost} créditos. "
-                        f"Créditos disponibles: {CreditService.get_or_create_user_credits(video.created_by).credits}"
+                        f"No tienes suficientes créditos. Necesitas aproximadamente {estimated_cost} créditos. {e}"
                     )
-                
-                try:
-                    CreditService.check_rate_limit(video.created_by, estimated_cost)
                 except RateLimitExceededException as e:
                     raise ValidationException(str(e))
+                
+                video.metadata = video.metadata or {}
+                video.metadata['credit_reservation'] = str(reservation.uuid)
+                video.save(update_fields=['metadata', 'updated_at'])
         
         # Preparar metadata
         task_metadata = metadata or {}
@@ -889,12 +955,19 @@ class VideoService:
         })
         
         # Encolar tarea
-        task = QueueService.enqueue_generation(
-            item=video,
-            user=video.created_by,
-            task_type='video',
-            metadata=task_metadata
-        )
+        try:
+            task = QueueService.enqueue_generation(
+                item=video,
+                user=video.created_by,
+                task_type='video',
+                metadata=task_metadata
+            )
+        except Exception:
+            if reservation:
+                CreditService.refund_reservation(reservation.uuid, reason='No se pudo encolar la generación')
+                video.metadata.pop('credit_reservation', None)
+                video.save(update_fields=['metadata', 'updated_at'])
+            raise
         
         # Marcar video como pending (no processing todavía)
         video.status = 'pending'
@@ -912,6 +985,7 @@ class VideoService:
             if not video.config.get('avatar_id') or not video.config.get('voice_id'):
                 raise ValidationException('Avatar ID y Voice ID son requeridos')
             
+            from core.services.status_watcher import provider_callback_url
             response = client.generate_video(
                 script=video.script,
                 title=video.title,
@@ -922,6 +996,7 @@ class VideoService:
                 voice_speed=video.config.get('voice_speed', 1.0),
                 voice_pitch=video.config.get('voice_pitch', 50),
                 voice_emotion=video.config.get('voice_emotion', 'Excited'),
+                callback_url=provider_callback_url('heygen'),
             )
         else:  # heygen_avatar_iv
             # Lógica para Avatar IV
@@ -1111,9 +1186,7 @@ class VideoService:
                 tmp_path = tmp_file.name
                 
                 # Descargar desde GCS
-                blob_name = gcs_path.replace(f"gs://{settings.GCS_BUCKET_NAME}/", "")
-                blob = gcs_storage.bucket.blob(blob_name)
-                blob.download_to_filename(tmp_path)
+                gcs_storage.download_to_file(gcs_path, tmp_path)
                 
                 logger.info(f"Imagen de referencia descargada a: {tmp_path}")
             
@@ -1255,6 +1328,13 @@ class VideoService:
         elif video.config.get('image_url'):
             image_url = video.config['image_url']
         
+        # Aviso de finalización al webhook (si está configurado); el watcher sigue de respaldo
+        from core.services.status_watcher import provider_callback_url
+        extra = {}
+        callback_url = provider_callback_url('kling')
+        if callback_url:
+            extra['callback_url'] = callback_url
+        
         # Generar video
         response = client.generate_video(
             model_name=model_name,
@@ -1262,44 +1342,114 @@ class VideoService:
             image_url=image_url,
             mode=mode,
             duration=duration,
-            aspect_ratio=aspect_ratio
+            aspect_ratio=aspect_ratio,
+            **extra
         )
         
         return response.get('task_id')
     
     def _generate_manim_quote_video(self, video: Video) -> str:
-        """Genera video de cita con Manim"""
-        from core.ai_services.manim import ManimClient
+        """
+        Genera video de cita con Manim
+
+        El render se guarda en la caché de renders (clave = parámetros de la
+        animación + tier + aspecto): repetir la misma cita reutiliza el MP4 ya
+        subido sin volver a renderizar. Si hay que renderizar y el tier final
+        no es el de preview, antes se renderiza un preview rápido (480p15) y
+        se publica su URL en el bus de progreso; el render final se encola
+        como tarea propia (render_manim_quote_task) en la cola de Manim y el
+        video queda en processing hasta que termina.
+        
+        Con MANIM_RENDER_ISOLATED cada render corre en un subproceso con
+        límites de CPU/memoria y directorio temporal propio (ver render_pool).
+        """
+        from core.ai_services.manim.client import PREVIEW_QUALITY
+        from core.tasks import render_manim_quote_task
         
-        client = ManimClient()
+        job = self._manim_quote_job(video)
         
-        # Obtener configuración
-        quote = video.script  # El texto de la cita va en script
-        author = video.config.get('author')
-        duration = video.config.get('duration')
-        quality = video.config.get('quality', 'k')  # Default: máxima calidad
-        container_color = video.config.get('container_color')  # Color del contenedor
-        text_color = video.config.get('text_color')  # Color del texto
-        font_family = video.config.get('font_family')  # Tipo de fuente
-        display_time = video.config.get('display_time')  # Tiempo de visualización en pantalla
-        
-        # Generar video localmente
-        # Usar video.id como unique_id para evitar colisiones entre renders simultáneos
-        result = client.generate_quote_video(
-            quote=quote,
-            author=author,
-            duration=duration,
-            quality=quality,
-            container_color=container_color,
-            text_color=text_color,
-            font_family=font_family,
-            display_time=display_time,
-            unique_id=str(video.id)  # ID único por video para evitar colisiones
+        cached_path = job['render_cache'].lookup(job['cache_key'])
+        if cached_path:
+            logger.info(f"✓ Video de cita reutilizado de la caché para video {video.id}: {cached_path}")
+            gcs_path = gcs_storage.copy_from_gcs(cached_path, job['gcs_destination'])
+            video.mark_as_completed(gcs_path=gcs_path, metadata={**job['metadata'], 'render_cache_hit': True})
+            return f"manim_{video.id}"
+        
+        # Preview rápido mientras se renderiza el tier final
+        video.metadata = video.metadata or {}
+        if job['quality'] != PREVIEW_QUALITY and getattr(settings, 'MANIM_PREVIEW_ENABLED', True):
+            try:
+                video.metadata['preview_gcs_path'] = self._render_manim_quote_preview(
+                    video, job['client'], job['render_cache'], job['animation']
+                )
+            except Exception as e:
+                logger.warning(f"No se pudo generar el preview de Manim para video {video.id}: {e}")
+        
+        video.status = 'processing'
+        video.save(update_fields=['status', 'metadata', 'updated_at'])
+        
+        render_manim_quote_task.apply_async(
+            args=[str(video.uuid)],
+            queue=getattr(settings, 'MANIM_RENDER_QUEUE', None) or 'video_generation',
         )
         
-        video_path = result['video_path']
+        # Usar el ID del video como external_id (Manim no tiene external_id)
+        return f"manim_{video.id}"
+    
+    def render_manim_quote_final(self, video: Video):
+        """Renderiza el tier final de un video de cita, lo sube y marca el video como completado"""
+        job = self._manim_quote_job(video)
+        render_cache = job['render_cache']
+        metadata = job['metadata']
+        if (video.metadata or {}).get('preview_gcs_path'):
+            metadata['preview_gcs_path'] = video.metadata['preview_gcs_path']
+        
+        # Un reintento tras subir el render lo encuentra ya en la caché
+        cached_path = render_cache.lookup(job['cache_key'])
+        result = None
+        if not cached_path:
+            # Sin aislamiento, el directorio de trabajo depende del contenido: un
+            # reintento del mismo render reutiliza los archivos parciales de Manim
+            result = job['client'].generate_quote_video(
+                quality=job['quality'],
+                unique_id=job['cache_key'][:16],
+                **job['animation']
+            )
+            
+            # Subir video a la caché de renders y copiarlo (en el servidor) a la ruta del video
+            logger.info(f"Subiendo video de Manim a GCS: {job['gcs_destination']}")
+            cached_path = self._store_manim_render(render_cache, job['cache_key'], result)
+        
+        gcs_path = gcs_storage.copy_from_gcs(cached_path, job['gcs_destination'])
+        video.mark_as_completed(gcs_path=gcs_path, metadata=metadata)
         
-        # Subir video a GCS
+        # Limpiar archivos de trabajo después de subir a GCS
+        if result:
+            self._clean_manim_render(result)
+    
+    def _manim_quote_job(self, video: Video) -> Dict:
+        """Parámetros de render, clave de caché y destino en GCS de un video de cita"""
+        from core.ai_services.manim import ManimClient
+        from core.ai_services.manim.client import DEFAULT_QUALITY
+        from core.services.render_cache import RenderCache
+        
+        # Obtener configuración
+        quality = video.config.get('quality', DEFAULT_QUALITY)  # Default: 1080p
+        aspect_ratio = video.config.get('aspect_ratio') or '16:9'
+        animation = {
+            'quote': video.script,  # El texto de la cita va en script
+            'author': video.config.get('author'),
+            'duration': video.config.get('duration'),
+            'container_color': video.config.get('container_color'),  # Color del contenedor
+            'text_color': video.config.get('text_color'),  # Color del texto
+            'font_family': video.config.get('font_family'),  # Tipo de fuente
+            'display_time': video.config.get('display_time'),  # Tiempo de visualización en pantalla
+            'aspect_ratio': aspect_ratio,
+        }
+        render_cache = RenderCache('manim_quote')
+        cache_key = render_cache.make_key([], {**animation, 'quality': quality})
+        
+        # Cada video tiene su propia copia (borrar el video no debe borrar la caché)
         if video.project:
             gcs_destination = f"projects/{video.project.id}/videos/{video.uuid}/manim_quote.mp4"
         elif video.created_by:
@@ -1307,27 +1457,83 @@ class VideoService:
         else:
             gcs_destination = f"standalone/videos/{video.uuid}/manim_quote.mp4"
         
-        logger.info(f"Subiendo video de Manim a GCS: {gcs_destination}")
-        gcs_path = gcs_storage.upload_file(video_path, gcs_destination)
-        
-        # Marcar como completado inmediatamente (Manim genera síncronamente)
-        metadata = {
-            'duration': duration or video.config.get('estimated_duration'),
+        return {
+            'client': ManimClient(isolated=getattr(settings, 'MANIM_RENDER_ISOLATED', True)),
             'quality': quality,
-            'author': author,
-            'local_path': video_path,
+            'animation': animation,
+            'render_cache': render_cache,
+            'cache_key': cache_key,
+            'gcs_destination': gcs_destination,
+            'metadata': {
+                'duration': animation['duration'] or video.config.get('estimated_duration'),
+                'quality': quality,
+                'aspect_ratio': aspect_ratio,
+                'author': animation['author'],
+                'render_cache_key': cache_key,
+            },
         }
+    
+    def _render_manim_quote_preview(self, video: Video, client, render_cache, animation: Dict) -> str:
+        """
+        Renderiza (o reutiliza) el preview de baja calidad y publica su URL
+
+        Returns:
+            GCS path del preview
+        """
+        from core.ai_services.manim.client import PREVIEW_QUALITY
+        from core.services.progress_bus import ProgressBus
+        
+        preview_key = render_cache.make_key([], {**animation, 'quality': PREVIEW_QUALITY})
+        preview_path = render_cache.lookup(preview_key)
+        if not preview_path:
+            result = client.generate_quote_video(
+                quality=PREVIEW_QUALITY,
+                unique_id=preview_key[:16],
+                **animation
+            )
+            preview_path = self._store_manim_render(render_cache, preview_key, result)
+            self._clean_manim_render(result)
+        
+        if video.created_by_id:
+            ProgressBus.publish(
+                video.created_by_id,
+                'video',
+                video.uuid,
+                'processing',
+                progress=50,
+                project_id=video.project_id,
+                stage='preview',
+                url=gcs_storage.get_signed_url(preview_path, expiration=3600),
+            )
+        logger.info(f"✓ Preview de Manim listo para video {video.id}: {preview_path}")
+        return preview_path
+    
+    @staticmethod
+    def _store_manim_render(render_cache, cache_key: str, result: Dict) -> str:
+        """Sube un render a la caché; si falla, libera su directorio temporal (tmpfs)"""
+        try:
+            return render_cache.store(cache_key, result['video_path'])
+        except Exception:
+            if result.get('scratch_dir'):
+                from core.ai_services.manim import render_pool
+                render_pool.cleanup(result['scratch_dir'])
+            raise
+    
+    @staticmethod
+    def _clean_manim_render(result: Dict):
+        """Elimina los archivos locales de un render de Manim ya subido"""
+        if result.get('scratch_dir'):
+            from core.ai_services.manim import render_pool
+            render_pool.cleanup(result['scratch_dir'])
+            return
         
-        video.mark_as_completed(gcs_path=gcs_path, metadata=metadata)
-        
-        # Limpiar archivos locales después de subir a GCS
+        video_path = result['video_path']
         try:
             video_path_obj = Path(video_path)
             if video_path_obj.exists():
                 video_path_obj.unlink()
                 logger.info(f"✅ Archivo local eliminado: {video_path}")
             
-            # También limpiar archivos parciales si existen
             partial_dir = video_path_obj.parent / "partial_movie_files" / "QuoteAnimation"
             if partial_dir.exists():
                 import shutil
@@ -1336,9 +1542,6 @@ class VideoService:
         except Exception as e:
             logger.warning(f"No se pudo eliminar archivo local {video_path}: {e}")
             # No fallar si no se puede eliminar
-        
-        # Usar el ID del video como external_id (Manim no tiene external_id)
-        return f"manim_{video.id}"
     
     # ----------------
     # CONSULTAR ESTADO
@@ -1376,21 +1579,25 @@ class VideoService:
             }
         
         try:
-            if video.type in ['heygen_avatar_v2', 'heygen_avatar_iv']:
-                status_data = self._check_heygen_status(video)
-            elif video.type == 'gemini_veo':
-                status_data = self._check_veo_status(video)
-            elif video.type == 'sora':
-                status_data = self._check_sora_status(video)
-            elif video.type in ['higgsfield_dop_standard', 'higgsfield_dop_preview', 'higgsfield_seedance_v1_pro', 'higgsfield_kling_v2_1_pro']:
-                status_data = self._check_higgsfield_status(video)
-            elif video.type.startswith('kling_'):
-                status_data = self._check_kling_status(video)
-            elif video.type == 'manim_quote':
-                # Manim genera síncronamente, así que si está aquí es porque ya está completado
-                status_data = {'status': video.status}
-            else:
-                status_data = {'status': video.status}
+            from core.services.scheduler import provider_scheduler
+            provider, model = provider_scheduler.classify(video, 'video')
+            
+            with GenerationTelemetry.span('poll', task_type='video', provider=provider, model=model, item_ref=video.uuid):
+                if video.type in ['heygen_avatar_v2', 'heygen_avatar_iv']:
+                    status_data = self._check_heygen_status(video)
+                elif video.type == 'gemini_veo':
+                    status_data = self._check_veo_status(video)
+                elif video.type == 'sora':
+                    status_data = self._check_sora_status(video)
+                elif video.type in ['higgsfield_dop_standard', 'higgsfield_dop_preview', 'higgsfield_seedance_v1_pro', 'higgsfield_kling_v2_1_pro']:
+                    status_data = self._check_higgsfield_status(video)
+                elif video.type.startswith('kling_'):
+                    status_data = self._check_kling_status(video)
+                elif video.type == 'manim_quote':
+                    # Manim genera síncronamente, así que si está aquí es porque ya está completado
+                    status_data = {'status': video.status}
+                else:
+                    status_data = {'status': video.status}
             
             # Si el video está completado pero tiene créditos pendientes, intentar cobrar de nuevo
             if video.status == 'completed' and video.created_by:
@@ -1431,7 +1638,8 @@ class VideoService:
                     gcs_path = f"users/{video.created_by.id}/videos/{video.uuid}/final_video.mp4"
                 else:
                     gcs_path = f"standalone/videos/{video.uuid}/final_video.mp4"
-                gcs_full_path = gcs_storage.upload_from_url(video_url, gcs_path)
+                with GenerationTelemetry.span('upload'):
+                    gcs_full_path = gcs_storage.upload_from_url(video_url, gcs_path)
                 
                 metadata = {
                     'duration': status_data.get('duration'),
@@ -1496,7 +1704,8 @@ class VideoService:
                         else:
                             gcs_full_path = gcs_storage.copy_from_gcs(url, gcs_path)
                     elif url.startswith('http'):
-                        gcs_full_path = gcs_storage.upload_from_url(url, gcs_path)
+                        with GenerationTelemetry.span('upload'):
+                            gcs_full_path = gcs_storage.upload_from_url(url, gcs_path)
                     else:
                         # Base64
                         gcs_full_path = gcs_storage.upload_base64(url, gcs_path)
@@ -1562,12 +1771,11 @@ class VideoService:
                     else:
                         gcs_path = f"standalone/videos/{video.uuid}/video.mp4"
                     
-                    with open(tmp_path, 'rb') as video_file:
-                        gcs_full_path = gcs_storage.upload_from_bytes(
-                            file_content=video_file.read(),
-                            destination_path=gcs_path,
-                            content_type='video/mp4'
-                        )
+                    gcs_full_path = gcs_storage.upload_file(
+                        tmp_path,
+                        destination_path=gcs_path,
+                        content_type='video/mp4'
+                    )
                     
                     # Preparar metadata
                     metadata = {
@@ -1593,12 +1801,11 @@ class VideoService:
                             else:
                                 thumb_gcs_path = f"standalone/videos/{video.uuid}/thumbnail.webp"
                             
-                            with open(thumb_path, 'rb') as thumb:
-                                thumb_gcs_full = gcs_storage.upload_from_bytes(
-                                    file_content=thumb.read(),
-                                    destination_path=thumb_gcs_path,
-                                    content_type='image/webp'
-                                )
+                            thumb_gcs_full = gcs_storage.upload_file(
+                                thumb_path,
+                                destination_path=thumb_gcs_path,
+                                content_type='image/webp'
+                            )
                             
                             metadata['thumbnail_gcs_path'] = thumb_gcs_full
                             logger.info(f"Thumbnail guardado: {thumb_gcs_full}")
@@ -1655,7 +1862,8 @@ class VideoService:
                 
                 try:
                     # Descargar video desde URL y subir a GCS
-                    gcs_full_path = gcs_storage.upload_from_url(video_url, gcs_path)
+                    with GenerationTelemetry.span('upload'):
+                        gcs_full_path = gcs_storage.upload_from_url(video_url, gcs_path)
                     
                     # Preparar metadata
                     metadata = {
@@ -1704,7 +1912,8 @@ class VideoService:
                 
                 try:
                     # Descargar video desde URL y subir a GCS
-                    gcs_full_path = gcs_storage.upload_from_url(video_url, gcs_path)
+                    with GenerationTelemetry.span('upload'):
+                        gcs_full_path = gcs_storage.upload_from_url(video_url, gcs_path)
                     
                     # Preparar metadata
                     metadata = {
@@ -1751,55 +1960,54 @@ class VideoService:
             'input_image_url': None
         }
         
+        # Reunir todos los paths y firmarlos en una sola llamada
+        all_videos = video.metadata.get('all_videos') if video.status == 'completed' else None
+        reference_images = video.config.get('reference_images') or []
+        input_image_gcs_uri = video.config.get('input_image_gcs_uri')
+        
+        paths = []
+        if video.status == 'completed' and video.gcs_path:
+            paths.append(video.gcs_path)
+        paths.extend(v.get('gcs_path') for v in (all_videos or []))
+        paths.extend(ref.get('gcs_uri') for ref in reference_images)
+        paths.append(input_image_gcs_uri)
+        
+        try:
+            signed_urls = gcs_storage.get_signed_urls(paths, expiration=3600)
+        except Exception as e:
+            logger.error(f"Error al generar URLs firmadas: {e}")
+            signed_urls = {}
+        
         # URL firmada del video principal
         if video.status == 'completed' and video.gcs_path:
-            try:
-                result['signed_url'] = gcs_storage.get_signed_url(video.gcs_path)
-            except Exception as e:
-                logger.error(f"Error al generar URL firmada: {e}")
+            result['signed_url'] = signed_urls.get(video.gcs_path)
         
         # URLs de todos los videos (si hay múltiples)
-        if video.status == 'completed' and video.metadata.get('all_videos'):
-            try:
-                for video_data in video.metadata['all_videos']:
-                    gcs_path = video_data.get('gcs_path')
-                    if gcs_path:
-                        signed = gcs_storage.get_signed_url(gcs_path, expiration=3600)
-                        result['all_videos'].append({
-                            'index': video_data.get('index', 0),
-                            'gcs_path': gcs_path,
-                            'signed_url': signed,
-                            'mime_type': video_data.get('mime_type', 'video/mp4')
-                        })
-            except Exception as e:
-                logger.error(f"Error al generar URLs firmadas para múltiples videos: {e}")
+        for video_data in all_videos or []:
+            gcs_path = video_data.get('gcs_path')
+            if gcs_path:
+                result['all_videos'].append({
+                    'index': video_data.get('index', 0),
+                    'gcs_path': gcs_path,
+                    'signed_url': signed_urls.get(gcs_path),
+                    'mime_type': video_data.get('mime_type', 'video/mp4')
+                })
         
         # URLs de imágenes de referencia
-        if video.config.get('reference_images'):
-            try:
-                for idx, ref_img in enumerate(video.config['reference_images']):
-                    gcs_uri = ref_img.get('gcs_uri')
-                    if gcs_uri:
-                        signed = gcs_storage.get_signed_url(gcs_uri, expiration=3600)
-                        result['reference_images'].append({
-                            'index': idx,
-                            'gcs_uri': gcs_uri,
-                            'signed_url': signed,
-                            'reference_type': ref_img.get('reference_type', 'asset'),
-                            'mime_type': ref_img.get('mime_type', 'image/jpeg')
-                        })
-            except Exception as e:
-                logger.error(f"Error al generar URLs firmadas para imágenes de referencia: {e}")
+        for idx, ref_img in enumerate(reference_images):
+            gcs_uri = ref_img.get('gcs_uri')
+            if gcs_uri:
+                result['reference_images'].append({
+                    'index': idx,
+                    'gcs_uri': gcs_uri,
+                    'signed_url': signed_urls.get(gcs_uri),
+                    'reference_type': ref_img.get('reference_type', 'asset'),
+                    'mime_type': ref_img.get('mime_type', 'image/jpeg')
+                })
         
         # URL de imagen inicial
-        if video.config.get('input_image_gcs_uri'):
-            try:
-                result['input_image_url'] = gcs_storage.get_signed_url(
-                    video.config['input_image_gcs_uri'], 
-                    expiration=3600
-                )
-            except Exception as e:
-                logger.error(f"Error al generar URL firmada para imagen inicial: {e}")
+        if input_image_gcs_uri:
+            result['input_image_url'] = signed_urls.get(input_image_gcs_uri)
         
         return result
 
@@ -1816,16 +2024,9 @@ class APIService:
     # Duración del caché obsoleto (stale) en segundos (24 horas)
     STALE_CACHE_TTL = 86400
     
-    def __init__(self):
-        self.heygen_client = None
-    
     def _get_heygen_client(self) -> HeyGenClient:
-        """Lazy initialization de HeyGen client"""
-        if not self.heygen_client:
-            if not settings.HEYGEN_API_KEY:
-                raise ValidationException('HEYGEN_API_KEY no está configurada')
-            self.heygen_client = HeyGenClient(api_key=settings.HEYGEN_API_KEY)
-        return self.heygen_client
+        """Cliente de HeyGen compartido"""
+        return get_heygen_client()
     
     def _get_stale_cache(self, cache_key: str):
         """Obtiene datos obsoletos del caché (stale cache)"""
@@ -2047,80 +2248,44 @@ class APIService:
 class ImageService:
     """Servicio principal para manejar imágenes generadas por IA"""
     
-    def __init__(self):
-        self.gemini_client = None
-        self.higgsfield_client = None
-        self.seedream_client = None
-        self.openai_image_client = None
-    
     # ----------------
     # CLIENT GETTERS
     # ----------------
     
     def _get_gemini_client(self, model_name: Optional[str] = None) -> GeminiImageClient:
-        """
-        Lazy initialization de Gemini Image client.
-        """
+        """Cliente de Gemini Image compartido (uno por modelo)"""
         model_to_use = model_name or "gemini-2.5-flash-image"
-        
-        if self.gemini_client and self.gemini_client.model == model_to_use:
-            return self.gemini_client
-            
         if not settings.GEMINI_API_KEY:
             raise ValidationException('GEMINI_API_KEY no está configurada')
-            
-        client = GeminiImageClient(api_key=settings.GEMINI_API_KEY, model_name=model_to_use)
-        
-        if model_name is None or model_to_use == "gemini-2.5-flash-image":
-            self.gemini_client = client
-            
-        return client
+        return client_pool.get(
+            ('gemini_image', model_to_use),
+            lambda: GeminiImageClient(api_key=settings.GEMINI_API_KEY, model_name=model_to_use)
+        )
     
     def _get_higgsfield_client(self):
-        """Lazy initialization de Higgsfield client."""
-        if not self.higgsfield_client:
-            from .ai_services.higgsfield import HiggsfieldClient
-            if not settings.HIGGSFIELD_API_KEY_ID or not settings.HIGGSFIELD_API_KEY:
-                raise ValidationException('HIGGSFIELD_API_KEY_ID y HIGGSFIELD_API_KEY deben estar configuradas')
-            self.higgsfield_client = HiggsfieldClient(
-                api_key_id=settings.HIGGSFIELD_API_KEY_ID,
-                api_key_secret=settings.HIGGSFIELD_API_KEY
-            )
-        return self.higgsfield_client
+        """Cliente de Higgsfield compartido"""
+        return get_higgsfield_client()
 
     def _get_seedream_client(self, model_name: Optional[str] = None) -> SeaDreamImageClient:
-        """Inicialización perezosa del cliente Seedream."""
+        """Cliente de Seedream compartido (uno por modelo)"""
         model_to_use = model_name or "seedream-default-model"
-
-        if self.seedream_client and self.seedream_client.model == model_to_use:
-            return self.seedream_client
-
         if not settings.SEEDREAM_API_KEY:
             raise ValidationException('SEEDREAM_API_KEY no está configurada')
-            
-        client = SeaDreamImageClient(api_key=settings.SEEDREAM_API_KEY, model_name=model_to_use)
-        
-        if model_name is None or model_to_use == "seedream-default-model":
-            self.seedream_client = client
-        
-        return client
+        return client_pool.get(
+            ('seedream', model_to_use),
+            lambda: SeaDreamImageClient(api_key=settings.SEEDREAM_API_KEY, model_name=model_to_use),
+            session_provider='seedream'
+        )
     
     def _get_openai_image_client(self, model_name: Optional[str] = None) -> OpenAIImageClient:
-        """Inicialización perezosa del cliente OpenAI Image."""
+        """Cliente de OpenAI Image compartido (uno por modelo)"""
         model_to_use = model_name or "gpt-image-1.5"
-        
-        if self.openai_image_client and self.openai_image_client.model == model_to_use:
-            return self.openai_image_client
-        
         if not settings.OPENAI_API_KEY:
             raise ValidationException('OPENAI_API_KEY no está configurada')
-        
-        client = OpenAIImageClient(api_key=settings.OPENAI_API_KEY, model_name=model_to_use)
-        
-        if model_name is None or model_to_use == "gpt-image-1.5":
-            self.openai_image_client = client
-        
-        return client
+        return client_pool.get(
+            ('openai_image', model_to_use),
+            lambda: OpenAIImageClient(api_key=settings.OPENAI_API_KEY, model_name=model_to_use)
+        )
     
     # ----------------
     # CREAR IMAGEN (se mantiene el original)
@@ -2210,9 +2375,16 @@ class ImageService:
     # GENERAR IMAGEN (Router)
     # ----------------
     
-    def generate_image(self, image: Image, skip_status_check: bool = False) -> str:
+    def generate_image(self, image: Image, skip_status_check: bool = False, defer_polling: bool = False) -> str:
         """
         Genera una imagen usando el servicio apropiado según model_id
+        
+        Args:
+            image: Imagen a generar
+            skip_status_check: No validar el estado actual de la imagen
+            defer_polling: Para proveedores asíncronos (Higgsfield), enviar el
+                trabajo y lanzar GenerationPendingException en lugar de esperar;
+                el estado se consulta después con check_image_status()
         """
         # Validar estado (solo si no se omite)
         if not skip_status_check and image.status in ['processing', 'completed']:
@@ -2268,7 +2440,11 @@ class ImageService:
             aspect_ratio = image.config.get('aspect_ratio', '1:1')
             
             # --- Enrutamiento ---
-            if service == 'higgsfield':
+            if service == 'higgsfield' and defer_polling:
+                request_id = self._submit_higgsfield_image(image, model_id, aspect_ratio, final_prompt)
+                raise GenerationPendingException('higgsfield', request_id, model_id)
+            
+            elif service == 'higgsfield':
                 result = self._generate_higgsfield_image(image, model_id, aspect_ratio, final_prompt)
                 
             elif service == 'seedream':
@@ -2282,35 +2458,78 @@ class ImageService:
             else:
                 # Por defecto, usar Gemini
                 result = self._generate_gemini_image(image, model_id, aspect_ratio, final_prompt)
-                
-            # Subir imagen generada a GCS
-            gcs_path = self._save_generated_image(
-                image_data=result['image_data'],
-                project=image.project,
-                image_uuid=str(image.uuid)
-            )
             
-            # Preparar metadata
-            metadata = {
-                'width': result['width'],
-                'height': result['height'],
-                'aspect_ratio': result['aspect_ratio'],
-                'text_response': result.get('text_response'),
-            }
-            
-            # Actualizar imagen en BD
-            image.width = result['width']
-            image.height = result['height']
-            image.aspect_ratio = result['aspect_ratio']
-            image.mark_as_completed(gcs_path=gcs_path, metadata=metadata)
-            
-            logger.info(f"Imagen {image.id} generada exitosamente: {gcs_path}")
-            return gcs_path
+            return self._finalize_generated_image(image, result)
             
+        except GenerationPendingException:
+            raise
         except Exception as e:
             logger.error(f"Error al generar imagen {image.id}: {e}")
             image.mark_as_error(str(e))
             raise ImageGenerationException(str(e))
+    
+    def check_image_status(self, image: Image) -> bool:
+        """
+        Consulta una vez el estado de una imagen enviada con defer_polling
+        
+        Returns:
+            True si la imagen ha terminado (completada), False si sigue pendiente
+        
+        Raises:
+            ImageGenerationException: Si el proveedor reporta un fallo
+        """
+        if image.status == 'completed':
+            return True
+        if not image.external_id:
+            raise ImageGenerationException('La imagen no tiene un trabajo pendiente en el proveedor')
+        
+        client = self._get_higgsfield_client()
+        status_data = client.get_request_status(image.external_id)
+        status = status_data.get('status')
+        
+        if status in ['failed', 'error', 'cancelled', 'nsfw']:
+            error_msg = f"Error al generar imagen con Higgsfield: {status_data.get('error', status)}"
+            image.mark_as_error(error_msg)
+            raise ImageGenerationException(error_msg)
+        if status != 'completed':
+            return False
+        
+        try:
+            aspect_ratio = image.config.get('aspect_ratio', '1:1')
+            final_prompt = apply_prompt_template(image.prompt, image.config.get('prompt_template_id'))
+            result = self._download_higgsfield_image(status_data, aspect_ratio, final_prompt)
+            self._finalize_generated_image(image, result)
+        except Exception as e:
+            logger.error(f"Error al finalizar imagen {image.id}: {e}")
+            image.mark_as_error(str(e))
+            raise ImageGenerationException(str(e))
+        return True
+    
+    def _finalize_generated_image(self, image: Image, result: dict) -> str:
+        """Sube el resultado de un proveedor a GCS y marca la imagen como completada"""
+        with GenerationTelemetry.span('upload'):
+            gcs_path = self._save_generated_image(
+                image_data=result['image_data'],
+                project=image.project,
+                image_uuid=str(image.uuid)
+            )
+        
+        # Preparar metadata
+        metadata = {
+            'width': result['width'],
+            'height': result['height'],
+            'aspect_ratio': result['aspect_ratio'],
+            'text_response': result.get('text_response'),
+        }
+        
+        # Actualizar imagen en BD
+        image.width = result['width']
+        image.height = result['height']
+        image.aspect_ratio = result['aspect_ratio']
+        image.mark_as_completed(gcs_path=gcs_path, metadata=metadata)
+        
+        logger.info(f"Imagen {image.id} generada exitosamente: {gcs_path}")
+        return gcs_path
 
     # ----------------
     # GENERACIÓN ASÍNCRONA (AÑADIDO)
@@ -2543,11 +2762,26 @@ class ImageService:
 
     def _generate_higgsfield_image(self, image: Image, model_id: str, aspect_ratio: str, final_prompt: str) -> dict:
         """
-        Genera una imagen usando Higgsfield API (Maneja el polling síncrono).
+        Genera una imagen usando Higgsfield API esperando el resultado (bloqueante)
+        
+        Las tareas de Celery usan defer_polling para no ocupar el worker.
         """
-        import requests
-        import time
+        request_id = self._submit_higgsfield_image(image, model_id, aspect_ratio, final_prompt)
         
+        client = self._get_higgsfield_client()
+        status_data = client.wait_for_completion(request_id, max_wait_seconds=300, model_id=model_id)
+        status = status_data.get('status')
+        
+        if status == 'timeout':
+            raise ImageGenerationException("Timeout esperando respuesta de Higgsfield")
+        if status != 'completed':
+            error_msg = status_data.get('error', 'Error desconocido')
+            raise ImageGenerationException(f"Error al generar imagen con Higgsfield: {error_msg}")
+        
+        return self._download_higgsfield_image(status_data, aspect_ratio, final_prompt)
+    
+    def _submit_higgsfield_image(self, image: Image, model_id: str, aspect_ratio: str, final_prompt: str) -> str:
+        """Envía la imagen a Higgsfield y guarda el request_id en image.external_id"""
         client = self._get_higgsfield_client()
         
         logger.info(f"Generando imagen con Higgsfield: {model_id}")
@@ -2570,50 +2804,37 @@ class ImageService:
         
         image.external_id = request_id
         image.save(update_fields=['external_id'])
-
-        # Polling síncrono
-        max_attempts = 60
-        attempt = 0
+        return request_id
+    
+    def _download_higgsfield_image(self, status_data: dict, aspect_ratio: str, final_prompt: str) -> dict:
+        """Descarga la imagen de un request completado de Higgsfield"""
+        import requests
         
-        while attempt < max_attempts:
-            time.sleep(5)
-            attempt += 1
-            
-            status_data = client.get_request_status(request_id)
-            status = status_data.get('status')
-            
-            if status == 'completed':
-                image_url = None
-                if 'images' in status_data.get('raw_response', {}) and status_data['raw_response']['images']:
-                    image_url = status_data['raw_response']['images'][0].get('url')
-                
-                if not image_url:
-                    raise ImageGenerationException("No se encontró URL de imagen en la respuesta de Higgsfield")
-                
-                # Descargar imagen desde la URL
-                try:
-                    img_response = requests.get(image_url, timeout=30)
-                    img_response.raise_for_status()
-                    image_data = img_response.content
-                except Exception as e:
-                    raise StorageException(f"Error al descargar imagen generada desde Higgsfield: {str(e)}")
+        image_url = None
+        if 'images' in status_data.get('raw_response', {}) and status_data['raw_response']['images']:
+            image_url = status_data['raw_response']['images'][0].get('url')
+        
+        if not image_url:
+            raise ImageGenerationException("No se encontró URL de imagen en la respuesta de Higgsfield")
+        
+        # Descargar imagen desde la URL
+        try:
+            img_response = requests.get(image_url, timeout=30)
+            img_response.raise_for_status()
+            image_data = img_response.content
+        except Exception as e:
+            raise StorageException(f"Error al descargar imagen generada desde Higgsfield: {str(e)}")
 
-                # Determinar dimensiones (usando auxiliar)
-                width, height = self._get_dimensions_from_aspect_ratio(aspect_ratio)
-                
-                return {
-                    'image_data': image_data,
-                    'width': width,
-                    'height': height,
-                    'aspect_ratio': aspect_ratio,
-                    'text_response': final_prompt
-                }
-            
-            elif status in ['failed', 'error', 'cancelled', 'nsfw']:
-                error_msg = status_data.get('error', 'Error desconocido')
-                raise ImageGenerationException(f"Error al generar imagen con Higgsfield: {error_msg}")
+        # Determinar dimensiones (usando auxiliar)
+        width, height = self._get_dimensions_from_aspect_ratio(aspect_ratio)
         
-        raise ImageGenerationException("Timeout esperando respuesta de Higgsfield")
+        return {
+            'image_data': image_data,
+            'width': width,
+            'height': height,
+            'aspect_ratio': aspect_ratio,
+            'text_response': final_prompt
+        }
 
     # ----------------
     # AUXILIAR METHODS
@@ -2634,9 +2855,7 @@ class ImageService:
         """Descarga imagen desde GCS y retorna bytes"""
         try:
             # Necesario para el cliente Gemini y SeaDream (Image-to-Image)
-            blob_name = gcs_path.replace(f"gs://{settings.GCS_BUCKET_NAME}/", "")
-            blob = gcs_storage.bucket.blob(blob_name)
-            image_data = blob.download_as_bytes()
+            image_data = gcs_storage.download_as_bytes(gcs_path)
             logger.info(f"Imagen descargada desde GCS: {len(image_data)} bytes")
             return image_data
         except Exception as e:
@@ -2691,41 +2910,35 @@ class ImageService:
             'input_images_urls': []
         }
         
+        input_paths = []
+        if image.type == 'image_to_image' and image.config.get('input_image_gcs_path'):
+            input_paths = [image.config['input_image_gcs_path']]
+        elif image.type == 'multi_image' and image.config.get('input_images'):
+            input_paths = [img_config.get('gcs_path') for img_config in image.config['input_images']]
+        
+        paths = list(input_paths)
+        if image.status == 'completed' and image.gcs_path:
+            paths.append(image.gcs_path)
+        
+        # Firmar imagen generada e imágenes de entrada en una sola llamada
+        try:
+            signed_urls = gcs_storage.get_signed_urls(paths, expiration=3600)
+        except Exception as e:
+            logger.error(f"Error al generar URLs firmadas: {e}")
+            signed_urls = {}
+        
         # URL firmada de la imagen generada
         if image.status == 'completed' and image.gcs_path:
-            try:
-                result['signed_url'] = gcs_storage.get_signed_url(image.gcs_path)
-            except Exception as e:
-                logger.error(f"Error al generar URL firmada: {e}")
+            result['signed_url'] = signed_urls.get(image.gcs_path)
         
         # URLs de imágenes de entrada (para image-to-image y multi_image)
-        if image.type == 'image_to_image' and image.config.get('input_image_gcs_path'):
-            try:
-                input_url = gcs_storage.get_signed_url(
-                    image.config['input_image_gcs_path'], 
-                    expiration=3600
-                )
+        for idx, gcs_path in enumerate(input_paths):
+            if gcs_path:
                 result['input_images_urls'].append({
-                    'index': 0,
-                    'gcs_path': image.config['input_image_gcs_path'],
-                    'signed_url': input_url
+                    'index': idx,
+                    'gcs_path': gcs_path,
+                    'signed_url': signed_urls.get(gcs_path)
                 })
-            except Exception as e:
-                logger.error(f"Error al generar URL firmada para imagen de entrada: {e}")
-        
-        if image.type == 'multi_image' and image.config.get('input_images'):
-            try:
-                for idx, img_config in enumerate(image.config['input_images']):
-                    gcs_path = img_config.get('gcs_path')
-                    if gcs_path:
-                        signed_url = gcs_storage.get_signed_url(gcs_path, expiration=3600)
-                        result['input_images_urls'].append({
-                            'index': idx,
-                            'gcs_path': gcs_path,
-                            'signed_url': signed_url
-                        })
-            except Exception as e:
-                logger.error(f"Error al generar URLs firmadas para imágenes de entrada: {e}")
         
         return result
     
@@ -2874,15 +3087,8 @@ class AudioService:
     
     @staticmethod
     def _get_elevenlabs_client():
-        """Obtiene cliente de ElevenLabs"""
-        from .ai_services import ElevenLabsClient
-        from django.conf import settings
-        
-        api_key = settings.ELEVENLABS_API_KEY
-        if not api_key:
-            raise ServiceException('ELEVENLABS_API_KEY no configurada')
-        
-        return ElevenLabsClient(api_key=api_key)
+        """Obtiene cliente de ElevenLabs (compartido por proceso)"""
+        return get_elevenlabs_client()
     
     @staticmethod
     def _get_lyria_client(model_name: str = "lyria-002"):
@@ -2896,7 +3102,10 @@ class AudioService:
         if not project_id:
             raise ServiceException('GCS_PROJECT_ID no configurada')
         
-        return GoogleLyriaClient(project_id=project_id, location=location, model_name=model_name)
+        return client_pool.get(
+            ('lyria', project_id, location, model_name),
+            lambda: GoogleLyriaClient(project_id=project_id, location=location, model_name=model_name)
+        )
     
     @staticmethod
     def _get_default_voice_settings():
@@ -3136,15 +3345,15 @@ class AudioService:
                 else:
                     gcs_path = f"audios/{audio.uuid}/{timestamp}_{safe_title}.mp3"
                 
-                with open(tmp_path, 'rb') as f:
-                    gcs_full_path = gcs_storage.upload_from_bytes(
-                        file_content=f.read(),
-                        destination_path=gcs_path,
-                        content_type='audio/mpeg'
-                    )
+                gcs_full_path = gcs_storage.upload_file(
+                    tmp_path,
+                    destination_path=gcs_path,
+                    content_type='audio/mpeg'
+                )
                 
-                # Obtener duración del audio usando ffprobe
-                duration = AudioService._get_audio_duration(tmp_path)
+                # Un ffprobe por blob: duración y formato quedan guardados en el audio
+                media_info = MediaProbe.remember(gcs_full_path, MediaProbe.probe_file(tmp_path))
+                duration = media_info.duration
                 file_size = os.path.getsize(tmp_path)
                 
                 # Marcar como completado
@@ -3156,6 +3365,7 @@ class AudioService:
                         'language_code': audio.language_code,
                         'voice_settings': voice_settings,
                         'file_size': file_size,
+                        **({'media_info': {'file': media_info.to_dict()}} if media_info.probed else {}),
                     },
                     alignment=alignment if alignment else None
                 )
@@ -3262,15 +3472,15 @@ class AudioService:
                 else:
                     gcs_path = f"audios/{audio.uuid}/{timestamp}_{safe_title}.{file_extension}"
                 
-                with open(tmp_path, 'rb') as f:
-                    gcs_full_path = gcs_storage.upload_from_bytes(
-                        file_content=f.read(),
-                        destination_path=gcs_path,
-                        content_type=content_type
-                    )
+                gcs_full_path = gcs_storage.upload_file(
+                    tmp_path,
+                    destination_path=gcs_path,
+                    content_type=content_type
+                )
                 
-                # Obtener duración del audio usando ffprobe
-                duration = AudioService._get_audio_duration(tmp_path)
+                # Un ffprobe por blob: duración y formato quedan guardados en el audio
+                media_info = MediaProbe.remember(gcs_full_path, MediaProbe.probe_file(tmp_path))
+                duration = media_info.duration
                 file_size = os.path.getsize(tmp_path)
                 
                 # Preparar metadata completa
@@ -3287,6 +3497,8 @@ class AudioService:
                     'seed': seed,
                     'sample_count_requested': sample_count,
                 }
+                if media_info.probed:
+                    metadata['media_info'] = {'file': media_info.to_dict()}
                 
                 # Guardar song_metadata si no existe
                 if not audio.song_metadata:
@@ -3405,46 +3617,6 @@ class AudioService:
         logger.info(f"Audio {audio.id} encolado. Task UUID: {task.uuid}")
         return task
     
-    @staticmethod
-    def _get_audio_duration(audio_path: str) -> float:
-        """
-        Obtiene la duración de un archivo de audio usando ffprobe
-        
-        Args:
-            audio_path: Path al archivo de audio
-            
-        Returns:
-            Duración en segundos
-        """
-        import subprocess
-        
-        try:
-            result = subprocess.run(
-                [
-                    'ffprobe',
-                    '-v', 'error',
-                    '-show_entries', 'format=duration',
-                    '-of', 'default=noprint_wrappers=1:nokey=1',
-                    audio_path
-                ],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0:
-                return float(result.stdout.strip())
-            else:
-                logger.warning(f"No se pudo obtener duración del audio: {result.stderr}")
-                return 0.0
-                
-        except FileNotFoundError:
-            logger.warning("ffprobe no está instalado. No se puede obtener la duración del audio.")
-            return 0.0
-        except Exception as e:
-            logger.warning(f"Error al obtener duración del audio: {e}")
-            return 0.0
-    
     @staticmethod
     def list_voices():
         """
@@ -3834,8 +4006,8 @@ This is a preview thumbnail for a video, make it visually engaging and represent
             InsufficientCreditsException: Si no hay suficientes créditos
             RateLimitExceededException: Si se excede el límite mensual
         """
-        # Validar créditos ANTES de generar
-        if scene.script.created_by:
+        # Validar créditos ANTES de generar (salvo que ya estén reservados, p.ej. en un storyboard)
+        if scene.script.created_by and not (scene.metadata or {}).get('credit_reservation'):
             from core.services.credits import CreditService, InsufficientCreditsException, RateLimitExceededException
             
             estimated_cost = CreditService.calculate_scene_video_cost(scene)
@@ -3898,14 +4070,13 @@ This is a preview thumbnail for a video, make it visually engaging and represent
     
     def _generate_heygen_scene_video(self, scene):
         """Genera video de escena con HeyGen (V2 o Avatar IV)"""
-        from .ai_services.heygen import HeyGenClient
         from .storage.gcs import gcs_storage
         from .services.voice_validator import VoiceValidator
         
         if not settings.HEYGEN_API_KEY:
             raise ValidationException('HEYGEN_API_KEY no está configurada')
         
-        client = HeyGenClient(api_key=settings.HEYGEN_API_KEY)
+        client = get_heygen_client()
         
         # Avatar IV: requiere image_key y voice_id
         if scene.ai_service == 'heygen_avatar_iv':
@@ -4059,13 +4230,12 @@ This is a preview thumbnail for a video, make it visually engaging and represent
     
     def _generate_veo_scene_video(self, scene):
         """Genera video de escena con Gemini Veo"""
-        from .ai_services.gemini_veo import GeminiVeoClient
         
         if not settings.GEMINI_API_KEY:
             raise ValidationException('GEMINI_API_KEY no está configurada')
         
         model_name = scene.ai_config.get('veo_model', 'veo-2.0-generate-001')
-        client = GeminiVeoClient(api_key=settings.GEMINI_API_KEY, model_name=model_name)
+        client = get_veo_client(model_name)
         
         # Preparar storage URI
         project_prefix = SceneService._get_project_id_for_path(scene)
@@ -4099,12 +4269,12 @@ This is a preview thumbnail for a video, make it visually engaging and represent
     
     def _generate_sora_scene_video(self, scene):
         """Genera video de escena con OpenAI Sora"""
-        from .ai_services.sora import SoraClient, SORA_DURATIONS
+        from .ai_services.sora import SORA_DURATIONS
         
         if not settings.OPENAI_API_KEY:
             raise ValidationException('OPENAI_API_KEY no está configurada')
         
-        client = SoraClient(api_key=settings.OPENAI_API_KEY)
+        client = get_sora_client()
         
         # Usar visual_prompt si existe, sino fallback a script_text + broll
         if scene.visual_prompt:
@@ -4213,15 +4383,11 @@ This is a preview thumbnail for a video, make it visually engaging and represent
     
     def _generate_higgsfield_scene_video(self, scene):
         """Genera video de escena con Higgsfield"""
-        from .ai_services.higgsfield import HiggsfieldClient
         
         if not settings.HIGGSFIELD_API_KEY_ID or not settings.HIGGSFIELD_API_KEY:
             raise ValidationException('HIGGSFIELD_API_KEY_ID y HIGGSFIELD_API_KEY deben estar configuradas')
         
-        client = HiggsfieldClient(
-            api_key_id=settings.HIGGSFIELD_API_KEY_ID,
-            api_key_secret=settings.HIGGSFIELD_API_KEY
-        )
+        client = get_higgsfield_client()
         
         # Mapear ai_service a model_id
         model_map = {
@@ -4281,15 +4447,11 @@ This is a preview thumbnail for a video, make it visually engaging and represent
     
     def _generate_kling_scene_video(self, scene):
         """Genera video de escena con Kling"""
-        from .ai_services.kling import KlingClient
         
         if not settings.KLING_ACCESS_KEY or not settings.KLING_SECRET_KEY:
             raise ValidationException('KLING_ACCESS_KEY y KLING_SECRET_KEY deben estar configuradas')
         
-        client = KlingClient(
-            access_key=settings.KLING_ACCESS_KEY,
-            secret_key=settings.KLING_SECRET_KEY
-        )
+        client = get_kling_client()
         
         # Mapear ai_service a model_name
         model_map = {
@@ -4333,6 +4495,13 @@ This is a preview thumbnail for a video, make it visually engaging and represent
         elif config.get('image_url'):
             image_url = config['image_url']
         
+        # Aviso de finalización al webhook (si está configurado); el watcher sigue de respaldo
+        from core.services.status_watcher import provider_callback_url
+        extra = {}
+        callback_url = provider_callback_url('kling')
+        if callback_url:
+            extra['callback_url'] = callback_url
+        
         # Generar video
         response = client.generate_video(
             model_name=model_name,
@@ -4340,7 +4509,8 @@ This is a preview thumbnail for a video, make it visually engaging and represent
             image_url=image_url,
             mode=mode,
             duration=duration,
-            aspect_ratio=aspect_ratio
+            aspect_ratio=aspect_ratio,
+            **extra
         )
         
         return response.get('task_id')
@@ -4383,26 +4553,29 @@ This is a preview thumbnail for a video, make it visually engaging and represent
             scene.save(update_fields=['ai_service'])
         
         try:
-            if scene.ai_service in ['heygen_v2', 'heygen_avatar_iv']:
-                return self._check_heygen_scene_status(scene)
-            elif scene.ai_service == 'gemini_veo':
-                return self._check_veo_scene_status(scene)
-            elif scene.ai_service == 'sora':
-                return self._check_sora_scene_status(scene)
-            elif scene.ai_service == 'vuela_ai':
-                return self._check_vuela_ai_scene_status(scene)
-            else:
-                raise ValidationException(f"Servicio de IA no soportado para check status: {scene.ai_service}")
+            from core.services.scheduler import provider_scheduler
+            provider, model = provider_scheduler.classify(scene, 'scene_video')
+            
+            with GenerationTelemetry.span('poll', task_type='scene', provider=provider, model=model, item_ref=scene.id):
+                if scene.ai_service in ['heygen_v2', 'heygen_avatar_iv']:
+                    return self._check_heygen_scene_status(scene)
+                elif scene.ai_service == 'gemini_veo':
+                    return self._check_veo_scene_status(scene)
+                elif scene.ai_service == 'sora':
+                    return self._check_sora_scene_status(scene)
+                elif scene.ai_service == 'vuela_ai':
+                    return self._check_vuela_ai_scene_status(scene)
+                else:
+                    raise ValidationException(f"Servicio de IA no soportado para check status: {scene.ai_service}")
         except Exception as e:
             logger.error(f"Error al consultar estado de escena: {e}")
             raise ServiceException(str(e))
     
     def _check_heygen_scene_status(self, scene):
         """Consulta estado en HeyGen con manejo mejorado de errores"""
-        from .ai_services.heygen import HeyGenClient
         from .services.voice_validator import VoiceValidator
         
-        client = HeyGenClient(api_key=settings.HEYGEN_API_KEY)
+        client = get_heygen_client()
         status_data = client.get_video_status(scene.external_id)
         
         api_status = status_data.get('status')
@@ -4412,7 +4585,8 @@ This is a preview thumbnail for a video, make it visually engaging and represent
             if video_url:
                 project_prefix = SceneService._get_project_id_for_path(scene)
                 gcs_path = f"{project_prefix}/scenes/{scene.id}/video.mp4"
-                gcs_full_path = gcs_storage.upload_from_url(video_url, gcs_path)
+                with GenerationTelemetry.span('upload'):
+                    gcs_full_path = gcs_storage.upload_from_url(video_url, gcs_path)
                 
                 metadata = {
                     'duration': status_data.get('duration'),
@@ -4501,9 +4675,8 @@ This is a preview thumbnail for a video, make it visually engaging and represent
     
     def _check_veo_scene_status(self, scene):
         """Consulta estado en Gemini Veo"""
-        from .ai_services.gemini_veo import GeminiVeoClient
         
-        client = GeminiVeoClient(api_key=settings.GEMINI_API_KEY)
+        client = get_veo_client('veo-3.1-generate-preview')
         status_data = client.get_video_status(scene.external_id)
         
         api_status = status_data.get('status')
@@ -4523,7 +4696,8 @@ This is a preview thumbnail for a video, make it visually engaging and represent
                     else:
                         gcs_full_path = gcs_storage.copy_from_gcs(url, gcs_path)
                 elif url.startswith('http'):
-                    gcs_full_path = gcs_storage.upload_from_url(url, gcs_path)
+                    with GenerationTelemetry.span('upload'):
+                        gcs_full_path = gcs_storage.upload_from_url(url, gcs_path)
                 else:
                     gcs_full_path = gcs_storage.upload_base64(url, gcs_path)
                 
@@ -4547,9 +4721,8 @@ This is a preview thumbnail for a video, make it visually engaging and represent
     
     def _check_sora_scene_status(self, scene):
         """Consulta estado en OpenAI Sora"""
-        from .ai_services.sora import SoraClient
         
-        client = SoraClient(api_key=settings.OPENAI_API_KEY)
+        client = get_sora_client()
         status_data = client.get_video_status(scene.external_id)
         
         api_status = status_data.get('status')
@@ -4568,12 +4741,11 @@ This is a preview thumbnail for a video, make it visually engaging and represent
                     project_prefix = SceneService._get_project_id_for_path(scene)
                     gcs_path = f"{project_prefix}/scenes/{scene.id}/video.mp4"
                     
-                    with open(tmp_path, 'rb') as video_file:
-                        gcs_full_path = gcs_storage.upload_from_bytes(
-                            file_content=video_file.read(),
-                            destination_path=gcs_path,
-                            content_type='video/mp4'
-                        )
+                    gcs_full_path = gcs_storage.upload_file(
+                        tmp_path,
+                        destination_path=gcs_path,
+                        content_type='video/mp4'
+                    )
                     
                     metadata = {
                         'model': status_data.get('model'),
@@ -4671,48 +4843,23 @@ This is a preview thumbnail for a video, make it visually engaging and represent
             if not video_url:
                 raise ValidationException('Vuela.ai no devolvió video_url')
             
-            import tempfile
-            import os
+            # Descargar video y subirlo a GCS en streaming (sin archivo temporal)
+            logger.info(f"Descargando video de Vuela.ai: {video_url}")
+            project_prefix = SceneService._get_project_id_for_path(scene)
+            gcs_path = f"{project_prefix}/scenes/{scene.id}/video.mp4"
+            gcs_full_path = gcs_storage.upload_from_url(video_url, gcs_path)
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
-                tmp_path = tmp_file.name
+            metadata = {
+                'mode': status_data.get('mode'),
+                'aspect_ratio': status_data.get('aspect_ratio'),
+                'animation_type': status_data.get('animation_type'),
+            }
             
-            try:
-                # Descargar video
-                logger.info(f"Descargando video de Vuela.ai: {video_url}")
-                response = requests.get(video_url, timeout=300, stream=True)
-                response.raise_for_status()
-                
-                with open(tmp_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                
-                # Subir a GCS
-                project_prefix = SceneService._get_project_id_for_path(scene)
-                gcs_path = f"{project_prefix}/scenes/{scene.id}/video.mp4"
-                
-                with open(tmp_path, 'rb') as video_file:
-                    gcs_full_path = gcs_storage.upload_from_bytes(
-                        file_content=video_file.read(),
-                        destination_path=gcs_path,
-                        content_type='video/mp4'
-                    )
-                
-                metadata = {
-                    'mode': status_data.get('mode'),
-                    'aspect_ratio': status_data.get('aspect_ratio'),
-                    'animation_type': status_data.get('animation_type'),
-                }
-                
-                scene.mark_video_as_completed(gcs_path=gcs_full_path, metadata=metadata)
-                logger.info(f"✓ Video de escena {scene.scene_id} completado desde Vuela.ai: {gcs_full_path}")
-                
-                # Auto-generar audio si está habilitado
-                self._auto_generate_audio_if_needed(scene)
-                
-            finally:
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
+            scene.mark_video_as_completed(gcs_path=gcs_full_path, metadata=metadata)
+            logger.info(f"✓ Video de escena {scene.scene_id} completado desde Vuela.ai: {gcs_full_path}")
+            
+            # Auto-generar audio si está habilitado
+            self._auto_generate_audio_if_needed(scene)
         
         elif api_status == 'failed':
             error_msg = status_data.get('error_message', 'Video generation failed')
@@ -4739,15 +4886,15 @@ This is a preview thumbnail for a video, make it visually engaging and represent
                 logger.info(f"Audio deshabilitado para script {scene.script.id}")
                 return
             
-            # Obtener configuración de voz (priorizar voz de escena sobre voz por defecto)
-            voice_id = scene.audio_voice_id or scene.script.default_voice_id
-            voice_name = scene.audio_voice_name or scene.script.default_voice_name
+            # Audio ya generado en paralelo con el video (storyboard): solo falta combinar.
+            # Si sigue en proceso, la tarea de audio combinará al terminar.
+            if (scene.metadata or {}).get('prefetched_audio') and scene.audio_status in ['processing', 'completed']:
+                logger.info(f"Escena {scene.scene_id} con audio pre-generado ({scene.audio_status})")
+                if scene.audio_status == 'completed':
+                    self._auto_combine_video_audio_if_ready(scene)
+                return
             
-            if not voice_id:
-                logger.warning(f"No hay voice_id configurado para escena {scene.scene_id}, usando voz por defecto")
-                from decouple import config
-                voice_id = config('ELEVENLABS_DEFAULT_VOICE_ID', default='pFZP5JQG7iQjIQuC4Bku')
-                voice_name = config('ELEVENLABS_DEFAULT_VOICE_NAME', default='Aria')
+            voice_id, voice_name = self._resolve_scene_voice(scene)
             
             logger.info(f"=== GENERANDO AUDIO AUTOMÁTICO PARA ESCENA {scene.scene_id} ===")
             logger.info(f"  Texto: {scene.script_text[:100]}...")
@@ -4760,9 +4907,21 @@ This is a preview thumbnail for a video, make it visually engaging and represent
             logger.error(f"Error al auto-generar audio para escena {scene.scene_id}: {e}")
             scene.mark_audio_as_error(str(e))
     
+    def _resolve_scene_voice(self, scene):
+        """Voz del audio de una escena (priorizar voz de escena sobre voz por defecto del script)"""
+        voice_id = scene.audio_voice_id or scene.script.default_voice_id
+        voice_name = scene.audio_voice_name or scene.script.default_voice_name
+        
+        if not voice_id:
+            logger.warning(f"No hay voice_id configurado para escena {scene.scene_id}, usando voz por defecto")
+            from decouple import config
+            voice_id = config('ELEVENLABS_DEFAULT_VOICE_ID', default='pFZP5JQG7iQjIQuC4Bku')
+            voice_name = config('ELEVENLABS_DEFAULT_VOICE_NAME', default='Aria')
+        
+        return voice_id, voice_name
+    
     def _generate_scene_audio(self, scene, voice_id: str, voice_name: str):
         """Genera audio para una escena usando ElevenLabs con validación y ajuste automático"""
-        from .ai_services.elevenlabs import ElevenLabsClient
         from .storage.gcs import gcs_storage
         from .services.audio_duration_calculator import AudioDurationCalculator
         from decouple import config
@@ -4773,7 +4932,7 @@ This is a preview thumbnail for a video, make it visually engaging and represent
         
         try:
             # Obtener cliente
-            client = ElevenLabsClient(api_key=settings.ELEVENLABS_API_KEY)
+            client = get_elevenlabs_client()
             
             # Configuración de voz inicial
             base_speed = float(config('ELEVENLABS_DEFAULT_SPEED', default=1.0))
@@ -4861,8 +5020,9 @@ This is a preview thumbnail for a video, make it visually engaging and represent
                 tmp_path = tmp_file.name
             
             try:
-                # Obtener duración real del audio generado
-                actual_duration = AudioService._get_audio_duration(tmp_path)
+                # Obtener duración real del audio generado (un solo ffprobe; se guarda en la escena)
+                audio_info = MediaProbe.probe_file(tmp_path)
+                actual_duration = audio_info.duration
                 
                 # Verificar si aún excede después del ajuste
                 if actual_duration > video_duration:
@@ -4892,12 +5052,11 @@ This is a preview thumbnail for a video, make it visually engaging and represent
                 project_prefix = SceneService._get_project_id_for_path(scene)
                 gcs_path = f"{project_prefix}/scenes/{scene.id}/audio_{timestamp}.mp3"
                 
-                with open(tmp_path, 'rb') as f:
-                    gcs_full_path = gcs_storage.upload_from_bytes(
-                        file_content=f.read(),
-                        destination_path=gcs_path,
-                        content_type='audio/mpeg'
-                    )
+                gcs_full_path = gcs_storage.upload_file(
+                    tmp_path,
+                    destination_path=gcs_path,
+                    content_type='audio/mpeg'
+                )
                 
                 # Marcar como completado (usar duración real)
                 scene.mark_audio_as_completed(
@@ -4906,6 +5065,7 @@ This is a preview thumbnail for a video, make it visually engaging and represent
                     voice_id=voice_id,
                     voice_name=voice_name
                 )
+                MediaProbe.record(scene, 'audio', MediaProbe.remember(gcs_full_path, audio_info))
                 
                 logger.info(
                     f"✓ Audio generado para escena {scene.scene_id}: {gcs_full_path} "
@@ -4963,25 +5123,48 @@ This is a preview thumbnail for a video, make it visually engaging and represent
                 scene.video_gcs_path,
                 scene.audio_gcs_path,
                 project_id,
-                scene.id
+                scene.id,
+                scene=scene
             )
             
             scene.mark_final_video_as_completed(final_gcs_path)
+            # El análisis del mux ya está en la caché de MediaProbe: solo se copia a la fila
+            MediaProbe.lookup(scene, 'final_video')
             logger.info(f"✓ Video final combinado para escena {scene.scene_id}: {final_gcs_path}")
             
         except Exception as e:
             logger.error(f"Error al combinar video+audio para escena {scene.scene_id}: {e}")
             scene.mark_final_video_as_error(str(e))
     
-    def _combine_video_and_audio(self, video_gcs_path: str, audio_gcs_path: str, project_id: int, scene_id: int) -> str:
+    # Parámetros del mux video+audio; forman parte de la clave de la caché de renders
+    # (subir 'version' si cambia el comando de FFmpeg para invalidar renders previos)
+    MUX_PARAMS = {
+        'version': 1,
+        'video_codec': 'copy',
+        'audio_codec': 'aac',
+        'audio_bitrate': '192k',
+        'audio_sample_rate': '44100',
+        'fit': 'video_duration',
+    }
+    
+    def _combine_video_and_audio(self, video_gcs_path: str, audio_gcs_path: str, project_id: int, scene_id: int, scene=None) -> str:
         """
         Combina un video con un audio usando FFmpeg
         
+        El resultado se guarda en una caché direccionada por contenido (huellas
+        de los blobs de entrada + MUX_PARAMS): si la misma pareja ya se combinó,
+        se devuelve el render existente tras una consulta de metadata en GCS.
+        
+        Las duraciones se leen de MediaProbe (guardadas en la escena o en la
+        caché); solo se lanza ffprobe sobre los blobs que no se habían analizado.
+        El resultado se analiza una vez y queda en la caché de MediaProbe.
+        
         Args:
             video_gcs_path: Path GCS del video
             audio_gcs_path: Path GCS del audio
             project_id: ID del proyecto
             scene_id: ID de la escena
+            scene: Scene (opcional) donde guardar el análisis de video y audio
             
         Returns:
             GCS path del video combinado
@@ -4989,9 +5172,27 @@ This is a preview thumbnail for a video, make it visually engaging and represent
         import tempfile
         import subprocess
         import os
+        import shutil
         from .storage.gcs import gcs_storage
+        from core.services.render_cache import RenderCache
         from datetime import datetime
         
+        render_cache = RenderCache('scene_mux')
+        fingerprints = RenderCache.source_fingerprints([video_gcs_path, audio_gcs_path])
+        cache_key = render_cache.make_key(fingerprints, self.MUX_PARAMS) if fingerprints else None
+        
+        if cache_key:
+            cached_path = render_cache.lookup(cache_key)
+            if cached_path:
+                logger.info(f"✓ Mux video+audio reutilizado de la caché para escena {scene_id}: {cached_path}")
+                return cached_path
+            
+            # Un intento anterior generó el mux pero no llegó a subirlo
+            staged_path = render_cache.local_path(cache_key)
+            if os.path.exists(staged_path):
+                logger.info(f"✓ Mux video+audio ya generado en disco para escena {scene_id}, solo se sube")
+                return render_cache.store(cache_key, staged_path)
+        
         temp_dir = None
         video_path = None
         audio_path = None
@@ -5002,73 +5203,27 @@ This is a preview thumbnail for a video, make it visually engaging and represent
             temp_dir = tempfile.mkdtemp(prefix='atenea_combine_audio_')
             
             # Descargar video
-            video_blob = gcs_storage.bucket.blob(video_gcs_path.replace(f"gs://{settings.GCS_BUCKET_NAME}/", ""))
             video_path = os.path.join(temp_dir, 'video.mp4')
-            video_blob.download_to_filename(video_path)
+            gcs_storage.download_to_file(video_gcs_path, video_path)
             
             # Descargar audio
-            audio_blob = gcs_storage.bucket.blob(audio_gcs_path.replace(f"gs://{settings.GCS_BUCKET_NAME}/", ""))
             audio_path = os.path.join(temp_dir, 'audio.mp3')
-            audio_blob.download_to_filename(audio_path)
+            gcs_storage.download_to_file(audio_gcs_path, audio_path)
             
             # Path de salida
             output_path = os.path.join(temp_dir, 'combined.mp4')
             
-            # Detectar si el video tiene audio original
-            probe_cmd = [
-                'ffprobe',
-                '-v', 'error',
-                '-select_streams', 'a:0',
-                '-show_entries', 'stream=codec_type',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                video_path
-            ]
-            try:
-                probe_result = subprocess.run(probe_cmd, capture_output=True, text=True)
-                has_original_audio = probe_result.stdout.strip() == 'audio'
-                logger.info(f"Video original tiene audio: {has_original_audio}")
-            except FileNotFoundError:
-                logger.warning("ffprobe no está instalado. Asumiendo que el video no tiene audio.")
-                has_original_audio = False
-            except Exception as e:
-                logger.warning(f"Error al verificar audio del video: {e}")
-                has_original_audio = False
-            
-            # Obtener duraciones para decidir la estrategia
-            video_duration_cmd = [
-                'ffprobe',
-                '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                video_path
-            ]
-            audio_duration_cmd = [
-                'ffprobe',
-                '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                audio_path
-            ]
-            
-            try:
-                video_duration_result = subprocess.run(video_duration_cmd, capture_output=True, text=True)
-                video_duration = float(video_duration_result.stdout.strip()) if video_duration_result.returncode == 0 else None
-            except FileNotFoundError:
-                logger.warning("ffprobe no está instalado. No se puede obtener duración del video.")
-                video_duration = None
-            except Exception as e:
-                logger.warning(f"Error al obtener duración del video: {e}")
-                video_duration = None
+            # Análisis de entrada: guardado en la escena/caché o un ffprobe por archivo
+            if scene is not None:
+                video_info = MediaProbe.for_asset(scene, 'video', local_path=video_path)
+                audio_info = MediaProbe.for_asset(scene, 'audio', local_path=audio_path)
+            else:
+                video_info = MediaProbe.for_blob(video_gcs_path, local_path=video_path)
+                audio_info = MediaProbe.for_blob(audio_gcs_path, local_path=audio_path)
+            logger.info(f"Video original tiene audio: {video_info.has_audio}")
             
-            try:
-                audio_duration_result = subprocess.run(audio_duration_cmd, capture_output=True, text=True)
-                audio_duration = float(audio_duration_result.stdout.strip()) if audio_duration_result.returncode == 0 else None
-            except FileNotFoundError:
-                logger.warning("ffprobe no está instalado. No se puede obtener duración del audio.")
-                audio_duration = None
-            except Exception as e:
-                logger.warning(f"Error al obtener duración del audio: {e}")
-                audio_duration = None
+            video_duration = video_info.duration or None
+            audio_duration = audio_info.duration or None
             
             logger.info(f"Duración video: {video_duration}s, Duración audio: {audio_duration}s")
             
@@ -5080,10 +5235,10 @@ This is a preview thumbnail for a video, make it visually engaging and represent
                 '-i', audio_path,      # Input 1: audio de ElevenLabs
                 '-map', '0:v:0',       # Tomar SOLO el stream de video del input 0
                 '-map', '1:a:0',       # Tomar el stream de audio del input 1 (ElevenLabs)
-                '-c:v', 'copy',        # Copiar video sin re-encodear (mantener calidad)
-                '-c:a', 'aac',         # Encodear audio a AAC
-                '-b:a', '192k',        # Bitrate de audio 192kbps
-                '-ar', '44100',        # Sample rate 44.1kHz
+                '-c:v', self.MUX_PARAMS['video_codec'],        # Copiar video sin re-encodear (mantener calidad)
+                '-c:a', self.MUX_PARAMS['audio_codec'],        # Encodear audio a AAC
+                '-b:a', self.MUX_PARAMS['audio_bitrate'],      # Bitrate de audio 192kbps
+                '-ar', self.MUX_PARAMS['audio_sample_rate'],   # Sample rate 44.1kHz
             ]
             
             # Solo usar -shortest si el audio es más largo que el video
@@ -5105,18 +5260,31 @@ This is a preview thumbnail for a video, make it visually engaging and represent
             logger.info(f"Ejecutando FFmpeg para REEMPLAZAR audio del video con ElevenLabs TTS")
             logger.info(f"Comando: {' '.join(ffmpeg_cmd)}")
             
-            result = subprocess.run(
-                ffmpeg_cmd,
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
+            with GenerationTelemetry.span('ffmpeg', provider='ffmpeg'):
+                result = subprocess.run(
+                    ffmpeg_cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=300
+                )
             
             if result.returncode != 0:
                 logger.error(f"FFmpeg stderr: {result.stderr}")
                 raise ServiceException(f"FFmpeg falló: {result.stderr[:500]}")
             
-            # Subir a GCS
+            output_info = MediaProbe.probe_file(output_path)
+            
+            if cache_key:
+                # Mover a la ruta estable antes de subir: si la subida falla,
+                # el reintento solo tendrá que subir el archivo
+                staged_path = render_cache.local_path(cache_key)
+                shutil.move(output_path, staged_path)
+                with GenerationTelemetry.span('upload'):
+                    gcs_full_path = render_cache.store(cache_key, staged_path)
+                MediaProbe.remember(gcs_full_path, output_info)
+                return gcs_full_path
+            
+            # Sin huellas de las entradas: subir a la ruta de la escena
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             if project_id:
                 gcs_destination = f"projects/{project_id}/scenes/{scene_id}/final_{timestamp}.mp4"
@@ -5124,19 +5292,19 @@ This is a preview thumbnail for a video, make it visually engaging and represent
                 # Si no hay proyecto, usar una ruta alternativa
                 gcs_destination = f"standalone/scenes/{scene_id}/final_{timestamp}.mp4"
             
-            with open(output_path, 'rb') as f:
-                gcs_full_path = gcs_storage.upload_from_bytes(
-                    file_content=f.read(),
+            with GenerationTelemetry.span('upload'):
+                gcs_full_path = gcs_storage.upload_file(
+                    output_path,
                     destination_path=gcs_destination,
                     content_type='video/mp4'
                 )
+            MediaProbe.remember(gcs_full_path, output_info)
             
             return gcs_full_path
             
         finally:
             # Limpiar archivos temporales
             if temp_dir and os.path.exists(temp_dir):
-                import shutil
                 shutil.rmtree(temp_dir)
     
     def get_scene_with_signed_urls(self, scene) -> Dict:
@@ -5149,55 +5317,55 @@ This is a preview thumbnail for a video, make it visually engaging and represent
         Returns:
             Dict con scene y URLs firmadas
         """
-        result = {
-            'scene': scene,
-            'preview_image_url': None,
-            'video_url': None,
-            'audio_url': None,
-            'final_video_url': None
-        }
-        
-        # URL firmada del preview image
-        if scene.preview_image_status == 'completed' and scene.preview_image_gcs_path:
-            try:
-                result['preview_image_url'] = gcs_storage.get_signed_url(
-                    scene.preview_image_gcs_path,
-                    expiration=3600
-                )
-            except Exception as e:
-                logger.error(f"Error al generar URL firmada de preview: {e}")
-        
-        # URL firmada del video original
-        if scene.video_status == 'completed' and scene.video_gcs_path:
-            try:
-                result['video_url'] = gcs_storage.get_signed_url(
-                    scene.video_gcs_path,
-                    expiration=3600
-                )
-            except Exception as e:
-                logger.error(f"Error al generar URL firmada de video: {e}")
+        return self.get_scenes_with_signed_urls([scene])[0]
+    
+    def get_scenes_with_signed_urls(self, scenes) -> List[Dict]:
+        """
+        Obtiene varias escenas con sus URLs firmadas, firmando todos los assets
+        en una sola llamada
         
-        # URL firmada del audio
-        if scene.audio_status == 'completed' and scene.audio_gcs_path:
-            try:
-                result['audio_url'] = gcs_storage.get_signed_url(
-                    scene.audio_gcs_path,
-                    expiration=3600
-                )
-            except Exception as e:
-                logger.error(f"Error al generar URL firmada de audio: {e}")
+        Args:
+            scenes: Escenas a procesar
+            
+        Returns:
+            Lista de dicts con scene y URLs firmadas, en el mismo orden
+        """
+        results = []
+        pending = []
+        for scene in scenes:
+            result = {
+                'scene': scene,
+                'preview_image_url': None,
+                'video_url': None,
+                'audio_url': None,
+                'final_video_url': None
+            }
+            # (campo de resultado, status, gcs_path) de cada asset de la escena
+            assets = [
+                ('preview_image_url', scene.preview_image_status, scene.preview_image_gcs_path),
+                ('video_url', scene.video_status, scene.video_gcs_path),
+                ('audio_url', scene.audio_status, scene.audio_gcs_path),
+                ('final_video_url', scene.final_video_status, scene.final_video_gcs_path),
+            ]
+            pending.extend(
+                (result, key, gcs_path) for key, status, gcs_path in assets if status == 'completed' and gcs_path
+            )
+            results.append(result)
         
-        # URL firmada del video final (video+audio combinados)
-        if scene.final_video_status == 'completed' and scene.final_video_gcs_path:
+        if pending:
             try:
-                result['final_video_url'] = gcs_storage.get_signed_url(
-                    scene.final_video_gcs_path,
+                signed_urls = gcs_storage.get_signed_urls(
+                    [gcs_path for _, _, gcs_path in pending],
                     expiration=3600
                 )
             except Exception as e:
-                logger.error(f"Error al generar URL firmada de video final: {e}")
+                logger.error(f"Error al generar URLs firmadas de {len(results)} escenas: {e}")
+                signed_urls = {}
+            
+            for result, key, gcs_path in pending:
+                result[key] = signed_urls.get(gcs_path)
         
-        return result
+        return results
 
 
 # ====================
@@ -5207,14 +5375,28 @@ This is a preview thumbnail for a video, make it visually engaging and represent
 class VideoCompositionService:
     """Servicio para combinar múltiples videos usando FFmpeg"""
     
+    # Campos de MediaInfo que deben coincidir en todas las escenas para concatenar sin re-encodear
+    STREAM_COPY_KEYS = (
+        'video_codec', 'width', 'height', 'pix_fmt', 'time_base', 'frame_rate',
+        'audio_codec', 'sample_rate', 'channels',
+    )
+    
     @staticmethod
-    def combine_scene_videos(scenes, output_filename: str) -> str:
+    def combine_scene_videos(scenes, output_filename: str, progress_callback=None) -> str:
         """
         Combina videos de múltiples escenas usando FFmpeg
         
+        Las escenas se descargan en paralelo. Su análisis (MediaInfo) se lee de
+        la escena o de la caché de MediaProbe; solo se lanza ffprobe sobre los
+        archivos no analizados antes. Si todas comparten códec, resolución,
+        timebase y formato de audio se concatenan con el demuxer concat sin
+        re-encodear (stream copy); si no, o si el stream copy falla, se
+        re-encodea con el filtro concat.
+        
         Args:
             scenes: QuerySet o lista de Scene objects ordenados
             output_filename: Nombre base para el archivo de salida
+            progress_callback: Función opcional (percent: int, stage: str) para reportar progreso
             
         Returns:
             GCS path del video combinado
@@ -5225,11 +5407,20 @@ class VideoCompositionService:
         import tempfile
         import os
         import subprocess
+        from concurrent.futures import ThreadPoolExecutor
         from django.conf import settings
         
-        if not scenes or len(scenes) == 0:
+        scenes = list(scenes)
+        if not scenes:
             raise ValidationException("No hay escenas para combinar")
         
+        def report(percent, stage):
+            if progress_callback:
+                try:
+                    progress_callback(int(percent), stage)
+                except Exception as e:
+                    logger.debug(f"Error reportando progreso de composición: {e}")
+        
         # Verificar que todos tengan video (original o final combinado)
         for scene in scenes:
             has_original_video = scene.video_status == 'completed' and scene.video_gcs_path
@@ -5239,7 +5430,6 @@ class VideoCompositionService:
                 raise ValidationException(f"La escena {scene.scene_id} no tiene video completado")
         
         temp_dir = None
-        concat_file_path = None
         output_path = None
         
         try:
@@ -5247,8 +5437,9 @@ class VideoCompositionService:
             temp_dir = tempfile.mkdtemp(prefix='atenea_combine_')
             logger.info(f"Directorio temporal creado: {temp_dir}")
             
-            # Descargar todos los videos de GCS al directorio temporal
-            video_paths = []
+            # Resolver qué archivo usar de cada escena (orden explícito en el nombre)
+            downloads = []
+            assets = []
             logger.info(f"=== ORDEN DE ESCENAS PARA CONCATENACIÓN ===")
             
             for idx, scene in enumerate(scenes):
@@ -5257,154 +5448,95 @@ class VideoCompositionService:
                 # PRIORIZAR el video final (con audio ElevenLabs) si existe, sino usar el original
                 if scene.final_video_status == 'completed' and scene.final_video_gcs_path:
                     video_gcs_path = scene.final_video_gcs_path
+                    assets.append('final_video')
                     logger.info(f"    → Usando video FINAL (con audio ElevenLabs TTS)")
                 else:
                     video_gcs_path = scene.video_gcs_path
+                    assets.append('video')
                     if scene.needs_audio():
                         logger.warning(f"    ⚠️ Video sin audio ElevenLabs (final_video_status={scene.final_video_status})")
                     else:
                         logger.info(f"    → Usando video original (servicio={scene.ai_service})")
                 
-                # Extraer blob name del GCS path
-                blob_name = video_gcs_path.replace(f"gs://{settings.GCS_BUCKET_NAME}/", "")
-                blob = gcs_storage.bucket.blob(blob_name)
-                
-                # Descargar a archivo temporal con orden explícito
                 temp_video_path = os.path.join(temp_dir, f"scene_{scene.order:03d}_{scene.scene_id.replace(' ', '_')}.mp4")
-                blob.download_to_filename(temp_video_path)
-                video_paths.append(temp_video_path)
-                
-                logger.info(f"    ✓ Descargado: {temp_video_path} ({os.path.getsize(temp_video_path)} bytes)")
+                downloads.append((video_gcs_path, temp_video_path))
+            
+            # Análisis ya conocidos: si todos están, validar resoluciones antes de descargar
+            known_infos = [MediaProbe.lookup(scene, asset) for scene, asset in zip(scenes, assets)]
+            if all(known_infos):
+                VideoCompositionService._check_same_resolution(known_infos)
+            
+            # Descargar todos los videos de GCS en paralelo
+            report(5, 'downloading')
+            video_paths = [local_path for _, local_path in downloads]
+            max_workers = min(len(downloads), getattr(settings, 'COMPOSITION_DOWNLOAD_WORKERS', 4))
+            completed_downloads = 0
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compose-download') as executor:
+                futures = [executor.submit(gcs_storage.download_to_file, gcs_path, local_path) for gcs_path, local_path in downloads]
+                for future in futures:
+                    future.result()
+                    completed_downloads += 1
+                    report(5 + 35 * completed_downloads / len(futures), 'downloading')
             
             logger.info(f"=== {len(video_paths)} VIDEOS DESCARGADOS ===")
             
-            # Verificar resoluciones y audio de cada video
-            logger.info("=== VERIFICANDO RESOLUCIONES Y AUDIO ===")
-            videos_with_audio = []
-            video_resolutions = []
-            
-            for video_path in video_paths:
-                has_audio = VideoCompositionService._check_audio_stream(video_path)
-                videos_with_audio.append(has_audio)
-                
-                # Obtener resolución
-                resolution = VideoCompositionService._get_video_resolution(video_path)
-                video_resolutions.append(resolution)
-                
-                logger.info(f"  {os.path.basename(video_path)}: {resolution[0]}x{resolution[1]} | {'✓ Audio' if has_audio else '⚠️ Sin audio'}")
-            
-            # Verificar si todas las resoluciones son iguales
-            all_same_resolution = all(r == video_resolutions[0] for r in video_resolutions)
-            
-            if not all_same_resolution:
-                # Listar todas las resoluciones diferentes
-                unique_resolutions = list(set(video_resolutions))
-                error_msg = (
-                    f"❌ ERROR: Las escenas tienen resoluciones diferentes y no se pueden combinar.\n"
-                    f"Resoluciones detectadas: {', '.join([f'{w}x{h}' for w, h in unique_resolutions])}\n\n"
-                    f"SOLUCIÓN: Debes regenerar todas las escenas con la MISMA orientación (16:9 o 9:16).\n"
-                    f"Ve al Paso 2 y asegúrate de que todas las escenas usen el mismo formato de video."
+            # Análisis de cada video: guardado, o un solo ffprobe sobre la descarga
+            logger.info("=== ANALIZANDO VIDEOS ===")
+            probes = []
+            for scene, asset, known, video_path in zip(scenes, assets, known_infos, video_paths):
+                probe = known or MediaProbe.for_asset(scene, asset, local_path=video_path)
+                probes.append(probe)
+                logger.info(
+                    f"  {os.path.basename(video_path)}: {probe.resolution} "
+                    f"{probe.video_codec} | {'✓ Audio' if probe.has_audio else '⚠️ Sin audio'} | {probe.duration:.2f}s"
+                    f"{'' if known else ' (ffprobe)'}"
                 )
-                logger.error(error_msg)
-                raise ValidationException(error_msg)
+            report(45, 'probing')
             
-            # Si algún video no tiene audio, usar estrategia especial
-            all_have_audio = all(videos_with_audio)
-            if not all_have_audio:
-                logger.warning("⚠️ Algunos videos no tienen audio - ajustando estrategia de concatenación")
+            # Verificar si todas las resoluciones son iguales
+            VideoCompositionService._check_same_resolution(probes)
             
             # Path de salida temporal
             output_path = os.path.join(temp_dir, 'combined_output.mp4')
-            
-            # Estrategia: Usar filtro concat de FFmpeg en lugar de demuxer concat
-            # Esto es más robusto para videos de diferentes fuentes y evita desfases de audio
-            
-            # Construir comando FFmpeg con inputs individuales
-            ffmpeg_command = ['ffmpeg']
-            
-            # Añadir todos los videos como inputs
-            for video_path in video_paths:
-                ffmpeg_command.extend(['-i', video_path])
-            
-            # Construir filter_complex para concatenación
-            # Si todos tienen audio: [0:v][0:a][1:v][1:a]...[n:v][n:a]concat=n=N:v=1:a=1[outv][outa]
-            # Si algunos no tienen audio: añadir anullsrc (audio silencioso) para los que no tienen
-            
-            if all_have_audio:
-                # Todos tienen audio - estrategia simple
-                filter_parts = []
-                for i in range(len(video_paths)):
-                    filter_parts.append(f"[{i}:v][{i}:a]")
-                
-                filter_complex = f"{''.join(filter_parts)}concat=n={len(video_paths)}:v=1:a=1[outv][outa]"
-            else:
-                # Algunos no tienen audio - añadir audio silencioso donde falte
-                # Necesitamos obtener la duración de cada video sin audio
-                filter_lines = []
-                concat_inputs = []
+            total_duration = sum(p.duration for p in probes)
+            
+            def on_ffmpeg_progress(fraction):
+                report(50 + 40 * fraction, 'encoding')
+            
+            # Fast path: todas las escenas son homogéneas → concat demuxer + stream copy
+            combined = False
+            if VideoCompositionService._can_stream_copy(probes):
+                logger.info("✓ Escenas homogéneas: concatenando sin re-encodear (stream copy)")
+                concat_list_path = os.path.join(temp_dir, 'concat.txt')
+                with open(concat_list_path, 'w') as f:
+                    for video_path in video_paths:
+                        escaped = video_path.replace("'", "'\\''")
+                        f.write(f"file '{escaped}'\n")
                 
-                for i, has_audio in enumerate(videos_with_audio):
-                    if has_audio:
-                        concat_inputs.append(f"[{i}:v][{i}:a]")
-                    else:
-                        # Obtener duración del video sin audio
-                        duration = VideoCompositionService.get_video_duration(video_paths[i])
-                        
-                        # Si no se pudo obtener duración, usar valor por defecto
-                        if duration <= 0:
-                            duration = 8.0  # 8 segundos por defecto
-                        
-                        # Generar audio silencioso con la duración del video
-                        # anullsrc no acepta inputs, genera audio sintético directamente
-                        audio_label = f"a{i}"
-                        filter_lines.append(f"anullsrc=channel_layout=stereo:sample_rate=48000:duration={duration}[{audio_label}]")
-                        concat_inputs.append(f"[{i}:v][{audio_label}]")
-                
-                if filter_lines:
-                    filter_complex = ';'.join(filter_lines) + ';' + ''.join(concat_inputs) + f"concat=n={len(video_paths)}:v=1:a=1[outv][outa]"
+                returncode, stderr = VideoCompositionService._run_ffmpeg(
+                    [
+                        'ffmpeg',
+                        '-f', 'concat',
+                        '-safe', '0',
+                        '-i', concat_list_path,
+                        '-c', 'copy',
+                        '-movflags', '+faststart',
+                        '-y',
+                        output_path
+                    ],
+                    timeout=300,
+                    total_duration=total_duration,
+                    on_progress=on_ffmpeg_progress
+                )
+                if returncode == 0 and os.path.exists(output_path):
+                    combined = True
                 else:
-                    filter_complex = ''.join(concat_inputs) + f"concat=n={len(video_paths)}:v=1:a=1[outv][outa]"
-            
-            ffmpeg_command.extend([
-                '-filter_complex', filter_complex,
-                '-map', '[outv]',
-                '-map', '[outa]',
-                '-c:v', 'libx264',  # Re-encodear video con H.264
-                '-preset', 'medium',  # Balance entre velocidad y calidad
-                '-crf', '23',  # Calidad constante (18-28, menor=mejor)
-                '-c:a', 'aac',  # Re-encodear audio con AAC
-                '-b:a', '192k',  # Bitrate de audio
-                '-ar', '48000',  # Sample rate consistente
-                '-movflags', '+faststart',  # Optimizar para streaming
-                '-y',  # Sobrescribir si existe
-                output_path
-            ])
-            
-            logger.info(f"Ejecutando FFmpeg con filter_complex concat:")
-            logger.info(f"  Número de videos: {len(video_paths)}")
-            logger.info(f"  Filter: {filter_complex}")
-            logger.info(f"  Comando: {' '.join(ffmpeg_command[:10])}... (truncado)")
-            
-            result = subprocess.run(
-                ffmpeg_command,
-                capture_output=True,
-                text=True,
-                timeout=600  # 10 minutos máximo (re-encoding toma más tiempo)
-            )
+                    logger.warning(f"Stream copy falló (código {returncode}), re-encodeando: {stderr[-500:]}")
             
-            if result.returncode != 0:
-                error_msg = f"FFmpeg falló con código {result.returncode}\n"
-                error_msg += f"=== STDOUT ===\n{result.stdout}\n"
-                error_msg += f"=== STDERR ===\n{result.stderr}"
-                logger.error(error_msg)
-                
-                # Detectar problemas específicos de audio
-                stderr_lower = result.stderr.lower()
-                if 'audio' in stderr_lower or 'stream' in stderr_lower:
-                    logger.error("⚠️ Posible problema de audio detectado")
-                    logger.error("Verificar que todos los videos tienen stream de audio")
-                
-                raise ServiceException(f"Error al combinar videos con FFmpeg: {result.stderr[:500]}")
+            if not combined:
+                VideoCompositionService._combine_with_reencode(
+                    video_paths, probes, output_path, total_duration, on_ffmpeg_progress
+                )
             
             logger.info("✓ Videos combinados exitosamente con FFmpeg")
             
@@ -5414,6 +5546,8 @@ class VideoCompositionService:
             
             file_size = os.path.getsize(output_path)
             logger.info(f"Video combinado: {file_size} bytes")
+            output_info = MediaProbe.probe_file(output_path)
+            report(92, 'uploading')
             
             # Subir video combinado a GCS
             project_id = None
@@ -5427,19 +5561,22 @@ class VideoCompositionService:
             else:
                 gcs_destination = f"standalone/combined_videos/{output_filename}"
             
-            with open(output_path, 'rb') as video_file:
-                gcs_full_path = gcs_storage.upload_from_bytes(
-                    file_content=video_file.read(),
-                    destination_path=gcs_destination,
-                    content_type='video/mp4'
-                )
+            gcs_full_path = gcs_storage.upload_file(
+                output_path,
+                destination_path=gcs_destination,
+                content_type='video/mp4'
+            )
             
+            MediaProbe.remember(gcs_full_path, output_info)
             logger.info(f"✓ Video combinado subido a GCS: {gcs_full_path}")
+            report(100, 'completed')
             
             return gcs_full_path
             
         except subprocess.TimeoutExpired:
             raise ServiceException("FFmpeg timeout: el proceso tardó más de 10 minutos")
+        except ValidationException:
+            raise
         except Exception as e:
             logger.error(f"Error al combinar videos: {e}")
             raise ServiceException(f"Error al combinar videos: {str(e)}")
@@ -5454,131 +5591,169 @@ class VideoCompositionService:
                     logger.warning(f"No se pudo eliminar directorio temporal {temp_dir}: {e}")
     
     @staticmethod
-    def get_video_duration(video_path: str) -> float:
+    def _combine_with_reencode(video_paths, probes, output_path: str, total_duration: float, on_progress=None):
         """
-        Obtiene la duración de un video usando FFprobe
+        Concatena re-encodeando con el filtro concat de FFmpeg
         
-        Args:
-            video_path: Path al archivo de video
-            
-        Returns:
-            Duración en segundos
+        Más robusto para videos de diferentes fuentes y evita desfases de audio.
+        Añade audio silencioso (anullsrc) a los videos que no tienen audio.
         """
-        import subprocess
+        # Construir comando FFmpeg con inputs individuales
+        ffmpeg_command = ['ffmpeg']
+        for video_path in video_paths:
+            ffmpeg_command.extend(['-i', video_path])
+        
+        # Si todos tienen audio: [0:v][0:a][1:v][1:a]...[n:v][n:a]concat=n=N:v=1:a=1[outv][outa]
+        # Si algunos no tienen audio: añadir anullsrc (audio silencioso) para los que no tienen
+        filter_lines = []
+        concat_inputs = []
+        for i, probe in enumerate(probes):
+            if probe.has_audio:
+                concat_inputs.append(f"[{i}:v][{i}:a]")
+            else:
+                # Si no se pudo obtener duración, usar valor por defecto
+                duration = probe.duration if probe.duration > 0 else 8.0
+                audio_label = f"a{i}"
+                filter_lines.append(f"anullsrc=channel_layout=stereo:sample_rate=48000:duration={duration}[{audio_label}]")
+                concat_inputs.append(f"[{i}:v][{audio_label}]")
+        
+        if filter_lines:
+            logger.warning("⚠️ Algunos videos no tienen audio - añadiendo audio silencioso")
+            filter_complex = ';'.join(filter_lines) + ';' + ''.join(concat_inputs) + f"concat=n={len(video_paths)}:v=1:a=1[outv][outa]"
+        else:
+            filter_complex = ''.join(concat_inputs) + f"concat=n={len(video_paths)}:v=1:a=1[outv][outa]"
+        
+        ffmpeg_command.extend([
+            '-filter_complex', filter_complex,
+            '-map', '[outv]',
+            '-map', '[outa]',
+            '-c:v', 'libx264',  # Re-encodear video con H.264
+            '-preset', 'medium',  # Balance entre velocidad y calidad
+            '-crf', '23',  # Calidad constante (18-28, menor=mejor)
+            '-c:a', 'aac',  # Re-encodear audio con AAC
+            '-b:a', '192k',  # Bitrate de audio
+            '-ar', '48000',  # Sample rate consistente
+            '-movflags', '+faststart',  # Optimizar para streaming
+            '-y',  # Sobrescribir si existe
+            output_path
+        ])
+        
+        logger.info(f"Ejecutando FFmpeg con filter_complex concat:")
+        logger.info(f"  Número de videos: {len(video_paths)}")
+        logger.info(f"  Filter: {filter_complex}")
+        
+        returncode, stderr = VideoCompositionService._run_ffmpeg(
+            ffmpeg_command,
+            timeout=600,  # 10 minutos máximo (re-encoding toma más tiempo)
+            total_duration=total_duration,
+            on_progress=on_progress
+        )
         
-        try:
-            result = subprocess.run(
-                [
-                    'ffprobe',
-                    '-v', 'error',
-                    '-show_entries', 'format=duration',
-                    '-of', 'default=noprint_wrappers=1:nokey=1',
-                    video_path
-                ],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+        if returncode != 0:
+            logger.error(f"FFmpeg falló con código {returncode}\n=== STDERR ===\n{stderr}")
             
-            if result.returncode == 0:
-                return float(result.stdout.strip())
-            else:
-                logger.warning(f"No se pudo obtener duración del video: {result.stderr}")
-                return 0.0
-                
-        except FileNotFoundError:
-            logger.warning("ffprobe no está instalado. No se puede obtener la duración del video.")
-            return 0.0
-        except Exception as e:
-            logger.warning(f"Error al obtener duración: {e}")
-            return 0.0
+            # Detectar problemas específicos de audio
+            stderr_lower = stderr.lower()
+            if 'audio' in stderr_lower or 'stream' in stderr_lower:
+                logger.error("⚠️ Posible problema de audio detectado")
+                logger.error("Verificar que todos los videos tienen stream de audio")
+            
+            raise ServiceException(f"Error al combinar videos con FFmpeg: {stderr[:500]}")
     
     @staticmethod
-    def _check_audio_stream(video_path: str) -> bool:
+    def _run_ffmpeg(command, timeout: int, total_duration: float = 0.0, on_progress=None):
         """
-        Verifica si un video tiene stream de audio usando FFprobe
+        Ejecuta FFmpeg reportando el progreso a partir de -progress
         
         Args:
-            video_path: Path al archivo de video
-            
+            command: Comando completo (empezando por 'ffmpeg')
+            timeout: Tiempo máximo en segundos
+            total_duration: Duración total esperada de la salida (para calcular el porcentaje)
+            on_progress: Función opcional (fraction: float 0-1)
+        
         Returns:
-            True si tiene audio, False si no
+            Tupla (returncode, stderr)
+        
+        Raises:
+            subprocess.TimeoutExpired: Si se supera el timeout
         """
         import subprocess
+        import tempfile
+        import threading
         
-        try:
-            result = subprocess.run(
-                [
-                    'ffprobe',
-                    '-v', 'error',
-                    '-select_streams', 'a:0',
-                    '-show_entries', 'stream=codec_name',
-                    '-of', 'default=noprint_wrappers=1:nokey=1',
-                    video_path
-                ],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+        command = [command[0], '-progress', 'pipe:1', '-nostats'] + list(command[1:])
+        
+        # stderr a archivo para no bloquear el proceso si escribe mucho
+        with tempfile.TemporaryFile(mode='w+') as stderr_file:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
             
-            # Si hay output, significa que encontró un stream de audio
-            has_audio = result.returncode == 0 and result.stdout.strip() != ''
+            # El timeout no depende de que FFmpeg escriba progreso: si se cuelga sin
+            # escribir nada, el watchdog lo mata y la lectura de stdout termina (EOF)
+            timed_out = threading.Event()
             
-            if has_audio:
-                codec = result.stdout.strip()
-                logger.debug(f"  Audio codec: {codec}")
+            def _kill():
+                timed_out.set()
+                process.kill()
             
-            return has_audio
-                
-        except FileNotFoundError:
-            logger.warning("ffprobe no está instalado. Asumiendo que el video tiene audio.")
-            return True
-        except Exception as e:
-            logger.warning(f"Error al verificar audio stream: {e}")
-            # Por defecto, asumir que tiene audio si no se puede verificar
-            return True
+            watchdog = threading.Timer(timeout, _kill)
+            watchdog.daemon = True
+            watchdog.start()
+            try:
+                for line in process.stdout:
+                    key, _, value = line.strip().partition('=')
+                    # out_time_ms está en microsegundos pese al nombre
+                    if key == 'out_time_ms' and on_progress and total_duration > 0:
+                        try:
+                            on_progress(min(1.0, int(value) / 1_000_000 / total_duration))
+                        except ValueError:
+                            pass
+                returncode = process.wait()
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+            finally:
+                watchdog.cancel()
+            
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(command, timeout)
+            
+            stderr_file.seek(0)
+            return returncode, stderr_file.read()
     
     @staticmethod
-    def _get_video_resolution(video_path: str) -> tuple:
+    def _check_same_resolution(probes):
         """
-        Obtiene la resolución de un video usando FFprobe
+        Verifica que todas las escenas tengan la misma resolución
         
-        Args:
-            video_path: Path al archivo de video
-            
-        Returns:
-            Tupla (width, height)
+        Raises:
+            ValidationException: Si hay resoluciones distintas
         """
-        import subprocess
-        
-        try:
-            result = subprocess.run(
-                [
-                    'ffprobe',
-                    '-v', 'error',
-                    '-select_streams', 'v:0',
-                    '-show_entries', 'stream=width,height',
-                    '-of', 'csv=s=x:p=0',
-                    video_path
-                ],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0 and result.stdout.strip():
-                width, height = map(int, result.stdout.strip().split('x'))
-                return (width, height)
-            else:
-                logger.warning(f"No se pudo obtener resolución del video: {result.stderr}")
-                return (1280, 720)  # Default
-                
-        except FileNotFoundError:
-            logger.warning("ffprobe no está instalado. Usando resolución por defecto (1280x720).")
-            return (1280, 720)  # Default
-        except Exception as e:
-            logger.warning(f"Error al obtener resolución: {e}")
-            return (1280, 720)  # Default
+        video_resolutions = [(p.width, p.height) for p in probes]
+        if all(r == video_resolutions[0] for r in video_resolutions):
+            return
+        
+        # Listar todas las resoluciones diferentes
+        unique_resolutions = list(set(video_resolutions))
+        error_msg = (
+            f"❌ ERROR: Las escenas tienen resoluciones diferentes y no se pueden combinar.\n"
+            f"Resoluciones detectadas: {', '.join([f'{w}x{h}' for w, h in unique_resolutions])}\n\n"
+            f"SOLUCIÓN: Debes regenerar todas las escenas con la MISMA orientación (16:9 o 9:16).\n"
+            f"Ve al Paso 2 y asegúrate de que todas las escenas usen el mismo formato de video."
+        )
+        logger.error(error_msg)
+        raise ValidationException(error_msg)
+    
+    @staticmethod
+    def _can_stream_copy(probes) -> bool:
+        """True si todas las escenas tienen audio y los mismos parámetros de códec/timebase"""
+        if not probes or not all(p.has_audio and p.video_codec for p in probes):
+            return False
+        signature = tuple(getattr(probes[0], key) for key in VideoCompositionService.STREAM_COPY_KEYS)
+        return all(
+            tuple(getattr(p, key) for key in VideoCompositionService.STREAM_COPY_KEYS) == signature
+            for p in probes[1:]
+        )
 
 
 # ====================
@@ -5697,8 +5872,12 @@ class N8nService:
                     # Crear escenas usando SceneService
                     created_scenes = SceneService.create_scenes_from_n8n_data(script, scenes_data)
                     
-                    # Iniciar generación de preview images solo si está habilitado
-                    if script.generate_previews:
+                    # Pre-generación especulativa (previews de prioridad baja, validación de
+                    # voces/avatares y estimación TTS) en segundo plano
+                    from core.services.prefetch import SpeculativePrefetch
+                    if SpeculativePrefetch.schedule(script):
+                        logger.info(f"✓ Pre-generación especulativa programada para script {script.id}")
+                    elif script.generate_previews:
                         scene_service = SceneService()
                         for scene in created_scenes:
                             try:
@@ -1,44 +1,457 @@
-from rembg import remove, new_session
+"""
+Eliminación de fondo con BiRefNet (rembg) en un worker dedicado
+
+- Sesiones ONNX calientes: una por modelo y proceso, creadas la primera vez
+  (o al arrancar el worker con BG_REMOVAL_WARMUP) con hilos intra/inter-op
+  configurables, en lugar de cargar los pesos en cada tarea.
+- Modo adaptativo: la segmentación y el alpha matting se hacen sobre una copia
+  reducida (lado máximo BG_REMOVAL_MAX_SIDE) y el alfa resultante se escala a
+  la resolución original. El modo 'full' mantiene el matting a resolución
+  completa, con el tamaño base acotado.
+- Lotes: las peticiones se apuntan en una lista de Redis; la tarea que arranca
+  reclama hasta BG_REMOVAL_BATCH_SIZE trabajos pendientes y los procesa juntos
+  (descargas/subidas en paralelo e inferencia en lote si el modelo admite
+  batch dinámico). Las tareas cuyos trabajos ya procesó otro lote terminan
+  sin hacer nada.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+QUEUE_KEY = 'bg_removal:pending'
+CLAIM_PREFIX = 'bg_removal:claimed:'
+# Lote reclamado por cada tarea (por task id): si el worker muere, la tarea
+# se re-entrega (acks_late) y retoma el mismo lote en lugar de perderlo
+BATCH_PREFIX = 'bg_removal:batch:'
+QUEUE_TTL = 60 * 60
+
+# Normalización de entrada de BiRefNet (la misma que usa rembg)
+BIREFNET_MEAN = (0.485, 0.456, 0.406)
+BIREFNET_STD = (0.229, 0.224, 0.225)
+BIREFNET_SIZE = (1024, 1024)
+
+# Umbrales de alpha matting para BiRefNet
+MATTING_PARAMS = {
+    'foreground_threshold': 240,
+    'background_threshold': 10,
+    'erode_structure_size': 1,
+}
+
+_sessions: Dict[str, object] = {}
+_sessions_lock = threading.Lock()
+_redis = None
+
+
+def _reset_after_fork():
+    global _sessions_lock, _redis
+    _sessions.clear()
+    _sessions_lock = threading.Lock()
+    _redis = None
+
+
+# Cada proceso hijo del worker crea sus propias sesiones ONNX
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ----------------
+# SESIONES
+# ----------------
+
+def _create_session(model_name: str):
+    """Sesión de rembg sobre CPU con hilos intra/inter-op ajustados"""
+    import onnxruntime as ort
+    from rembg import new_session
+
+    os.environ['ONNXRUNTIME_EXECUTION_PROVIDERS'] = 'CPUExecutionProvider'
+    os.environ['ORT_CUDA_PATHS'] = ''  # Desactivar CUDA
+    os.environ['NUMBA_THREADING_LAYER'] = 'tbb'  # Numba thread-safe (alpha matting)
+
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = settings.BG_REMOVAL_INTRA_OP_THREADS
+    sess_opts.inter_op_num_threads = settings.BG_REMOVAL_INTER_OP_THREADS
+    providers = ['CPUExecutionProvider']
+
+    try:
+        from rembg.sessions import sessions_class
+        for session_class in sessions_class:
+            if session_class.name() == model_name:
+                return session_class(model_name, sess_opts, providers=providers)
+    except (ImportError, TypeError) as e:
+        logger.warning(f"No se pudieron fijar los hilos de ONNX para {model_name}: {e}")
+
+    return new_session(model_name, providers=providers)
+
+
+def get_session(model_name: Optional[str] = None):
+    """Sesión caliente del proceso para el modelo (se crea la primera vez)"""
+    model_name = model_name or settings.BG_REMOVAL_MODEL
+    session = _sessions.get(model_name)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(model_name)
+            if session is None:
+                logger.info(f"Cargando sesión de eliminación de fondo '{model_name}'...")
+                session = _create_session(model_name)
+                _sessions[model_name] = session
+    return session
+
+
+def warm_up():
+    """Carga la sesión por defecto (al arrancar el proceso del worker dedicado)"""
+    try:
+        get_session()
+    except Exception as e:
+        logger.error(f"No se pudo precargar el modelo de eliminación de fondo: {e}")
+
+
+# ----------------
+# INFERENCIA
+# ----------------
+
+def _supports_batch(session) -> bool:
+    """Si el modelo es BiRefNet y su entrada tiene dimensión de lote dinámica"""
+    try:
+        if not session.model_name.startswith('birefnet'):
+            return False
+        return not isinstance(session.inner_session.get_inputs()[0].shape[0], int)
+    except Exception:
+        return False
+
+
+def _predict_batch(session, images: List) -> List:
+    """Máscaras de BiRefNet para varias imágenes en una sola ejecución de ONNX"""
+    import numpy as np
+    from PIL import Image as PILImage
+
+    inputs = [session.normalize(image, BIREFNET_MEAN, BIREFNET_STD, BIREFNET_SIZE) for image in images]
+    input_name = next(iter(inputs[0]))
+    outputs = session.inner_session.run(
+        None, {input_name: np.concatenate([item[input_name] for item in inputs], axis=0)}
+    )
+
+    masks = []
+    for prediction, image in zip(outputs[0][:, 0, :, :], images):
+        prediction = 1 / (1 + np.exp(-prediction))
+        low, high = prediction.min(), prediction.max()
+        prediction = (prediction - low) / (high - low) if high > low else prediction
+        mask = PILImage.fromarray((prediction * 255).astype('uint8'), mode='L')
+        masks.append(mask.resize(image.size, PILImage.Resampling.LANCZOS))
+    return masks
+
+
+def predict_masks(images: List, session=None) -> List:
+    """Máscaras de segmentación de varias imágenes (en lote si el modelo lo admite)"""
+    session = session or get_session()
+    if len(images) > 1 and _supports_batch(session):
+        try:
+            return _predict_batch(session, images)
+        except Exception as e:
+            logger.warning(f"Inferencia en lote no disponible, se procesa imagen a imagen: {e}")
+    return [session.predict(image)[0] for image in images]
+
+
+def _cutout(image, mask):
+    """Recorte con alpha matting (si falla, el alfa es la máscara directamente)"""
+    from rembg.bg import alpha_matting_cutout
+
+    try:
+        return alpha_matting_cutout(image, mask, **MATTING_PARAMS)
+    except Exception as e:
+        logger.warning(f"Alpha matting falló, se usa la máscara sin refinar: {e}")
+        cutout = image.convert('RGBA')
+        cutout.putalpha(mask)
+        return cutout
+
+
+def remove_backgrounds(images_bytes: List[bytes], mode: Optional[str] = None) -> List[bytes]:
+    """
+    Elimina el fondo de varias imágenes
+
+    Args:
+        images_bytes: Imágenes originales
+        mode: 'adaptive' (segmentación sobre copia reducida) o 'full'
+
+    Returns:
+        PNGs con transparencia, en el mismo orden
+    """
+    from PIL import Image as PILImage, ImageOps
+
+    mode = mode or settings.BG_REMOVAL_MODE
+    session = get_session()
+
+    if mode == 'full':
+        from rembg import remove
+        return [
+            remove(
+                data,
+                session=session,
+                alpha_matting=True,
+                alpha_matting_foreground_threshold=MATTING_PARAMS['foreground_threshold'],
+                alpha_matting_background_threshold=MATTING_PARAMS['background_threshold'],
+                alpha_matting_erode_size=MATTING_PARAMS['erode_structure_size'],
+                alpha_matting_base_size=settings.BG_REMOVAL_MATTING_BASE_SIZE,
+                post_process_mask=False,
+            )
+            for data in images_bytes
+        ]
+
+    originals = [ImageOps.exif_transpose(PILImage.open(BytesIO(data))).convert('RGB') for data in images_bytes]
+    max_side = settings.BG_REMOVAL_MAX_SIDE
+    reduced = []
+    for original in originals:
+        scale = min(1.0, max_side / max(original.size))
+        if scale < 1.0:
+            size = (max(1, round(original.width * scale)), max(1, round(original.height * scale)))
+            reduced.append(original.resize(size, PILImage.Resampling.LANCZOS))
+        else:
+            reduced.append(original)
+
+    results = []
+    for original, small, mask in zip(originals, reduced, predict_masks(reduced, session)):
+        alpha = _cutout(small, mask).getchannel('A')
+        if alpha.size != original.size:
+            alpha = alpha.resize(original.size, PILImage.Resampling.BICUBIC)
+        output = original.convert('RGBA')
+        output.putalpha(alpha)
+        buffer = BytesIO()
+        output.save(buffer, format='PNG')
+        results.append(buffer.getvalue())
+    return results
 
-# Configuración ULTRA CALIDAD (BiRefNet):
-# Inicializamos la sesión fuera de la función para que el modelo 
-# se cargue solo una vez en memoria al iniciar la aplicación,
-# mejorando drásticamente el rendimiento en peticiones sucesivas.
-try:
-    # Nota: Asegúrate de tener instalado rembg[gpu] si tienes tarjeta gráfica
-    # para acelerar el proceso.
-    bg_session = new_session("birefnet-general")
-except Exception as e:
-    print(f"Error cargando modelo BiRefNet, asegúrate de tener rembg actualizado: {e}")
-    bg_session = None
 
 def process_remove_background(input_bytes: bytes) -> bytes:
     """
-    Toma los bytes de una imagen, elimina el fondo con configuración de alta fidelidad
-    y retorna los bytes de la nueva imagen en formato PNG.
+    Toma los bytes de una imagen, elimina el fondo y retorna los bytes de la
+    nueva imagen en formato PNG.
     """
-    if bg_session is None:
-        raise RuntimeError("El modelo de eliminación de fondo no se pudo cargar.")
-
-    # Configuración "RAW / LOSSLESS" (Máxima fidelidad):
-    output_bytes = remove(
-        input_bytes,
-        session=bg_session,
-        alpha_matting=True,
-        
-        # Umbrales EXTREMOS para BiRefNet
-        alpha_matting_foreground_threshold=250,
-        alpha_matting_background_threshold=5,
-        
-        # Erode size 0: Conserva el 100% de los píxeles originales del borde (pelos, humo).
-        alpha_matting_erode_size=0,
-        
-        # Resolución masiva para el refinado de bordes
-        alpha_matting_base_size=4096,
-        
-        # Sin post-proceso para evitar borrar detalles finos por error
-        post_process_mask=False
-    )
-    
-    return output_bytes
\ No newline at end of file
+    return remove_backgrounds([input_bytes])[0]
+
+
+# ----------------
+# COLA Y LOTES
+# ----------------
+
+def _client():
+    global _redis
+    if _redis is None:
+        import redis
+        _redis = redis.Redis.from_url(settings.SCHEDULER_REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+    return _redis
+
+
+def _job(image_uuid, new_image_uuid) -> str:
+    return json.dumps({'image_uuid': str(image_uuid), 'new_image_uuid': str(new_image_uuid) if new_image_uuid else None})
+
+
+class BackgroundRemovalService:
+    """Encola, agrupa y procesa trabajos de eliminación de fondo"""
+
+    @staticmethod
+    def enqueue(image_uuid, new_image_uuid):
+        """Apunta el trabajo en la cola de lotes y lanza la tarea"""
+        from core.tasks import remove_image_background_task
+
+        try:
+            client = _client()
+            client.rpush(QUEUE_KEY, _job(image_uuid, new_image_uuid))
+            client.expire(QUEUE_KEY, QUEUE_TTL)
+        except Exception as e:
+            # Sin Redis la tarea procesa solo su propio trabajo
+            logger.warning(f"No se pudo apuntar el trabajo de eliminación de fondo en la cola: {e}")
+        # Solo kwargs: self.retry reutiliza los args originales si se le pasan kwargs
+        return remove_image_background_task.apply_async(kwargs={
+            'image_uuid': str(image_uuid),
+            'new_image_uuid': str(new_image_uuid) if new_image_uuid else None,
+        })
+
+    @staticmethod
+    def claim_batch(image_uuid, new_image_uuid, owner: str = None) -> List[Dict]:
+        """
+        Reclama el trabajo propio y hasta BG_REMOVAL_BATCH_SIZE - 1 pendientes
+
+        Cada trabajo se marca como reclamado (SET NX) para que solo un lote lo
+        procese. El lote se guarda bajo el id de la tarea (owner): si la misma
+        tarea se re-entrega tras morir el worker, recupera el lote completo,
+        incluidos los trabajos de otras tareas que ya terminaron.
+
+        Returns:
+            Trabajos a procesar; vacío si otro lote ya se llevó el propio
+        """
+        own = _job(image_uuid, new_image_uuid)
+        try:
+            client = _client()
+            if owner:
+                saved = client.get(f'{BATCH_PREFIX}{owner}')
+                if saved:
+                    return json.loads(saved)
+            if not client.set(f'{CLAIM_PREFIX}{own}', 1, nx=True, ex=QUEUE_TTL):
+                return []
+            client.lrem(QUEUE_KEY, 1, own)
+            claimed = [json.loads(own)]
+
+            extra = settings.BG_REMOVAL_BATCH_SIZE - 1
+            if extra > 0:
+                with client.pipeline() as pipe:
+                    pipe.lrange(QUEUE_KEY, 0, extra - 1)
+                    pipe.ltrim(QUEUE_KEY, extra, -1)
+                    others, _ = pipe.execute()
+                for item in others:
+                    item = item.decode() if isinstance(item, bytes) else item
+                    if client.set(f'{CLAIM_PREFIX}{item}', 1, nx=True, ex=QUEUE_TTL):
+                        claimed.append(json.loads(item))
+            if owner:
+                client.set(f'{BATCH_PREFIX}{owner}', json.dumps(claimed), ex=QUEUE_TTL)
+            return claimed
+        except Exception as e:
+            logger.warning(f"No se pudo reclamar lote de eliminación de fondo: {e}")
+            return [json.loads(own)]
+
+    @classmethod
+    def process_batch(cls, jobs: List[Dict]) -> List[Tuple[Dict, Exception]]:
+        """
+        Procesa un lote de trabajos
+
+        Returns:
+            Lista de (trabajo, excepción) de los que fallaron
+        """
+        from core.models import Image
+        from core.services import ImageService
+
+        image_service = ImageService()
+        workers = min(len(jobs), 4)
+        failures = []
+
+        def download(job):
+            image = Image.objects.select_related('project', 'created_by').get(uuid=job['image_uuid'])
+            return image, image_service._download_image_from_gcs(image.gcs_path)
+
+        # Descargas en paralelo
+        loaded = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for job, future in [(job, pool.submit(download, job)) for job in jobs]:
+                try:
+                    loaded.append((job, *future.result()))
+                except Exception as e:
+                    failures.append((job, e))
+
+        if not loaded:
+            return failures
+
+        try:
+            outputs = remove_backgrounds([data for _, _, data in loaded])
+        except Exception as e:
+            return failures + [(job, e) for job, _, _ in loaded]
+
+        # Subidas y notificaciones en paralelo
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                (job, pool.submit(cls._complete, image_service, job, image, output))
+                for (job, image, _), output in zip(loaded, outputs)
+            ]
+            for job, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.append((job, e))
+
+        return failures
+
+    @staticmethod
+    def _complete(image_service, job: Dict, image, output: bytes):
+        """Guarda el resultado en la imagen destino y notifica al usuario"""
+        from PIL import Image as PILImage
+        from django.db import connection
+        from core.models import Image, Notification
+        from core.services.derivatives import DerivativeService
+
+        try:
+            with PILImage.open(BytesIO(output)) as pil_image:
+                width, height = pil_image.size
+
+            if job.get('new_image_uuid'):
+                # La imagen ya fue creada desde la view con status='processing'
+                new_image = Image.objects.get(uuid=job['new_image_uuid'])
+            else:
+                # Fallback: crear nueva imagen si no se pasó UUID
+                new_image = Image.objects.create(
+                    title=f"{image.title} (Sin Fondo)",
+                    type='text_to_image',
+                    prompt=f"Versión sin fondo de: {image.prompt}",
+                    created_by=image.created_by,
+                    project=image.project,
+                    width=width,
+                    height=height,
+                    status='processing'
+                )
+
+            new_image.gcs_path = image_service._save_generated_image(
+                output,
+                project=image.project,
+                image_uuid=str(new_image.uuid)
+            )
+            new_image.width = width
+            new_image.height = height
+            new_image.status = 'completed'
+            new_image.save(update_fields=['gcs_path', 'status', 'width', 'height'])
+            DerivativeService.schedule(item=new_image)
+            logger.info(f"Fondo removido: {image.uuid} -> {new_image.uuid} ({width}x{height})")
+
+            if image.project:
+                action_url = f'/projects/{image.project.uuid}/images/{new_image.uuid}/'
+            else:
+                action_url = f'/images/{new_image.uuid}/'
+
+            Notification.create_notification(
+                user=image.created_by,
+                type='generation_completed',
+                title='Fondo removido',
+                message=f'Se creó versión sin fondo de "{image.title}"',
+                action_url=action_url,
+                action_label='Ver imagen',
+                metadata={'item_type': 'image', 'item_uuid': str(new_image.uuid)}
+            )
+        finally:
+            # Hilo del pool: cerrar su conexión a la BD
+            connection.close()
+
+    @staticmethod
+    def finish_batch(owner: str):
+        """Olvida el lote de una tarea (sus trabajos ya están resueltos o viajan en el reintento)"""
+        if not owner:
+            return
+        try:
+            _client().delete(f'{BATCH_PREFIX}{owner}')
+        except Exception as e:
+            logger.warning(f"No se pudo limpiar el lote de eliminación de fondo {owner}: {e}")
+
+    @staticmethod
+    def fail(job: Dict, error: Exception):
+        """Marca la imagen destino como fallida y notifica al usuario"""
+        from core.models import Image, Notification
+
+        if job.get('new_image_uuid'):
+            Image.objects.filter(uuid=job['new_image_uuid']).update(status='error')
+            logger.warning(f"Imagen destino {job['new_image_uuid']} marcada como fallida")
+
+        image = Image.objects.filter(uuid=job['image_uuid']).select_related('created_by').first()
+        if image:
+            try:
+                Notification.create_notification(
+                    user=image.created_by,
+                    type='generation_failed',
+                    title='Error al remover fondo',
+                    message=f'No se pudo procesar "{image.title}": {str(error)[:100]}',
+                    metadata={'item_type': 'image', 'item_uuid': str(image.uuid)}
+                )
+            except Exception:
+                pass  # Ignorar error si no se puede crear notificación
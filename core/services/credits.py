@@ -5,9 +5,10 @@ from decimal import Decimal
 from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
+from django.db.models import Case, DateField, DecimalField, F, Q, Value, When
 import logging
 
-from core.models import UserCredits, CreditTransaction, ServiceUsage
+from core.models import UserCredits, CreditTransaction, CreditReservation, ServiceUsage
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,13 @@ class RateLimitExceededException(Exception):
     pass
 
 
+# Resultados de CreditService.commit_reservation
+RESERVATION_MISSING = 'missing'
+RESERVATION_COMMITTED = 'committed'
+RESERVATION_ALREADY_COMMITTED = 'already_committed'
+RESERVATION_REFUNDED = 'refunded'
+
+
 class CreditService:
     """Servicio para manejar créditos de usuarios"""
     
@@ -201,31 +209,126 @@ class CreditService:
                 f"Necesitas {amount_decimal} créditos más."
             )
     
+    # ----------------
+    # LEDGER ATÓMICO
+    # ----------------
+    #
+    # El saldo se modifica con un único UPDATE condicional
+    # (credits = credits - x WHERE credits >= x AND <límite mensual>), de modo que
+    # dos generaciones concurrentes del mismo usuario no pueden gastar de más.
+    # El reset mensual se aplica dentro del mismo UPDATE.
+    
+    @staticmethod
+    def _month_start():
+        return timezone.now().date().replace(day=1)
+    
+    @staticmethod
+    def _content_type_for(resource):
+        """(content_type, object_id) del recurso, con una sola búsqueda de ContentType"""
+        if resource is None:
+            return None, None
+        return ContentType.objects.get_for_model(resource), resource.id
+    
+    @staticmethod
+    def _debit(user, amount: Decimal, count_as_spent: bool = True) -> Decimal:
+        """
+        Descuenta créditos con un UPDATE condicional
+        
+        Args:
+            user: Usuario
+            amount: Créditos a descontar (> 0)
+            count_as_spent: Si True, suma también a total_spent
+        
+        Returns:
+            Saldo después del descuento
+        
+        Raises:
+            InsufficientCreditsException: Si no hay saldo suficiente
+            RateLimitExceededException: Si se excede el límite mensual
+        """
+        today = timezone.now().date()
+        current_month = Q(last_reset_date__gte=CreditService._month_start())
+        within_limit = (
+            Q(monthly_limit=0)
+            | (current_month & Q(current_month_usage__lte=F('monthly_limit') - amount))
+            | (~current_month & Q(monthly_limit__gte=amount))
+        )
+        updates = {
+            'credits': F('credits') - amount,
+            'current_month_usage': Case(
+                When(current_month, then=F('current_month_usage') + amount),
+                default=Value(amount),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+            'last_reset_date': Case(
+                When(current_month, then=F('last_reset_date')),
+                default=Value(today),
+                output_field=DateField(),
+            ),
+            'updated_at': timezone.now(),
+        }
+        if count_as_spent:
+            updates['total_spent'] = F('total_spent') + amount
+        
+        for _ in range(2):
+            updated = UserCredits.objects.filter(
+                Q(user=user, credits__gte=amount) & within_limit
+            ).update(**updates)
+            if updated:
+                # La fila queda bloqueada por el UPDATE hasta el commit: este saldo es el nuestro
+                return UserCredits.objects.filter(user=user).values_list('credits', flat=True).get()
+            
+            # Diagnóstico (solo en el camino de fallo): crear el registro si no existía
+            # y distinguir saldo insuficiente de límite mensual
+            credits = CreditService.get_or_create_user_credits(user)
+            if credits.credits < amount:
+                raise InsufficientCreditsException(
+                    f"Créditos insuficientes. Disponibles: {credits.credits}, Necesarios: {amount}"
+                )
+            CreditService.check_rate_limit(user, amount)
+        
+        raise InsufficientCreditsException(
+            f"No se pudieron reservar {amount} créditos (saldo modificado concurrentemente)"
+        )
+    
+    @staticmethod
+    def _credit(user, amount: Decimal, uncount_usage: bool = False) -> Decimal:
+        """
+        Devuelve créditos al saldo con un UPDATE atómico
+        
+        Args:
+            user: Usuario
+            amount: Créditos a devolver (> 0)
+            uncount_usage: Si True, descuenta también del uso del mes actual
+        
+        Returns:
+            Saldo después de la devolución
+        """
+        updates = {
+            'credits': F('credits') + amount,
+            'updated_at': timezone.now(),
+        }
+        if uncount_usage:
+            updates['current_month_usage'] = Case(
+                When(current_month_usage__gte=amount, then=F('current_month_usage') - amount),
+                default=Value(Decimal('0')),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        
+        if not UserCredits.objects.filter(user=user).update(**updates):
+            CreditService.get_or_create_user_credits(user)
+            UserCredits.objects.filter(user=user).update(**updates)
+        return UserCredits.objects.filter(user=user).values_list('credits', flat=True).get()
+    
     @staticmethod
     @transaction.atomic
     def deduct_credits(user, amount, service_name, operation_type, resource=None, metadata=None):
         """Deduce créditos del usuario"""
-        credits = CreditService.get_or_create_user_credits(user)
         amount_decimal = Decimal(str(amount))
+        content_type, object_id = CreditService._content_type_for(resource)
         
-        # Verificar créditos disponibles
-        if credits.credits < amount_decimal:
-            raise InsufficientCreditsException(
-                f"Créditos insuficientes. Disponibles: {credits.credits}, Necesarios: {amount_decimal}"
-            )
-        
-        # Verificar límite mensual
-        CreditService.check_rate_limit(user, amount_decimal)
-        
-        # Guardar balances antes
-        balance_before = credits.credits
-        balance_after = balance_before - amount_decimal
-        
-        # Actualizar créditos
-        credits.credits = balance_after
-        credits.total_spent += amount_decimal
-        credits.current_month_usage += amount_decimal
-        credits.save(update_fields=['credits', 'total_spent', 'current_month_usage', 'updated_at'])
+        balance_after = CreditService._debit(user, amount_decimal)
+        balance_before = balance_after + amount_decimal
         
         # Crear transacción
         transaction_obj = CreditTransaction.objects.create(
@@ -237,8 +340,8 @@ class CreditService:
             description=f"Gasto en {service_name} - {operation_type}",
             service_name=service_name,
             metadata=metadata or {},
-            content_type=ContentType.objects.get_for_model(resource) if resource else None,
-            object_id=resource.id if resource else None,
+            content_type=content_type,
+            object_id=object_id,
         )
         
         # Crear registro de uso
@@ -248,8 +351,8 @@ class CreditService:
             operation_type=operation_type,
             credits_spent=amount_decimal,
             metadata=metadata or {},
-            content_type=ContentType.objects.get_for_model(resource) if resource else None,
-            object_id=resource.id if resource else None,
+            content_type=content_type,
+            object_id=object_id,
         )
         
         logger.info(
@@ -259,6 +362,252 @@ class CreditService:
         
         return transaction_obj
     
+    # ----------------
+    # RESERVAS (generaciones de larga duración)
+    # ----------------
+    
+    @staticmethod
+    @transaction.atomic
+    def reserve_credits(user, amount, service_name, operation_type, resource=None, metadata=None):
+        """
+        Reserva créditos antes de lanzar una generación larga
+        
+        El saldo se descuenta en el momento (así las generaciones concurrentes
+        ven el saldo real). La reserva se confirma con commit_reservation cuando
+        la generación termina o se devuelve con refund_reservation si falla.
+        
+        Returns:
+            CreditReservation creada
+        
+        Raises:
+            InsufficientCreditsException: Si no hay saldo suficiente
+            RateLimitExceededException: Si se excede el límite mensual
+        """
+        amount_decimal = Decimal(str(amount))
+        content_type, object_id = CreditService._content_type_for(resource)
+        
+        balance_after = CreditService._debit(user, amount_decimal, count_as_spent=False)
+        
+        reservation = CreditReservation.objects.create(
+            user=user,
+            amount=amount_decimal,
+            service_name=service_name,
+            operation_type=operation_type,
+            content_type=content_type,
+            object_id=object_id,
+            metadata=metadata or {},
+        )
+        CreditTransaction.objects.create(
+            user=user,
+            transaction_type='spend',
+            amount=-amount_decimal,
+            balance_before=balance_after + amount_decimal,
+            balance_after=balance_after,
+            description=f"Reserva para {service_name} - {operation_type}",
+            service_name=service_name,
+            metadata={**(metadata or {}), 'reservation': str(reservation.uuid)},
+            content_type=content_type,
+            object_id=object_id,
+        )
+        
+        logger.info(f"Créditos reservados: {user.username} - {amount_decimal} ({service_name}). Reserva {reservation.uuid}")
+        return reservation
+    
+    @staticmethod
+    @transaction.atomic
+    def reserve_credits_bulk(user, charges):
+        """
+        Reserva créditos para varias generaciones con un solo UPDATE
+        
+        Se reserva todo o nada. Cada cargo tiene su propia CreditReservation
+        para poder confirmarla o devolverla por separado.
+        
+        Args:
+            user: Usuario
+            charges: Lista de dicts con amount, service_name, operation_type y
+                opcionalmente resource y metadata
+        
+        Returns:
+            Lista de CreditReservation en el mismo orden que charges (None para
+            cargos con importe 0)
+        
+        Raises:
+            InsufficientCreditsException: Si no hay saldo para el total
+            RateLimitExceededException: Si el total excede el límite mensual
+        """
+        amounts = [Decimal(str(charge['amount'])) for charge in charges]
+        total = sum(amounts, Decimal('0'))
+        if total <= 0:
+            return [None] * len(charges)
+        
+        balance_after = CreditService._debit(user, total, count_as_spent=False)
+        
+        reservations = []
+        for charge, amount_decimal in zip(charges, amounts):
+            if amount_decimal <= 0:
+                reservations.append(None)
+                continue
+            content_type, object_id = CreditService._content_type_for(charge.get('resource'))
+            reservations.append(CreditReservation(
+                user=user,
+                amount=amount_decimal,
+                service_name=charge['service_name'],
+                operation_type=charge['operation_type'],
+                content_type=content_type,
+                object_id=object_id,
+                metadata=charge.get('metadata') or {},
+            ))
+        CreditReservation.objects.bulk_create([r for r in reservations if r is not None])
+        
+        CreditTransaction.objects.create(
+            user=user,
+            transaction_type='spend',
+            amount=-total,
+            balance_before=balance_after + total,
+            balance_after=balance_after,
+            description=f"Reserva de {len([r for r in reservations if r])} generaciones",
+            metadata={'reservations': [str(r.uuid) for r in reservations if r is not None]},
+        )
+        
+        logger.info(f"Créditos reservados en lote: {user.username} - {total} ({len(charges)} cargos)")
+        return reservations
+    
+    @staticmethod
+    @transaction.atomic
+    def commit_reservation(reservation_uuid, amount=None, metadata=None) -> str:
+        """
+        Confirma una reserva con el coste real de la generación
+        
+        Si el coste real difiere del reservado se cobra o devuelve la diferencia.
+        Si el usuario ya no tiene saldo para un coste mayor, la reserva se
+        liquida por lo reservado y la diferencia queda apuntada como impagada
+        en su metadata (unpaid_amount).
+        
+        Args:
+            reservation_uuid: UUID de la CreditReservation
+            amount: Coste real (None = el reservado)
+            metadata: Metadata para el registro de ServiceUsage
+        
+        Returns:
+            RESERVATION_COMMITTED si se confirma ahora; RESERVATION_ALREADY_COMMITTED
+            si otra ruta ya la confirmó (está pagada); RESERVATION_REFUNDED si se
+            devolvió o RESERVATION_MISSING si no existe (en ambos casos no hay cobro)
+        """
+        reservation = CreditReservation.objects.select_related('user').filter(uuid=reservation_uuid).first()
+        if reservation is None:
+            return RESERVATION_MISSING
+        
+        # Transición reserved → committed (idempotente frente a reintentos)
+        if not CreditReservation.objects.filter(pk=reservation.pk, status='reserved').update(
+            status='committed', settled_at=timezone.now()
+        ):
+            status = CreditReservation.objects.filter(pk=reservation.pk).values_list('status', flat=True).first()
+            if status == 'committed':
+                return RESERVATION_ALREADY_COMMITTED
+            return RESERVATION_REFUNDED if status == 'refunded' else RESERVATION_MISSING
+        
+        user = reservation.user
+        final_amount = Decimal(str(amount)) if amount is not None else reservation.amount
+        delta = final_amount - reservation.amount
+        
+        if delta > 0:
+            try:
+                with transaction.atomic():
+                    balance_after = CreditService._debit(user, delta, count_as_spent=False)
+            except (InsufficientCreditsException, RateLimitExceededException) as e:
+                logger.warning(
+                    f"Reserva {reservation.uuid}: no se pudo cobrar la diferencia de {delta} créditos "
+                    f"({e}); se liquida por lo reservado"
+                )
+                CreditReservation.objects.filter(pk=reservation.pk).update(
+                    metadata={**(reservation.metadata or {}), 'unpaid_amount': str(delta)}
+                )
+                final_amount, delta = reservation.amount, Decimal('0')
+        elif delta < 0:
+            # Solo se descuenta del uso mensual si la reserva es de este mes
+            same_month = reservation.created_at.date() >= CreditService._month_start()
+            balance_after = CreditService._credit(user, -delta, uncount_usage=same_month)
+        
+        if delta:
+            CreditTransaction.objects.create(
+                user=user,
+                transaction_type='adjustment',
+                amount=-delta,
+                balance_before=balance_after + delta,
+                balance_after=balance_after,
+                description=f"Ajuste de reserva {reservation.service_name}: {reservation.amount} → {final_amount}",
+                service_name=reservation.service_name,
+                metadata={'reservation': str(reservation.uuid)},
+                content_type=reservation.content_type,
+                object_id=reservation.object_id,
+            )
+        
+        UserCredits.objects.filter(user=user).update(total_spent=F('total_spent') + final_amount)
+        ServiceUsage.objects.create(
+            user=user,
+            service_name=reservation.service_name,
+            operation_type=reservation.operation_type,
+            credits_spent=final_amount,
+            metadata=metadata or reservation.metadata,
+            content_type=reservation.content_type,
+            object_id=reservation.object_id,
+        )
+        
+        logger.info(f"Reserva {reservation.uuid} confirmada: {final_amount} créditos")
+        return RESERVATION_COMMITTED
+    
+    @staticmethod
+    @transaction.atomic
+    def refund_reservation(reservation_uuid, reason: str = '') -> bool:
+        """
+        Devuelve al saldo los créditos de una reserva no confirmada
+        
+        Returns:
+            False si la reserva no existe o ya estaba liquidada
+        """
+        reservation = CreditReservation.objects.select_related('user').filter(uuid=reservation_uuid).first()
+        if reservation is None:
+            return False
+        
+        if not CreditReservation.objects.filter(pk=reservation.pk, status='reserved').update(
+            status='refunded', settled_at=timezone.now()
+        ):
+            return False
+        
+        # Solo se descuenta del uso mensual si la reserva es de este mes
+        same_month = reservation.created_at.date() >= CreditService._month_start()
+        balance_after = CreditService._credit(reservation.user, reservation.amount, uncount_usage=same_month)
+        
+        CreditTransaction.objects.create(
+            user=reservation.user,
+            transaction_type='refund',
+            amount=reservation.amount,
+            balance_before=balance_after - reservation.amount,
+            balance_after=balance_after,
+            description=reason[:500] if reason else f"Reembolso de reserva {reservation.service_name}",
+            service_name=reservation.service_name,
+            metadata={'reservation': str(reservation.uuid)},
+            content_type=reservation.content_type,
+            object_id=reservation.object_id,
+        )
+        
+        logger.info(f"Reserva {reservation.uuid} reembolsada: {reservation.amount} créditos")
+        return True
+    
+    @staticmethod
+    def refund_stale_reservations(max_age_hours: int = 6) -> int:
+        """Reembolsa reservas que siguen abiertas tras max_age_hours (generaciones perdidas)"""
+        from datetime import timedelta
+        
+        cutoff = timezone.now() - timedelta(hours=max_age_hours)
+        refunded = 0
+        for reservation_uuid in CreditReservation.objects.filter(
+            status='reserved', created_at__lt=cutoff
+        ).values_list('uuid', flat=True):
+            if CreditService.refund_reservation(reservation_uuid, reason='Reserva expirada'):
+                refunded += 1
+        return refunded
+    
     # Métodos de cálculo por tipo de servicio
     @staticmethod
     def calculate_video_cost(video):
@@ -478,6 +827,8 @@ class CreditService:
         
         cost = CreditService.calculate_video_cost(video)
         if cost == 0:
+            if video.metadata.get('credit_reservation'):
+                CreditService.refund_reservation(video.metadata['credit_reservation'], reason='Coste no calculable')
             logger.warning(f"No se pudo calcular costo para video {video.id} (tipo: {video.type}, duración: {video.duration or video.metadata.get('duration') or video.config.get('duration', 'N/A')})")
             return
         
@@ -511,14 +862,24 @@ class CreditService:
         }
         service_name = service_name_map.get(video.type, video.type)
         
-        CreditService.deduct_credits(
-            user=user,
-            amount=cost,
-            service_name=service_name,
-            operation_type='video_generation',
-            resource=video,
-            metadata=metadata
+        # Si se reservaron créditos al encolar, confirmar la reserva con el coste real
+        reservation_uuid = video.metadata.get('credit_reservation')
+        status = (
+            CreditService.commit_reservation(reservation_uuid, amount=cost, metadata=metadata)
+            if reservation_uuid else RESERVATION_MISSING
         )
+        if status == RESERVATION_ALREADY_COMMITTED:
+            # Otra ruta de finalización (webhook, watcher, reintento) ya la cobró: solo se marca como pagada
+            logger.info(f"Reserva de video {video.id} ya confirmada por otra ruta")
+        elif status in (RESERVATION_MISSING, RESERVATION_REFUNDED):
+            CreditService.deduct_credits(
+                user=user,
+                amount=cost,
+                service_name=service_name,
+                operation_type='video_generation',
+                resource=video,
+                metadata=metadata
+            )
         
         video.metadata['credits_charged'] = True
         video.save(update_fields=['metadata'])
@@ -627,6 +988,8 @@ class CreditService:
         
         cost = CreditService.calculate_scene_video_cost(scene)
         if cost == 0:
+            if scene.metadata.get('credit_reservation'):
+                CreditService.refund_reservation(scene.metadata['credit_reservation'], reason='Coste no calculable')
             logger.warning(f"No se pudo calcular costo para escena {scene.scene_id} (ID: {scene.id}, ai_service: {scene.ai_service}, duration: {scene.duration_sec})")
             return
         
@@ -638,18 +1001,61 @@ class CreditService:
             'ai_config': scene.ai_config,
         }
         
+        # Si se reservaron créditos al lanzar el storyboard, confirmar la reserva con el coste real
+        reservation_uuid = scene.metadata.get('credit_reservation')
+        status = (
+            CreditService.commit_reservation(reservation_uuid, amount=cost, metadata=metadata)
+            if reservation_uuid else RESERVATION_MISSING
+        )
+        if status == RESERVATION_ALREADY_COMMITTED:
+            # Otra ruta de finalización (reconciliador, vista, reintento) ya la cobró: solo se marca como pagada
+            logger.info(f"Reserva de escena {scene.scene_id} (ID: {scene.id}) ya confirmada por otra ruta")
+        elif status in (RESERVATION_MISSING, RESERVATION_REFUNDED):
+            CreditService.deduct_credits(
+                user=user,
+                amount=cost,
+                service_name=scene.ai_service,
+                operation_type='video_generation',
+                resource=scene,
+                metadata=metadata
+            )
+        
+        scene.metadata['credits_charged'] = True
+        scene.save(update_fields=['metadata'])
+        logger.info(f"✓ Créditos cobrados y marcados en metadata para escena {scene.scene_id} (ID: {scene.id})")
+    
+    @staticmethod
+    def deduct_credits_for_scene_audio(user, scene):
+        """Deduce créditos para audio de escena"""
+        if not scene.metadata:
+            scene.metadata = {}
+        
+        if scene.metadata.get('audio_credits_charged'):
+            logger.info(f"Créditos de audio ya cobrados para escena {scene.scene_id} (ID: {scene.id})")
+            return
+        
+        cost = CreditService.estimate_audio_cost(scene.script_text or '')
+        if cost <= 0:
+            logger.warning(f"Costo de audio es 0 para escena {scene.scene_id} (ID: {scene.id})")
+            return
+        
+        logger.info(f"Cobrando {cost} créditos por audio de escena {scene.scene_id} (ID: {scene.id})")
+        
         CreditService.deduct_credits(
             user=user,
             amount=cost,
-            service_name=scene.ai_service,
-            operation_type='video_generation',
+            service_name='elevenlabs',
+            operation_type='audio_generation',
             resource=scene,
-            metadata=metadata
+            metadata={
+                'character_count': len(scene.script_text or ''),
+                'duration': scene.audio_duration,
+                'voice_id': scene.audio_voice_id,
+            }
         )
         
-        scene.metadata['credits_charged'] = True
+        scene.metadata['audio_credits_charged'] = True
         scene.save(update_fields=['metadata'])
-        logger.info(f"✓ Créditos cobrados y marcados en metadata para escena {scene.scene_id} (ID: {scene.id})")
     
     @staticmethod
     def _map_model_id_to_video_type(model_id: str) -> str:
@@ -840,17 +1246,21 @@ class CreditService:
         return Decimal(str(character_count * CreditService.PRICING['elevenlabs']['per_character']))
     
     @staticmethod
+    @transaction.atomic
     def add_credits(user, amount, description='', transaction_type='purchase'):
         """Agrega créditos al usuario (para asignación manual)"""
         credits = CreditService.get_or_create_user_credits(user)
         amount_decimal = Decimal(str(amount))
         
-        balance_before = credits.credits
-        balance_after = balance_before + amount_decimal
+        UserCredits.objects.filter(pk=credits.pk).update(
+            credits=F('credits') + amount_decimal,
+            total_purchased=F('total_purchased') + amount_decimal,
+            updated_at=timezone.now(),
+        )
+        credits.refresh_from_db()
         
-        credits.credits = balance_after
-        credits.total_purchased += amount_decimal
-        credits.save(update_fields=['credits', 'total_purchased', 'updated_at'])
+        balance_after = credits.credits
+        balance_before = balance_after - amount_decimal
         
         CreditTransaction.objects.create(
             user=user,
@@ -864,6 +1274,3 @@ class CreditService:
         logger.info(f"Créditos agregados: {user.username} - {amount_decimal} créditos. Balance: {balance_after}")
         
         return credits
-
-
-
@@ -0,0 +1,408 @@
+"""
+Derivados ligeros de los medios para listados (biblioteca, dashboard, templates)
+
+Los listados no deben descargar el original (PNGs de varios MB, MP4 4K, MP3
+completos) para pintar una card. Al completarse un item (mark_as_completed,
+subidas, stock) se encola la generación de sus derivados, que se guardan en
+GCS junto al original:
+
+    <dir>/<archivo>.png
+    <dir>/derivatives/<archivo>/w320.webp        miniaturas WebP (imágenes)
+    <dir>/derivatives/<archivo>/poster_w320.webp fotograma de portada (videos)
+    <dir>/derivatives/<archivo>/preview.mp4      preview corto sin audio (videos)
+    <dir>/derivatives/<archivo>/peaks.json       picos de la forma de onda (audios)
+    <dir>/derivatives/<archivo>/manifest.json
+
+El manifest se guarda también en item.metadata['derivatives'] (con la ruta
+del original, para detectar que ha cambiado). Para rutas sueltas sin item
+(previews de templates) el manifest se busca en Django cache y, si no está,
+en GCS.
+
+Los items sin derivados (anteriores a este pipeline) se encolan al aparecer
+en un listado; mientras tanto se sirve el original.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from array import array
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.storage.gcs import gcs_storage
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST_VERSION = 1
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'gif', 'bmp', 'tiff'}
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'webm', 'avi', 'mkv', 'm4v'}
+AUDIO_EXTENSIONS = {'mp3', 'wav', 'ogg', 'm4a', 'aac', 'flac', 'opus', 'webm'}
+
+WEBP_QUALITY = 80
+FFMPEG_TIMEOUT = 300
+
+
+class DerivativeService:
+    """Genera, indexa y resuelve los derivados de imágenes, videos y audios"""
+
+    CACHE_PREFIX = 'derivatives:'
+    INDEX_TTL = 60 * 60 * 24 * 7  # 7 días (la fuente de verdad es GCS)
+    MISS_TTL = 60 * 10
+    SCHEDULE_TTL = 60 * 60
+
+    # ----------------
+    # RUTAS
+    # ----------------
+
+    @staticmethod
+    def media_kind(gcs_path: str, item_type: Optional[str] = None) -> Optional[str]:
+        """'image', 'video' o 'audio' según el tipo de item o la extensión del archivo"""
+        if item_type in ('image', 'video', 'audio'):
+            return item_type
+        extension = gcs_path.rsplit('.', 1)[-1].lower() if '.' in gcs_path else ''
+        if extension in IMAGE_EXTENSIONS:
+            return 'image'
+        if extension in VIDEO_EXTENSIONS:
+            return 'video'
+        if extension in AUDIO_EXTENSIONS:
+            return 'audio'
+        return None
+
+    @staticmethod
+    def base_path(gcs_path: str) -> str:
+        """Carpeta de derivados de un original (nombre de blob en el bucket propio)"""
+        _, blob_name = gcs_storage.parse_gcs_path(gcs_path)
+        directory, filename = os.path.split(blob_name)
+        stem = filename.rsplit('.', 1)[0]
+        return f"{directory}/derivatives/{stem}" if directory else f"derivatives/{stem}"
+
+    @staticmethod
+    def _index_key(gcs_path: str) -> str:
+        return f"{DerivativeService.CACHE_PREFIX}{hashlib.sha1(gcs_path.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def widths() -> List[int]:
+        return sorted(settings.DERIVATIVE_THUMBNAIL_WIDTHS)
+
+    @staticmethod
+    def pick_width(paths: Dict[str, str], width: Optional[int] = None) -> Optional[str]:
+        """La miniatura más pequeña que cubre el ancho pedido (o la mayor disponible)"""
+        if not paths:
+            return None
+        width = width or settings.DERIVATIVE_CARD_WIDTH
+        available = sorted(int(w) for w in paths)
+        chosen = next((w for w in available if w >= width), available[-1])
+        return paths[str(chosen)]
+
+    # ----------------
+    # ENCOLADO
+    # ----------------
+
+    @classmethod
+    def schedule(cls, item=None, gcs_path: Optional[str] = None):
+        """
+        Encola la generación de derivados de un item (o de una ruta suelta)
+
+        Se ejecuta al confirmar la transacción y como mucho una vez por
+        original cada SCHEDULE_TTL segundos.
+        """
+        if not settings.DERIVATIVES_ENABLED:
+            return
+        source = item.gcs_path if item is not None else gcs_path
+        if not source:
+            return
+        if not cache.add(f"{cls._index_key(source)}:scheduled", 1, timeout=cls.SCHEDULE_TTL):
+            return
+
+        def enqueue():
+            from core.tasks import generate_media_derivatives_task
+            try:
+                if item is not None:
+                    generate_media_derivatives_task.delay(item._meta.model_name, str(item.uuid))
+                else:
+                    generate_media_derivatives_task.delay(None, None, gcs_path=source)
+            except Exception as e:
+                logger.warning(f"No se pudo encolar la generación de derivados de {source}: {e}")
+
+        transaction.on_commit(enqueue)
+
+    # ----------------
+    # GENERACIÓN
+    # ----------------
+
+    @classmethod
+    def generate(cls, gcs_path: str, kind: str) -> Dict:
+        """
+        Genera y sube los derivados de un original
+
+        Returns:
+            Manifest con las rutas gs:// de los derivados
+        """
+        base = cls.base_path(gcs_path)
+        manifest = {'version': MANIFEST_VERSION, 'source': gcs_path, 'kind': kind}
+        work_dir = tempfile.mkdtemp(prefix='derivatives_')
+        try:
+            if kind == 'image':
+                data = gcs_storage.download_as_bytes(gcs_path)
+                manifest['thumbnails'] = cls._upload_thumbnails(data, f"{base}/w")
+            elif kind == 'video':
+                manifest.update(cls._video_derivatives(gcs_path, base, work_dir))
+            elif kind == 'audio':
+                manifest.update(cls._audio_derivatives(gcs_path, base, work_dir))
+            else:
+                raise ValueError(f"Tipo de medio no soportado para derivados: {gcs_path}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        gcs_storage.upload_from_bytes(
+            json.dumps(manifest).encode('utf-8'),
+            f"{base}/manifest.json",
+            content_type='application/json'
+        )
+        cache.set(cls._index_key(gcs_path), manifest, timeout=cls.INDEX_TTL)
+        logger.info(f"Derivados generados para {gcs_path}: {sorted(k for k in manifest if k not in ('version', 'source', 'kind'))}")
+        return manifest
+
+    @classmethod
+    def generate_for_item(cls, item) -> Dict:
+        """Genera los derivados de un item y guarda el manifest en su metadata"""
+        kind = cls.media_kind(item.gcs_path, item._meta.model_name)
+        manifest = cls.generate(item.gcs_path, kind)
+
+        # Fusionar con la metadata actual (puede haber cambiado mientras se generaba)
+        model = type(item)
+        with transaction.atomic():
+            current = model.objects.select_for_update().get(pk=item.pk)
+            if current.gcs_path != item.gcs_path:
+                logger.info(f"El original de {kind} {item.uuid} cambió durante la generación de derivados")
+                return manifest
+            metadata = current.metadata or {}
+            metadata['derivatives'] = manifest
+            model.objects.filter(pk=item.pk).update(metadata=metadata)
+        return manifest
+
+    @classmethod
+    def _upload_thumbnails(cls, image_data: bytes, prefix: str) -> Dict[str, str]:
+        """Miniaturas WebP a los anchos configurados (sin ampliar el original)"""
+        from PIL import Image as PILImage, ImageOps
+
+        with PILImage.open(BytesIO(image_data)) as source:
+            source = ImageOps.exif_transpose(source)
+            if source.mode not in ('RGB', 'RGBA'):
+                source = source.convert('RGBA' if 'A' in source.getbands() or source.mode == 'P' else 'RGB')
+
+            paths = {}
+            for width in cls.widths():
+                target = min(width, source.width)
+                if str(target) in paths or (target < width and paths):
+                    # El original es más estrecho: basta con una miniatura a su ancho
+                    continue
+                height = max(1, round(source.height * target / source.width))
+                thumbnail = source if target == source.width else source.resize((target, height), PILImage.Resampling.LANCZOS)
+                buffer = BytesIO()
+                thumbnail.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+                paths[str(target)] = gcs_storage.upload_from_bytes(
+                    buffer.getvalue(), f"{prefix}{target}.webp", content_type='image/webp'
+                )
+            return paths
+
+    @staticmethod
+    def _ffmpeg(command: List[str]) -> subprocess.CompletedProcess:
+        result = subprocess.run(command, capture_output=True, timeout=FFMPEG_TIMEOUT)
+        if result.returncode != 0:
+            error = result.stderr.decode('utf-8', errors='replace').strip().splitlines()[-3:]
+            raise RuntimeError(f"FFmpeg falló ({result.returncode}): {' '.join(error)}")
+        return result
+
+    @classmethod
+    def _video_derivatives(cls, gcs_path: str, base: str, work_dir: str) -> Dict:
+        """Portada (miniaturas WebP) y preview MP4 corto, leyendo el original por HTTP con seek"""
+        # FFmpeg lee por rangos desde la URL firmada: no descarga el 4K completo
+        source = gcs_storage.get_signed_url(gcs_path, expiration=3600, use_cache=False)
+        poster_path = os.path.join(work_dir, 'poster.png')
+
+        # Fotograma en el segundo 1 (el 0 suele ser negro); vídeos muy cortos: el primero
+        for offset in ('1', '0'):
+            try:
+                cls._ffmpeg([
+                    'ffmpeg', '-y', '-ss', offset, '-i', source,
+                    '-frames:v', '1', '-update', '1', poster_path,
+                ])
+                if os.path.exists(poster_path) and os.path.getsize(poster_path) > 0:
+                    break
+            except RuntimeError:
+                if offset == '0':
+                    raise
+        with open(poster_path, 'rb') as f:
+            posters = cls._upload_thumbnails(f.read(), f"{base}/poster_w")
+
+        preview_path = os.path.join(work_dir, 'preview.mp4')
+        width = settings.DERIVATIVE_PREVIEW_WIDTH
+        cls._ffmpeg([
+            'ffmpeg', '-y', '-i', source,
+            '-t', str(settings.DERIVATIVE_PREVIEW_SECONDS),
+            '-an',
+            '-vf', f"scale='min({width},iw)':-2",
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '32',
+            '-maxrate', settings.DERIVATIVE_PREVIEW_MAXRATE,
+            '-bufsize', settings.DERIVATIVE_PREVIEW_MAXRATE,
+            '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+            preview_path,
+        ])
+        preview = gcs_storage.upload_file(preview_path, f"{base}/preview.mp4", content_type='video/mp4')
+
+        return {'poster': posters, 'preview': preview}
+
+    @classmethod
+    def _audio_derivatives(cls, gcs_path: str, base: str, work_dir: str) -> Dict:
+        """JSON con los picos de la forma de onda (mono, normalizados a 0..1)"""
+        local_path = os.path.join(work_dir, 'source')
+        gcs_storage.download_to_file(gcs_path, local_path)
+
+        sample_rate = 8000
+        result = cls._ffmpeg([
+            'ffmpeg', '-i', local_path, '-ac', '1', '-ar', str(sample_rate),
+            '-f', 's16le', '-acodec', 'pcm_s16le', '-',
+        ])
+        samples = array('h')
+        samples.frombytes(result.stdout[:len(result.stdout) - len(result.stdout) % 2])
+
+        buckets = settings.DERIVATIVE_WAVEFORM_PEAKS
+        step = max(1, len(samples) // buckets) if samples else 1
+        peaks = []
+        for start in range(0, len(samples), step):
+            window = samples[start:start + step]
+            peaks.append(max(max(window), -min(window)) / 32768)
+        loudest = max(peaks, default=0) or 1
+        waveform = {
+            'version': MANIFEST_VERSION,
+            'duration': round(len(samples) / sample_rate, 3),
+            'peaks': [round(peak / loudest, 3) for peak in peaks[:buckets]],
+        }
+        peaks_path = gcs_storage.upload_from_bytes(
+            json.dumps(waveform, separators=(',', ':')).encode('utf-8'),
+            f"{base}/peaks.json",
+            content_type='application/json'
+        )
+        return {'peaks': peaks_path}
+
+    # ----------------
+    # CONSULTA
+    # ----------------
+
+    @classmethod
+    def manifest_for(cls, item=None, gcs_path: Optional[str] = None) -> Optional[Dict]:
+        """
+        Manifest de derivados de un item o de una ruta suelta
+
+        Si no hay derivados se encola su generación y se devuelve None (el
+        llamador sirve el original).
+        """
+        if item is not None:
+            manifest = (item.metadata or {}).get('derivatives')
+            if manifest and manifest.get('source') == item.gcs_path:
+                return manifest
+            if item.status == 'completed' and item.gcs_path:
+                cls.schedule(item=item)
+            return None
+
+        if not gcs_path:
+            return None
+        key = cls._index_key(gcs_path)
+        manifest = cache.get(key)
+        if manifest is None:
+            manifest = cls._load_manifest(gcs_path)
+            cache.set(key, manifest or {}, timeout=cls.INDEX_TTL if manifest else cls.MISS_TTL)
+            if not manifest:
+                cls.schedule(gcs_path=gcs_path)
+        return manifest or None
+
+    @classmethod
+    def _load_manifest(cls, gcs_path: str) -> Optional[Dict]:
+        manifest_path = f"{cls.base_path(gcs_path)}/manifest.json"
+        try:
+            if not gcs_storage.file_exists(manifest_path):
+                return None
+            manifest = json.loads(gcs_storage.download_as_bytes(manifest_path))
+            return manifest if manifest.get('source') == gcs_path else None
+        except Exception as e:
+            logger.warning(f"No se pudo leer el manifest de derivados de {gcs_path}: {e}")
+            return None
+
+    @classmethod
+    def display_paths(cls, item=None, gcs_path: Optional[str] = None, kind: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """
+        Rutas a mostrar en una card
+
+        Returns:
+            Dict con 'display' (miniatura, preview o el original si no hay
+            derivados), 'poster' y 'peaks'
+        """
+        source = item.gcs_path if item is not None else gcs_path
+        kind = cls.media_kind(source or '', kind or (item._meta.model_name if item is not None else None))
+        paths = {'display': source, 'poster': None, 'peaks': None}
+        if not source or not settings.DERIVATIVES_ENABLED:
+            return paths
+
+        manifest = cls.manifest_for(item=item) if item is not None else cls.manifest_for(gcs_path=source)
+        if not manifest:
+            return paths
+
+        if kind == 'image':
+            paths['display'] = cls.pick_width(manifest.get('thumbnails')) or source
+        elif kind == 'video':
+            paths['display'] = manifest.get('preview') or source
+            paths['poster'] = cls.pick_width(manifest.get('poster'))
+        elif kind == 'audio':
+            paths['peaks'] = manifest.get('peaks')
+        return paths
+
+    @classmethod
+    def card_urls(cls, items: Iterable, expiration: int = 3600) -> List[Dict[str, Optional[str]]]:
+        """
+        URLs firmadas para las cards de una página, en el mismo orden
+
+        Cada elemento es un item con gcs_path (o None) y se devuelve un dict con
+        'signed_url', 'poster_url' y 'peaks_url'. Todas las rutas se firman en
+        una sola llamada.
+        """
+        resolved = [cls.display_paths(item=item) if item is not None else None for item in items]
+        signed = gcs_storage.get_signed_urls(
+            [path for paths in resolved if paths for path in paths.values() if path],
+            expiration=expiration
+        )
+        return [
+            {
+                'signed_url': signed.get(paths['display']) if paths and paths['display'] else None,
+                'poster_url': signed.get(paths['poster']) if paths and paths['poster'] else None,
+                'peaks_url': signed.get(paths['peaks']) if paths and paths['peaks'] else None,
+            }
+            for paths in resolved
+        ]
+
+    # ----------------
+    # LIMPIEZA
+    # ----------------
+
+    @classmethod
+    def delete(cls, item):
+        """Borra los derivados de un item (al eliminar el item)"""
+        manifest = (item.metadata or {}).get('derivatives') or {}
+        paths = []
+        for key in ('thumbnails', 'poster'):
+            paths.extend((manifest.get(key) or {}).values())
+        paths.extend(path for path in (manifest.get('preview'), manifest.get('peaks')) if path)
+        if manifest.get('source'):
+            paths.append(f"gs://{settings.GCS_BUCKET_NAME}/{cls.base_path(manifest['source'])}/manifest.json")
+            cache.delete(cls._index_key(manifest['source']))
+        for path in paths:
+            gcs_storage.delete_file(path)
@@ -0,0 +1,231 @@
+"""
+Feed unificado de la biblioteca
+
+Combina videos, imágenes, audios y guiones del usuario en una sola consulta
+UNION ALL ordenada por (created_at, tipo, id) en la base de datos, en lugar de
+cargar todos los items en Python y ordenarlos allí.
+
+Soporta dos modos de paginación:
+    - Offset (page=N): para la paginación numerada de la plantilla
+    - Keyset (cursor=...): para scroll infinito con HTMX; el coste de cada
+      página no depende de lo profundo que esté el usuario en la biblioteca
+
+Los conteos por tipo se obtienen con una única consulta agregada.
+"""
+import base64
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models import Count, IntegerField, Q, Value
+
+from core.models import Video, Image, Audio, Script
+
+logger = logging.getLogger(__name__)
+
+
+# (tipo, modelo, campos de búsqueda). El índice en la tupla es el rango del tipo,
+# usado como desempate estable cuando dos items comparten created_at.
+LIBRARY_SOURCES = (
+    ('video', Video, ('title', 'script')),
+    ('image', Image, ('title', 'prompt')),
+    ('audio', Audio, ('title', 'text')),
+    ('script', Script, ('title', 'original_script')),
+)
+
+LIBRARY_TYPES = tuple(item_type for item_type, _, _ in LIBRARY_SOURCES)
+
+
+class LibraryItem:
+    """Item de la biblioteca: objeto del modelo + tipo"""
+
+    __slots__ = ('item', 'type', 'created_at', 'title', 'status')
+
+    def __init__(self, item, item_type: str):
+        self.item = item
+        self.type = item_type
+        self.created_at = item.created_at
+        self.title = getattr(item, 'title', None) or 'Sin título'
+        self.status = getattr(item, 'status', None)
+
+
+def encode_cursor(created_at: datetime, rank: int, pk: int) -> str:
+    """Codifica la posición (created_at, rango de tipo, id) como token opaco"""
+    raw = f"{created_at.isoformat()}|{rank}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int, int]]:
+    """Decodifica un cursor; devuelve None si es inválido o está manipulado"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, rank, pk = raw.split('|')
+        position = datetime.fromisoformat(created_at), int(rank), int(pk)
+    except (ValueError, UnicodeError, TypeError):
+        return None
+    if not 0 <= position[1] < len(LIBRARY_SOURCES) or position[2] < 0:
+        return None
+    return position
+
+
+class LibraryFeed:
+    """
+    Feed paginado de la biblioteca de un usuario
+
+    Se comporta como una secuencia para django.core.paginator.Paginator
+    (count() y slicing), de modo que ListView puede paginarlo directamente.
+    """
+
+    def __init__(self, user, item_type: str = '', search_query: str = ''):
+        self.user = user
+        self.item_type = item_type if item_type in LIBRARY_TYPES else ''
+        self.search_query = (search_query or '').strip()
+        self._counts = None
+
+    # ----------------
+    # QUERIES
+    # ----------------
+
+    def _sources(self):
+        for rank, (item_type, model, search_fields) in enumerate(LIBRARY_SOURCES):
+            if self.item_type and item_type != self.item_type:
+                continue
+            yield rank, item_type, model, search_fields
+
+    def _base_queryset(self, model, search_fields):
+        # order_by() vacío: sin ORDER BY de Meta.ordering en las partes del UNION
+        queryset = model.objects.filter(created_by=self.user).order_by()
+        if self.search_query:
+            search = Q()
+            for field in search_fields:
+                search |= Q(**{f'{field}__icontains': self.search_query})
+            queryset = queryset.filter(search)
+        return queryset
+
+    def _keyset_filter(self, rank: int, position: Tuple[datetime, int, int]) -> Q:
+        """Filtro "estrictamente después de position" en orden (-created_at, -rank, -id)"""
+        created_at, cursor_rank, cursor_pk = position
+        if rank < cursor_rank:
+            return Q(created_at__lte=created_at)
+        if rank > cursor_rank:
+            return Q(created_at__lt=created_at)
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=cursor_pk)
+
+    def _union(self, position: Optional[Tuple[datetime, int, int]] = None):
+        parts = []
+        for rank, _, model, search_fields in self._sources():
+            queryset = self._base_queryset(model, search_fields)
+            if position:
+                queryset = queryset.filter(self._keyset_filter(rank, position))
+            parts.append(
+                queryset
+                .annotate(kind=Value(rank, output_field=IntegerField()))
+                .values_list('created_at', 'kind', 'id')
+            )
+
+        if not parts:
+            return None
+
+        union = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+        return union.order_by('-created_at', '-kind', '-id')
+
+    def _hydrate(self, rows: List[Tuple[datetime, int, int]]) -> List[LibraryItem]:
+        """Carga los objetos de la página con una consulta por tipo presente"""
+        ids_by_rank: Dict[int, List[int]] = {}
+        for _, rank, pk in rows:
+            ids_by_rank.setdefault(rank, []).append(pk)
+
+        objects_by_rank = {}
+        for rank, ids in ids_by_rank.items():
+            _, model, _ = LIBRARY_SOURCES[rank]
+            objects_by_rank[rank] = model.objects.select_related('project').in_bulk(ids)
+
+        items = []
+        for _, rank, pk in rows:
+            obj = objects_by_rank[rank].get(pk)
+            if obj is not None:
+                items.append(LibraryItem(obj, LIBRARY_SOURCES[rank][0]))
+        return items
+
+    # ----------------
+    # CONTEOS
+    # ----------------
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Conteos por tipo (con los filtros del feed) en una sola consulta agregada
+
+        Returns:
+            Dict {'video': n, 'image': n, 'audio': n, 'script': n, 'total': n}
+        """
+        if self._counts is not None:
+            return self._counts
+
+        parts = [
+            self._base_queryset(model, search_fields)
+            .annotate(kind=Value(rank, output_field=IntegerField()))
+            .values('kind')
+            .annotate(n=Count('id'))
+            .values_list('kind', 'n')
+            for rank, _, model, search_fields in self._sources()
+        ]
+        rows = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+
+        counts = {item_type: 0 for item_type in LIBRARY_TYPES}
+        for rank, n in rows:
+            counts[LIBRARY_SOURCES[rank][0]] = n
+        counts['total'] = sum(counts[item_type] for item_type in LIBRARY_TYPES)
+
+        self._counts = counts
+        return counts
+
+    # ----------------
+    # PAGINACIÓN
+    # ----------------
+
+    def count(self) -> int:
+        return self.counts()['total']
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, index):
+        """Paginación por offset (usada por Paginator)"""
+        union = self._union()
+        if union is None:
+            return []
+        if isinstance(index, slice):
+            return self._hydrate(list(union[index]))
+        rows = list(union[index:index + 1])
+        if not rows:
+            raise IndexError(index)
+        return self._hydrate(rows)[0]
+
+    def page_after(self, cursor: Optional[str] = None, limit: int = 24) -> Tuple[List[LibraryItem], Optional[str]]:
+        """
+        Paginación keyset
+
+        Args:
+            cursor: Token devuelto por la página anterior (None = primera página)
+            limit: Número de items por página
+
+        Returns:
+            (items, next_cursor). next_cursor es None si no hay más items.
+        
+        Raises:
+            ValueError: Si el cursor es inválido (servir la primera página
+                duplicaría items en el scroll infinito)
+        """
+        position = decode_cursor(cursor) if cursor else None
+        if cursor and position is None:
+            raise ValueError('Cursor de paginación inválido')
+        union = self._union(position)
+        if union is None:
+            return [], None
+
+        rows = list(union[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = encode_cursor(*rows[-1]) if has_more and rows else None
+        return self._hydrate(rows), next_cursor
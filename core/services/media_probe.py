@@ -0,0 +1,233 @@
+"""
+Análisis de medios con un único ffprobe por blob
+
+Cada blob de GCS se analiza una sola vez (ffprobe -show_streams -show_format
+en JSON) y el resultado compacto (MediaInfo) se guarda:
+
+    - En Django cache, por ruta del blob. Las rutas de GCS de la app llevan
+      timestamp o son direccionadas por contenido (RenderCache): una ruta
+      identifica una generación del blob.
+    - En la fila que lo usa, en metadata['media_info'][<asset>]:
+        Video/Audio: 'file' (gcs_path)
+        Scene: 'video', 'audio', 'final_video'
+
+La composición (mux de escenas, concatenación) lee de ahí en lugar de lanzar
+ffprobe sobre cada descarga.
+"""
+import hashlib
+import json
+import logging
+import subprocess
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.storage.gcs import gcs_storage
+
+logger = logging.getLogger(__name__)
+
+
+# Asset → campo con la ruta del blob
+ASSET_FIELDS = {
+    'file': 'gcs_path',
+    'video': 'video_gcs_path',
+    'audio': 'audio_gcs_path',
+    'final_video': 'final_video_gcs_path',
+}
+
+PROBE_TIMEOUT = 30
+
+
+@dataclass
+class MediaInfo:
+    """Resumen de un ffprobe (duración, códecs, resolución, fps, audio, bitrate)"""
+    duration: float = 0.0
+    container: Optional[str] = None
+    bitrate: Optional[int] = None
+    video_codec: Optional[str] = None
+    width: int = 1280
+    height: int = 720
+    pix_fmt: Optional[str] = None
+    time_base: Optional[str] = None
+    frame_rate: Optional[str] = None
+    fps: Optional[float] = None
+    # Por defecto, asumir que tiene audio si no se puede verificar
+    has_audio: bool = True
+    audio_codec: Optional[str] = None
+    sample_rate: Optional[str] = None
+    channels: Optional[int] = None
+    # False si ffprobe falló y son valores por defecto (no se guardan)
+    probed: bool = False
+    source: Optional[str] = None
+
+    @property
+    def resolution(self) -> str:
+        return f"{self.width}x{self.height}"
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'MediaInfo':
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+    @classmethod
+    def from_ffprobe(cls, data: Dict) -> 'MediaInfo':
+        """Construye el resumen a partir de la salida JSON de ffprobe"""
+        info = cls(probed=True)
+        streams = data.get('streams', [])
+        video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        media_format = data.get('format', {})
+
+        if video_stream:
+            info.video_codec = video_stream.get('codec_name')
+            info.width = int(video_stream.get('width') or info.width)
+            info.height = int(video_stream.get('height') or info.height)
+            info.pix_fmt = video_stream.get('pix_fmt')
+            info.time_base = video_stream.get('time_base')
+            info.frame_rate = video_stream.get('r_frame_rate')
+            try:
+                numerator, _, denominator = (info.frame_rate or '').partition('/')
+                info.fps = round(int(numerator) / int(denominator or 1), 3)
+            except (ValueError, ZeroDivisionError):
+                info.fps = None
+
+        info.has_audio = audio_stream is not None
+        if audio_stream:
+            info.audio_codec = audio_stream.get('codec_name')
+            info.sample_rate = audio_stream.get('sample_rate')
+            info.channels = audio_stream.get('channels')
+
+        info.container = media_format.get('format_name')
+        try:
+            info.duration = float(media_format.get('duration') or 0.0)
+        except (TypeError, ValueError):
+            info.duration = 0.0
+        try:
+            info.bitrate = int(media_format['bit_rate']) if media_format.get('bit_rate') else None
+        except (TypeError, ValueError):
+            info.bitrate = None
+        return info
+
+
+class MediaProbe:
+    """Analiza blobs con ffprobe una vez y reutiliza el resultado"""
+
+    CACHE_PREFIX = 'media_probe:'
+    CACHE_TTL = 60 * 60 * 24 * 30  # 30 días
+
+    @staticmethod
+    def probe_file(path: str) -> MediaInfo:
+        """
+        Ejecuta un único ffprobe sobre un archivo local o URL
+
+        Returns:
+            MediaInfo (con probed=False y valores por defecto si ffprobe falla)
+        """
+        try:
+            result = subprocess.run(
+                [
+                    'ffprobe',
+                    '-v', 'error',
+                    '-print_format', 'json',
+                    '-show_streams',
+                    '-show_format',
+                    path
+                ],
+                capture_output=True,
+                text=True,
+                timeout=PROBE_TIMEOUT
+            )
+            if result.returncode != 0:
+                logger.warning(f"ffprobe falló para {path[:200]}: {result.stderr}")
+                return MediaInfo()
+            return MediaInfo.from_ffprobe(json.loads(result.stdout or '{}'))
+        except FileNotFoundError:
+            logger.warning("ffprobe no está instalado. Usando valores por defecto.")
+        except Exception as e:
+            logger.warning(f"Error al analizar {path[:200]}: {e}")
+        return MediaInfo()
+
+    @classmethod
+    def _cache_key(cls, gcs_path: str) -> str:
+        return f"{cls.CACHE_PREFIX}{hashlib.sha1(gcs_path.encode('utf-8')).hexdigest()}"
+
+    @classmethod
+    def remember(cls, gcs_path: str, info: MediaInfo) -> MediaInfo:
+        """Guarda el análisis de un blob (solo si ffprobe funcionó)"""
+        if info.probed and gcs_path:
+            info.source = gcs_path
+            cache.set(cls._cache_key(gcs_path), info.to_dict(), timeout=cls.CACHE_TTL)
+        return info
+
+    @classmethod
+    def cached(cls, gcs_path: str) -> Optional[MediaInfo]:
+        """Análisis ya conocido de un blob (sin lanzar ffprobe)"""
+        data = cache.get(cls._cache_key(gcs_path)) if gcs_path else None
+        return MediaInfo.from_dict(data) if data else None
+
+    @classmethod
+    def for_blob(cls, gcs_path: str, local_path: Optional[str] = None) -> MediaInfo:
+        """
+        Análisis de un blob: caché, o ffprobe sobre la copia local si la hay
+        (si no, sobre una URL firmada: ffprobe solo lee las cabeceras)
+        """
+        info = cls.cached(gcs_path)
+        if info:
+            return info
+        target = local_path or gcs_storage.get_signed_url(gcs_path, expiration=900)
+        return cls.remember(gcs_path, cls.probe_file(target))
+
+    # ----------------
+    # FILAS (Video, Audio, Scene)
+    # ----------------
+
+    @staticmethod
+    def stored(obj, asset: str = 'file') -> Optional[MediaInfo]:
+        """Análisis guardado en la fila para el blob actual del asset (sin ffprobe ni caché)"""
+        gcs_path = getattr(obj, ASSET_FIELDS[asset], None)
+        data = ((obj.metadata or {}).get('media_info') or {}).get(asset)
+        if gcs_path and data and data.get('source') == gcs_path:
+            return MediaInfo.from_dict(data)
+        return None
+
+    @classmethod
+    def lookup(cls, obj, asset: str = 'file') -> Optional[MediaInfo]:
+        """Análisis conocido del asset (fila o caché), guardándolo en la fila si venía de la caché"""
+        info = cls.stored(obj, asset)
+        if info:
+            return info
+        info = cls.cached(getattr(obj, ASSET_FIELDS[asset], None))
+        if info:
+            cls.record(obj, asset, info)
+        return info
+
+    @classmethod
+    def for_asset(cls, obj, asset: str = 'file', local_path: Optional[str] = None) -> MediaInfo:
+        """Análisis del asset de una fila; lo calcula y lo guarda si no se conocía"""
+        info = cls.lookup(obj, asset)
+        if info:
+            return info
+        info = cls.for_blob(getattr(obj, ASSET_FIELDS[asset]), local_path=local_path)
+        if info.probed:
+            cls.record(obj, asset, info)
+        return info
+
+    @staticmethod
+    def record(obj, asset: str, info: MediaInfo):
+        """Guarda el análisis en metadata['media_info'][asset] sin pisar otros cambios de metadata"""
+        if not info.probed:
+            return
+        model = type(obj)
+        with transaction.atomic():
+            current = model.objects.select_for_update().only('metadata').get(pk=obj.pk)
+            metadata = current.metadata or {}
+            metadata.setdefault('media_info', {})[asset] = info.to_dict()
+            model.objects.filter(pk=obj.pk).update(metadata=metadata)
+        if obj.metadata is None:
+            obj.metadata = {}
+        obj.metadata.setdefault('media_info', {})[asset] = info.to_dict()
@@ -0,0 +1,327 @@
+"""
+Pre-generación especulativa del paso "Configurar escenas" del agente
+
+Cuando un Script del agente pasa a completed (escenas creadas), se adelanta en
+segundo plano lo que el usuario pediría después en AgentConfigureView:
+
+    - Previews de las escenas (generate_scene_preview_task) con prioridad baja,
+      solo en huecos libres del plan del usuario y hasta un presupuesto diario
+      de créditos por usuario (PREFETCH_CREDIT_BUDGET).
+    - Validación de todos los avatares/voces de HeyGen del script en una sola
+      consulta de cada lista (VoiceValidator.validate_many).
+    - Estimación de la duración TTS de cada escena (AudioDurationCalculator).
+
+Cada escena guarda su estado en metadata['prefetch']. La preview especulativa
+lleva la huella de los campos que usa su prompt; si la escena cambia antes de
+que se genere, la tarea se cancela (al guardar la configuración o, como muy
+tarde, al arrancar en el worker) y el presupuesto reservado se devuelve.
+"""
+import hashlib
+import json
+import logging
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+HEYGEN_SERVICES = ('heygen', 'heygen_v2', 'heygen_avatar_v2', 'heygen_avatar_iv')
+
+
+class SpeculativePrefetch:
+    """Pre-genera previews, validaciones y estimaciones TTS de un script del agente"""
+
+    SCHEDULE_PREFIX = 'prefetch:scheduled:'
+    BUDGET_PREFIX = 'prefetch:spent:'
+    # Créditos guardados en centésimas para usar incr/decr atómicos de la caché
+    BUDGET_SCALE = 100
+
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, 'PREFETCH_ENABLED', True)
+
+    # ----------------
+    # PROGRAMACIÓN
+    # ----------------
+
+    @classmethod
+    def schedule(cls, script) -> bool:
+        """
+        Encola la pre-generación de un script con escenas (tras el commit)
+
+        Returns:
+            False si está desactivada (el llamador mantiene el flujo anterior)
+        """
+        if not cls.enabled() or not script.agent_flow:
+            return False
+
+        # Un único prefetch por script aunque el webhook llegue dos veces
+        if not cache.add(f"{cls.SCHEDULE_PREFIX}{script.id}", 1, timeout=60 * 10):
+            return True
+
+        from core.tasks import prefetch_script_task
+        transaction.on_commit(lambda: prefetch_script_task.delay(script.id))
+        return True
+
+    @classmethod
+    def run(cls, script_id) -> Dict:
+        """Ejecuta la pre-generación de un script (en el worker)"""
+        from core.models import Script
+
+        script = Script.objects.select_related('created_by').get(id=script_id)
+        scenes = list(script.db_scenes.all().order_by('order'))
+
+        validation = cls._validate_resources(script, scenes)
+        estimates = cls._estimate_tts(script, scenes)
+        previews = cls._enqueue_previews(script, scenes) if script.generate_previews else 0
+
+        logger.info(
+            f"Pre-generación de script {script_id}: {len(estimates)} estimaciones TTS, "
+            f"{validation} recursos validados, {previews} previews encoladas"
+        )
+        return {'validated': validation, 'estimates': len(estimates), 'previews': previews}
+
+    # ----------------
+    # VALIDACIÓN Y TTS
+    # ----------------
+
+    @classmethod
+    def _validate_resources(cls, script, scenes) -> int:
+        """Valida en lote los avatares y voces de HeyGen del script"""
+        from core.services.voice_validator import VoiceValidator
+
+        preferences = script.model_preferences or {}
+        avatar_ids = [preferences.get('default_heygen_avatar_id')]
+        voice_ids = [preferences.get('default_heygen_voice_id')]
+        heygen_scenes = [scene for scene in scenes if scene.ai_service in HEYGEN_SERVICES]
+        for scene in heygen_scenes:
+            avatar_ids.append((scene.ai_config or {}).get('avatar_id'))
+            voice_ids.append((scene.ai_config or {}).get('voice_id'))
+
+        if not any(avatar_ids) and not any(voice_ids):
+            return 0
+
+        try:
+            results = VoiceValidator.validate_many(voice_ids=voice_ids, avatar_ids=avatar_ids)
+        except Exception as e:
+            logger.warning(f"No se pudieron validar en lote los recursos del script {script.id}: {e}")
+            return 0
+
+        for scene in heygen_scenes:
+            config = scene.ai_config or {}
+            cls._record(scene, validation={
+                'avatar': results['avatars'].get(config.get('avatar_id')),
+                'voice': results['voices'].get(config.get('voice_id')),
+            })
+        return len(results['voices']) + len(results['avatars'])
+
+    @staticmethod
+    def estimate_tts(scene, language: str) -> Dict:
+        """Estimación de la duración TTS del texto de la escena frente a su duración"""
+        from core.services.audio_duration_calculator import AudioDurationCalculator
+
+        validation = AudioDurationCalculator.validate_text_length(
+            text=scene.script_text,
+            duration_sec=scene.duration_sec,
+            language=language,
+            speed=getattr(settings, 'ELEVENLABS_DEFAULT_SPEED', 1.0)
+        )
+        return {
+            'estimated_duration': round(validation['estimated_duration'], 2),
+            'target_duration': scene.duration_sec,
+            'valid': validation['valid'],
+            'recommendation': validation['recommendation'],
+            'words_count': validation['words_count'],
+        }
+
+    @classmethod
+    def _estimate_tts(cls, script, scenes) -> Dict:
+        language = script.language or 'es'
+        estimates = {}
+        for scene in scenes:
+            if not scene.script_text or not scene.duration_sec:
+                continue
+            estimates[scene.id] = cls.estimate_tts(scene, language)
+            cls._record(scene, tts=estimates[scene.id])
+        return estimates
+
+    # ----------------
+    # PREVIEWS
+    # ----------------
+
+    @staticmethod
+    def fingerprint(scene) -> str:
+        """Huella de los campos de la escena que usa el prompt de la preview"""
+        payload = json.dumps(
+            [scene.summary, scene.script_text, scene.visual_prompt, scene.broll],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def _enqueue_previews(cls, script, scenes) -> int:
+        """Encola previews de escenas sin preview en los huecos libres del plan del usuario"""
+        from core.services.credits import CreditService
+        from core.services.progress_bus import ProgressBus
+        from core.services.queue import QueueService
+        from core.services.scheduler import provider_scheduler
+
+        user = script.created_by
+        if not user:
+            return 0
+
+        pending = [
+            scene for scene in scenes
+            if scene.preview_image_status == 'pending' and not scene.preview_image_gcs_path
+        ]
+        running = [entry for entry in ProgressBus.active_tasks(user.id) if not entry.get('held')]
+        # Lo especulativo nunca deja tareas retenidas por delante de las del usuario
+        slots = provider_scheduler.user_concurrency(user) - len(running)
+        cost = CreditService.estimate_image_cost()
+
+        enqueued = 0
+        for scene in pending[:max(slots, 0)]:
+            if not CreditService.has_enough_credits(user, cost) or not cls.reserve_budget(user.id, cost):
+                logger.info(f"Presupuesto de pre-generación agotado para usuario {user.id}")
+                break
+
+            fingerprint = cls.fingerprint(scene)
+            try:
+                task = QueueService.enqueue_generation(
+                    item=scene,
+                    user=user,
+                    task_type='scene_preview',
+                    metadata={'speculative': True, 'fingerprint': fingerprint, 'cost': str(cost)},
+                    priority=getattr(settings, 'PREFETCH_PRIORITY', 1)
+                )
+            except ValueError as e:
+                cls.refund_budget(user.id, cost)
+                logger.info(f"Pre-generación de previews detenida para usuario {user.id}: {e}")
+                break
+
+            cls._record(scene, preview={'task_uuid': str(task.uuid), 'fingerprint': fingerprint})
+            enqueued += 1
+        return enqueued
+
+    @classmethod
+    def stale_reason(cls, scene, task) -> Optional[str]:
+        """Motivo para descartar una preview especulativa antes de generarla (None si sigue vigente)"""
+        metadata = task.metadata or {}
+        if scene.preview_image_status in ('generating', 'completed'):
+            return 'La escena ya tiene preview'
+        # Sin task_uuid todavía si el worker arranca antes de que se apunte: decide la huella
+        preview = ((scene.metadata or {}).get('prefetch') or {}).get('preview') or {}
+        if preview.get('task_uuid') and preview['task_uuid'] != str(task.uuid):
+            return 'Preview especulativa reemplazada'
+        if metadata.get('fingerprint') != cls.fingerprint(scene):
+            return 'La configuración de la escena cambió'
+        return None
+
+    @classmethod
+    def release(cls, task, reason: str = None):
+        """Devuelve el presupuesto de una preview especulativa que no llegó a cobrarse"""
+        metadata = task.metadata or {}
+        if metadata.get('speculative') and metadata.get('cost'):
+            cls.refund_budget(task.user_id, Decimal(metadata['cost']))
+            if reason:
+                logger.info(f"Preview especulativa {task.uuid} descartada: {reason}")
+
+    @classmethod
+    def on_scene_changed(cls, scene):
+        """
+        Tras editar una escena: cancela su preview especulativa si ya no
+        corresponde y recalcula la estimación TTS
+        """
+        from core.models import GenerationTask
+        from core.services.queue import QueueService
+
+        prefetch = (scene.metadata or {}).get('prefetch') or {}
+        preview = prefetch.get('preview') or {}
+        if preview.get('task_uuid') and preview.get('fingerprint') != cls.fingerprint(scene):
+            task = GenerationTask.objects.filter(
+                uuid=preview['task_uuid'], status='queued'
+            ).first()
+            if task and QueueService.cancel_task(task.uuid, reason='La configuración de la escena cambió'):
+                cls.release(task)
+            cls._record(scene, preview=None)
+
+        if 'validation' in prefetch:
+            cls._record(scene, validation=cls._validate_scene(scene))
+
+        if 'tts' in prefetch and scene.script_text and scene.duration_sec:
+            language = (scene.script.language if scene.script else None) or 'es'
+            cls._record(scene, tts=cls.estimate_tts(scene, language))
+
+    @staticmethod
+    def _validate_scene(scene) -> Optional[Dict]:
+        """Valida el avatar y la voz de HeyGen de una escena (None si no aplica o falla)"""
+        from core.services.voice_validator import VoiceValidator
+
+        config = scene.ai_config or {}
+        if scene.ai_service not in HEYGEN_SERVICES or not (config.get('avatar_id') or config.get('voice_id')):
+            return None
+        try:
+            results = VoiceValidator.validate_many(
+                voice_ids=[config.get('voice_id')], avatar_ids=[config.get('avatar_id')]
+            )
+        except Exception as e:
+            logger.warning(f"No se pudo validar la escena {scene.id}: {e}")
+            return None
+        return {
+            'avatar': results['avatars'].get(config.get('avatar_id')),
+            'voice': results['voices'].get(config.get('voice_id')),
+        }
+
+    # ----------------
+    # PRESUPUESTO
+    # ----------------
+
+    @classmethod
+    def _budget_key(cls, user_id) -> str:
+        return f"{cls.BUDGET_PREFIX}{user_id}:{date.today().isoformat()}"
+
+    @classmethod
+    def reserve_budget(cls, user_id, cost) -> bool:
+        """Reserva créditos del presupuesto diario de pre-generación del usuario"""
+        budget = Decimal(str(getattr(settings, 'PREFETCH_CREDIT_BUDGET', 20)))
+        amount = int(Decimal(str(cost)) * cls.BUDGET_SCALE)
+        key = cls._budget_key(user_id)
+        cache.add(key, 0, timeout=60 * 60 * 48)
+        spent = cache.incr(key, amount)
+        if spent > budget * cls.BUDGET_SCALE:
+            cache.decr(key, amount)
+            return False
+        return True
+
+    @classmethod
+    def refund_budget(cls, user_id, cost):
+        try:
+            cache.decr(cls._budget_key(user_id), int(Decimal(str(cost)) * cls.BUDGET_SCALE))
+        except ValueError:
+            # La clave ya expiró (cambio de día)
+            pass
+
+    # ----------------
+    # METADATA
+    # ----------------
+
+    @staticmethod
+    def _record(scene, **values):
+        """Guarda valores en metadata['prefetch'] sin pisar otros cambios de metadata (None borra)"""
+        from core.models import Scene
+
+        with transaction.atomic():
+            current = Scene.objects.select_for_update().only('metadata').get(pk=scene.pk)
+            metadata = current.metadata or {}
+            prefetch = metadata.setdefault('prefetch', {})
+            for key, value in values.items():
+                if value is None:
+                    prefetch.pop(key, None)
+                else:
+                    prefetch[key] = value
+            Scene.objects.filter(pk=scene.pk).update(metadata=metadata)
+        scene.metadata = metadata
@@ -0,0 +1,352 @@
+"""
+Bus de progreso en tiempo real para tareas de generación
+
+Un único canal tipado sobre la capa de Channels/Redis existente:
+
+    queued → processing → (progress N%)* → completed | failed | cancelled
+
+Publicadores: GenerationTask (cambios de estado) y las tareas de Celery
+(porcentaje y etapa). Cada evento se envía al grupo del usuario
+(notifications_user_{id}, al que ya se une NotificationConsumer) y, si el item
+pertenece a un proyecto, al grupo del proyecto (progress_project_{id}).
+
+Además se guarda un snapshot del último evento de cada item en la caché
+(Redis), de modo que los endpoints de polling sirven de fallback barato sin
+consultar el ORM ni al proveedor. Las tareas activas de cada usuario se
+indexan en un hash de Redis (HSET/HDEL por tarea, sin leer-modificar-escribir).
+"""
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+TERMINAL_STATES = ('completed', 'failed', 'cancelled')
+ACTIVE_STATES = ('queued', 'processing')
+
+STATUS_DISPLAY = {
+    'queued': 'En Cola',
+    'processing': 'Procesando',
+    'completed': 'Completado',
+    'failed': 'Fallido',
+    'cancelled': 'Cancelado',
+}
+
+TASK_TYPE_DISPLAY = {
+    'video': 'Video',
+    'image': 'Imagen',
+    'audio': 'Audio',
+    'scene': 'Escena',
+}
+
+
+class ProgressBus:
+    """Publica eventos de progreso y mantiene sus snapshots en caché"""
+
+    SNAPSHOT_PREFIX = 'progress:item:'
+    ACTIVE_PREFIX = 'progress:active:'
+    SNAPSHOT_TTL = 60 * 60 * 6  # 6 horas
+    # El índice de tareas activas se reconstruye desde la BD como mucho cada ACTIVE_TTL
+    # (acota el efecto de una actualización que llegue durante la reconstrucción)
+    ACTIVE_TTL = 120
+    ACTIVE_LIMIT = 50
+
+    _redis = None
+
+    # ----------------
+    # GRUPOS
+    # ----------------
+
+    @staticmethod
+    def user_group(user_id) -> str:
+        return f'notifications_user_{user_id}'
+
+    @staticmethod
+    def project_group(project_id) -> str:
+        return f'progress_project_{project_id}'
+
+    # ----------------
+    # SNAPSHOTS
+    # ----------------
+
+    @classmethod
+    def _snapshot_key(cls, item_type: str, item_uuid) -> str:
+        return f"{cls.SNAPSHOT_PREFIX}{item_type}:{item_uuid}"
+
+    @classmethod
+    def get_snapshot(cls, item_type: str, item_uuid) -> Optional[Dict]:
+        """Último evento publicado para un item (None si no hay)"""
+        try:
+            return cache.get(cls._snapshot_key(item_type, item_uuid))
+        except Exception as e:
+            logger.debug(f"No se pudo leer snapshot de progreso: {e}")
+            return None
+
+    @classmethod
+    def _client(cls):
+        if cls._redis is None:
+            import redis
+            cls._redis = redis.Redis.from_url(
+                settings.SCHEDULER_REDIS_URL, socket_timeout=2, socket_connect_timeout=2
+            )
+        return cls._redis
+
+    @classmethod
+    def reset(cls):
+        """Descarta la conexión (se llama en el hijo tras un fork)"""
+        cls._redis = None
+
+    @classmethod
+    def _active_key(cls, user_id) -> str:
+        return f"{cls.ACTIVE_PREFIX}{user_id}"
+
+    @classmethod
+    def _active_built_key(cls, user_id) -> str:
+        # Marca de que el hash refleja la BD; sin ella se reconstruye
+        return f"{cls.ACTIVE_PREFIX}{user_id}:built"
+
+    @classmethod
+    def _active_from_db(cls, user_id) -> Dict[str, Dict]:
+        from core.models import GenerationTask
+        tasks = GenerationTask.objects.filter(
+            user_id=user_id,
+            status__in=ACTIVE_STATES
+        ).order_by('-created_at')[:cls.ACTIVE_LIMIT]
+        return {str(task.uuid): cls.task_entry(task) for task in tasks}
+
+    @classmethod
+    def active_tasks(cls, user_id) -> List[Dict]:
+        """
+        Tareas en cola o procesando del usuario (más recientes primero, como
+        mucho ACTIVE_LIMIT)
+
+        Se sirven desde el hash de Redis; si no está construido se reconstruye
+        con una consulta a la BD.
+        """
+        try:
+            client = cls._client()
+            key = cls._active_key(user_id)
+            if client.exists(cls._active_built_key(user_id)):
+                entries = {
+                    field.decode(): json.loads(value) for field, value in client.hgetall(key).items()
+                }
+            else:
+                entries = cls._active_from_db(user_id)
+                pipe = client.pipeline()
+                pipe.delete(key)
+                if entries:
+                    pipe.hset(key, mapping={uuid: json.dumps(entry) for uuid, entry in entries.items()})
+                    pipe.expire(key, cls.ACTIVE_TTL * 2)
+                pipe.set(cls._active_built_key(user_id), 1, ex=cls.ACTIVE_TTL)
+                pipe.execute()
+        except Exception as e:
+            logger.debug(f"Índice de tareas activas no disponible en Redis: {e}")
+            entries = cls._active_from_db(user_id)
+
+        active = sorted(entries.values(), key=lambda e: e['created_at'], reverse=True)
+        return active[:cls.ACTIVE_LIMIT]
+
+    @staticmethod
+    def active_count(user_id) -> int:
+        """Número total de tareas en cola o procesando del usuario (sin el tope de active_tasks)"""
+        from core.models import GenerationTask
+        return GenerationTask.objects.filter(user_id=user_id, status__in=ACTIVE_STATES).count()
+
+    @classmethod
+    def _update_active(cls, user_id, task_uuid: str, entry: Optional[Dict]):
+        client = cls._client()
+        if not client.exists(cls._active_built_key(user_id)):
+            # Sin índice: se reconstruirá desde la BD en la próxima lectura
+            return
+        key = cls._active_key(user_id)
+        if entry is None:
+            client.hdel(key, task_uuid)
+        else:
+            pipe = client.pipeline()
+            pipe.hset(key, task_uuid, json.dumps(entry))
+            pipe.expire(key, cls.ACTIVE_TTL * 2)
+            pipe.execute()
+
+    @staticmethod
+    def task_entry(task) -> Dict:
+        """Representación de una GenerationTask para el dropdown de colas activas"""
+        metadata = task.metadata or {}
+        return {
+            'uuid': str(task.uuid),
+            'task_type': task.task_type,
+            'task_type_display': TASK_TYPE_DISPLAY.get(task.task_type, task.task_type),
+            'status': task.status,
+            'status_display': STATUS_DISPLAY.get(task.status, task.status),
+            'prompt': metadata.get('prompt'),
+            'text': metadata.get('text'),
+            'item_uuid': metadata.get('item_uuid') or str(task.item_uuid),
+            'provider': metadata.get('provider'),
+            'held': bool(metadata.get('held')),
+            'created_at': task.created_at.timestamp() if task.created_at else time.time(),
+        }
+
+    # ----------------
+    # PUBLICACIÓN
+    # ----------------
+
+    @classmethod
+    def publish(
+        cls,
+        user_id,
+        item_type: str,
+        item_uuid,
+        status: str,
+        progress: Optional[int] = None,
+        task_uuid=None,
+        project_id=None,
+        stage: Optional[str] = None,
+        url: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> Dict:
+        """
+        Publica un evento de progreso
+
+        Args:
+            user_id: Usuario propietario
+            item_type: 'video', 'image', 'audio' o 'scene'
+            item_uuid: UUID del item (o id para escenas)
+            status: queued, processing, completed, failed o cancelled
+            progress: Porcentaje 0-100 (se conserva el anterior si es None)
+            task_uuid: UUID de la GenerationTask
+            project_id: Proyecto del item (para el grupo del proyecto)
+            stage: Etapa legible (downloading, encoding...)
+            url: URL firmada del resultado (en completed)
+            error: Mensaje de error (en failed)
+
+        Returns:
+            Evento publicado
+        """
+        previous = cls.get_snapshot(item_type, item_uuid) or {}
+        if progress is None:
+            progress = 100 if status == 'completed' else previous.get('progress', 0)
+
+        event = {
+            'item_type': item_type,
+            'item_uuid': str(item_uuid),
+            'task_uuid': str(task_uuid) if task_uuid else previous.get('task_uuid'),
+            'status': status,
+            'progress': int(progress),
+            'stage': stage,
+            'url': url or previous.get('url'),
+            'error': error,
+            'project_id': project_id or previous.get('project_id'),
+            'updated_at': time.time(),
+        }
+
+        try:
+            cache.set(cls._snapshot_key(item_type, item_uuid), event, cls.SNAPSHOT_TTL)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar snapshot de progreso: {e}")
+
+        cls._send(user_id, event['project_id'], event)
+        return event
+
+    @classmethod
+    def publish_task(cls, task, progress: Optional[int] = None, stage: Optional[str] = None) -> Dict:
+        """
+        Publica el estado actual de una GenerationTask
+
+        En completed incluye la URL firmada del resultado, así el cliente no
+        necesita volver a pedir el item.
+        """
+        item_type = task.task_type
+        item_ref = cls._item_ref(task)
+        project_id, url = cls._resolve_item(item_type, item_ref, with_url=task.status == 'completed')
+
+        event = cls.publish(
+            user_id=task.user_id,
+            item_type=item_type,
+            item_uuid=item_ref,
+            status=task.status,
+            progress=progress,
+            task_uuid=task.uuid,
+            project_id=project_id,
+            stage=stage,
+            url=url,
+            error=task.error_message if task.status == 'failed' else None,
+        )
+
+        try:
+            if task.status in ACTIVE_STATES:
+                cls._update_active(task.user_id, str(task.uuid), cls.task_entry(task))
+            else:
+                cls._update_active(task.user_id, str(task.uuid), None)
+        except Exception as e:
+            logger.debug(f"No se pudo actualizar índice de tareas activas: {e}")
+
+        return event
+
+    @staticmethod
+    def _item_ref(task):
+        """Identificador del item: UUID, salvo escenas (id numérico en metadata)"""
+        metadata = task.metadata or {}
+        if task.task_type == 'scene' and metadata.get('item_id'):
+            return metadata['item_id']
+        return metadata.get('item_uuid') or task.item_uuid
+
+    @staticmethod
+    def _resolve_item(item_type: str, item_ref, with_url: bool = False):
+        """(project_id, signed_url) del item con una consulta de columnas"""
+        from core.models import Video, Image, Audio, Scene
+
+        try:
+            if item_type == 'scene':
+                row = Scene.objects.filter(id=item_ref).values_list(
+                    'project_id', 'final_video_gcs_path', 'video_gcs_path'
+                ).first()
+                if not row:
+                    return None, None
+                project_id, final_path, video_path = row
+                gcs_path = final_path or video_path
+            else:
+                model = {'video': Video, 'image': Image, 'audio': Audio}.get(item_type)
+                if model is None:
+                    return None, None
+                row = model.objects.filter(uuid=item_ref).values_list('project_id', 'gcs_path').first()
+                if not row:
+                    return None, None
+                project_id, gcs_path = row
+
+            url = None
+            if with_url and gcs_path:
+                from core.storage.gcs import gcs_storage
+                url = gcs_storage.get_signed_url(gcs_path, expiration=3600)
+            return project_id, url
+        except Exception as e:
+            logger.debug(f"No se pudo resolver item {item_type}:{item_ref} para progreso: {e}")
+            return None, None
+
+    @classmethod
+    def _send(cls, user_id, project_id, event: Dict):
+        from channels.layers import get_channel_layer
+        from asgiref.sync import async_to_sync
+
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+
+        message = {'type': 'task_progress', 'event': event}
+        groups = [cls.user_group(user_id)]
+        if project_id:
+            groups.append(cls.project_group(project_id))
+
+        for group in groups:
+            try:
+                async_to_sync(channel_layer.group_send)(group, message)
+            except Exception as e:
+                logger.warning(f"Error enviando progreso a {group}: {e}")
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ProgressBus.reset)
@@ -0,0 +1,243 @@
+"""
+Caché de remixes de Prompt Templates y contador de uso por lotes
+
+apply_prompt_template combina template + prompt del usuario con un LLM. El
+resultado se reutiliza mientras no cambie el template:
+
+    clave = uuid del template + versión (updated_at) + hash del prompt normalizado
+
+Se busca primero en un LRU en proceso (con TTL) y después en la caché de Django
+(compartida entre procesos). Los datos del template (texto, nombre, versión)
+se cachean igual y se invalidan al guardar o borrar el template; en otros
+procesos el LRU puede servir la versión anterior durante SNAPSHOT_LOCAL_TTL.
+
+El uso de cada template se acumula en Redis (HINCRBY) y una tarea periódica lo
+vuelca a PromptTemplate.usage_count, de modo que generar no escribe en la BD.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class PromptRemixCache:
+    """Remixes y datos de templates en LRU en proceso + caché de Django"""
+
+    REMIX_PREFIX = 'prompt_remix:v1:'
+    TEMPLATE_PREFIX = 'prompt_template:snapshot:'
+    TEMPLATE_TTL = 60 * 60
+    # Segundos que el LRU sirve los datos de un template sin volver a la caché
+    SNAPSHOT_LOCAL_TTL = 30
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or getattr(settings, 'PROMPT_REMIX_CACHE_SIZE', 1024)
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, 'PROMPT_REMIX_CACHE_ENABLED', True)
+
+    @property
+    def ttl(self) -> int:
+        return getattr(settings, 'PROMPT_REMIX_CACHE_TTL', 60 * 60 * 24 * 7)
+
+    # ----------------
+    # LRU EN PROCESO
+    # ----------------
+
+    def _local_get(self, key: str):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            value, valid_until = entry
+            if valid_until <= time.time():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key: str, value, ttl: int):
+        with self._lock:
+            self._local[key] = (value, time.time() + ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def reset(self):
+        """Vacía el LRU (se llama en el hijo tras un fork)"""
+        with self._lock:
+            self._local.clear()
+
+    # ----------------
+    # TEMPLATES
+    # ----------------
+
+    @staticmethod
+    def snapshot_of(template) -> Dict:
+        """Datos del template necesarios para el remix"""
+        return {
+            'uuid': str(template.uuid),
+            'name': template.name,
+            'prompt_text': template.prompt_text,
+            'version': str(int(template.updated_at.timestamp() * 1_000_000)) if template.updated_at else '0',
+        }
+
+    def template(self, template_id) -> Optional[Dict]:
+        """
+        Datos de un template activo (None si no existe o está inactivo)
+
+        Solo consulta la BD si no está ni en el LRU ni en la caché de Django.
+        """
+        from core.models import PromptTemplate
+
+        key = f"{self.TEMPLATE_PREFIX}{template_id}"
+        snapshot = self._local_get(key)
+        if snapshot is not None:
+            return snapshot
+
+        snapshot = cache.get(key)
+        if snapshot is None:
+            template = PromptTemplate.objects.only(
+                'uuid', 'name', 'prompt_text', 'updated_at'
+            ).filter(uuid=template_id, is_active=True).first()
+            if template is None:
+                return None
+            snapshot = self.snapshot_of(template)
+            cache.set(key, snapshot, self.TEMPLATE_TTL)
+
+        self._local_set(key, snapshot, self.SNAPSHOT_LOCAL_TTL)
+        return snapshot
+
+    def invalidate_template(self, template_id):
+        """Olvida los datos del template (los remixes antiguos caducan por versión)"""
+        key = f"{self.TEMPLATE_PREFIX}{template_id}"
+        with self._lock:
+            self._local.pop(key, None)
+        cache.delete(key)
+
+    # ----------------
+    # REMIXES
+    # ----------------
+
+    @staticmethod
+    def normalize(user_prompt: str) -> str:
+        return ' '.join((user_prompt or '').split())
+
+    def _remix_key(self, snapshot: Dict, user_prompt: str) -> str:
+        digest = hashlib.sha256(self.normalize(user_prompt).encode('utf-8')).hexdigest()
+        return f"{self.REMIX_PREFIX}{snapshot['uuid']}:{snapshot['version']}:{digest}"
+
+    def get(self, snapshot: Dict, user_prompt: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = self._remix_key(snapshot, user_prompt)
+        remix = self._local_get(key)
+        if remix is not None:
+            return remix
+        remix = cache.get(key)
+        if remix is not None:
+            self._local_set(key, remix, self.ttl)
+        return remix
+
+    def set(self, snapshot: Dict, user_prompt: str, remix: str):
+        if not self.enabled or not remix:
+            return
+        key = self._remix_key(snapshot, user_prompt)
+        cache.set(key, remix, self.ttl)
+        self._local_set(key, remix, self.ttl)
+
+
+class TemplateUsageCounter:
+    """Usos de templates acumulados en Redis y volcados por lotes a la BD"""
+
+    PENDING_KEY = 'prompt_template:usage'
+    FLUSHING_KEY = 'prompt_template:usage:flushing'
+
+    def __init__(self):
+        self._redis = None
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                settings.SCHEDULER_REDIS_URL, socket_timeout=2, socket_connect_timeout=2
+            )
+        return self._redis
+
+    def reset(self):
+        """Descarta la conexión (se llama en el hijo tras un fork)"""
+        self._redis = None
+
+    @staticmethod
+    def _apply(template_id, count: int):
+        from core.models import PromptTemplate
+        PromptTemplate.objects.filter(uuid=template_id).update(usage_count=F('usage_count') + count)
+
+    def incr(self, template_id):
+        """Apunta un uso; si Redis no responde, lo escribe directamente en la BD"""
+        try:
+            self._client().hincrby(self.PENDING_KEY, str(template_id), 1)
+        except Exception as e:
+            logger.warning(f"No se pudo acumular el uso del template {template_id} en Redis: {e}")
+            try:
+                self._apply(template_id, 1)
+            except Exception as db_error:
+                logger.error(f"Error incrementando uso del template {template_id}: {db_error}")
+
+    def flush(self) -> int:
+        """
+        Vuelca los usos acumulados a PromptTemplate.usage_count
+
+        El hash pendiente se renombra antes de leerlo, así los usos que llegan
+        durante el volcado quedan para la siguiente ronda. Si una ronda anterior
+        se interrumpió, primero se termina la suya.
+
+        Returns:
+            Número de templates actualizados
+        """
+        import redis
+
+        client = self._client()
+        if not client.exists(self.FLUSHING_KEY):
+            try:
+                client.rename(self.PENDING_KEY, self.FLUSHING_KEY)
+            except redis.ResponseError:
+                # No hay usos pendientes
+                return 0
+
+        counts = client.hgetall(self.FLUSHING_KEY)
+        updated = 0
+        for template_id, count in counts.items():
+            template_id = template_id.decode() if isinstance(template_id, bytes) else template_id
+            count = int(count)
+            if count > 0:
+                self._apply(template_id, count)
+                updated += 1
+            # Quitar cada template al volcarlo: un reintento no lo cuenta dos veces
+            client.hdel(self.FLUSHING_KEY, template_id)
+        client.delete(self.FLUSHING_KEY)
+        return updated
+
+
+prompt_remix_cache = PromptRemixCache()
+template_usage = TemplateUsageCounter()
+
+
+def _reset_after_fork():
+    prompt_remix_cache.reset()
+    template_usage.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -6,10 +6,17 @@ import uuid
 from typing import Optional, Dict, Any
 from django.contrib.auth.models import User
 from celery import current_app
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from core.models import GenerationTask, Video, Image, Audio, Scene
+from core.services.scheduler import provider_scheduler
 
 logger = logging.getLogger(__name__)
 
+ADMIT_LOCK_KEY = 'queue:admit_held:lock'
+ACTIVE_STATUSES = ['queued', 'processing']
+
 
 class QueueService:
     """Servicio para encolar tareas de generación"""
@@ -41,6 +48,11 @@ class QueueService:
             'queue': 'scene_processing',
             'priority': 5,
         },
+        'video_compose': {
+            'task': 'core.tasks.compose_final_video_task',
+            'queue': 'scene_processing',
+            'priority': 5,
+        },
         'image_upscale': {
             'task': 'core.tasks.upscale_image_task',
             'queue': 'image_generation',
@@ -48,6 +60,21 @@ class QueueService:
         },
     }
     
+    # Tipos de video que se renderizan localmente (CPU) y van a su propia cola
+    # para no competir con las colas de generación: {video.type: setting con la cola}
+    VIDEO_TYPE_QUEUES = {
+        'manim_quote': 'MANIM_RENDER_QUEUE',
+    }
+    
+    @classmethod
+    def queue_for(cls, item, task_type: str) -> str:
+        """Cola de Celery de una tarea (la del tipo de tarea salvo renders locales)"""
+        if isinstance(item, Video) and item.type in cls.VIDEO_TYPE_QUEUES:
+            queue = getattr(settings, cls.VIDEO_TYPE_QUEUES[item.type], None)
+            if queue:
+                return queue
+        return cls.TASK_MAPPING[task_type]['queue']
+    
     @classmethod
     def enqueue_generation(
         cls,
@@ -99,19 +126,6 @@ class QueueService:
         else:
             raise ValueError(f"Tipo de item no soportado: {type(item)}")
         
-        # Verificar límite de tareas simultáneas por usuario
-        active_tasks = GenerationTask.objects.filter(
-            user=user,
-            status__in=['queued', 'processing']
-        ).count()
-        
-        max_concurrent = 10  # TODO: Hacer configurable por tipo de suscripción
-        if active_tasks >= max_concurrent:
-            raise ValueError(
-                f"Límite de tareas simultáneas alcanzado ({max_concurrent}). "
-                f"Tienes {active_tasks} tareas en cola o procesando."
-            )
-        
         # Guardar item_uuid en metadata para búsqueda
         task_metadata = metadata or {}
         if isinstance(item, (Image, Video, Audio)):
@@ -119,45 +133,148 @@ class QueueService:
         elif isinstance(item, Scene):
             task_metadata['item_id'] = item.id  # Scene aún no tiene uuid
         
-        # Crear GenerationTask
-        task_uuid = uuid.uuid4()
-        task = GenerationTask.objects.create(
-            uuid=task_uuid,
-            task_id=None,  # Se actualizará después de encolar (null para evitar UNIQUE constraint)
-            user=user,
-            task_type=task_type.split('_')[0],  # 'video', 'image', 'audio', 'scene'
-            item_uuid=item_uuid,
-            status='queued',
-            queue_name=config['queue'],
-            priority=priority or config['priority'],
-            metadata=task_metadata
+        # Proveedor/modelo para el control de ritmo y concurrencia en el worker
+        provider, model = provider_scheduler.classify(item, task_type)
+        task_metadata['provider'] = provider
+        task_metadata['model'] = model
+        task_metadata['celery_task'] = config['task']
+        
+        queue_name = cls.queue_for(item, task_type)
+        
+        # Límites por plan: por encima de la concurrencia del plan la tarea se retiene
+        # en cola (se despacha al liberarse huecos); solo se rechaza por encima del
+        # máximo de tareas en espera. Se cuentan las filas de la BD con la fila del
+        # usuario bloqueada, así dos encolados simultáneos no superan el límite.
+        with transaction.atomic():
+            User.objects.select_for_update().filter(pk=user.pk).first()
+            active = GenerationTask.objects.filter(user=user, status__in=ACTIVE_STATUSES)
+            active_count = active.count()
+            running_count = active.exclude(metadata__held=True).count()
+            held = cls.admission(
+                active_count, running_count,
+                concurrency=provider_scheduler.user_concurrency(user),
+                max_queued=settings.USER_MAX_QUEUED_TASKS,
+            )
+            if held:
+                task_metadata['held'] = True
+            
+            # Crear GenerationTask
+            task_uuid = uuid.uuid4()
+            task = GenerationTask.objects.create(
+                uuid=task_uuid,
+                task_id=None,  # Se actualizará después de encolar (null para evitar UNIQUE constraint)
+                user=user,
+                task_type=task_type.split('_')[0],  # 'video', 'image', 'audio', 'scene'
+                item_uuid=item_uuid,
+                status='queued',
+                queue_name=queue_name,
+                priority=priority or config['priority'],
+                metadata=task_metadata
+            )
+        
+        if held:
+            task._dispatch_status_change()
+            logger.info(
+                f"Tarea retenida por límite del plan: {task_type} para {item.__class__.__name__} {item_uuid} "
+                f"({running_count} en curso)"
+            )
+            return task
+        
+        cls._dispatch(task)
+        
+        logger.info(
+            f"Tarea encolada: {task_type} para {item.__class__.__name__} {item_uuid} "
+            f"(Task ID: {task.task_id}, Queue: {queue_name})"
         )
         
-        # Encolar tarea en Celery
+        return task
+    
+    @staticmethod
+    def admission(active_count: int, running_count: int, concurrency: int, max_queued: int) -> bool:
+        """
+        Decide si una tarea nueva se despacha o se retiene
+        
+        Args:
+            active_count: Tareas del usuario en cola o procesando (retenidas incluidas)
+            running_count: Tareas del usuario despachadas (no retenidas)
+            concurrency: Concurrencia del plan del usuario
+            max_queued: Máximo de tareas en cola o procesando
+        
+        Returns:
+            True si la tarea debe quedar retenida
+        
+        Raises:
+            ValueError: Si se alcanzó el máximo de tareas en cola
+        """
+        if active_count >= max_queued:
+            raise ValueError(
+                f"Límite de tareas en cola alcanzado ({max_queued}). "
+                f"Tienes {active_count} tareas en cola o procesando."
+            )
+        return running_count >= concurrency
+    
+    @classmethod
+    def _dispatch(cls, task: GenerationTask):
+        """Envía una GenerationTask a Celery y publica su estado"""
+        metadata = task.metadata or {}
+        
         # Para Scene, pasar el ID numérico; para otros items, pasar el UUID string
-        if isinstance(item, Scene):
-            item_identifier = item.id  # Scene usa id numérico
+        if metadata.get('item_id') is not None:
+            item_identifier = metadata['item_id']
         else:
-            item_identifier = str(item_uuid)  # Video, Image, Audio usan UUID
+            item_identifier = str(task.item_uuid)
         
         celery_task = current_app.send_task(
-            config['task'],
-            args=[str(task_uuid), item_identifier, user.id],
+            metadata['celery_task'],
+            args=[str(task.uuid), item_identifier, task.user_id],
             kwargs={},
-            queue=config['queue'],
-            priority=priority or config['priority']
+            queue=task.queue_name,
+            priority=task.priority
         )
         
         # Actualizar task_id
         task.task_id = celery_task.id
         task.save(update_fields=['task_id'])
+        task._dispatch_status_change()
+    
+    @classmethod
+    def admit_held_tasks(cls) -> int:
+        """
+        Despacha tareas retenidas por el límite del plan cuando el usuario tiene huecos
         
-        logger.info(
-            f"Tarea encolada: {task_type} para {item.__class__.__name__} {item_uuid} "
-            f"(Task ID: {celery_task.id}, Queue: {config['queue']})"
-        )
+        Returns:
+            Número de tareas despachadas
+        """
+        # Un único despachador a la vez para no enviar dos veces la misma tarea
+        if not cache.add(ADMIT_LOCK_KEY, 1, timeout=60):
+            return 0
         
-        return task
+        admitted = 0
+        try:
+            held_by_user = {}
+            for task in GenerationTask.objects.filter(
+                status='queued', metadata__held=True
+            ).select_related('user').order_by('created_at'):
+                held_by_user.setdefault(task.user_id, []).append(task)
+            
+            for user_id, held_tasks in held_by_user.items():
+                user = held_tasks[0].user
+                running = GenerationTask.objects.filter(
+                    user_id=user_id, status__in=ACTIVE_STATUSES
+                ).count() - len(held_tasks)
+                slots = provider_scheduler.user_concurrency(user) - running
+                
+                for task in held_tasks[:max(slots, 0)]:
+                    task.metadata.pop('held', None)
+                    task.save(update_fields=['metadata'])
+                    cls._dispatch(task)
+                    admitted += 1
+        finally:
+            cache.delete(ADMIT_LOCK_KEY)
+        
+        if admitted:
+            logger.info(f"{admitted} tareas retenidas despachadas")
+        return admitted
     
     @classmethod
     def cancel_task(cls, task_uuid: uuid.UUID, reason: str = None) -> bool:
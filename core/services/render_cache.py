@@ -0,0 +1,164 @@
+"""
+Caché de renders direccionada por contenido
+
+Un render (p.ej. el mux video+audio de una escena) se identifica por la huella
+de sus blobs de entrada en GCS (MD5/CRC32C, obtenidos solo con metadata) más
+los parámetros de FFmpeg usados. El resultado se guarda en una ruta de GCS
+derivada de esa clave, de modo que volver a combinar la misma pareja de
+archivos se reduce a una consulta de metadata en lugar de descargar, ejecutar
+FFmpeg y subir de nuevo.
+
+Además, el resultado local se conserva en disco hasta que la subida termina:
+si una tarea falla al subir y se reintenta en el mismo worker, no repite el
+paso de FFmpeg. Los archivos en staging que nadie llega a subir (la tarea se
+rindió o el reintento fue a otro worker) se borran pasado STAGING_TTL.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+
+from core.storage.gcs import gcs_storage
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache:
+    """Caché de renders en GCS con índice en Django cache y staging en disco local"""
+
+    CACHE_PREFIX = 'render_cache:'
+    GCS_PREFIX = 'render_cache'
+    INDEX_TTL = 60 * 60 * 24 * 7  # 7 días (la fuente de verdad es GCS)
+    LOCAL_DIR = os.path.join(tempfile.gettempdir(), 'atenea_render_cache')
+    # Antigüedad a partir de la cual un archivo en staging se considera abandonado
+    STAGING_TTL = 60 * 60 * 6
+    # Cada cuánto (como mucho) cada proceso revisa el directorio de staging
+    PURGE_INTERVAL = 60 * 10
+
+    _last_purge = 0.0
+
+    def __init__(self, kind: str, extension: str = 'mp4'):
+        """
+        Args:
+            kind: Tipo de render (namespace de la caché), p.ej. 'scene_mux'
+            extension: Extensión del archivo resultante
+        """
+        self.kind = kind
+        self.extension = extension
+
+    @staticmethod
+    def source_fingerprints(gcs_paths: List[str]) -> Optional[List[str]]:
+        """
+        Huellas de contenido de los blobs de entrada
+
+        Returns:
+            Lista de huellas en el mismo orden, o None si alguna no se puede obtener
+            (en ese caso no se usa la caché)
+        """
+        fingerprints = []
+        for gcs_path in gcs_paths:
+            fingerprint = gcs_storage.get_content_fingerprint(gcs_path)
+            if not fingerprint:
+                return None
+            fingerprints.append(fingerprint)
+        return fingerprints
+
+    def make_key(self, fingerprints: List[str], params: Dict) -> str:
+        """Clave del render: huellas de las entradas + parámetros del render"""
+        payload = json.dumps(
+            {'kind': self.kind, 'sources': fingerprints, 'params': params},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def gcs_destination(self, key: str) -> str:
+        return f"{self.GCS_PREFIX}/{self.kind}/{key[:2]}/{key}.{self.extension}"
+
+    def local_path(self, key: str) -> str:
+        """Ruta local estable del render (sobrevive a un reintento en el mismo worker)"""
+        os.makedirs(self.LOCAL_DIR, exist_ok=True)
+        self.purge_staged()
+        return os.path.join(self.LOCAL_DIR, f"{self.kind}_{key}.{self.extension}")
+
+    @classmethod
+    def purge_staged(cls, force: bool = False) -> int:
+        """
+        Borra los archivos en staging más antiguos que STAGING_TTL
+
+        El staging es local a cada worker, así que la limpieza la hace cada
+        proceso al usar la caché (como mucho una vez cada PURGE_INTERVAL).
+
+        Returns:
+            Número de archivos borrados
+        """
+        now = time.monotonic()
+        if not force and now - cls._last_purge < cls.PURGE_INTERVAL:
+            return 0
+        cls._last_purge = now
+
+        removed = 0
+        cutoff = time.time() - cls.STAGING_TTL
+        try:
+            entries = list(os.scandir(cls.LOCAL_DIR))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                # Otro proceso lo está subiendo o ya lo borró
+                pass
+        if removed:
+            logger.info(f"Render cache: {removed} archivos abandonados eliminados del staging")
+        return removed
+
+    def lookup(self, key: str) -> Optional[str]:
+        """
+        Busca un render ya subido
+
+        Returns:
+            GCS path del render o None si no existe
+        """
+        cache_key = f"{self.CACHE_PREFIX}{self.kind}:{key}"
+        gcs_path = cache.get(cache_key)
+        if gcs_path:
+            return gcs_path
+
+        destination = self.gcs_destination(key)
+        if not gcs_storage.file_exists(destination):
+            return None
+
+        bucket_name, _ = gcs_storage.parse_gcs_path(destination)
+        gcs_path = f"gs://{bucket_name}/{destination}"
+        cache.set(cache_key, gcs_path, self.INDEX_TTL)
+        return gcs_path
+
+    def store(self, key: str, local_path: str, content_type: str = 'video/mp4') -> str:
+        """
+        Sube el render a su ruta direccionada por contenido y lo indexa
+
+        El archivo local se elimina solo después de que la subida termine.
+
+        Returns:
+            GCS path del render
+        """
+        gcs_path = gcs_storage.upload_file(
+            local_path,
+            destination_path=self.gcs_destination(key),
+            content_type=content_type
+        )
+        cache.set(f"{self.CACHE_PREFIX}{self.kind}:{key}", gcs_path, self.INDEX_TTL)
+
+        try:
+            os.remove(local_path)
+        except OSError:
+            pass
+
+        return gcs_path
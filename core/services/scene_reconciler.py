@@ -0,0 +1,247 @@
+"""
+Reconciliador de escenas en segundo plano
+
+SceneStatusView consultaba al proveedor, cobraba créditos de video y audio y
+firmaba URLs en cada poll. Este módulo separa las dos responsabilidades:
+
+    - SceneReconciler (Celery Beat): único dueño de las consultas al proveedor
+      de las escenas en processing y del cobro idempotente de las escenas
+      completadas sin cobrar.
+    - scene_state(): snapshot de solo lectura para el endpoint de estado, con
+      un ETag derivado de los campos de estado y del momento en que se firmaron
+      sus URLs (el snapshot se cachea, así que un poll sin cambios no firma
+      nada, y al caducar el ETag cambia y el cliente recibe URLs nuevas).
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Scene
+
+logger = logging.getLogger(__name__)
+
+
+RECONCILER_LOCK_KEY = 'scene_reconciler:lock'
+CHECKED_PREFIX = 'scene_reconciler:checked:'
+# Escenas que no se pudieron cobrar (coste 0, sin saldo...): se reintentan más tarde
+SKIP_PREFIX = 'scene_reconciler:skip:'
+SKIP_TTL = 60 * 60
+STATE_PREFIX = 'scene_state:'
+
+# Campos que determinan el estado visible de una escena (y su ETag)
+STATE_FIELDS = (
+    'id', 'video_status', 'audio_status', 'final_video_status', 'preview_image_status',
+    'video_gcs_path', 'audio_gcs_path', 'final_video_gcs_path', 'preview_image_gcs_path',
+    'error_message', 'audio_error_message', 'updated_at',
+)
+
+# Las URLs firmadas duran 1 hora; el snapshot (y con él el ETag) caduca bastante
+# antes, así un cliente que recibe 304 nunca conserva URLs caducadas
+SIGNED_URL_EXPIRATION = 60 * 60
+STATE_TTL = 60 * 30
+
+# Solo se buscan cobros pendientes en escenas completadas recientemente
+UNCHARGED_LOOKBACK_DAYS = 7
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+# ----------------
+# SNAPSHOT DE ESTADO (lectura)
+# ----------------
+
+def scene_state(scene_id: int) -> Optional[Tuple[str, Dict]]:
+    """
+    Estado de una escena para el endpoint de polling, sin efectos secundarios
+
+    Returns:
+        (etag, payload) o None si la escena no existe
+    """
+    row = Scene.objects.filter(pk=scene_id).values(*STATE_FIELDS).first()
+    if row is None:
+        return None
+
+    fingerprint = json.dumps(row, sort_keys=True, default=str)
+    state_hash = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+    cache_key = f"{STATE_PREFIX}{scene_id}:{state_hash}"
+    cached = cache.get(cache_key)
+    if cached is None:
+        cached = {'signed_at': timezone.now().isoformat(), 'payload': _build_state_payload(row)}
+        cache.set(cache_key, cached, STATE_TTL)
+
+    # El momento de firma entra en el ETag: un snapshot regenerado nunca da 304
+    etag = hashlib.sha1(f"{state_hash}:{cached['signed_at']}".encode('utf-8')).hexdigest()
+    return etag, cached['payload']
+
+
+def _build_state_payload(row: Dict) -> Dict:
+    from core.storage.gcs import gcs_storage
+
+    assets = {
+        'preview_url': (row['preview_image_status'], row['preview_image_gcs_path']),
+        'video_url': (row['video_status'], row['video_gcs_path']),
+        'audio_url': (row['audio_status'], row['audio_gcs_path']),
+        'final_video_url': (row['final_video_status'], row['final_video_gcs_path']),
+    }
+    completed = {key: path for key, (status, path) in assets.items() if status == 'completed' and path}
+
+    signed_urls = {}
+    if completed:
+        try:
+            signed_urls = gcs_storage.get_signed_urls(list(completed.values()), expiration=SIGNED_URL_EXPIRATION)
+        except Exception as e:
+            logger.error(f"Error al generar URLs firmadas de la escena {row['id']}: {e}")
+
+    return {
+        'status': 'success',
+        'scene_id': row['id'],
+        'video_status': row['video_status'],
+        'audio_status': row['audio_status'],
+        'final_video_status': row['final_video_status'],
+        'preview_status': row['preview_image_status'],
+        'video_url': signed_urls.get(completed.get('video_url')),
+        'audio_url': signed_urls.get(completed.get('audio_url')),
+        'final_video_url': signed_urls.get(completed.get('final_video_url')),
+        'preview_url': signed_urls.get(completed.get('preview_url')),
+        'error_message': row['error_message'],
+        'audio_error_message': row['audio_error_message'],
+    }
+
+
+# ----------------
+# RECONCILIADOR (escritura)
+# ----------------
+
+class SceneReconciler:
+    """Consulta proveedores y cobra créditos de escenas fuera del ciclo de petición"""
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Ejecuta una ronda protegida por un lock distribuido
+
+        Returns:
+            Contadores de la ronda (escenas consultadas y cobros realizados)
+        """
+        if not cache.add(RECONCILER_LOCK_KEY, 1, timeout=_setting('SCENE_RECONCILER_LOCK_TIMEOUT', 120)):
+            return {}
+        try:
+            return {
+                'checked': self.check_processing(),
+                'video_charged': self.charge_completed_videos(),
+                'audio_charged': self.charge_completed_audio(),
+            }
+        finally:
+            cache.delete(RECONCILER_LOCK_KEY)
+
+    def check_processing(self) -> int:
+        """Consulta al proveedor las escenas en processing cuyo intervalo haya vencido"""
+        from core.services import SceneService
+
+        batch_size = _setting('SCENE_RECONCILER_BATCH_SIZE', 50)
+        interval = _setting('SCENE_RECONCILER_CHECK_INTERVAL', 20)
+
+        scenes = Scene.objects.select_related('script', 'script__created_by', 'project').filter(
+            video_status='processing'
+        ).exclude(external_id='').exclude(external_id__isnull=True).order_by('updated_at')[:batch_size]
+
+        checked = 0
+        scene_service = None
+        batches = set()
+        for scene in scenes:
+            # Intervalo mínimo entre consultas de la misma escena
+            if not cache.add(f"{CHECKED_PREFIX}{scene.id}", 1, timeout=interval):
+                continue
+            scene_service = scene_service or SceneService()
+            try:
+                scene_service.check_scene_video_status(scene)
+                checked += 1
+            except Exception as e:
+                logger.error(f"[SceneReconciler] Error al consultar escena {scene.id}: {e}")
+            if (scene.metadata or {}).get('storyboard_batch'):
+                batches.add(scene.metadata['storyboard_batch'])
+        
+        # Un evento de progreso agregado por storyboard y ronda
+        if batches:
+            from core.services.storyboard import StoryboardBatchService
+            for batch_id in batches:
+                StoryboardBatchService.publish_progress(batch_id)
+        return checked
+
+    def charge_completed_videos(self) -> int:
+        """Cobra los videos de escena completados que no se hayan cobrado"""
+        from core.services.credits import CreditService
+
+        charged = 0
+        for scene_id in self._uncharged_ids('video_status', 'credits_charged'):
+            try:
+                with transaction.atomic():
+                    scene = Scene.objects.select_for_update(of=('self',)).select_related('script__created_by').get(pk=scene_id)
+                    if (scene.metadata or {}).get('credits_charged') or not scene.script.created_by:
+                        continue
+                    CreditService.deduct_credits_for_scene_video(scene.script.created_by, scene)
+                if scene.metadata.get('credits_charged'):
+                    charged += 1
+                else:
+                    self._skip(scene_id, 'credits_charged')
+            except Exception as e:
+                logger.error(f"[SceneReconciler] Error al cobrar video de escena {scene_id}: {e}")
+                self._skip(scene_id, 'credits_charged')
+        return charged
+
+    def charge_completed_audio(self) -> int:
+        """Cobra los audios de escena completados que no se hayan cobrado"""
+        from core.services.credits import CreditService
+
+        charged = 0
+        for scene_id in self._uncharged_ids('audio_status', 'audio_credits_charged'):
+            try:
+                with transaction.atomic():
+                    scene = Scene.objects.select_for_update(of=('self',)).select_related('script__created_by').get(pk=scene_id)
+                    if (scene.metadata or {}).get('audio_credits_charged') or not scene.script.created_by:
+                        continue
+                    CreditService.deduct_credits_for_scene_audio(scene.script.created_by, scene)
+                if scene.metadata.get('audio_credits_charged'):
+                    charged += 1
+                else:
+                    self._skip(scene_id, 'audio_credits_charged')
+            except Exception as e:
+                logger.error(f"[SceneReconciler] Error al cobrar audio de escena {scene_id}: {e}")
+                self._skip(scene_id, 'audio_credits_charged')
+        return charged
+
+    def _uncharged_ids(self, status_field: str, charged_flag: str):
+        batch_size = _setting('SCENE_RECONCILER_BATCH_SIZE', 50)
+        since = timezone.now() - timedelta(days=UNCHARGED_LOOKBACK_DAYS)
+        candidates = list(
+            Scene.objects.filter(
+                **{status_field: 'completed'},
+                updated_at__gte=since,
+                script__created_by__isnull=False
+            ).exclude(
+                **{f'metadata__{charged_flag}': True}
+            ).order_by('-updated_at').values_list('id', flat=True)[:batch_size * 4]
+        )
+        # Descartar las que fallaron hace poco para que no acaparen el lote
+        skipped = cache.get_many([f"{SKIP_PREFIX}{charged_flag}:{scene_id}" for scene_id in candidates])
+        return [
+            scene_id for scene_id in candidates
+            if f"{SKIP_PREFIX}{charged_flag}:{scene_id}" not in skipped
+        ][:batch_size]
+
+    @staticmethod
+    def _skip(scene_id: int, charged_flag: str):
+        cache.set(f"{SKIP_PREFIX}{charged_flag}:{scene_id}", 1, SKIP_TTL)
+
+
+# Instancia global
+scene_reconciler = SceneReconciler()
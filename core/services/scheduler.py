@@ -0,0 +1,367 @@
+"""
+Planificador de generaciones por proveedor
+
+Capa de admisión entre QueueService y los proveedores de IA:
+
+    - Token bucket por proveedor (y por modelo si tiene límites propios) en
+      Redis: controla el ritmo de envíos para no provocar 429.
+    - Slots de concurrencia por proveedor: un sorted set con los trabajos en
+      curso y un lease (se liberan al terminar la GenerationTask o al caducar
+      el lease si el worker muere).
+    - Concurrencia por plan de usuario: las tareas que exceden el límite del
+      plan se retienen en cola (metadata['held']) en lugar de fallar, y
+      admit_held_tasks_task las despacha cuando se liberan huecos.
+
+Si el proveedor no tiene cupo, la tarea de Celery se re-programa con un
+countdown (defer) en lugar de consumir sus reintentos.
+
+Si Redis no está disponible el planificador deja pasar (fail-open): es un
+mecanismo de protección, no de corrección.
+"""
+import logging
+import math
+import os
+import random
+import time
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# Límites por proveedor
+# rate: envíos por segundo sostenidos; burst: envíos seguidos permitidos
+# concurrency: trabajos en curso simultáneos en el proveedor (0 = sin límite)
+# lease: segundos que un trabajo ocupa su slot como máximo (debe cubrir el render)
+PROVIDER_LIMITS = {
+    'heygen': {'rate': 0.5, 'burst': 5, 'concurrency': 10, 'lease': 30 * 60},
+    'veo': {'rate': 0.2, 'burst': 3, 'concurrency': 6, 'lease': 20 * 60},
+    'sora': {'rate': 0.1, 'burst': 2, 'concurrency': 4, 'lease': 30 * 60},
+    'kling': {'rate': 0.3, 'burst': 3, 'concurrency': 5, 'lease': 20 * 60},
+    'higgsfield': {'rate': 0.3, 'burst': 3, 'concurrency': 5, 'lease': 15 * 60},
+    'elevenlabs': {'rate': 2.0, 'burst': 10, 'concurrency': 8, 'lease': 5 * 60},
+    'image': {'rate': 1.0, 'burst': 5, 'concurrency': 8, 'lease': 5 * 60},
+}
+
+# Modelos con límites propios (se aplican en lugar de los del proveedor)
+MODEL_LIMITS = {
+    'sora:sora-2-pro': {'rate': 0.05, 'burst': 1, 'concurrency': 2, 'lease': 40 * 60},
+}
+
+# Espera mínima antes de reintentar una admisión sin slot de concurrencia (segundos)
+CONCURRENCY_RETRY = 15
+
+# Tiempo medio de generación usado en estimaciones cuando no hay historial (segundos)
+DEFAULT_DURATION = 120
+
+STATS_CACHE_KEY = 'provider_scheduler:stats'
+STATS_TTL = 30
+
+_ADMIT_SCRIPT = """
+local bucket = KEYS[1]
+local inflight = KEYS[2]
+local now = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local concurrency = tonumber(ARGV[4])
+local lease = tonumber(ARGV[5])
+local member = ARGV[6]
+
+redis.call('ZREMRANGEBYSCORE', inflight, '-inf', now)
+
+-- Reentrada (reintento de un trabajo ya admitido): renovar lease
+if redis.call('ZSCORE', inflight, member) then
+    redis.call('ZADD', inflight, now + lease, member)
+    return 0
+end
+
+if concurrency > 0 and redis.call('ZCARD', inflight) >= concurrency then
+    return -1
+end
+
+local state = redis.call('HMGET', bucket, 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+if tokens < 1 then
+    redis.call('HSET', bucket, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', bucket, 3600)
+    return math.ceil((1 - tokens) / rate * 1000)
+end
+
+redis.call('HSET', bucket, 'tokens', tostring(tokens - 1), 'ts', tostring(now))
+redis.call('EXPIRE', bucket, 3600)
+redis.call('ZADD', inflight, now + lease, member)
+redis.call('EXPIRE', inflight, lease * 2)
+return 0
+"""
+
+
+class ProviderScheduler:
+    """Admisión de trabajos por proveedor, plan de usuario y estimaciones de espera"""
+
+    KEY_PREFIX = 'provider_scheduler:'
+
+    def __init__(self):
+        self._redis = None
+        self._script = None
+
+    # ----------------
+    # REDIS
+    # ----------------
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                settings.SCHEDULER_REDIS_URL, socket_timeout=2, socket_connect_timeout=2
+            )
+            self._script = self._redis.register_script(_ADMIT_SCRIPT)
+        return self._redis
+
+    def reset(self):
+        """Descarta la conexión (se llama en el hijo tras un fork)"""
+        self._redis = None
+        self._script = None
+
+    # ----------------
+    # CLASIFICACIÓN
+    # ----------------
+
+    @staticmethod
+    def classify(item, task_type: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Proveedor y modelo que consume un item al generarse
+
+        Returns:
+            (provider, model); provider None si la tarea no llama a un proveedor
+            (p.ej. combinar video+audio con FFmpeg)
+        """
+        from core.models import Video, Image, Audio, Scene
+        from core.services.status_watcher import get_video_provider
+
+        if isinstance(item, Video):
+            config = item.config or {}
+            model = config.get('sora_model') or config.get('veo_model') or config.get('model_id') or item.type
+            return get_video_provider(item.type), model
+        if isinstance(item, Image):
+            return 'image', (item.config or {}).get('model_id') or item.type
+        if isinstance(item, Audio):
+            return 'elevenlabs', (item.config or {}).get('model_id')
+        if isinstance(item, Scene) and task_type == 'scene_preview':
+            return 'image', None
+        if isinstance(item, Scene) and task_type == 'scene_video':
+            provider = get_video_provider(item.ai_service) or item.ai_service
+            return provider, (item.ai_config or {}).get('sora_model') or item.ai_service
+        return None, None
+
+    @staticmethod
+    def limits_for(provider: str, model: Optional[str] = None) -> Tuple[str, Dict]:
+        """(clave del bucket, límites) aplicables a un proveedor/modelo"""
+        model_key = f"{provider}:{model}" if model else None
+        if model_key and model_key in MODEL_LIMITS:
+            return model_key, MODEL_LIMITS[model_key]
+        return provider, PROVIDER_LIMITS.get(provider, {'rate': 1.0, 'burst': 5, 'concurrency': 0, 'lease': 10 * 60})
+
+    # ----------------
+    # ADMISIÓN POR PROVEEDOR
+    # ----------------
+
+    def acquire(self, provider: Optional[str], member: str, model: Optional[str] = None) -> float:
+        """
+        Intenta ocupar un envío y un slot de concurrencia del proveedor
+
+        Args:
+            provider: Proveedor (None = sin control)
+            member: Identificador estable del trabajo (uuid de la GenerationTask)
+            model: Modelo (para límites por modelo)
+
+        Returns:
+            0 si se admite; si no, segundos recomendados de espera
+        """
+        if not provider:
+            return 0
+        key, limits = self.limits_for(provider, model)
+        try:
+            self._client()
+            wait_ms = self._script(
+                keys=[f"{self.KEY_PREFIX}bucket:{key}", f"{self.KEY_PREFIX}inflight:{key}"],
+                args=[time.time(), limits['rate'], limits['burst'], limits['concurrency'], limits['lease'], member],
+            )
+        except Exception as e:
+            logger.warning(f"[Scheduler] Redis no disponible, admitiendo {member} sin control: {e}")
+            return 0
+
+        wait_ms = int(wait_ms)
+        if wait_ms == 0:
+            return 0
+        if wait_ms < 0:
+            return CONCURRENCY_RETRY
+        return wait_ms / 1000.0
+
+    def release(self, provider: Optional[str], member: str, model: Optional[str] = None):
+        """Libera el slot de concurrencia de un trabajo terminado"""
+        if not provider:
+            return
+        key, _ = self.limits_for(provider, model)
+        try:
+            self._client().zrem(f"{self.KEY_PREFIX}inflight:{key}", member)
+        except Exception as e:
+            logger.debug(f"[Scheduler] No se pudo liberar slot de {member}: {e}")
+
+    def release_task(self, task):
+        """Libera el slot de una GenerationTask (al pasar a estado final)"""
+        metadata = task.metadata or {}
+        self.release(metadata.get('provider'), str(task.uuid), metadata.get('model'))
+
+    def penalize(self, provider: str, retry_after: float = 0, model: Optional[str] = None):
+        """
+        Vacía el bucket de un proveedor tras un 429
+
+        Los siguientes envíos esperan retry_after (o lo que tarde en rellenarse
+        un token) en lugar de repetir el error.
+        """
+        key, limits = self.limits_for(provider, model)
+        # Tokens negativos = espera adicional de retry_after segundos
+        tokens = -max(retry_after, 0) * limits['rate']
+        try:
+            self._client().hset(f"{self.KEY_PREFIX}bucket:{key}", mapping={'tokens': tokens, 'ts': time.time()})
+        except Exception as e:
+            logger.debug(f"[Scheduler] No se pudo penalizar {key}: {e}")
+
+    def defer_if_throttled(self, celery_task, task) -> bool:
+        """
+        Admite una GenerationTask o re-programa su tarea de Celery
+
+        Se llama al inicio de la tarea, antes de mark_as_processing. La espera
+        no cuenta como reintento.
+
+        Returns:
+            True si la tarea se ha re-programado (el worker debe salir sin hacer nada)
+        """
+        metadata = task.metadata or {}
+        wait = self.acquire(metadata.get('provider'), str(task.uuid), metadata.get('model'))
+        if not wait:
+            return False
+
+        # Jitter para que los trabajos diferidos no lleguen todos a la vez
+        countdown = wait + random.uniform(0, max(1.0, wait * 0.2))
+        result = celery_task.apply_async(
+            args=celery_task.request.args,
+            kwargs=celery_task.request.kwargs,
+            countdown=countdown,
+            queue=task.queue_name,
+            priority=task.priority,
+        )
+
+        metadata['deferrals'] = metadata.get('deferrals', 0) + 1
+        metadata['deferred_until'] = (timezone.now() + timedelta(seconds=countdown)).isoformat()
+        task.metadata = metadata
+        task.task_id = result.id
+        task.save(update_fields=['metadata', 'task_id'])
+
+        logger.info(
+            f"[Scheduler] Tarea {task.uuid} diferida {countdown:.1f}s "
+            f"(proveedor {metadata.get('provider')}, modelo {metadata.get('model')})"
+        )
+        return True
+
+    # ----------------
+    # CONCURRENCIA POR PLAN
+    # ----------------
+
+    @staticmethod
+    def plan_for(user) -> str:
+        """Plan del usuario: 'staff' o el primer grupo de Django con límite en PLAN_CONCURRENCY"""
+        plans = settings.PLAN_CONCURRENCY
+        if user.is_staff and 'staff' in plans:
+            return 'staff'
+        for name in user.groups.values_list('name', flat=True):
+            if name in plans:
+                return name
+        return 'default'
+
+    @classmethod
+    def user_concurrency(cls, user) -> int:
+        plans = settings.PLAN_CONCURRENCY
+        return plans.get(cls.plan_for(user), plans.get('default', 10))
+
+    # ----------------
+    # ESTADÍSTICAS
+    # ----------------
+
+    def queue_stats(self) -> Dict[str, Dict]:
+        """
+        Profundidad de cola, trabajos en curso y espera estimada por proveedor
+
+        Returns:
+            Dict provider -> {queued, held, in_flight, concurrency, avg_duration, estimated_wait}
+        """
+        stats = cache.get(STATS_CACHE_KEY)
+        if stats is not None:
+            return stats
+
+        from core.models import GenerationTask
+
+        queued = {
+            row['metadata__provider']: row
+            for row in GenerationTask.objects.filter(status='queued').values('metadata__provider').annotate(
+                count=Count('uuid')
+            )
+        }
+        # Duración típica (p50 de processing) medida por la telemetría de generaciones
+        from core.monitoring.telemetry import GenerationTelemetry
+        durations = GenerationTelemetry.typical_seconds('processing')['providers']
+        held = dict(
+            GenerationTask.objects.filter(status='queued', metadata__held=True).values_list(
+                'metadata__provider'
+            ).annotate(count=Count('uuid'))
+        )
+
+        in_flight = {}
+        try:
+            client = self._client()
+            now = time.time()
+            for provider in PROVIDER_LIMITS:
+                in_flight[provider] = client.zcount(f"{self.KEY_PREFIX}inflight:{provider}", now, '+inf')
+        except Exception as e:
+            logger.debug(f"[Scheduler] Sin datos de Redis para estadísticas: {e}")
+
+        stats = {}
+        for provider, limits in PROVIDER_LIMITS.items():
+            depth = queued.get(provider, {}).get('count', 0)
+            avg_seconds = durations.get(provider) or DEFAULT_DURATION
+            concurrency = limits['concurrency'] or 1
+            # Tandas completas por delante de un trabajo nuevo + ritmo de envío del bucket
+            waves = math.floor((depth + in_flight.get(provider, 0)) / concurrency)
+            stats[provider] = {
+                'queued': depth,
+                'held': held.get(provider, 0),
+                'in_flight': in_flight.get(provider, 0),
+                'concurrency': limits['concurrency'],
+                'avg_duration': round(avg_seconds, 1),
+                'estimated_wait': round(waves * avg_seconds + depth / limits['rate'], 1),
+            }
+
+        cache.set(STATS_CACHE_KEY, stats, STATS_TTL)
+        return stats
+
+    def estimate_wait(self, provider: Optional[str]) -> Optional[float]:
+        """Espera estimada (segundos) para un trabajo nuevo del proveedor"""
+        if not provider:
+            return None
+        stats = self.queue_stats().get(provider)
+        return stats['estimated_wait'] if stats else None
+
+
+# Instancia global
+provider_scheduler = ProviderScheduler()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=provider_scheduler.reset)
@@ -0,0 +1,500 @@
+"""
+Vigilante de estado de proveedores de video
+
+Sustituye las cadenas de poll_video_status_task (una tarea Celery por video que
+se re-programa cada 30s) por una ronda periódica que mantiene las GenerationTask
+pendientes agrupadas por proveedor y las consulta por lotes con un intervalo
+adaptativo. La tabla de pendientes y los intervalos viven en Redis, así que la
+ronda puede ejecutarse en cualquier worker sin perder el backoff.
+
+Los webhooks de proveedores, cuando existen, disparan una comprobación inmediata
+del video afectado; el polling por lotes queda como respaldo. Los proveedores
+que aceptan una URL de aviso por trabajo la reciben de provider_callback_url().
+"""
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.urls import reverse
+
+from core.models import GenerationTask, Video, Notification
+
+logger = logging.getLogger(__name__)
+
+
+# Configuración de polling por proveedor (segundos)
+# min_interval: intervalo tras detectar cambios / con trabajos recién enviados
+# max_interval: techo del backoff cuando no hay cambios o el proveedor falla
+# batch_size: número máximo de videos consultados por ronda
+PROVIDER_POLL_CONFIG = {
+    'heygen': {'min_interval': 20, 'max_interval': 90, 'batch_size': 25},
+    'veo': {'min_interval': 20, 'max_interval': 120, 'batch_size': 25},
+    'sora': {'min_interval': 20, 'max_interval': 120, 'batch_size': 20},
+    'kling': {'min_interval': 15, 'max_interval': 90, 'batch_size': 25},
+    'higgsfield': {'min_interval': 10, 'max_interval': 60, 'batch_size': 25},
+}
+
+# Factor de crecimiento del intervalo cuando una ronda no detecta cambios
+BACKOFF_FACTOR = 1.5
+
+# Cada cuánto se re-sincroniza la tabla en memoria con la BD (segundos)
+RESYNC_INTERVAL = 30
+
+# Lock para que solo un proceso ejecute rondas a la vez. Se renueva tras cada
+# consulta, así que su TTL solo tiene que cubrir una consulta (timeout HTTP
+# de los clientes) y no la ronda completa
+WATCHER_LOCK_KEY = 'provider_status_watcher:lock'
+WATCHER_LOCK_TIMEOUT = 120
+
+# Estado compartido en Redis
+PENDING_PREFIX = 'provider_status_watcher:pending:'  # hash por proveedor {video_uuid: entrada JSON}
+SCHEDULE_KEY = 'provider_status_watcher:schedule'    # hash {provider:interval, provider:next_check_at}
+SYNCED_KEY = 'provider_status_watcher:synced'        # marca con TTL = RESYNC_INTERVAL
+
+
+def provider_callback_url(provider: str) -> Optional[str]:
+    """
+    URL pública del webhook de un proveedor (None si los webhooks no están configurados)
+
+    Requiere PROVIDER_WEBHOOK_BASE_URL (dominio público de la app) y
+    PROVIDER_WEBHOOK_SECRET (token que valida ProviderWebhookView).
+    """
+    base_url = getattr(settings, 'PROVIDER_WEBHOOK_BASE_URL', '')
+    secret = getattr(settings, 'PROVIDER_WEBHOOK_SECRET', '')
+    if not base_url or not secret:
+        return None
+    path = reverse('core:provider_webhook', args=[provider])
+    return f"{base_url.rstrip('/')}{path}?token={secret}"
+
+
+def get_video_provider(video_type: str) -> Optional[str]:
+    """
+    Devuelve el proveedor que hay que consultar para un tipo de video
+
+    Returns:
+        Nombre del proveedor o None si el tipo es síncrono (uploaded, manim)
+    """
+    if not video_type:
+        return None
+    if video_type.startswith('heygen_'):
+        return 'heygen'
+    if video_type == 'gemini_veo':
+        return 'veo'
+    if video_type == 'sora':
+        return 'sora'
+    # higgsfield_kling_* pertenece a Higgsfield, comprobar antes que kling_
+    if video_type.startswith('higgsfield_'):
+        return 'higgsfield'
+    if video_type.startswith('kling_'):
+        return 'kling'
+    return None
+
+
+def notify_video_transition(task: GenerationTask, video: Video) -> None:
+    """
+    Reporta el estado final de un video a su GenerationTask y al usuario
+
+    Args:
+        task: GenerationTask asociada (puede ser None)
+        video: Video ya recargado desde BD en estado 'completed' o 'error'
+    """
+    user = task.user if task else video.created_by
+
+    if video.status == 'completed':
+        if task and task.status != 'completed':
+            task.mark_as_completed()
+        if user:
+            Notification.create_notification(
+                user=user,
+                type='generation_completed',
+                title='Video generado',
+                message=f'Tu video "{video.title}" está listo',
+                action_url=f'/videos/{video.uuid}/',
+                action_label='Ver video',
+                metadata={'item_type': 'video', 'item_uuid': str(video.uuid)}
+            )
+        logger.info(f"[StatusWatcher] Video {video.uuid} completado. Notificación enviada.")
+
+    elif video.status == 'error':
+        if task and task.status not in ['failed', 'cancelled']:
+            task.mark_as_failed(video.error_message or 'Error desconocido')
+        if user:
+            Notification.create_notification(
+                user=user,
+                type='generation_failed',
+                title='Error al generar video',
+                message=f'No se pudo generar el video "{video.title}"',
+                metadata={'item_type': 'video', 'item_uuid': str(video.uuid), 'error': video.error_message}
+            )
+        logger.info(f"[StatusWatcher] Video {video.uuid} terminó con error: {video.error_message}")
+
+
+class ProviderStatusWatcher:
+    """
+    Tabla de videos pendientes agrupados por proveedor (en Redis)
+
+    Cada entrada guarda el UUID de la GenerationTask, el UUID del video y el
+    instante de su última consulta. Cada proveedor tiene su propio intervalo,
+    que vuelve al mínimo cuando una ronda detecta transiciones y crece con
+    BACKOFF_FACTOR cuando no hay cambios o el proveedor responde con error.
+    Los instantes son de reloj de pared (time.time) porque se comparten entre
+    procesos y máquinas.
+    """
+
+    def __init__(self):
+        self._redis = None
+        self._video_service = None
+
+    @property
+    def video_service(self):
+        """Lazy initialization de VideoService (reutiliza sus clientes entre rondas)"""
+        if self._video_service is None:
+            from core.services import VideoService
+            self._video_service = VideoService()
+        return self._video_service
+
+    def _client(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                settings.SCHEDULER_REDIS_URL, socket_timeout=2, socket_connect_timeout=2
+            )
+        return self._redis
+
+    def reset(self):
+        """Descarta la conexión (se llama en el hijo tras un fork)"""
+        self._redis = None
+
+    # ----------------
+    # TABLA DE PENDIENTES
+    # ----------------
+
+    @staticmethod
+    def _pending_key(provider: str) -> str:
+        return f"{PENDING_PREFIX}{provider}"
+
+    def _entries(self, provider: str) -> Dict[str, Dict]:
+        return {
+            field.decode(): json.loads(value)
+            for field, value in self._client().hgetall(self._pending_key(provider)).items()
+        }
+
+    def _save_entry(self, provider: str, entry: Dict) -> None:
+        self._client().hset(self._pending_key(provider), entry['video_uuid'], json.dumps(entry))
+
+    def _schedule(self, provider: str) -> Dict[str, float]:
+        """Intervalo actual y siguiente ronda de un proveedor"""
+        interval, next_check_at = self._client().hmget(
+            SCHEDULE_KEY, f"{provider}:interval", f"{provider}:next_check_at"
+        )
+        return {
+            'interval': float(interval) if interval else float(PROVIDER_POLL_CONFIG[provider]['min_interval']),
+            'next_check_at': float(next_check_at) if next_check_at else 0.0,
+        }
+
+    def _set_schedule(self, provider: str, interval: float, next_check_at: float) -> None:
+        self._client().hset(SCHEDULE_KEY, mapping={
+            f"{provider}:interval": interval,
+            f"{provider}:next_check_at": next_check_at,
+        })
+
+    def register(self, task_uuid: str, video: Video) -> bool:
+        """
+        Añade un video a la tabla de pendientes
+
+        Returns:
+            True si el video corresponde a un proveedor asíncrono y se añadió
+        """
+        provider = get_video_provider(video.type)
+        if not provider:
+            return False
+
+        entry = {
+            'task_uuid': str(task_uuid) if task_uuid else None,
+            'video_uuid': str(video.uuid),
+            'last_checked': 0.0,
+        }
+        if self._client().hsetnx(self._pending_key(provider), entry['video_uuid'], json.dumps(entry)):
+            # Un trabajo nuevo adelanta la siguiente ronda del proveedor
+            interval = PROVIDER_POLL_CONFIG[provider]['min_interval']
+            next_check_at = min(self._schedule(provider)['next_check_at'], time.time() + interval)
+            self._set_schedule(provider, interval, next_check_at)
+        return True
+
+    def unregister(self, video_uuid: str) -> None:
+        """Elimina un video de la tabla de pendientes"""
+        pipe = self._client().pipeline()
+        for provider in PROVIDER_POLL_CONFIG:
+            pipe.hdel(self._pending_key(provider), str(video_uuid))
+        pipe.execute()
+
+    def pending_count(self) -> Dict[str, int]:
+        """Número de videos pendientes por proveedor"""
+        pipe = self._client().pipeline()
+        for provider in PROVIDER_POLL_CONFIG:
+            pipe.hlen(self._pending_key(provider))
+        return dict(zip(PROVIDER_POLL_CONFIG, pipe.execute()))
+
+    def sync(self, force: bool = False) -> int:
+        """
+        Re-sincroniza la tabla de pendientes con las GenerationTask en curso
+
+        Hace dos consultas en total (tareas y videos) independientemente del
+        número de videos pendientes; como mucho una vez cada RESYNC_INTERVAL
+        entre todos los procesos.
+
+        Returns:
+            Número total de videos pendientes tras sincronizar
+        """
+        client = self._client()
+        if force:
+            client.set(SYNCED_KEY, 1, ex=RESYNC_INTERVAL)
+        elif not client.set(SYNCED_KEY, 1, ex=RESYNC_INTERVAL, nx=True):
+            return sum(self.pending_count().values())
+
+        task_by_item = {
+            str(item_uuid): str(task_uuid)
+            for task_uuid, item_uuid in GenerationTask.objects.filter(
+                task_type='video',
+                status='processing'
+            ).values_list('uuid', 'item_uuid')
+        }
+
+        videos = Video.objects.filter(
+            uuid__in=list(task_by_item.keys()),
+            status__in=['pending', 'processing'],
+            external_id__isnull=False,
+        ).exclude(external_id='').only('uuid', 'type')
+
+        alive = set()
+        for video in videos:
+            if self.register(task_by_item.get(str(video.uuid)), video):
+                alive.add(str(video.uuid))
+
+        # Descartar entradas cuyo video o tarea ya no están en curso
+        for provider in PROVIDER_POLL_CONFIG:
+            stale = [video_key for video_key in self._entries(provider) if video_key not in alive]
+            if stale:
+                client.hdel(self._pending_key(provider), *stale)
+
+        return len(alive)
+
+    # ----------------
+    # RONDAS DE POLLING
+    # ----------------
+
+    def tick(self, lock=None) -> Dict[str, int]:
+        """
+        Ejecuta una ronda para cada proveedor cuyo intervalo haya vencido
+
+        Args:
+            lock: Lock de la ronda (redis Lock); se renueva tras cada consulta
+
+        Returns:
+            Dict {provider: transiciones detectadas} para los proveedores consultados
+        """
+        now = time.time()
+        results = {}
+        for provider, count in self.pending_count().items():
+            if not count or now < self._schedule(provider)['next_check_at']:
+                continue
+            results[provider] = self._check_provider_batch(provider, lock=lock)
+        return results
+
+    def seconds_until_next_check(self) -> float:
+        """Segundos hasta la siguiente ronda de cualquier proveedor con pendientes"""
+        now = time.time()
+        waits = [
+            max(0.0, self._schedule(provider)['next_check_at'] - now)
+            for provider, count in self.pending_count().items() if count
+        ]
+        return min(waits) if waits else float(RESYNC_INTERVAL)
+
+    def _check_provider_batch(self, provider: str, lock=None) -> int:
+        """
+        Consulta un lote de videos de un proveedor y ajusta su intervalo
+
+        Raises:
+            redis.exceptions.LockNotOwnedError: Si el lock de la ronda expiró y
+                otro proceso lo tomó (la ronda se abandona)
+        """
+        config = PROVIDER_POLL_CONFIG[provider]
+        entries = self._entries(provider)
+
+        # Los que llevan más tiempo sin consultarse van primero
+        batch = sorted(entries.values(), key=lambda e: e['last_checked'])[:config['batch_size']]
+        videos = Video.objects.select_related('project', 'created_by').in_bulk(
+            [entry['video_uuid'] for entry in batch],
+            field_name='uuid'
+        )
+        tasks = GenerationTask.objects.select_related('user').in_bulk(
+            [entry['task_uuid'] for entry in batch if entry['task_uuid']]
+        )
+
+        transitions = 0
+        provider_failed = False
+        for entry in batch:
+            if lock is not None:
+                # Renovar antes de cada consulta: otra ronda no puede empezar sobre el mismo lote
+                lock.reacquire()
+            entry['last_checked'] = time.time()
+            self._save_entry(provider, entry)
+            video = videos.get(self._as_uuid(entry['video_uuid']))
+            task = tasks.get(self._as_uuid(entry['task_uuid'])) if entry['task_uuid'] else None
+            try:
+                if self._check_video(video, task):
+                    transitions += 1
+            except Exception as e:
+                provider_failed = True
+                logger.warning(f"[StatusWatcher] Error consultando {provider} para video {entry['video_uuid']}: {e}")
+
+        # Intervalo adaptativo
+        if transitions or len(entries) > len(batch):
+            # Hubo cambios o quedan videos sin consultar en esta ronda
+            interval = config['min_interval']
+        elif provider_failed:
+            interval = config['max_interval']
+        else:
+            interval = min(self._schedule(provider)['interval'] * BACKOFF_FACTOR, config['max_interval'])
+        self._set_schedule(provider, interval, time.time() + interval)
+
+        logger.debug(
+            f"[StatusWatcher] {provider}: {len(batch)} consultados, {transitions} transiciones, "
+            f"siguiente ronda en {interval:.0f}s"
+        )
+        return transitions
+
+    @staticmethod
+    def _as_uuid(value):
+        return uuid.UUID(str(value))
+
+    def _check_video(self, video: Optional[Video], task: Optional[GenerationTask]) -> bool:
+        """
+        Consulta el estado de un video y reporta la transición si terminó
+
+        Returns:
+            True si el video pasó a un estado final
+        """
+        if video is None:
+            if task:
+                self.unregister(task.item_uuid)
+            return False
+
+        if video.status not in ['pending', 'processing'] or (task and task.status != 'processing'):
+            self.unregister(video.uuid)
+            if video.status in ['completed', 'error'] and task and task.status == 'processing':
+                notify_video_transition(task, video)
+                return True
+            return False
+
+        self.video_service.check_video_status(video)
+        video.refresh_from_db()
+
+        if video.status in ['completed', 'error']:
+            self.unregister(video.uuid)
+            notify_video_transition(task, video)
+            return True
+        return False
+
+    def check_task(self, task_uuid: str, video_uuid: str) -> str:
+        """
+        Consulta inmediatamente un video concreto (poll puntual o webhook)
+
+        Returns:
+            Estado del video tras la consulta
+        """
+        video = Video.objects.select_related('project', 'created_by').get(uuid=video_uuid)
+        task = GenerationTask.objects.select_related('user').filter(uuid=task_uuid).first() if task_uuid else None
+        if not self._check_video(video, task) and video.status in ['pending', 'processing']:
+            self.register(task_uuid, video)
+        return video.status
+
+    # ----------------
+    # WEBHOOKS
+    # ----------------
+
+    def handle_webhook(self, provider: str, external_id: str) -> bool:
+        """
+        Procesa el aviso de un proveedor consultando el video afectado
+
+        El payload del webhook no se considera fuente de verdad: se usa solo para
+        localizar el video y se vuelve a consultar al proveedor con sus
+        credenciales, reutilizando el mismo camino que el polling.
+
+        Returns:
+            True si se encontró un video en curso para ese external_id
+        """
+        video = Video.objects.filter(
+            external_id=external_id,
+            status__in=['pending', 'processing']
+        ).only('uuid', 'type').first()
+        if not video or get_video_provider(video.type) != provider:
+            logger.info(f"[StatusWatcher] Webhook {provider} sin video en curso para {external_id}")
+            return False
+
+        task = GenerationTask.objects.filter(
+            task_type='video',
+            item_uuid=video.uuid,
+            status='processing'
+        ).order_by('-created_at').first()
+
+        status = self.check_task(str(task.uuid) if task else None, str(video.uuid))
+        logger.info(f"[StatusWatcher] Webhook {provider} procesado para video {video.uuid}: {status}")
+        return True
+
+    # ----------------
+    # BUCLE PRINCIPAL
+    # ----------------
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Sincroniza y ejecuta una ronda protegida por un lock distribuido
+
+        Solo un proceso a la vez ejecuta la ronda; si otro la tiene, no hace nada.
+        El lock lleva un token propio de la ronda: se renueva entre consultas y
+        al terminar solo se libera si sigue siendo de esta ronda.
+        """
+        from redis.exceptions import LockError
+
+        lock = self._client().lock(WATCHER_LOCK_KEY, timeout=WATCHER_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            return {}
+        try:
+            self.sync()
+            return self.tick(lock=lock)
+        except LockError:
+            logger.warning("[StatusWatcher] El lock expiró durante la ronda; se abandona")
+            return {}
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # Ya no es de esta ronda: no borrar el de otro proceso
+                pass
+
+    def run_forever(self, idle_sleep: float = 5.0) -> None:
+        """Bucle del proceso dedicado (ver comando run_status_watcher)"""
+        logger.info("[StatusWatcher] Iniciado")
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"[StatusWatcher] Error en ronda: {e}", exc_info=True)
+            time.sleep(min(max(self.seconds_until_next_check(), 1.0), idle_sleep))
+
+
+def is_watcher_enabled() -> bool:
+    """Indica si el watcher sustituye a las cadenas de poll_video_status_task"""
+    return getattr(settings, 'STATUS_WATCHER_ENABLED', True)
+
+
+# Instancia global (una por proceso; el estado está en Redis)
+status_watcher = ProviderStatusWatcher()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=status_watcher.reset)
@@ -4,7 +4,7 @@ Sistema de caché para búsquedas de contenido stock
 import hashlib
 import json
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from django.core.cache import cache
 from django.conf import settings
 
@@ -193,6 +193,118 @@ class StockCache:
         cache.delete(cache_key)
         logger.info(f"Caché invalidado (hash: {cache_key[-8:]})")
     
+    # ----------------
+    # CACHÉ POR FUENTE
+    # ----------------
+    
+    @staticmethod
+    def get_source_cache_key(source: str, content_type: str, query: str, params: Dict[str, Any]) -> str:
+        """
+        Clave de caché de la página de una sola fuente
+        
+        Cada fuente se cachea por separado para que la expiración (o el fallo)
+        de un proveedor no invalide los resultados del resto.
+        
+        Args:
+            source: Fuente ('freepik', 'pexels', ...)
+            content_type: Tipo de contenido ('image', 'video' o 'audio')
+            query: Término de búsqueda
+            params: Resto de parámetros de la búsqueda (orientation, page, limit...)
+        """
+        cache_data = {
+            'source': source,
+            'type': content_type,
+            'query': query.lower().strip(),
+            'params': params,
+        }
+        content_str = json.dumps(cache_data, sort_keys=True, default=str)
+        content_hash = hashlib.sha256(content_str.encode('utf-8')).hexdigest()
+        
+        return f"{StockCache.CACHE_PREFIX}source:{content_hash}"
+    
+    @staticmethod
+    def get_source_pages(
+        requests: Dict[str, Dict[str, Any]],
+        content_type: str,
+        query: str
+    ) -> Dict[str, List[Dict]]:
+        """
+        Obtiene del caché las páginas de varias fuentes en una sola lectura
+        
+        Args:
+            requests: Dict {source: params} con la página pedida a cada fuente
+            content_type: Tipo de contenido
+            query: Término de búsqueda
+        
+        Returns:
+            Dict {source: resultados} solo con las fuentes cacheadas
+        """
+        keys = {
+            StockCache.get_source_cache_key(source, content_type, query, params): source
+            for source, params in requests.items()
+        }
+        cached = cache.get_many(list(keys.keys()))
+        
+        pages = {keys[key]: results for key, results in cached.items() if results is not None}
+        if pages:
+            logger.info(f"Stock Cache HIT para '{query}' en {', '.join(sorted(pages))}")
+        return pages
+    
+    @staticmethod
+    def set_source_page(
+        source: str,
+        content_type: str,
+        query: str,
+        params: Dict[str, Any],
+        results: List[Dict],
+        ttl: Optional[int] = None
+    ):
+        """Guarda en caché la página de una fuente"""
+        if ttl is None:
+            ttl = getattr(settings, 'STOCK_CACHE_TTL', StockCache.DEFAULT_TTL)
+        
+        cache_key = StockCache.get_source_cache_key(source, content_type, query, params)
+        cache.set(cache_key, results, ttl)
+        logger.debug(f"Página de {source} guardada en caché (hash: {cache_key[-8:]}, TTL: {ttl}s)")
+    
+    # ----------------
+    # CURSORES POR QUERY
+    # ----------------
+    
+    @staticmethod
+    def get_cursor_cache_key(content_type: str, query: str, params: Dict[str, Any]) -> str:
+        """Clave del estado de paginación merged de una query (sin número de página)"""
+        cache_data = {
+            'type': content_type,
+            'query': query.lower().strip(),
+            'params': params,
+        }
+        content_str = json.dumps(cache_data, sort_keys=True, default=str)
+        content_hash = hashlib.sha256(content_str.encode('utf-8')).hexdigest()
+        
+        return f"{StockCache.CACHE_PREFIX}cursor:{content_hash}"
+    
+    @staticmethod
+    def get_cursor_state(content_type: str, query: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el estado de paginación de una query: cursor por fuente,
+        resultados descargados pendientes y páginas merged ya servidas
+        """
+        return cache.get(StockCache.get_cursor_cache_key(content_type, query, params))
+    
+    @staticmethod
+    def set_cursor_state(
+        content_type: str,
+        query: str,
+        params: Dict[str, Any],
+        state: Dict[str, Any],
+        ttl: Optional[int] = None
+    ):
+        """Guarda el estado de paginación de una query"""
+        if ttl is None:
+            ttl = getattr(settings, 'STOCK_CACHE_TTL', StockCache.DEFAULT_TTL)
+        cache.set(StockCache.get_cursor_cache_key(content_type, query, params), state, ttl)
+    
     @staticmethod
     def invalidate_all():
         """Invalida todo el caché de stock (usar con precaución)"""
@@ -0,0 +1,219 @@
+"""
+Motor de merge/ranking para búsquedas de stock multi-fuente
+
+Combina las páginas de cada fuente en una sola lista ordenada por relevancia
+normalizada, elimina duplicados entre fuentes y mantiene un cursor por fuente
+para que la página N+1 solo pida a cada proveedor lo que le falta.
+
+Relevancia:
+    Cada proveedor devuelve sus resultados ordenados por su propia relevancia,
+    pero las puntuaciones no son comparables entre APIs. Se usa la posición
+    global del resultado dentro de su fuente (reciprocal rank fusion) más un
+    bonus por coincidencia de términos de la query en el título/tags.
+
+Deduplicación:
+    Un mismo asset suele estar publicado en varias fuentes (p.ej. Pexels y
+    Pixabay). Se considera duplicado si coincide la URL normalizada del archivo,
+    o el id del proveedor dentro de la misma fuente (páginas solapadas). No se
+    usan dimensiones ni títulos: dos fotos distintas de 1920x1080 con título
+    "Beach sunset" no son el mismo asset.
+
+Agotamiento:
+    Una fuente se da por agotada cuando el proveedor devuelve menos resultados
+    de los pedidos, contando los resultados crudos (antes de filtros locales
+    como la licencia de Freepik), no los que quedan tras filtrar.
+"""
+import math
+import re
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+# Constante k de reciprocal rank fusion (amortigua la ventaja de las primeras posiciones)
+RRF_K = 60
+
+# Peso del bonus por coincidencia de términos de la query en el título
+TITLE_MATCH_WEIGHT = 0.5 / RRF_K
+
+# Tamaño mínimo de cada petición a un proveedor
+MIN_SOURCE_FETCH = 10
+
+# Página merged máxima: la reconstrucción de páginas 1..N queda acotada
+MAX_PAGE = 20
+
+_TOKEN_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def _tokens(text) -> Set[str]:
+    if not text:
+        return set()
+    if isinstance(text, (list, tuple)):
+        text = ' '.join(str(t) for t in text)
+    return {t for t in _TOKEN_RE.findall(str(text).lower()) if len(t) > 2}
+
+
+def _normalize_url(url: str) -> str:
+    """URL sin esquema ni query string (los CDNs añaden parámetros de tamaño)"""
+    if not url:
+        return ''
+    parts = urlsplit(url)
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+class SourcePage(list):
+    """
+    Resultados parseados de una página de un proveedor
+
+    raw_count es el número de resultados que devolvió el proveedor antes de
+    filtrar localmente (None = sin filtro, igual a len()).
+    """
+
+    def __init__(self, results=(), raw_count: Optional[int] = None):
+        super().__init__(results)
+        self.raw_count = raw_count
+
+
+def fingerprints(result: Dict) -> List[str]:
+    """Claves con las que se detectan duplicados entre fuentes"""
+    keys = []
+    for field in ('download_url', 'preview'):
+        url = _normalize_url(result.get(field, ''))
+        if url:
+            keys.append(f"url:{url}")
+
+    if result.get('id'):
+        keys.append(f"id:{result.get('source', '')}:{result['id']}")
+    return keys
+
+
+def relevance_score(result: Dict, position: int, query_tokens: Set[str]) -> float:
+    """
+    Relevancia normalizada comparable entre fuentes
+
+    Args:
+        result: Resultado parseado
+        position: Posición global del resultado dentro de su fuente (0 = primero)
+        query_tokens: Términos de la query
+    """
+    score = 1.0 / (RRF_K + position)
+    if query_tokens:
+        overlap = len(query_tokens & _tokens(result.get('title')))
+        score += TITLE_MATCH_WEIGHT * overlap / len(query_tokens)
+    return score
+
+
+def source_fetch_size(per_page: int, num_sources: int) -> int:
+    """Resultados a pedir a cada fuente por petición"""
+    if num_sources <= 0:
+        return per_page
+    return max(MIN_SOURCE_FETCH, math.ceil(per_page / num_sources))
+
+
+def new_cursor_state(sources: List[str], fetch_size: int) -> Dict:
+    """
+    Estado de paginación de una query (se guarda en StockCache)
+
+    - sources[source]: next_page (página del proveedor a pedir), position
+      (posición global del siguiente resultado), buffer (resultados ya
+      descargados y aún no servidos) y exhausted
+    - pages: páginas merged ya construidas (índice 0 = página 1)
+    - seen: fingerprints ya servidos (deduplicación entre páginas)
+    """
+    return {
+        'fetch_size': fetch_size,
+        'sources': {
+            source: {'next_page': 1, 'position': 0, 'buffer': [], 'exhausted': False}
+            for source in sources
+        },
+        'pages': [],
+        'seen': [],
+    }
+
+
+def sources_needing_fetch(state: Dict, per_page: int) -> List[str]:
+    """Fuentes cuyo buffer no cubre su cuota de la siguiente página"""
+    active = [s for s, cursor in state['sources'].items() if not cursor['exhausted']]
+    if not active:
+        return []
+    quota = math.ceil(per_page / len(active))
+    return [s for s in active if len(state['sources'][s]['buffer']) < quota]
+
+
+def absorb_source_page(state: Dict, source: str, results: List[Dict], raw_count: Optional[int] = None):
+    """
+    Añade la página descargada de una fuente a su buffer y avanza su cursor
+
+    Args:
+        raw_count: Resultados devueltos por el proveedor antes de filtrar
+            (por defecto, los de `results` o su raw_count si es una SourcePage)
+    """
+    cursor = state['sources'][source]
+    for result in results:
+        if 'source' not in result:
+            result['source'] = source
+        cursor['buffer'].append({'position': cursor['position'], 'result': result})
+        cursor['position'] += 1
+    cursor['next_page'] += 1
+    if raw_count is None:
+        raw_count = getattr(results, 'raw_count', None)
+    if raw_count is None:
+        raw_count = len(results)
+    if raw_count < state['fetch_size']:
+        cursor['exhausted'] = True
+
+
+def build_next_page(state: Dict, query: str, per_page: int) -> List[Dict]:
+    """
+    Construye la siguiente página merged a partir de los buffers
+
+    Toma los resultados con mayor relevancia normalizada de todas las fuentes,
+    descarta duplicados y deja el resto en los buffers para la página siguiente.
+    """
+    query_tokens = _tokens(query)
+    seen = set(state['seen'])
+
+    candidates = []
+    for source, cursor in state['sources'].items():
+        for entry in cursor['buffer']:
+            candidates.append((relevance_score(entry['result'], entry['position'], query_tokens), source, entry))
+    # Orden estable: relevancia, luego posición, luego fuente
+    candidates.sort(key=lambda c: (-c[0], c[2]['position'], c[1]))
+
+    page = []
+    consumed = {source: set() for source in state['sources']}
+    for _, source, entry in candidates:
+        if len(page) >= per_page:
+            break
+        consumed[source].add(entry['position'])
+        keys = fingerprints(entry['result'])
+        if any(key in seen for key in keys):
+            continue
+        seen.update(keys)
+        page.append(entry['result'])
+
+    for source, cursor in state['sources'].items():
+        cursor['buffer'] = [e for e in cursor['buffer'] if e['position'] not in consumed[source]]
+
+    state['seen'] = list(seen)
+    state['pages'].append(page)
+    return page
+
+
+def has_more(state: Dict) -> bool:
+    return any(
+        cursor['buffer'] or not cursor['exhausted']
+        for cursor in state['sources'].values()
+    )
+
+
+def group_by_source(results: List[Dict], sources: List[str]) -> Dict[str, List[Dict]]:
+    grouped = {source: [] for source in sources}
+    for result in results:
+        grouped.setdefault(result.get('source'), []).append(result)
+    return grouped
+
+
+def get_page(state: Dict, page: int) -> Optional[List[Dict]]:
+    """Página merged ya construida (1-indexed) o None"""
+    if 1 <= page <= len(state['pages']):
+        return state['pages'][page - 1]
+    return None
@@ -1,19 +1,94 @@
 """
 Servicio unificado para búsqueda de contenido stock
 Integra múltiples APIs: Freepik, Pexels, Unsplash, Pixabay
+
+Las fuentes se consultan en paralelo en un pool de threads acotado, con un
+presupuesto de latencia global: las fuentes que no responden a tiempo se omiten
+de la respuesta (resultados parciales) y su página se cachea cuando termina.
+Cada fuente tiene su propio circuit breaker y su propia entrada en StockCache.
 """
 import logging
-from typing import Dict, List, Optional, Set
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Set
 from django.conf import settings
 from core.ai_services.freepik import FreepikClient, FreepikContentType, FreepikOrientation
 from core.ai_services.pexels import PexelsClient, PexelsOrientation
 from core.ai_services.unsplash import UnsplashClient, UnsplashOrientation
 from core.ai_services.pixabay import PixabayClient, PixabayOrientation, PixabayImageType
 from core.ai_services.freesound import FreeSoundClient, FreeSoundSort
+from core.services.stock_ranking import SourcePage
 
 logger = logging.getLogger(__name__)
 
 
+class SourceCircuitBreaker:
+    """
+    Circuit breaker por fuente de stock
+    
+    Tras `failure_threshold` fallos consecutivos (errores o deadline excedido) la
+    fuente se deja de consultar durante `reset_timeout` segundos. Pasado ese
+    tiempo se permite de nuevo; un solo fallo más la vuelve a abrir.
+    """
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: int = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        with self._lock:
+            return time.time() >= self._open_until
+    
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+    
+    def record_failure(self) -> bool:
+        """Registra un fallo. Devuelve True si el circuito queda abierto."""
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._open_until = time.time() + self.reset_timeout
+                # Semiabierto: el siguiente fallo tras el reset vuelve a abrirlo
+                self._failures = self.failure_threshold - 1
+                return True
+            return False
+
+
+# Estado compartido por proceso (StockService se instancia por request)
+_executor = None
+_executor_lock = threading.Lock()
+_circuit_breakers: Dict[str, SourceCircuitBreaker] = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'STOCK_SEARCH_MAX_WORKERS', 16),
+                    thread_name_prefix='stock-search'
+                )
+    return _executor
+
+
+def get_circuit_breaker(source: str) -> SourceCircuitBreaker:
+    breaker = _circuit_breakers.get(source)
+    if breaker is None:
+        with _executor_lock:
+            breaker = _circuit_breakers.setdefault(source, SourceCircuitBreaker(
+                failure_threshold=getattr(settings, 'STOCK_CIRCUIT_FAILURE_THRESHOLD', 3),
+                reset_timeout=getattr(settings, 'STOCK_CIRCUIT_RESET_TIMEOUT', 60),
+            ))
+    return breaker
+
+
 class StockService:
     """Servicio unificado para búsqueda de contenido stock"""
     
@@ -85,6 +160,240 @@ class StockService:
         
         logger.info(f"StockService inicializado con {len(self.clients)} clientes disponibles")
     
+    def _fan_out(
+        self,
+        content_type: str,
+        query: str,
+        requests: Dict[str, Dict],
+        search_fn: Callable[[str, int, int], List[Dict]],
+        use_cache: bool = True,
+        deadline_at: Optional[float] = None
+    ) -> Dict[str, any]:
+        """
+        Consulta varias fuentes en paralelo con un deadline global
+        
+        Args:
+            content_type: 'image', 'video' o 'audio' (para la clave de caché)
+            query: Término de búsqueda
+            requests: Dict {source: params} con la página a pedir a cada fuente
+                (params incluye 'page' y 'limit'; el dict completo identifica
+                la página en el caché por fuente)
+            search_fn: Función (source, page, limit) que devuelve la página de
+                resultados de la fuente (debe lanzar excepción si la fuente falla)
+            use_cache: Si True, lee/escribe la página de cada fuente en StockCache
+            deadline_at: Instante (time.monotonic) límite compartido por varias
+                rondas; None = STOCK_SEARCH_DEADLINE desde ahora
+        
+        Returns:
+            Dict con results_by_source y el estado de cada fuente
+        """
+        from core.services.stock_cache import StockCache
+        
+        sources = list(requests.keys())
+        results_by_source = {}
+        sources_failed = []
+        sources_timed_out = []
+        sources_skipped = []
+        sources_cached = []
+        
+        if use_cache:
+            try:
+                cached_pages = StockCache.get_source_pages(requests, content_type, query)
+            except Exception as e:
+                logger.warning(f"Error al leer caché de stock: {e}")
+                cached_pages = {}
+            results_by_source.update(cached_pages)
+            sources_cached = list(cached_pages.keys())
+        
+        def on_done(source, future, state):
+            # Se ejecuta al terminar la llamada, aunque ya se haya respondido:
+            # una página que llega tarde calienta el caché para la siguiente búsqueda
+            breaker = get_circuit_breaker(source)
+            error = future.exception()
+            if error is not None:
+                if not state['expired'] and breaker.record_failure():
+                    logger.warning(f"⚠ {source}: circuit breaker abierto tras fallos consecutivos")
+                return
+            if not state['expired']:
+                breaker.record_success()
+            if use_cache:
+                try:
+                    StockCache.set_source_page(source, content_type, query, requests[source], future.result())
+                except Exception as e:
+                    logger.warning(f"Error al guardar en caché la página de {source}: {e}")
+        
+        futures = {}
+        for source in sources:
+            if source in results_by_source:
+                continue
+            if not get_circuit_breaker(source).allow():
+                logger.info(f"{source}: circuit breaker abierto, saltando...")
+                sources_skipped.append(source)
+                results_by_source[source] = []
+                continue
+            state = {'expired': False}
+            future = _get_executor().submit(
+                search_fn, source, requests[source]['page'], requests[source]['limit']
+            )
+            future.add_done_callback(lambda f, source=source, state=state: on_done(source, f, state))
+            futures[future] = (source, state)
+        
+        if futures:
+            if deadline_at is None:
+                deadline = getattr(settings, 'STOCK_SEARCH_DEADLINE', 8)
+            else:
+                deadline = max(0.0, deadline_at - time.monotonic())
+            done, not_done = wait(futures.keys(), timeout=deadline)
+            
+            for future in not_done:
+                source, state = futures[future]
+                state['expired'] = True
+                if get_circuit_breaker(source).record_failure():
+                    logger.warning(f"⚠ {source}: circuit breaker abierto tras exceder el deadline")
+                logger.warning(f"⚠ {source}: sin respuesta en {deadline:.1f}s, devolviendo resultados parciales")
+                sources_timed_out.append(source)
+                results_by_source[source] = []
+            
+            for future in done:
+                source, _ = futures[future]
+                error = future.exception()
+                if error is not None:
+                    logger.error(f"Error buscando {content_type} en {source}: {error}")
+                    sources_failed.append(source)
+                    results_by_source[source] = []
+                else:
+                    results_by_source[source] = future.result()
+        
+        for source, source_results in results_by_source.items():
+            # Asegurar que todos los resultados tengan el campo 'source'
+            for result in source_results:
+                if 'source' not in result:
+                    result['source'] = source
+        
+        return {
+            'results_by_source': results_by_source,
+            'sources_failed': sources_failed + sources_skipped,
+            'sources_timed_out': sources_timed_out,
+            'sources_skipped': sources_skipped,
+            'sources_cached': sources_cached,
+            'partial': bool(sources_failed or sources_timed_out or sources_skipped),
+        }
+    
+    def _search_paginated(
+        self,
+        content_type: str,
+        query: str,
+        sources: List[str],
+        search_fn: Callable[[str, int, int], List[Dict]],
+        query_params: Dict,
+        page: int,
+        per_page: int,
+        fetch_size: Optional[int] = None,
+        use_cache: bool = True
+    ) -> Dict[str, any]:
+        """
+        Búsqueda multi-fuente paginada con merge por relevancia y deduplicación
+        
+        El estado de paginación (cursor por fuente + resultados pendientes) se
+        guarda en StockCache, de modo que la página N+1 solo pide a cada fuente
+        lo que falta para completar su cuota.
+        
+        Si no hay cursores en caché (p.ej. la búsqueda anterior fue parcial) las
+        páginas 1..N se reconstruyen con un único deadline para todas las rondas,
+        y N se limita a stock_ranking.MAX_PAGE.
+        
+        Args:
+            content_type: 'image', 'video' o 'audio'
+            query: Término de búsqueda
+            sources: Fuentes disponibles a consultar
+            search_fn: Función (source, page, limit) -> resultados de la fuente
+            query_params: Filtros de la búsqueda (orientation, license...)
+            page: Página merged solicitada (1-indexed)
+            per_page: Resultados por página
+            fetch_size: Resultados por petición a cada fuente (None = automático)
+            use_cache: Usar StockCache para cursores y páginas por fuente
+        """
+        from core.services import stock_ranking as ranking
+        from core.services.stock_cache import StockCache
+        
+        page = min(page, ranking.MAX_PAGE)
+        fetch_size = fetch_size or ranking.source_fetch_size(per_page, len(sources))
+        state_params = dict(query_params, sources=sorted(sources), per_page=per_page, fetch_size=fetch_size)
+        
+        state = None
+        if use_cache:
+            try:
+                state = StockCache.get_cursor_state(content_type, query, state_params)
+            except Exception as e:
+                logger.warning(f"Error al leer cursores de stock: {e}")
+        if state is None:
+            state = ranking.new_cursor_state(sources, fetch_size)
+        
+        sources_failed = set()
+        sources_timed_out = set()
+        fetched_live = False
+        # Un único presupuesto de latencia para todas las rondas de esta petición
+        deadline_at = time.monotonic() + getattr(settings, 'STOCK_SEARCH_DEADLINE', 8)
+        
+        # Construir páginas merged hasta llegar a la solicitada
+        while len(state['pages']) < page:
+            needing = ranking.sources_needing_fetch(state, per_page)
+            if needing and time.monotonic() >= deadline_at:
+                # Sin tiempo para otra ronda: respuesta parcial
+                sources_timed_out.update(needing)
+                break
+            if needing:
+                requests = {
+                    source: dict(query_params, page=state['sources'][source]['next_page'], limit=fetch_size)
+                    for source in needing
+                }
+                fan_out = self._fan_out(
+                    content_type, query, requests, search_fn,
+                    use_cache=use_cache, deadline_at=deadline_at
+                )
+                sources_failed.update(fan_out['sources_failed'])
+                sources_timed_out.update(fan_out['sources_timed_out'])
+                fetched_live = fetched_live or set(fan_out['sources_cached']) != set(needing)
+                
+                for source in needing:
+                    # Las fuentes que fallan no avanzan su cursor
+                    if source in fan_out['sources_failed'] or source in fan_out['sources_timed_out']:
+                        continue
+                    ranking.absorb_source_page(state, source, fan_out['results_by_source'].get(source, []))
+            
+            page_results = ranking.build_next_page(state, query, per_page)
+            if not page_results and not ranking.has_more(state):
+                break
+        
+        partial = bool(sources_failed or sources_timed_out)
+        
+        # Solo se persisten cursores de páginas completas: una página construida
+        # sin alguna fuente no debe quedar fijada en caché
+        if use_cache and not partial:
+            try:
+                StockCache.set_cursor_state(content_type, query, state_params, state)
+            except Exception as e:
+                logger.warning(f"Error al guardar cursores de stock: {e}")
+        
+        page_results = ranking.get_page(state, page) or []
+        results_by_source = ranking.group_by_source(page_results, sources)
+        
+        return {
+            'query': query,
+            'total': len(page_results),
+            'sources_searched': sources,
+            'sources_successful': [s for s in sources if results_by_source.get(s)],
+            'sources_failed': sorted(sources_failed),
+            'sources_timed_out': sorted(sources_timed_out),
+            'from_cache': not fetched_live,
+            'partial': partial,
+            'has_more': page < ranking.MAX_PAGE and (len(state['pages']) > page or ranking.has_more(state)),
+            'results_by_source': results_by_source,
+            'results': page_results,
+            'page': page,
+            'per_page': per_page
+        }
+    
     def search_images(
         self,
         query: str,
@@ -93,7 +402,8 @@ class StockService:
         license_filter: str = 'all',
         page: int = 1,
         per_page: int = 20,
-        max_results_per_source: Optional[int] = None
+        max_results_per_source: Optional[int] = None,
+        use_cache: bool = True
     ) -> Dict[str, any]:
         """
         Busca imágenes en múltiples fuentes de stock
@@ -105,10 +415,12 @@ class StockService:
             license_filter: Filtro de licencia ('all', 'free', 'premium')
             page: Número de página
             per_page: Resultados totales deseados
-            max_results_per_source: Máximo de resultados por fuente
+            max_results_per_source: Resultados por petición a cada fuente (None = automático)
+            use_cache: Usar el caché por fuente de StockCache
             
         Returns:
-            Dict con resultados agrupados por fuente y totales
+            Dict con resultados agrupados por fuente y totales. Si alguna fuente
+            falla o excede el deadline, 'partial' es True.
         """
         if sources is None:
             sources = list(self.clients.keys())
@@ -125,57 +437,34 @@ class StockService:
                 'per_page': per_page
             }
         
-        if max_results_per_source is None:
-            # Distribuir resultados equitativamente entre fuentes
-            max_results_per_source = (per_page // len(sources)) + 5  # Buffer extra
-        
-        results_by_source = {}
-        all_results = []
-        
+        available = []
         for source in sources:
             if source not in self.clients:
                 logger.warning(f"Fuente '{source}' no disponible, saltando...")
                 continue
-            
-            try:
-                client = self.clients[source]
-                source_results = self._search_images_in_source(
-                    client=client,
-                    source=source,
-                    query=query,
-                    orientation=orientation,
-                    license_filter=license_filter,
-                    page=page,
-                    limit=max_results_per_source
-                )
-                
-                # Asegurar que todos los resultados tengan el campo 'source'
-                for result in source_results:
-                    if 'source' not in result:
-                        result['source'] = source
-                
-                results_by_source[source] = source_results
-                all_results.extend(source_results)
-                
-            except Exception as e:
-                logger.error(f"Error buscando en {source}: {e}")
-                results_by_source[source] = []
-        
-        # Ordenar todos los resultados (por relevancia, fecha, etc.)
-        # Por ahora los dejamos en el orden que vienen
-        
-        # Limitar resultados totales
-        all_results = all_results[:per_page]
-        
-        return {
-            'query': query,
-            'total': len(all_results),
-            'sources_searched': sources,
-            'results_by_source': results_by_source,
-            'results': all_results,
-            'page': page,
-            'per_page': per_page
-        }
+            available.append(source)
+        
+        result = self._search_paginated(
+            content_type='image',
+            query=query,
+            sources=available,
+            search_fn=lambda source, source_page, limit: self._search_images_in_source(
+                client=self.clients[source],
+                source=source,
+                query=query,
+                orientation=orientation,
+                license_filter=license_filter,
+                page=source_page,
+                limit=limit
+            ),
+            query_params={'orientation': orientation, 'license': license_filter},
+            page=page,
+            per_page=per_page,
+            fetch_size=max_results_per_source,
+            use_cache=use_cache
+        )
+        result['sources_searched'] = sources
+        return result
     
     def _search_images_in_source(
         self,
@@ -204,7 +493,12 @@ class StockService:
                     limit=limit,
                     license_filter=license_filter
                 )
-                return client.parse_search_results(results, license_filter=license_filter)
+                # El filtro de licencia se aplica al parsear: el agotamiento se decide
+                # con el número de resultados que devolvió Freepik
+                return SourcePage(
+                    client.parse_search_results(results, license_filter=license_filter),
+                    raw_count=len(results.get('data') or [])
+                )
             
             elif source == 'pexels':
                 # Mapear orientación
@@ -257,7 +551,7 @@ class StockService:
         
         except Exception as e:
             logger.error(f"Error buscando imágenes en {source}: {e}")
-            return []
+            raise
     
     def search_videos(
         self,
@@ -266,7 +560,8 @@ class StockService:
         orientation: Optional[str] = None,
         page: int = 1,
         per_page: int = 20,
-        max_results_per_source: Optional[int] = None
+        max_results_per_source: Optional[int] = None,
+        use_cache: bool = True
     ) -> Dict[str, any]:
         """
         Busca videos en múltiples fuentes de stock
@@ -277,10 +572,12 @@ class StockService:
             orientation: Orientación ('horizontal', 'vertical', 'square')
             page: Número de página
             per_page: Resultados totales deseados
-            max_results_per_source: Máximo de resultados por fuente
+            max_results_per_source: Resultados por petición a cada fuente (None = automático)
+            use_cache: Usar el caché por fuente de StockCache
             
         Returns:
-            Dict con resultados agrupados por fuente y totales
+            Dict con resultados agrupados por fuente y totales. Si alguna fuente
+            falla o excede el deadline, 'partial' es True.
         """
         if sources is None:
             sources = list(self.clients.keys())
@@ -297,51 +594,33 @@ class StockService:
                 'per_page': per_page
             }
         
-        if max_results_per_source is None:
-            max_results_per_source = (per_page // len(sources)) + 5
-        
-        results_by_source = {}
-        all_results = []
-        
+        available = []
         for source in sources:
             if source not in self.clients:
                 logger.warning(f"Fuente '{source}' no disponible, saltando...")
                 continue
-            
-            try:
-                client = self.clients[source]
-                source_results = self._search_videos_in_source(
-                    client=client,
-                    source=source,
-                    query=query,
-                    orientation=orientation,
-                    page=page,
-                    limit=max_results_per_source
-                )
-                
-                # Asegurar que todos los resultados tengan el campo 'source'
-                for result in source_results:
-                    if 'source' not in result:
-                        result['source'] = source
-                
-                results_by_source[source] = source_results
-                all_results.extend(source_results)
-                
-            except Exception as e:
-                logger.error(f"Error buscando videos en {source}: {e}")
-                results_by_source[source] = []
-        
-        all_results = all_results[:per_page]
-        
-        return {
-            'query': query,
-            'total': len(all_results),
-            'sources_searched': sources,
-            'results_by_source': results_by_source,
-            'results': all_results,
-            'page': page,
-            'per_page': per_page
-        }
+            available.append(source)
+        
+        result = self._search_paginated(
+            content_type='video',
+            query=query,
+            sources=available,
+            search_fn=lambda source, source_page, limit: self._search_videos_in_source(
+                client=self.clients[source],
+                source=source,
+                query=query,
+                orientation=orientation,
+                page=source_page,
+                limit=limit
+            ),
+            query_params={'orientation': orientation},
+            page=page,
+            per_page=per_page,
+            fetch_size=max_results_per_source,
+            use_cache=use_cache
+        )
+        result['sources_searched'] = sources
+        return result
     
     def _search_videos_in_source(
         self,
@@ -367,7 +646,10 @@ class StockService:
                     limit=limit
                 )
                 # Freepik videos usa el mismo parser que imágenes
-                return client.parse_search_results(results)
+                return SourcePage(
+                    client.parse_search_results(results),
+                    raw_count=len(results.get('data') or [])
+                )
             
             elif source == 'pexels':
                 pexels_orientation = None
@@ -400,7 +682,7 @@ class StockService:
         
         except Exception as e:
             logger.error(f"Error buscando videos en {source}: {e}")
-            return []
+            raise
     
     def search_audio(
         self,
@@ -409,7 +691,8 @@ class StockService:
         audio_type: Optional[str] = None,  # 'music', 'sound_effects', 'all'
         page: int = 1,
         per_page: int = 20,
-        max_results_per_source: Optional[int] = None
+        max_results_per_source: Optional[int] = None,
+        use_cache: bool = True
     ) -> Dict[str, any]:
         """
         Busca audios en múltiples fuentes de stock
@@ -420,10 +703,12 @@ class StockService:
             audio_type: Tipo de audio ('music', 'sound_effects', 'all')
             page: Número de página
             per_page: Resultados totales deseados
-            max_results_per_source: Máximo de resultados por fuente
+            max_results_per_source: Resultados por petición a cada fuente (None = automático)
+            use_cache: Usar el caché por fuente de StockCache
             
         Returns:
-            Dict con resultados agrupados por fuente y totales
+            Dict con resultados agrupados por fuente y totales. Si alguna fuente
+            falla o excede el deadline, 'partial' es True.
         """
         # Fuentes que soportan audio
         audio_sources = ['pixabay', 'freesound']
@@ -445,68 +730,33 @@ class StockService:
                 'per_page': per_page
             }
         
-        if max_results_per_source is None:
-            max_results_per_source = (per_page // len(sources)) + 5
-        
-        results_by_source = {}
-        all_results = []
-        
-        for source in sources:
-            try:
-                client = self.clients[source]
-                source_results = self._search_audio_in_source(
-                    client=client,
-                    source=source,
-                    query=query,
-                    audio_type=audio_type,
-                    page=page,
-                    limit=max_results_per_source
-                )
-                
-                # Asegurar que todos los resultados tengan el campo 'source'
-                for result in source_results:
-                    if 'source' not in result:
-                        result['source'] = source
-                
-                results_by_source[source] = source_results
-                all_results.extend(source_results)
-                
-                if source_results:
-                    logger.info(f"✓ {source}: {len(source_results)} resultados encontrados")
-                
-            except Exception as e:
-                error_msg = str(e)
-                # Detectar errores de autenticación específicos
-                if '401' in error_msg or 'Unauthorized' in error_msg or 'Invalid token' in error_msg:
-                    logger.warning(f"⚠ {source}: Error de autenticación - API key/token inválido o no configurado")
-                elif '400' in error_msg or 'Bad Request' in error_msg or 'Invalid or missing API key' in error_msg:
-                    logger.warning(f"⚠ {source}: Error de API key - clave inválida o no configurada")
-                else:
-                    logger.error(f"✗ {source}: Error buscando audio: {e}")
-                results_by_source[source] = []
-        
-        all_results = all_results[:per_page]
+        result = self._search_paginated(
+            content_type='audio',
+            query=query,
+            sources=sources,
+            search_fn=lambda source, source_page, limit: self._search_audio_in_source(
+                client=self.clients[source],
+                source=source,
+                query=query,
+                audio_type=audio_type,
+                page=source_page,
+                limit=limit
+            ),
+            query_params={'audio_type': audio_type},
+            page=page,
+            per_page=per_page,
+            fetch_size=max_results_per_source,
+            use_cache=use_cache
+        )
         
         # Log resumen de búsqueda
-        successful_sources = [s for s, results in results_by_source.items() if results]
-        failed_sources = [s for s in sources if s not in successful_sources]
-        
+        successful_sources = result['sources_successful']
         if successful_sources:
-            logger.info(f"✓ Búsqueda de audio exitosa: {len(all_results)} resultados de {len(successful_sources)} fuente(s): {', '.join(successful_sources)}")
+            logger.info(f"✓ Búsqueda de audio exitosa: {result['total']} resultados de {len(successful_sources)} fuente(s): {', '.join(successful_sources)}")
         else:
-            logger.warning(f"⚠ Búsqueda de audio sin resultados: todas las fuentes fallaron ({', '.join(failed_sources)})")
+            logger.warning(f"⚠ Búsqueda de audio sin resultados en: {', '.join(sources)}")
         
-        return {
-            'query': query,
-            'total': len(all_results),
-            'sources_searched': sources,
-            'sources_successful': successful_sources,
-            'sources_failed': failed_sources,
-            'results_by_source': results_by_source,
-            'results': all_results,
-            'page': page,
-            'per_page': per_page
-        }
+        return result
     
     def _search_audio_in_source(
         self,
@@ -567,7 +817,7 @@ class StockService:
                 logger.warning(f"⚠ {source}: API key inválida o no configurada (400)")
             else:
                 logger.error(f"✗ Error buscando audio en {source}: {e}")
-            return []
+            raise
     
     def get_available_sources(self) -> List[str]:
         """Retorna lista de fuentes disponibles"""
@@ -0,0 +1,264 @@
+"""
+Generación de storyboards completos en lote
+
+Lanza todas las escenas de un Script con una sola llamada en lugar de un POST
+síncrono por escena. El lote se ejecuta como un grafo de tareas de Celery:
+
+    chord(
+        group(
+            chain(group(video × cap), group(video × cap), ...)  por proveedor
+            chain(group(audio × cap), ...)                      TTS en paralelo
+        ),
+        finalize_storyboard_batch_task
+    )
+
+    - Los créditos de todas las escenas se reservan de una vez (todo o nada);
+      cada escena confirma o devuelve su propia reserva.
+    - Cada proveedor recibe como mucho `cap` envíos simultáneos.
+    - El audio TTS no depende del video, así que se genera en paralelo; el mux
+      video+audio se dispara cuando ambos nodos han terminado (lo hace quien
+      termine último: la tarea de audio o la comprobación de estado del video).
+    - El progreso agregado del lote se publica en el bus de progreso como un
+      único item 'storyboard' (uuid = id del script).
+"""
+import logging
+import uuid
+from typing import Dict, List, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.models import Scene, Script
+
+logger = logging.getLogger(__name__)
+
+
+# Envíos simultáneos por proveedor dentro de un lote
+PROVIDER_CONCURRENCY = {
+    'heygen': 5,
+    'veo': 4,
+    'sora': 3,
+    'kling': 4,
+    'higgsfield': 4,
+}
+DEFAULT_CONCURRENCY = 3
+AUDIO_CONCURRENCY = 4
+
+BATCH_PREFIX = 'storyboard_batch:'
+BATCH_TTL = 60 * 60 * 24
+
+
+class StoryboardBatchService:
+    """Lanza y sigue la generación de todas las escenas de un script"""
+
+    @staticmethod
+    def provider_for(scene) -> str:
+        """Proveedor al que se envía la escena (clave de PROVIDER_CONCURRENCY)"""
+        from core.services.status_watcher import get_video_provider
+        return get_video_provider(scene.ai_service) or scene.ai_service
+
+    @staticmethod
+    def pending_scenes(script: Script, lock: bool = False) -> List[Scene]:
+        """
+        Escenas incluidas cuyo video falta por generar
+
+        Args:
+            lock: Bloquear las filas (select_for_update, dentro de una transacción)
+        """
+        queryset = script.db_scenes.filter(
+            is_included=True,
+            video_status__in=['pending', 'error'],
+        ).exclude(ai_service='').order_by('order')
+        if lock:
+            queryset = queryset.select_for_update(of=('self',))
+        return list(queryset.select_related('script', 'project'))
+
+    @classmethod
+    def claimed_by_active_batch(cls, scene) -> bool:
+        """La escena sigue pendiente dentro de un lote vivo (aún no enviada)"""
+        batch_id = (scene.metadata or {}).get('storyboard_batch')
+        return bool(batch_id) and scene.video_status == 'pending' and cls.get_batch(batch_id) is not None
+
+    @classmethod
+    def generate_all_scenes(cls, script: Script, user) -> Dict:
+        """
+        Reserva créditos y encola la generación de todas las escenas pendientes
+
+        Returns:
+            Dict con batch_id, scene_ids, créditos reservados y proveedores
+
+        Raises:
+            ValidationException: Si no hay escenas o alguna está mal configurada
+            InsufficientCreditsException: Si no hay saldo para el lote completo
+        """
+        from celery import chain, chord, group
+        from core.services import ValidationException
+        from core.services.credits import CreditService
+        from core.tasks import (
+            generate_scene_video_task, generate_scene_audio_task, finalize_storyboard_batch_task
+        )
+
+        batch_id = uuid.uuid4().hex
+
+        # Reclamar las escenas con las filas bloqueadas: un doble clic o dos POST
+        # simultáneos esperan aquí y el segundo ya las ve reclamadas por el primero
+        with transaction.atomic():
+            scenes = [
+                scene for scene in cls.pending_scenes(script, lock=True)
+                if not cls.claimed_by_active_batch(scene)
+            ]
+            if not scenes:
+                raise ValidationException('No hay escenas pendientes de generar en este guión')
+
+            for scene in scenes:
+                if scene.ai_service in ['heygen', 'heygen_v2', 'heygen_avatar_iv'] and (
+                    not scene.ai_config.get('avatar_id') or not scene.ai_config.get('voice_id')
+                ):
+                    raise ValidationException(
+                        f'La escena "{scene.scene_id}" no tiene avatar y voz configurados. '
+                        'Regresa al Paso 2 (Configurar) y selecciónalos.'
+                    )
+
+            # Reservar créditos de todas las escenas de una vez
+            reservations = CreditService.reserve_credits_bulk(user, [
+                {
+                    'amount': CreditService.calculate_scene_video_cost(scene),
+                    'service_name': scene.ai_service,
+                    'operation_type': 'video_generation',
+                    'resource': scene,
+                    'metadata': {'storyboard_batch': batch_id, 'duration': scene.duration_sec},
+                }
+                for scene in scenes
+            ])
+
+            with_audio = []
+            for scene, reservation in zip(scenes, reservations):
+                scene.metadata = scene.metadata or {}
+                scene.metadata['storyboard_batch'] = batch_id
+                if reservation is not None:
+                    scene.metadata['credit_reservation'] = str(reservation.uuid)
+                if script.enable_audio and scene.uses_tts_audio():
+                    scene.metadata['prefetched_audio'] = True
+                    with_audio.append(scene)
+            Scene.objects.bulk_update(scenes, ['metadata'])
+
+            # El lote existe antes de liberar las filas (claimed_by_active_batch lo consulta)
+            cache.set(f"{BATCH_PREFIX}{batch_id}", {
+                'script_id': script.id,
+                'user_id': user.id,
+                'project_id': script.project_id,
+                'scene_ids': [scene.id for scene in scenes],
+                'submitted': False,
+            }, BATCH_TTL)
+
+        # Nodos de video: una cadena de grupos por proveedor (cap envíos a la vez)
+        by_provider: Dict[str, List[int]] = {}
+        for scene in scenes:
+            by_provider.setdefault(cls.provider_for(scene), []).append(scene.id)
+
+        branches = []
+        for provider, scene_ids in by_provider.items():
+            cap = PROVIDER_CONCURRENCY.get(provider, DEFAULT_CONCURRENCY)
+            branches.append(cls._capped_chain(
+                [generate_scene_video_task.si(scene_id, batch_id) for scene_id in scene_ids], cap, chain, group
+            ))
+
+        # Nodos de audio TTS (independientes del video)
+        if with_audio:
+            branches.append(cls._capped_chain(
+                [generate_scene_audio_task.si(scene.id, batch_id) for scene in with_audio],
+                AUDIO_CONCURRENCY, chain, group
+            ))
+
+        try:
+            chord(group(branches), finalize_storyboard_batch_task.si(batch_id)).apply_async()
+        except Exception:
+            # Sin lote encolado: devolver las reservas
+            for scene, reservation in zip(scenes, reservations):
+                if reservation is not None:
+                    CreditService.refund_reservation(reservation.uuid, reason='Error al encolar storyboard')
+                for key in ('storyboard_batch', 'credit_reservation', 'prefetched_audio'):
+                    scene.metadata.pop(key, None)
+            Scene.objects.bulk_update(scenes, ['metadata'])
+            cache.delete(f"{BATCH_PREFIX}{batch_id}")
+            raise
+
+        cls.publish_progress(batch_id, stage='submitting')
+
+        total_reserved = sum((r.amount for r in reservations if r is not None), 0)
+        logger.info(
+            f"Storyboard {batch_id} encolado: script {script.id}, {len(scenes)} escenas, "
+            f"{len(with_audio)} audios, proveedores {list(by_provider)}"
+        )
+        return {
+            'batch_id': batch_id,
+            'scene_ids': [scene.id for scene in scenes],
+            'credits_reserved': float(total_reserved),
+            'providers': {provider: len(ids) for provider, ids in by_provider.items()},
+        }
+
+    @staticmethod
+    def _capped_chain(signatures, cap: int, chain, group):
+        """Trocea signatures en grupos de tamaño cap ejecutados uno detrás de otro"""
+        chunks = [group(signatures[i:i + cap]) for i in range(0, len(signatures), cap)]
+        return chain(*chunks) if len(chunks) > 1 else chunks[0]
+
+    # ----------------
+    # PROGRESO AGREGADO
+    # ----------------
+
+    @staticmethod
+    def get_batch(batch_id: str) -> Optional[Dict]:
+        return cache.get(f"{BATCH_PREFIX}{batch_id}")
+
+    @classmethod
+    def mark_submitted(cls, batch_id: str):
+        batch = cls.get_batch(batch_id)
+        if batch:
+            batch['submitted'] = True
+            cache.set(f"{BATCH_PREFIX}{batch_id}", batch, BATCH_TTL)
+
+    @staticmethod
+    def scene_outcome(scene, enable_audio: bool) -> Optional[str]:
+        """'completed', 'failed' o None si la escena sigue en curso"""
+        if scene.video_status == 'error' or scene.final_video_status == 'error':
+            return 'failed'
+        if enable_audio and scene.uses_tts_audio():
+            if scene.audio_status == 'error':
+                return 'failed'
+            return 'completed' if scene.final_video_status == 'completed' else None
+        return 'completed' if scene.video_status == 'completed' else None
+
+    @classmethod
+    def publish_progress(cls, batch_id: str, stage: Optional[str] = None) -> Optional[Dict]:
+        """Publica el progreso agregado del lote (una consulta para todas las escenas)"""
+        from core.services.progress_bus import ProgressBus
+
+        batch = cls.get_batch(batch_id)
+        if not batch:
+            return None
+
+        scenes = Scene.objects.select_related('script').filter(id__in=batch['scene_ids']).only(
+            'id', 'ai_service', 'video_status', 'audio_status', 'final_video_status', 'script__enable_audio'
+        )
+        outcomes = [cls.scene_outcome(scene, scene.script.enable_audio) for scene in scenes]
+        total = len(batch['scene_ids'])
+        completed = outcomes.count('completed')
+        failed = outcomes.count('failed')
+        finished = completed + failed == total
+
+        if finished:
+            status = 'failed' if failed == total else 'completed'
+        else:
+            status = 'processing'
+
+        return ProgressBus.publish(
+            batch['user_id'],
+            'storyboard',
+            batch['script_id'],
+            status,
+            progress=int((completed + failed) * 100 / total) if total else 100,
+            project_id=batch['project_id'],
+            stage=stage or ('rendering' if batch.get('submitted') else 'submitting'),
+            error=f"{failed} de {total} escenas fallaron" if failed else None,
+        )
@@ -53,46 +53,7 @@ class VoiceValidator:
             api_service = APIService()
             voices = api_service.list_voices(use_cache=not force_refresh)
             
-            # Buscar la voz en la lista
-            voice_ids = []
-            voice_map = {}  # voice_id -> voice_data
-            
-            for voice in voices:
-                vid = voice.get('voice_id') or voice.get('id')
-                if vid:
-                    voice_ids.append(vid)
-                    voice_map[vid] = voice
-            
-            is_valid = voice_id in voice_ids
-            
-            result = {
-                'valid': is_valid,
-                'voice_id': voice_id,
-                'fallback_voice_id': None,
-                'fallback_voice_name': None,
-                'message': '',
-                'used_fallback': False
-            }
-            
-            if is_valid:
-                result['message'] = f'Voz {voice_id} válida'
-                logger.info(f"✓ Voz {voice_id} validada correctamente")
-            else:
-                result['message'] = f'Voz {voice_id} no encontrada en HeyGen'
-                logger.warning(f"⚠ Voz {voice_id} no encontrada. Buscando fallback...")
-                
-                # Buscar fallback: misma lengua/género si es posible
-                # Por ahora, usar la primera voz disponible
-                if voice_ids:
-                    fallback_voice_id = voice_ids[0]
-                    fallback_voice = voice_map.get(fallback_voice_id, {})
-                    result['fallback_voice_id'] = fallback_voice_id
-                    result['fallback_voice_name'] = fallback_voice.get('name', 'Voz por defecto')
-                    result['message'] = f'Voz no encontrada. Usando fallback: {result["fallback_voice_name"]}'
-                    logger.info(f"✓ Fallback encontrado: {fallback_voice_id} ({result['fallback_voice_name']})")
-                else:
-                    result['message'] = 'Voz no encontrada y no hay voces disponibles'
-                    logger.error(f"❌ No hay voces disponibles para fallback")
+            result = VoiceValidator._voice_result(voice_id, voices)
             
             # Guardar en caché
             cache.set(cache_key, result, VoiceValidator.VALIDATION_CACHE_TTL)
@@ -146,46 +107,7 @@ class VoiceValidator:
             api_service = APIService()
             avatars = api_service.list_avatars(use_cache=not force_refresh)
             
-            # Buscar el avatar en la lista
-            avatar_ids = []
-            avatar_map = {}  # avatar_id -> avatar_data
-            
-            for avatar in avatars:
-                aid = avatar.get('avatar_id') or avatar.get('id')
-                if aid:
-                    avatar_ids.append(aid)
-                    avatar_map[aid] = avatar
-            
-            is_valid = avatar_id in avatar_ids
-            
-            result = {
-                'valid': is_valid,
-                'avatar_id': avatar_id,
-                'fallback_avatar_id': None,
-                'fallback_avatar_name': None,
-                'message': '',
-                'used_fallback': False
-            }
-            
-            if is_valid:
-                result['message'] = f'Avatar {avatar_id} válido'
-                logger.info(f"✓ Avatar {avatar_id} validado correctamente")
-            else:
-                result['message'] = f'Avatar {avatar_id} no encontrado en HeyGen'
-                logger.warning(f"⚠ Avatar {avatar_id} no encontrado. Buscando fallback...")
-                
-                # Buscar fallback: mismo género si es posible
-                # Por ahora, usar el primer avatar disponible
-                if avatar_ids:
-                    fallback_avatar_id = avatar_ids[0]
-                    fallback_avatar = avatar_map.get(fallback_avatar_id, {})
-                    result['fallback_avatar_id'] = fallback_avatar_id
-                    result['fallback_avatar_name'] = fallback_avatar.get('name', 'Avatar por defecto')
-                    result['message'] = f'Avatar no encontrado. Usando fallback: {result["fallback_avatar_name"]}'
-                    logger.info(f"✓ Fallback encontrado: {fallback_avatar_id} ({result['fallback_avatar_name']})")
-                else:
-                    result['message'] = 'Avatar no encontrado y no hay avatares disponibles'
-                    logger.error(f"❌ No hay avatares disponibles para fallback")
+            result = VoiceValidator._avatar_result(avatar_id, avatars)
             
             # Guardar en caché
             cache.set(cache_key, result, VoiceValidator.VALIDATION_CACHE_TTL)
@@ -204,6 +126,132 @@ class VoiceValidator:
                 'used_fallback': False
             }
     
+    @staticmethod
+    def _voice_result(voice_id: str, voices: List[Dict]) -> Dict:
+        """Resultado de validación de una voz contra la lista de voces de HeyGen"""
+        # Buscar la voz en la lista
+        voice_ids = []
+        voice_map = {}  # voice_id -> voice_data
+        
+        for voice in voices:
+            vid = voice.get('voice_id') or voice.get('id')
+            if vid:
+                voice_ids.append(vid)
+                voice_map[vid] = voice
+        
+        is_valid = voice_id in voice_ids
+        
+        result = {
+            'valid': is_valid,
+            'voice_id': voice_id,
+            'fallback_voice_id': None,
+            'fallback_voice_name': None,
+            'message': '',
+            'used_fallback': False
+        }
+        
+        if is_valid:
+            result['message'] = f'Voz {voice_id} válida'
+            logger.info(f"✓ Voz {voice_id} validada correctamente")
+        else:
+            result['message'] = f'Voz {voice_id} no encontrada en HeyGen'
+            logger.warning(f"⚠ Voz {voice_id} no encontrada. Buscando fallback...")
+            
+            # Buscar fallback: misma lengua/género si es posible
+            # Por ahora, usar la primera voz disponible
+            if voice_ids:
+                fallback_voice_id = voice_ids[0]
+                fallback_voice = voice_map.get(fallback_voice_id, {})
+                result['fallback_voice_id'] = fallback_voice_id
+                result['fallback_voice_name'] = fallback_voice.get('name', 'Voz por defecto')
+                result['message'] = f'Voz no encontrada. Usando fallback: {result["fallback_voice_name"]}'
+                logger.info(f"✓ Fallback encontrado: {fallback_voice_id} ({result['fallback_voice_name']})")
+            else:
+                result['message'] = 'Voz no encontrada y no hay voces disponibles'
+                logger.error(f"❌ No hay voces disponibles para fallback")
+        
+        return result
+    
+    @staticmethod
+    def _avatar_result(avatar_id: str, avatars: List[Dict]) -> Dict:
+        """Resultado de validación de un avatar contra la lista de avatares de HeyGen"""
+        # Buscar el avatar en la lista
+        avatar_ids = []
+        avatar_map = {}  # avatar_id -> avatar_data
+        
+        for avatar in avatars:
+            aid = avatar.get('avatar_id') or avatar.get('id')
+            if aid:
+                avatar_ids.append(aid)
+                avatar_map[aid] = avatar
+        
+        is_valid = avatar_id in avatar_ids
+        
+        result = {
+            'valid': is_valid,
+            'avatar_id': avatar_id,
+            'fallback_avatar_id': None,
+            'fallback_avatar_name': None,
+            'message': '',
+            'used_fallback': False
+        }
+        
+        if is_valid:
+            result['message'] = f'Avatar {avatar_id} válido'
+            logger.info(f"✓ Avatar {avatar_id} validado correctamente")
+        else:
+            result['message'] = f'Avatar {avatar_id} no encontrado en HeyGen'
+            logger.warning(f"⚠ Avatar {avatar_id} no encontrado. Buscando fallback...")
+            
+            # Buscar fallback: mismo género si es posible
+            # Por ahora, usar el primer avatar disponible
+            if avatar_ids:
+                fallback_avatar_id = avatar_ids[0]
+                fallback_avatar = avatar_map.get(fallback_avatar_id, {})
+                result['fallback_avatar_id'] = fallback_avatar_id
+                result['fallback_avatar_name'] = fallback_avatar.get('name', 'Avatar por defecto')
+                result['message'] = f'Avatar no encontrado. Usando fallback: {result["fallback_avatar_name"]}'
+                logger.info(f"✓ Fallback encontrado: {fallback_avatar_id} ({result['fallback_avatar_name']})")
+            else:
+                result['message'] = 'Avatar no encontrado y no hay avatares disponibles'
+                logger.error(f"❌ No hay avatares disponibles para fallback")
+        
+        return result
+    
+    @staticmethod
+    def validate_many(voice_ids: List[str] = None, avatar_ids: List[str] = None) -> Dict:
+        """
+        Valida varias voces y avatares con una sola consulta de cada lista
+        
+        Los resultados quedan en el mismo caché que validate_voice/validate_avatar,
+        así las validaciones posteriores de cada escena no consultan HeyGen.
+        
+        Returns:
+            {'voices': {voice_id: resultado}, 'avatars': {avatar_id: resultado}}
+        """
+        voice_ids = sorted({vid for vid in (voice_ids or []) if vid})
+        avatar_ids = sorted({aid for aid in (avatar_ids or []) if aid})
+        results = {'voices': {}, 'avatars': {}}
+        to_cache = {}
+        api_service = APIService()
+        
+        if voice_ids:
+            voices = api_service.list_voices(use_cache=True)
+            for voice_id in voice_ids:
+                results['voices'][voice_id] = VoiceValidator._voice_result(voice_id, voices)
+                to_cache[f'voice_validation:{voice_id}'] = results['voices'][voice_id]
+        
+        if avatar_ids:
+            avatars = api_service.list_avatars(use_cache=True)
+            for avatar_id in avatar_ids:
+                results['avatars'][avatar_id] = VoiceValidator._avatar_result(avatar_id, avatars)
+                to_cache[f'avatar_validation:{avatar_id}'] = results['avatars'][avatar_id]
+        
+        if to_cache:
+            cache.set_many(to_cache, VoiceValidator.VALIDATION_CACHE_TTL)
+        
+        return results
+    
     @staticmethod
     def get_valid_voice(voice_id: str, script_default_voice_id: Optional[str] = None, 
                        force_refresh: bool = False) -> Dict:
@@ -230,8 +230,12 @@ class ScriptAgentService:
                     # Crear escenas usando SceneService
                     created_scenes = SceneService.create_scenes_from_n8n_data(script, scenes_data)
                     
-                    # Iniciar generación de preview images solo si está habilitado
-                    if script.generate_previews:
+                    # Pre-generación especulativa (previews de prioridad baja, validación de
+                    # voces/avatares y estimación TTS) en segundo plano
+                    from core.services.prefetch import SpeculativePrefetch
+                    if SpeculativePrefetch.schedule(script):
+                        logger.info(f"✓ Pre-generación especulativa programada para script {script.id}")
+                    elif script.generate_previews:
                         scene_service = SceneService()
                         for scene in created_scenes:
                             try:
@@ -1,19 +1,79 @@
 """Google Cloud Storage Manager"""
 from google.cloud import storage
 from django.conf import settings
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import quote
+import hashlib
+import hmac
 import logging
 import requests
 import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
 
+class SignedURLLRU:
+    """
+    Caché LRU en proceso para URLs firmadas
+    
+    Se consulta antes que Redis. Cada entrada guarda el instante (epoch) a
+    partir del cual deja de ser válida, de modo que nunca se sirve una URL
+    cercana a expirar.
+    """
+    
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            url, valid_until = entry
+            if valid_until <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return url
+    
+    def set(self, key: str, url: str, valid_until: float) -> None:
+        with self._lock:
+            self._data[key] = (url, valid_until)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
 class GCSStorageManager:
     """Gestor para Google Cloud Storage"""
     
+    # Tamaño de chunk para subidas/descargas resumibles (múltiplo de 256 KB, requerido por GCS)
+    # El consumo de memoria por transferencia queda acotado a este tamaño
+    CHUNK_SIZE = 8 * 1024 * 1024  # 8 MB
+    
+    # Host para URLs firmadas V4
+    SIGNING_HOST = 'storage.googleapis.com'
+    
+    # Prefijo de claves de caché de URLs firmadas (valor: {'url', 'valid_until'})
+    SIGNED_URL_CACHE_PREFIX = 'gcs_signed_url:v2:'
+    
+    # Fracción de la expiración durante la que se reutiliza una URL firmada
+    SIGNED_URL_REUSE_RATIO = 0.9
+    
     def __init__(self):
         self._client = None
         self._bucket = None
+        self._signed_url_lru = SignedURLLRU()
     
     @property
     def client(self):
@@ -29,6 +89,23 @@ class GCSStorageManager:
             self._bucket = self.client.bucket(settings.GCS_BUCKET_NAME)
         return self._bucket
     
+    def _get_blob(self, gcs_path: str, chunked: bool = False):
+        """
+        Obtiene el blob para un path gs://bucket/path, bucket/path o path relativo
+        
+        Args:
+            gcs_path: Path del archivo
+            chunked: Si True, configura chunk_size para transferencias resumibles por chunks
+        """
+        bucket_name, blob_name = self.parse_gcs_path(gcs_path)
+        
+        if bucket_name == settings.GCS_BUCKET_NAME:
+            bucket = self.bucket
+        else:
+            bucket = self.client.bucket(bucket_name)
+        
+        return bucket.blob(blob_name, chunk_size=self.CHUNK_SIZE if chunked else None)
+    
     def copy_from_gcs(self, source_gcs_uri: str, destination_path: str) -> str:
         """
         Copia un archivo desde otro bucket de GCS a nuestro bucket
@@ -77,36 +154,86 @@ class GCSStorageManager:
             raise
     
     def upload_from_url(self, url: str, destination_path: str) -> str:
-        """Descarga un archivo desde URL y lo sube a GCS"""
+        """
+        Descarga un archivo desde URL y lo sube a GCS en streaming
+        
+        El cuerpo HTTP se envía al blob por chunks resumibles sin cargar el
+        archivo completo en memoria; cada chunk se guarda en un buffer hasta
+        que GCS lo confirma, así un chunk fallido se reenvía sin repetir la
+        descarga (ver upload_stream).
+        """
         try:
             logger.info(f"[GCS] Descargando archivo desde: {url}")
-            response = requests.get(url, stream=True, timeout=300)
-            response.raise_for_status()
-            
-            content_length = len(response.content)
-            logger.info(f"[GCS] Archivo descargado: {content_length / (1024*1024):.2f} MB")
+            with requests.get(url, stream=True, timeout=300) as response:
+                response.raise_for_status()
+                
+                content_length = response.headers.get('content-length')
+                size = int(content_length) if content_length and content_length.isdigit() else None
+                if size:
+                    logger.info(f"[GCS] Tamaño del archivo: {size / (1024*1024):.2f} MB")
+                
+                # Descomprimir gzip/deflate de transporte al leer del socket
+                response.raw.decode_content = True
+                
+                return self.upload_stream(
+                    response.raw,
+                    destination_path,
+                    content_type=response.headers.get('content-type', 'video/mp4'),
+                    # Con decode_content el tamaño real puede diferir del content-length
+                    size=size if not response.headers.get('content-encoding') else None
+                )
             
-            blob = self.bucket.blob(destination_path)
-            logger.info(f"[GCS] Subiendo a: {destination_path}")
+        except Exception as e:
+            logger.error(f"[GCS] ❌ Error al subir archivo: {str(e)}")
+            raise
+    
+    def upload_stream(self, stream, destination_path: str, content_type: str = 'application/octet-stream', size: int = None) -> str:
+        """
+        Sube un objeto file-like a GCS por chunks resumibles
+        
+        Cada chunk que falla se reintenta desde la última posición confirmada
+        por GCS. Un stream con seek (archivo, UploadedFile) se rebobina hasta
+        esa posición; uno sin seek (response.raw) se sube con BlobWriter, que
+        mantiene el chunk en curso en memoria (CHUNK_SIZE) para poder reenviarlo.
+        
+        Args:
+            stream: Objeto con read(n) (archivo abierto, response.raw, UploadedFile...)
+            destination_path: Path destino en el bucket
+            content_type: MIME type del archivo
+            size: Tamaño total en bytes si se conoce (opcional)
+        
+        Returns:
+            URI completa del archivo subido
+        """
+        from google.cloud.storage.retry import DEFAULT_RETRY
+        
+        try:
+            logger.info(f"[GCS] Subiendo en streaming a: {destination_path}")
             
-            blob.upload_from_string(
-                response.content,
-                content_type=response.headers.get('content-type', 'video/mp4')
-            )
+            blob = self._get_blob(destination_path, chunked=True)
+            seekable = getattr(stream, 'seekable', None)
+            if seekable and seekable():
+                blob.upload_from_file(stream, content_type=content_type, size=size, rewind=False, retry=DEFAULT_RETRY)
+            else:
+                writer = blob.open('wb', chunk_size=self.CHUNK_SIZE, content_type=content_type, retry=DEFAULT_RETRY)
+                for chunk in iter(lambda: stream.read(self.CHUNK_SIZE), b''):
+                    writer.write(chunk)
+                # Solo se finaliza el objeto si el stream se leyó completo
+                writer.close()
             
             gcs_path = f"gs://{settings.GCS_BUCKET_NAME}/{destination_path}"
             logger.info(f"[GCS] ✅ Archivo subido exitosamente: {gcs_path}")
             return gcs_path
             
         except Exception as e:
-            logger.error(f"[GCS] ❌ Error al subir archivo: {str(e)}")
+            logger.error(f"[GCS] ❌ Error al subir en streaming: {str(e)}")
             raise
     
-    def upload_file(self, local_path: str, destination_path: str) -> str:
-        """Sube un archivo local a GCS"""
+    def upload_file(self, local_path: str, destination_path: str, content_type: str = None) -> str:
+        """Sube un archivo local a GCS por chunks resumibles (sin leerlo entero en memoria)"""
         try:
-            blob = self.bucket.blob(destination_path)
-            blob.upload_from_filename(local_path)
+            blob = self._get_blob(destination_path, chunked=True)
+            blob.upload_from_filename(local_path, content_type=content_type)
             
             gcs_path = f"gs://{settings.GCS_BUCKET_NAME}/{destination_path}"
             logger.info(f"[GCS] Subido a {gcs_path}")
@@ -116,6 +243,44 @@ class GCSStorageManager:
             logger.error(f"[GCS] Error: {str(e)}")
             raise
     
+    def download_to_file(self, gcs_path: str, local_path: str) -> str:
+        """
+        Descarga un archivo de GCS a disco por chunks
+        
+        Args:
+            gcs_path: Path en formato gs://bucket/path o path relativo
+            local_path: Ruta local destino
+        
+        Returns:
+            Ruta local del archivo descargado
+        """
+        try:
+            blob = self._get_blob(gcs_path, chunked=True)
+            blob.download_to_filename(local_path)
+            logger.info(f"[GCS] Descargado {gcs_path} a {local_path}")
+            return local_path
+            
+        except Exception as e:
+            logger.error(f"[GCS] ❌ Error al descargar {gcs_path}: {str(e)}")
+            raise
+    
+    def download_as_bytes(self, gcs_path: str) -> bytes:
+        """Descarga un archivo pequeño (imágenes, JSON) de GCS a memoria"""
+        try:
+            return self._get_blob(gcs_path).download_as_bytes()
+        except Exception as e:
+            logger.error(f"[GCS] ❌ Error al descargar {gcs_path}: {str(e)}")
+            raise
+    
+    def open_read(self, gcs_path: str):
+        """
+        Abre un archivo de GCS para lectura en streaming
+        
+        Returns:
+            Objeto file-like (BlobReader) que lee por chunks de CHUNK_SIZE
+        """
+        return self._get_blob(gcs_path).open('rb', chunk_size=self.CHUNK_SIZE)
+    
     def upload_from_bytes(self, file_content: bytes, destination_path: str, content_type: str = 'image/jpeg') -> str:
         """Sube contenido desde bytes a GCS"""
         try:
@@ -149,90 +314,201 @@ class GCSStorageManager:
             raise
     
     def upload_django_file(self, django_file, destination_path: str) -> str:
-        """Sube un archivo de Django (UploadedFile) a GCS"""
+        """Sube un archivo de Django (UploadedFile) a GCS en streaming"""
         try:
             logger.info(f"[GCS] Subiendo archivo Django: {django_file.name} ({django_file.size} bytes)")
             
-            # Leer contenido del archivo
-            file_content = django_file.read()
-            content_type = django_file.content_type or 'application/octet-stream'
+            content_type = getattr(django_file, 'content_type', None) or 'application/octet-stream'
+            django_file.seek(0)
             
-            return self.upload_from_bytes(file_content, destination_path, content_type)
+            return self.upload_stream(django_file, destination_path, content_type, size=django_file.size)
             
         except Exception as e:
             logger.error(f"[GCS] ❌ Error al subir archivo Django: {str(e)}")
             raise
     
+    def parse_gcs_path(self, gcs_path: str) -> Tuple[str, str]:
+        """Devuelve (bucket_name, blob_name) para gs://bucket/path, bucket/path o path relativo"""
+        if gcs_path.startswith('gs://'):
+            parts = gcs_path.replace('gs://', '', 1).split('/', 1)
+            return parts[0], parts[1] if len(parts) > 1 else ''
+        if gcs_path.startswith(f"{settings.GCS_BUCKET_NAME}/"):
+            return settings.GCS_BUCKET_NAME, gcs_path.replace(f"{settings.GCS_BUCKET_NAME}/", "", 1)
+        return settings.GCS_BUCKET_NAME, gcs_path
+    
+    def _signed_url_cache_key(self, bucket_name: str, blob_name: str, expiration: int) -> str:
+        # Hash para no depender de la longitud ni de caracteres especiales del path
+        digest = hashlib.sha1(f"{bucket_name}/{blob_name}".encode('utf-8')).hexdigest()
+        return f"{self.SIGNED_URL_CACHE_PREFIX}{digest}:{expiration}"
+    
+    def _sign_url_hmac(self, bucket_name: str, blob_name: str, expiration: int) -> str:
+        """
+        Firma una URL V4 (GOOG4-HMAC-SHA256) localmente con una clave HMAC de GCS
+        
+        No hace llamadas de red ni operaciones RSA: solo HMAC-SHA256.
+        """
+        access_id = settings.GCS_HMAC_ACCESS_ID
+        secret = settings.GCS_HMAC_SECRET
+        
+        now = datetime.now(timezone.utc)
+        request_timestamp = now.strftime('%Y%m%dT%H%M%SZ')
+        datestamp = now.strftime('%Y%m%d')
+        credential_scope = f"{datestamp}/auto/storage/goog4_request"
+        
+        canonical_uri = f"/{bucket_name}/{quote(blob_name, safe='/~')}"
+        query_params = {
+            'X-Goog-Algorithm': 'GOOG4-HMAC-SHA256',
+            'X-Goog-Credential': f"{access_id}/{credential_scope}",
+            'X-Goog-Date': request_timestamp,
+            'X-Goog-Expires': str(expiration),
+            'X-Goog-SignedHeaders': 'host',
+        }
+        canonical_query = '&'.join(
+            f"{quote(k, safe='~')}={quote(v, safe='~')}" for k, v in sorted(query_params.items())
+        )
+        canonical_request = '\n'.join([
+            'GET',
+            canonical_uri,
+            canonical_query,
+            f"host:{self.SIGNING_HOST}\n",
+            'host',
+            'UNSIGNED-PAYLOAD',
+        ])
+        string_to_sign = '\n'.join([
+            'GOOG4-HMAC-SHA256',
+            request_timestamp,
+            credential_scope,
+            hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+        ])
+        
+        def _hmac(key: bytes, msg: str) -> bytes:
+            return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+        
+        signing_key = _hmac(f"GOOG4{secret}".encode('utf-8'), datestamp)
+        for scope_part in ('auto', 'storage', 'goog4_request'):
+            signing_key = _hmac(signing_key, scope_part)
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        
+        return f"https://{self.SIGNING_HOST}{canonical_uri}?{canonical_query}&X-Goog-Signature={signature}"
+    
+    def _sign_url(self, bucket_name: str, blob_name: str, expiration: int) -> str:
+        """
+        Firma una URL de lectura
+        
+        Usa la clave HMAC si está configurada (GCS_HMAC_ACCESS_ID / GCS_HMAC_SECRET);
+        si no, la librería firma con las credenciales del cliente (que se
+        cargan una sola vez por proceso).
+        """
+        if getattr(settings, 'GCS_HMAC_ACCESS_ID', '') and getattr(settings, 'GCS_HMAC_SECRET', ''):
+            return self._sign_url_hmac(bucket_name, blob_name, expiration)
+        
+        if bucket_name == settings.GCS_BUCKET_NAME:
+            bucket = self.bucket
+        else:
+            bucket = self.client.bucket(bucket_name)
+        
+        return bucket.blob(blob_name).generate_signed_url(
+            version="v4",
+            expiration=expiration,
+            method="GET"
+        )
+    
+    def get_signed_urls(self, gcs_paths: Iterable[str], expiration: int = 3600) -> Dict[str, str]:
+        """
+        Genera URLs firmadas para varios archivos de una vez
+        
+        Orden de resolución:
+            1. LRU en proceso
+            2. Redis: una sola lectura MGET para todos los fallos del LRU
+            3. Firma local de los que falten, guardados con un único set_many (pipeline)
+        
+        Args:
+            gcs_paths: Paths en formato gs://bucket/path o relativos (se ignoran vacíos/duplicados)
+            expiration: Tiempo de expiración en segundos
+        
+        Returns:
+            Dict {gcs_path: signed_url}. Los paths que no se pudieron firmar no aparecen.
+        """
+        result = {}
+        pending = {}  # cache_key -> (gcs_path, bucket_name, blob_name)
+        
+        for gcs_path in gcs_paths:
+            if not gcs_path or gcs_path in result:
+                continue
+            bucket_name, blob_name = self.parse_gcs_path(gcs_path)
+            cache_key = self._signed_url_cache_key(bucket_name, blob_name, expiration)
+            
+            url = self._signed_url_lru.get(cache_key)
+            if url:
+                result[gcs_path] = url
+            else:
+                pending.setdefault(cache_key, []).append((gcs_path, bucket_name, blob_name))
+        
+        if not pending:
+            return result
+        
+        # Segundo nivel: Redis (MGET)
+        from django.core.cache import cache
+        try:
+            cached = cache.get_many(list(pending.keys()))
+        except Exception as e:
+            logger.debug(f"[GCS] Error al leer URLs firmadas del caché (continuando sin caché): {e}")
+            cached = {}
+        
+        now = time.time()
+        to_cache = {}
+        for cache_key, entries in pending.items():
+            entry = cached.get(cache_key)
+            if isinstance(entry, dict) and entry.get('valid_until', 0) > now:
+                url = entry['url']
+                self._signed_url_lru.set(cache_key, url, entry['valid_until'])
+            else:
+                _, bucket_name, blob_name = entries[0]
+                try:
+                    url = self._sign_url(bucket_name, blob_name, expiration)
+                except Exception as e:
+                    logger.error(f"Error al generar URL para {bucket_name}/{blob_name}: {str(e)}")
+                    continue
+                valid_until = now + int(expiration * self.SIGNED_URL_REUSE_RATIO)
+                self._signed_url_lru.set(cache_key, url, valid_until)
+                to_cache[cache_key] = {'url': url, 'valid_until': valid_until}
+            
+            for gcs_path, _, _ in entries:
+                result[gcs_path] = url
+        
+        # Guardar las firmas nuevas en un solo set_many (pipeline en Redis)
+        if to_cache:
+            try:
+                cache.set_many(to_cache, int(expiration * self.SIGNED_URL_REUSE_RATIO))
+                logger.debug(f"[GCS] {len(to_cache)} URLs firmadas guardadas en caché")
+            except Exception as e:
+                logger.debug(f"[GCS] Error al guardar URLs firmadas en caché (continuando sin caché): {e}")
+        
+        return result
+    
     def get_signed_url(self, gcs_path: str, expiration: int = 3600, use_cache: bool = True) -> str:
         """
         Genera URL firmada para acceder a un archivo con caché opcional
         
+        Para varios archivos usar get_signed_urls, que resuelve todo con una
+        lectura y una escritura de Redis.
+        
         Args:
             gcs_path: Path en formato gs://bucket/path o path relativo
             expiration: Tiempo de expiración en segundos (default: 3600)
-            use_cache: Si True, usa caché de Redis para evitar regenerar URLs
+            use_cache: Si True, usa el LRU en proceso y Redis para evitar regenerar URLs
         
         Returns:
             URL firmada
         """
-        # Intentar obtener del caché si está habilitado
         if use_cache:
-            try:
-                from django.core.cache import cache
-                cache_key = f'gcs_signed_url:{gcs_path}:{expiration}'
-                cached_url = cache.get(cache_key)
-                if cached_url:
-                    logger.debug(f"[GCS] URL firmada obtenida del caché: {gcs_path}")
-                    return cached_url
-            except Exception as e:
-                # Si hay error con el caché, continuar sin caché
-                logger.debug(f"[GCS] Error al obtener del caché (continuando sin caché): {e}")
+            url = self.get_signed_urls([gcs_path], expiration=expiration).get(gcs_path)
+            if url:
+                return url
+        
         try:
-            # Parsear gcs_path: gs://bucket_name/path/to/file
-            if gcs_path.startswith('gs://'):
-                gcs_path = gcs_path.replace('gs://', '')
-                parts = gcs_path.split('/', 1)
-                bucket_name = parts[0]
-                blob_name = parts[1] if len(parts) > 1 else ''
-            else:
-                # Si no empieza con gs://, verificar si contiene bucket name
-                if gcs_path.startswith(f"{settings.GCS_BUCKET_NAME}/"):
-                    # Path contiene bucket name al inicio, extraerlo
-                    blob_name = gcs_path.replace(f"{settings.GCS_BUCKET_NAME}/", "", 1)
-                else:
-                    # Path relativo sin bucket name
-                    blob_name = gcs_path
-                bucket_name = settings.GCS_BUCKET_NAME
-            
-            # Obtener el bucket (puede ser diferente al bucket por defecto)
-            if bucket_name == settings.GCS_BUCKET_NAME:
-                bucket = self.bucket
-            else:
-                bucket = self.client.bucket(bucket_name)
-            
-            blob = bucket.blob(blob_name)
-            
-            url = blob.generate_signed_url(
-                version="v4",
-                expiration=expiration,
-                method="GET"
-            )
-            
-            # Guardar en caché si está habilitado (cachear por menos tiempo que la expiración)
-            if use_cache:
-                try:
-                    from django.core.cache import cache
-                    cache_key = f'gcs_signed_url:{gcs_path}:{expiration}'
-                    # Cachear por 90% del tiempo de expiración para evitar URLs expiradas
-                    cache_timeout = int(expiration * 0.9)
-                    cache.set(cache_key, url, cache_timeout)
-                    logger.debug(f"[GCS] URL firmada guardada en caché por {cache_timeout}s: {gcs_path}")
-                except Exception as e:
-                    # Si hay error con el caché, continuar sin caché
-                    logger.debug(f"[GCS] Error al guardar en caché (continuando sin caché): {e}")
-            
-            return url
-            
+            bucket_name, blob_name = self.parse_gcs_path(gcs_path)
+            return self._sign_url(bucket_name, blob_name, expiration)
         except Exception as e:
             logger.error(f"Error al generar URL: {str(e)}")
             raise
@@ -251,6 +527,31 @@ class GCSStorageManager:
             logger.error(f"Error al eliminar: {str(e)}")
             return False
     
+    def get_content_fingerprint(self, gcs_path: str) -> Optional[str]:
+        """
+        Huella del contenido de un blob usando solo metadata (sin descargarlo)
+        
+        Usa el MD5 que calcula GCS; para objetos compuestos (sin MD5) usa el
+        CRC32C, y en último caso la generación del objeto.
+        
+        Returns:
+            Huella del contenido o None si el blob no existe o falla la consulta
+        """
+        try:
+            bucket_name, blob_name = self.parse_gcs_path(gcs_path)
+            bucket = self.bucket if bucket_name == settings.GCS_BUCKET_NAME else self.client.bucket(bucket_name)
+            blob = bucket.get_blob(blob_name)
+            if blob is None:
+                return None
+            if blob.md5_hash:
+                return f"md5:{blob.md5_hash}"
+            if blob.crc32c:
+                return f"crc32c:{blob.crc32c}:{blob.size}"
+            return f"gen:{bucket_name}/{blob_name}#{blob.generation}"
+        except Exception as e:
+            logger.warning(f"[GCS] No se pudo obtener la huella de {gcs_path}: {e}")
+            return None
+    
     def file_exists(self, gcs_path: str) -> bool:
         """Verifica si existe un archivo"""
         try:
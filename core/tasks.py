@@ -10,7 +10,10 @@ from celery import shared_task
 from django.utils import timezone
 from django.contrib.auth.models import User
 from core.models import GenerationTask, Video, Image, Audio, Scene, Notification
-from core.services import VideoService, ImageService, AudioService
+from core.services import VideoService, ImageService, AudioService, GenerationPendingException
+from core.ai_services.polling import next_poll_delay, poll_timeout
+from core.monitoring.telemetry import GenerationTelemetry
+from core.services.scheduler import provider_scheduler
 
 # rembg imports are done lazily inside the task to avoid CI failures
 # (rembg requires onnxruntime which is heavy and not needed for tests)
@@ -34,6 +37,10 @@ def generate_video_task(self, task_uuid, video_uuid, user_id, **kwargs):
     """
     try:
         task = GenerationTask.objects.get(uuid=task_uuid)
+        # Sin cupo en el proveedor: re-programar sin gastar reintentos
+        if provider_scheduler.defer_if_throttled(self, task):
+            return {'status': 'deferred', 'task_uuid': str(task_uuid)}
+        
         task.mark_as_processing()
         
         user = User.objects.get(id=user_id)
@@ -47,7 +54,8 @@ def generate_video_task(self, task_uuid, video_uuid, user_id, **kwargs):
         
         # El servicio ya maneja la selección del servicio correcto según video.type
         video_service = VideoService()
-        external_id = video_service.generate_video(video=video)
+        with GenerationTelemetry.span('submit', **GenerationTelemetry.task_attributes(task)):
+            external_id = video_service.generate_video(video=video)
         
         # Recargar para ver el estado actual
         video.refresh_from_db()
@@ -72,13 +80,21 @@ def generate_video_task(self, task_uuid, video_uuid, user_id, **kwargs):
             logger.info(f"Video {video.uuid} generado exitosamente (síncrono).")
             return {'status': 'completed', 'video_uuid': str(video.uuid), 'external_id': external_id}
         else:
-            # Servicio asíncrono (Veo) - solo se envió, hay que hacer polling
-            # Programar primer poll en 30 segundos (Veo tarda ~2-5 minutos)
-            poll_video_status_task.apply_async(
-                args=[str(task_uuid), str(video.uuid), user_id],
-                countdown=30  # Primer check en 30 segundos
-            )
-            logger.info(f"Video {video.uuid} enviado a generación asíncrona. Polling programado. External ID: {external_id}")
+            # Servicio asíncrono (Veo, Sora, Kling...) - solo se envió
+            # El ProviderStatusWatcher recoge la tarea en su siguiente sincronización;
+            # si está desactivado, volver a la cadena de polling por video
+            from core.services.status_watcher import is_watcher_enabled
+            if video.type == 'manim_quote':
+                # El render final corre en su propia tarea (render_manim_quote_task)
+                logger.info(f"Video {video.uuid}: render final de Manim encolado")
+            elif is_watcher_enabled():
+                logger.info(f"Video {video.uuid} enviado a generación asíncrona. Seguimiento por StatusWatcher. External ID: {external_id}")
+            else:
+                poll_video_status_task.apply_async(
+                    args=[str(task_uuid), str(video.uuid), user_id],
+                    countdown=30  # Primer check en 30 segundos
+                )
+                logger.info(f"Video {video.uuid} enviado a generación asíncrona. Polling programado. External ID: {external_id}")
             return {'status': 'processing', 'video_uuid': str(video.uuid), 'external_id': external_id}
         
     except Exception as exc:
@@ -120,6 +136,39 @@ def generate_video_task(self, task_uuid, video_uuid, user_id, **kwargs):
         return {'status': 'failed', 'error': str(exc)}
 
 
+@shared_task(bind=True, max_retries=2)
+def render_manim_quote_task(self, video_uuid):
+    """
+    Render final de un video de cita de Manim
+
+    Lo encola VideoService._generate_manim_quote_video tras el preview; al
+    terminar cierra la GenerationTask del video y notifica al usuario.
+    """
+    from core.services.status_watcher import notify_video_transition
+    
+    video = Video.objects.select_related('project', 'created_by').get(uuid=video_uuid)
+    if video.status != 'processing':
+        return {'status': 'skipped', 'video_uuid': video_uuid}
+    
+    task = GenerationTask.objects.select_related('user').filter(
+        task_type='video', item_uuid=video.uuid, status='processing'
+    ).order_by('-created_at').first()
+    attributes = GenerationTelemetry.task_attributes(task) if task else {'task_type': 'video', 'provider': 'manim'}
+    
+    try:
+        with GenerationTelemetry.span('generate', **attributes):
+            VideoService().render_manim_quote_final(video)
+    except Exception as exc:
+        logger.error(f"Error en el render final de Manim del video {video_uuid}: {exc}", exc_info=True)
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=30)
+        video.mark_as_error(str(exc))
+    
+    video.refresh_from_db()
+    notify_video_transition(task, video)
+    return {'status': video.status, 'video_uuid': video_uuid}
+
+
 @shared_task(bind=True, max_retries=3)
 def generate_image_task(self, task_uuid, image_uuid, user_id, **kwargs):
     """
@@ -136,6 +185,10 @@ def generate_image_task(self, task_uuid, image_uuid, user_id, **kwargs):
     """
     try:
         task = GenerationTask.objects.get(uuid=task_uuid)
+        # Sin cupo en el proveedor: re-programar sin gastar reintentos
+        if provider_scheduler.defer_if_throttled(self, task):
+            return {'status': 'deferred', 'task_uuid': str(task_uuid)}
+        
         task.mark_as_processing()
         
         user = User.objects.get(id=user_id)
@@ -162,22 +215,24 @@ def generate_image_task(self, task_uuid, image_uuid, user_id, **kwargs):
         
         # El servicio ya maneja la selección del servicio correcto según image.config
         image_service = ImageService()
-        # Pasar skip_status_check=True para evitar validación de estado (ya la validamos arriba)
-        gcs_path = image_service.generate_image(image=image, skip_status_check=True)
+        try:
+            # Pasar skip_status_check=True para evitar validación de estado (ya la validamos arriba)
+            with GenerationTelemetry.span(
+                'generate', ok_exceptions=(GenerationPendingException,), **GenerationTelemetry.task_attributes(task)
+            ):
+                gcs_path = image_service.generate_image(image=image, skip_status_check=True, defer_polling=True)
+        except GenerationPendingException as pending:
+            # Proveedor asíncrono: la espera se aparca en poll_image_status_task
+            # en lugar de bloquear este worker
+            poll_image_status_task.apply_async(
+                args=[str(task_uuid), str(image.uuid), user_id],
+                kwargs={'provider': pending.provider},
+                countdown=next_poll_delay(pending.provider, pending.model_id, 0),
+            )
+            return {'status': 'polling', 'image_uuid': str(image.uuid), 'external_id': pending.external_id}
         
         task.mark_as_completed()
-        
-        # Crear notificación de éxito
-        from core.models import Notification
-        Notification.create_notification(
-            user=user,
-            type='generation_completed',
-            title='Imagen generada',
-            message=f'Tu imagen "{image.title}" está lista',
-            action_url=f'/images/{image.uuid}/',
-            action_label='Ver imagen',
-            metadata={'item_type': 'image', 'item_uuid': str(image.uuid)}
-        )
+        _notify_image_completed(user, image)
         
         logger.info(f"Imagen {image_uuid} generada exitosamente. GCS Path: {gcs_path}")
         return {'status': 'completed', 'image_uuid': str(image_uuid), 'gcs_path': gcs_path}
@@ -229,6 +284,19 @@ def generate_image_task(self, task_uuid, image_uuid, user_id, **kwargs):
         return {'status': 'failed', 'error': str(exc), 'image_uuid': str(image_uuid)}
 
 
+def _notify_image_completed(user, image):
+    """Notificación de imagen generada"""
+    Notification.create_notification(
+        user=user,
+        type='generation_completed',
+        title='Imagen generada',
+        message=f'Tu imagen "{image.title}" está lista',
+        action_url=f'/images/{image.uuid}/',
+        action_label='Ver imagen',
+        metadata={'item_type': 'image', 'item_uuid': str(image.uuid)}
+    )
+
+
 @shared_task(bind=True, max_retries=3)
 def upscale_image_task(self, task_uuid, image_uuid, user_id, **kwargs):
     """
@@ -242,6 +310,10 @@ def upscale_image_task(self, task_uuid, image_uuid, user_id, **kwargs):
     """
     try:
         task = GenerationTask.objects.get(uuid=task_uuid)
+        # Sin cupo en el proveedor: re-programar sin gastar reintentos
+        if provider_scheduler.defer_if_throttled(self, task):
+            return {'status': 'deferred', 'task_uuid': str(task_uuid)}
+        
         task.mark_as_processing()
         
         user = User.objects.get(id=user_id)
@@ -376,6 +448,10 @@ def generate_audio_task(self, task_uuid, audio_uuid, user_id, **kwargs):
     """
     try:
         task = GenerationTask.objects.get(uuid=task_uuid)
+        # Sin cupo en el proveedor: re-programar sin gastar reintentos
+        if provider_scheduler.defer_if_throttled(self, task):
+            return {'status': 'deferred', 'task_uuid': str(task_uuid)}
+        
         task.mark_as_processing()
         
         user = User.objects.get(id=user_id)
@@ -390,7 +466,8 @@ def generate_audio_task(self, task_uuid, audio_uuid, user_id, **kwargs):
         # El servicio ya maneja la selección del servicio correcto
         # with_timestamps viene de task.metadata, no de kwargs (que siempre está vacío)
         with_timestamps = task.metadata.get('with_timestamps', False)
-        gcs_path = AudioService.generate_audio(audio=audio, with_timestamps=with_timestamps)
+        with GenerationTelemetry.span('generate', **GenerationTelemetry.task_attributes(task)):
+            gcs_path = AudioService.generate_audio(audio=audio, with_timestamps=with_timestamps)
         
         task.mark_as_completed()
         
@@ -465,9 +542,25 @@ def generate_scene_preview_task(self, task_uuid, scene_id, user_id, **kwargs):
         **kwargs: Parámetros adicionales (custom_prompt opcional)
     """
     from core.services import SceneService
+    from core.services.prefetch import SpeculativePrefetch
     
+    speculative = False
     try:
         task = GenerationTask.objects.get(uuid=task_uuid)
+        speculative = bool((task.metadata or {}).get('speculative'))
+        
+        # Preview especulativa: descartarla sin gastar si la escena cambió o ya tiene preview
+        if speculative:
+            reason = SpeculativePrefetch.stale_reason(Scene.objects.get(id=int(scene_id)), task)
+            if reason:
+                task.mark_as_cancelled(reason=reason)
+                SpeculativePrefetch.release(task, reason)
+                return {'status': 'cancelled', 'scene_id': scene_id, 'reason': reason}
+        
+        # Sin cupo en el proveedor: re-programar sin gastar reintentos
+        if provider_scheduler.defer_if_throttled(self, task):
+            return {'status': 'deferred', 'task_uuid': str(task_uuid)}
+        
         task.mark_as_processing()
         
         user = User.objects.get(id=user_id)
@@ -492,6 +585,11 @@ def generate_scene_preview_task(self, task_uuid, scene_id, user_id, **kwargs):
         
         task.mark_as_completed()
         
+        # Las previews especulativas aparecen en la pantalla de configuración sin notificar
+        if speculative:
+            logger.info(f"Preview especulativa de escena {scene_id} generada. GCS Path: {gcs_path}")
+            return {'status': 'completed', 'scene_id': scene_id_int, 'gcs_path': gcs_path}
+        
         # Crear notificación de éxito
         from core.models import Notification
         Notification.create_notification(
@@ -513,6 +611,11 @@ def generate_scene_preview_task(self, task_uuid, scene_id, user_id, **kwargs):
             task = GenerationTask.objects.get(uuid=task_uuid)
             task.mark_as_failed(str(exc))
             
+            # Especulativa: sin reintentos ni notificación; se devuelve el presupuesto
+            if speculative:
+                SpeculativePrefetch.release(task, str(exc))
+                return {'status': 'failed', 'error': str(exc)}
+            
             # Crear notificación de error solo si no se va a reintentar
             if task.retry_count >= task.max_retries:
                 try:
@@ -538,6 +641,27 @@ def generate_scene_preview_task(self, task_uuid, scene_id, user_id, **kwargs):
         return {'status': 'failed', 'error': str(exc)}
 
 
+@shared_task
+def prefetch_script_task(script_id):
+    """
+    Pre-generación especulativa de un script del agente recién procesado
+    
+    Valida en lote avatares/voces, estima la duración TTS de cada escena y
+    encola previews de prioridad baja (ver core/services/prefetch.py).
+    """
+    from core.models import Script
+    from core.services.prefetch import SpeculativePrefetch
+    
+    try:
+        return SpeculativePrefetch.run(script_id)
+    except Script.DoesNotExist:
+        logger.warning(f"Script {script_id} no encontrado para pre-generación")
+        return {'error': 'not_found'}
+    except Exception as exc:
+        logger.error(f"Error en pre-generación del script {script_id}: {exc}", exc_info=True)
+        return {'error': str(exc)}
+
+
 @shared_task(bind=True, max_retries=3)
 def combine_video_audio_task(self, task_uuid, scene_id, user_id, **kwargs):
     """
@@ -577,7 +701,8 @@ def combine_video_audio_task(self, task_uuid, scene_id, user_id, **kwargs):
         
         # Combinar video y audio usando SceneService
         scene_service = SceneService()
-        scene_service._auto_combine_video_audio_if_ready(scene)
+        with GenerationTelemetry.span('combine', **GenerationTelemetry.task_attributes(task)):
+            scene_service._auto_combine_video_audio_if_ready(scene)
         
         # Recargar escena para verificar resultado
         scene.refresh_from_db()
@@ -635,88 +760,237 @@ def combine_video_audio_task(self, task_uuid, scene_id, user_id, **kwargs):
         return {'status': 'failed', 'error': str(exc)}
 
 
-@shared_task
-def poll_video_status_task(task_uuid, video_uuid, user_id=None):
+@shared_task(bind=True, max_retries=3)
+def compose_final_video_task(self, task_uuid, video_uuid, user_id, **kwargs):
     """
-    Tarea periódica para verificar estado de generación de video
+    Tarea para componer el video final del agente a partir de sus escenas
+    
+    Descarga los videos de las escenas, los concatena con FFmpeg (stream copy
+    si son homogéneas) y sube el resultado. El progreso se publica en el bus de
+    progreso (WebSocket + snapshot) mientras la petición HTTP ya ha respondido.
     
     Args:
         task_uuid: UUID de la GenerationTask
-        video_uuid: UUID del Video
-        user_id: ID del usuario (para notificaciones)
-    
-    Nota: El VideoService ya tiene métodos _check_*_status que manejan
-    la selección del servicio correcto según video.type. Usaremos esos métodos.
+        video_uuid: UUID del Video final (creado en estado processing)
+        user_id: ID del usuario
+        **kwargs: Parámetros adicionales
     """
+    from core.services import VideoCompositionService
+    from core.services.progress_bus import ProgressBus
+    from core.models import Script
+    
     try:
         task = GenerationTask.objects.get(uuid=task_uuid)
+        task.mark_as_processing()
+        
+        user = User.objects.get(id=user_id)
         video = Video.objects.get(uuid=video_uuid)
         
-        # Si ya no está en processing, no hacer nada
-        if video.status not in ['pending', 'processing']:
-            if video.status == 'completed' and task.status != 'completed':
-                task.mark_as_completed()
-            return {'status': video.status}
+        # Mantener el orden de las escenas tal como se eligieron al encolar
+        scene_ids = video.config.get('scene_ids', [])
+        scenes_by_id = Scene.objects.select_related('project', 'script').in_bulk(scene_ids)
+        scenes = [scenes_by_id[scene_id] for scene_id in scene_ids if scene_id in scenes_by_id]
+        
+        def on_progress(percent, stage):
+            ProgressBus.publish(
+                user_id,
+                'video',
+                video.uuid,
+                'processing',
+                progress=percent,
+                task_uuid=task_uuid,
+                project_id=video.project_id,
+                stage=stage,
+            )
         
-        previous_status = video.status
+        gcs_path = VideoCompositionService.combine_scene_videos(
+            scenes,
+            video.config.get('output_filename') or f"{video.uuid}.mp4",
+            progress_callback=on_progress
+        )
         
-        # VideoService.check_video_status hace el dispatch internamente
-        video_service = VideoService()
-        video_service.check_video_status(video)
+        # Análisis del video compuesto (hecho antes de subirlo): duración y MediaInfo en la fila
+        from core.services.media_probe import MediaProbe
+        output_info = MediaProbe.cached(gcs_path)
+        metadata = {'duration': output_info.duration, 'media_info': {'file': output_info.to_dict()}} if output_info else None
         
-        # Recargar video para ver si cambió
-        video.refresh_from_db()
+        # Los créditos se cobraron al generar cada escena
+        video.mark_as_completed(gcs_path=gcs_path, metadata=metadata, charge_credits=False)
         
-        # Si el video terminó, actualizar task y enviar notificación
-        if video.status == 'completed' and previous_status != 'completed':
-            task.mark_as_completed()
-            
-            # Enviar notificación
-            if user_id:
-                try:
-                    user = User.objects.get(id=user_id)
-                    from core.models import Notification
-                    Notification.create_notification(
-                        user=user,
-                        type='generation_completed',
-                        title='Video generado',
-                        message=f'Tu video "{video.title}" está listo',
-                        action_url=f'/videos/{video.uuid}/',
-                        action_label='Ver video',
-                        metadata={'item_type': 'video', 'item_uuid': str(video.uuid)}
-                    )
-                    logger.info(f"Video {video.uuid} completado. Notificación enviada.")
-                except User.DoesNotExist:
-                    logger.warning(f"Usuario {user_id} no encontrado para notificación")
-            
-            return {'status': 'completed', 'video_uuid': str(video.uuid)}
+        # Asociar video final con el script
+        script_id = video.config.get('script_id')
+        if script_id:
+            Script.objects.filter(id=script_id).update(final_video=video)
+        
+        task.mark_as_completed()
+        
+        Notification.create_notification(
+            user=user,
+            type='generation_completed',
+            title='Video final listo',
+            message=f'El video "{video.title}" se ha compuesto con {len(scenes)} escenas',
+            action_url=f'/videos/{video.uuid}/',
+            action_label='Ver video',
+            metadata={'item_type': 'video', 'item_uuid': str(video.uuid)}
+        )
+        
+        logger.info(f"Video final {video_uuid} compuesto. GCS Path: {gcs_path}")
+        return {'status': 'completed', 'video_uuid': str(video_uuid), 'gcs_path': gcs_path}
+        
+    except Exception as exc:
+        logger.error(f"Error componiendo video final {video_uuid}: {exc}", exc_info=True)
+        
+        # Los errores de validación (p.ej. resoluciones distintas) no se arreglan reintentando
+        from core.services import ValidationException
+        retryable = not isinstance(exc, (ValidationException, Video.DoesNotExist))
         
-        elif video.status == 'error':
-            task.mark_as_failed(video.error_message or 'Error desconocido')
+        try:
+            task = GenerationTask.objects.get(uuid=task_uuid)
+            task.mark_as_failed(str(exc))
             
-            # Enviar notificación de error
-            if user_id:
-                try:
-                    user = User.objects.get(id=user_id)
-                    from core.models import Notification
-                    Notification.create_notification(
-                        user=user,
-                        type='generation_failed',
-                        title='Error al generar video',
-                        message=f'No se pudo generar el video "{video.title}"',
-                        metadata={'item_type': 'video', 'item_uuid': str(video.uuid), 'error': video.error_message}
-                    )
-                except User.DoesNotExist:
-                    pass
+            if retryable and task.retry_count < task.max_retries:
+                task.retry_count += 1
+                task.save(update_fields=['retry_count'])
+                raise self.retry(exc=exc, countdown=60 * (2 ** task.retry_count))
             
-            return {'status': 'error', 'video_uuid': str(video.uuid)}
+            video = Video.objects.filter(uuid=video_uuid).first()
+            if video:
+                video.mark_as_error(str(exc))
+            try:
+                user = User.objects.get(id=user_id)
+                Notification.create_notification(
+                    user=user,
+                    type='generation_failed',
+                    title='Error al componer video',
+                    message=f'No se pudo componer el video final: {str(exc)[:100]}',
+                    metadata={'item_type': 'video', 'item_uuid': str(video_uuid), 'error': str(exc)}
+                )
+            except User.DoesNotExist:
+                pass
+        except GenerationTask.DoesNotExist:
+            pass
         
-        # Sigue en processing - programar siguiente poll en 30 segundos
-        poll_video_status_task.apply_async(
-            args=[str(task_uuid), str(video_uuid), user_id],
-            countdown=30
-        )
-        return {'status': 'processing', 'video_uuid': str(video.uuid)}
+        return {'status': 'failed', 'error': str(exc)}
+
+
+@shared_task(bind=True, max_retries=None)
+def generate_scene_video_task(self, scene_id, batch_id=None):
+    """
+    Nodo de video de un storyboard: envía la escena a su proveedor
+    
+    La comprobación de estado posterior la hace el SceneReconciler. Nunca
+    propaga excepciones para no romper el chord del lote; los reintentos solo
+    se usan para esperar cupo en el proveedor (sin límite).
+    
+    Args:
+        scene_id: ID numérico de la Scene
+        batch_id: ID del lote de storyboard (opcional)
+    """
+    from celery.exceptions import Retry
+    from core.services import SceneService
+    from core.services.storyboard import StoryboardBatchService
+    
+    try:
+        scene = Scene.objects.select_related('script', 'script__created_by', 'project').get(id=scene_id)
+        if scene.video_status not in ['pending', 'error']:
+            return {'status': 'skipped', 'scene_id': scene_id}
+        # La escena fue reclamada por otro lote más reciente
+        if batch_id and (scene.metadata or {}).get('storyboard_batch') != batch_id:
+            return {'status': 'skipped', 'scene_id': scene_id}
+        
+        provider, model = provider_scheduler.classify(scene, 'scene_video')
+        wait = provider_scheduler.acquire(provider, f"scene:{scene.id}", model)
+        if wait:
+            raise self.retry(countdown=wait)
+        
+        external_id = SceneService().generate_scene_video(scene)
+        return {'status': 'submitted', 'scene_id': scene_id, 'external_id': external_id}
+    
+    except Retry:
+        raise
+    except Scene.DoesNotExist:
+        return {'status': 'failed', 'scene_id': scene_id, 'error': 'Escena no encontrada'}
+    except Exception as exc:
+        # generate_scene_video ya marcó la escena con error y devolvió la reserva
+        logger.error(f"Error enviando escena {scene_id} del storyboard {batch_id}: {exc}")
+        return {'status': 'failed', 'scene_id': scene_id, 'error': str(exc)}
+    finally:
+        if batch_id:
+            StoryboardBatchService.publish_progress(batch_id)
+
+
+@shared_task
+def generate_scene_audio_task(scene_id, batch_id=None):
+    """
+    Nodo de audio TTS de un storyboard, en paralelo con el video
+    
+    Al terminar combina video+audio si el video ya está listo; si no, lo hará
+    la comprobación de estado del video cuando complete.
+    
+    Args:
+        scene_id: ID numérico de la Scene
+        batch_id: ID del lote de storyboard (opcional)
+    """
+    from core.services import SceneService
+    from core.services.storyboard import StoryboardBatchService
+    
+    try:
+        scene = Scene.objects.select_related('script', 'project').get(id=scene_id)
+        if scene.audio_status in ['processing', 'completed']:
+            return {'status': 'skipped', 'scene_id': scene_id}
+        
+        scene_service = SceneService()
+        voice_id, voice_name = scene_service._resolve_scene_voice(scene)
+        scene_service._generate_scene_audio(scene, voice_id, voice_name)
+        return {'status': 'completed', 'scene_id': scene_id}
+    
+    except Scene.DoesNotExist:
+        return {'status': 'failed', 'scene_id': scene_id, 'error': 'Escena no encontrada'}
+    except Exception as exc:
+        logger.error(f"Error generando audio de escena {scene_id} del storyboard {batch_id}: {exc}")
+        return {'status': 'failed', 'scene_id': scene_id, 'error': str(exc)}
+    finally:
+        if batch_id:
+            StoryboardBatchService.publish_progress(batch_id)
+
+
+@shared_task
+def finalize_storyboard_batch_task(batch_id):
+    """Cierre del chord de un storyboard: todos los envíos a proveedores han terminado"""
+    from core.services.storyboard import StoryboardBatchService
+    
+    StoryboardBatchService.mark_submitted(batch_id)
+    event = StoryboardBatchService.publish_progress(batch_id, stage='rendering')
+    logger.info(f"Storyboard {batch_id} enviado a proveedores: {event}")
+    return event
+
+
+@shared_task
+def poll_video_status_task(task_uuid, video_uuid, user_id=None):
+    """
+    Verifica el estado de generación de un video
+    
+    Args:
+        task_uuid: UUID de la GenerationTask
+        video_uuid: UUID del Video
+        user_id: ID del usuario (no se usa, se mantiene por compatibilidad con tareas ya encoladas)
+    
+    Nota: Con STATUS_WATCHER_ENABLED la consulta es puntual y el seguimiento
+    posterior lo hace watch_provider_status_task. Sin el watcher, la tarea se
+    re-programa cada 30 segundos mientras el video siga en processing.
+    """
+    from core.services.status_watcher import status_watcher, is_watcher_enabled
+    
+    try:
+        status = status_watcher.check_task(task_uuid, video_uuid)
+        
+        if status in ['pending', 'processing'] and not is_watcher_enabled():
+            # Sigue en processing - programar siguiente poll en 30 segundos
+            poll_video_status_task.apply_async(
+                args=[str(task_uuid), str(video_uuid), user_id],
+                countdown=30
+            )
+        return {'status': status, 'video_uuid': str(video_uuid)}
         
     except Exception as exc:
         logger.error(f"Error en polling de video {video_uuid}: {exc}", exc_info=True)
@@ -724,18 +998,133 @@ def poll_video_status_task(task_uuid, video_uuid, user_id=None):
 
 
 @shared_task
-def poll_image_status_task(task_uuid, image_uuid):
+def watch_provider_status_task():
+    """
+    Tarea periódica (Celery Beat) que ejecuta una ronda del ProviderStatusWatcher
+    
+    Consulta por lotes los videos en curso de cada proveedor cuyo intervalo
+    adaptativo haya vencido. Un lock en caché garantiza que solo un worker
+    ejecuta la ronda a la vez.
+    """
+    from core.services.status_watcher import status_watcher, is_watcher_enabled
+    
+    if not is_watcher_enabled():
+        return {}
+    
+    try:
+        return status_watcher.run_once()
+    except Exception as exc:
+        logger.error(f"Error en ronda de StatusWatcher: {exc}", exc_info=True)
+        return {'error': str(exc)}
+
+
+@shared_task
+def reconcile_scenes_task():
+    """
+    Tarea periódica (Celery Beat) que ejecuta una ronda del SceneReconciler
+    
+    Consulta al proveedor las escenas en processing y cobra las escenas
+    completadas pendientes de cobro, de modo que SceneStatusView sea de solo
+    lectura.
+    """
+    from core.services.scene_reconciler import scene_reconciler
+    
+    try:
+        return scene_reconciler.run_once()
+    except Exception as exc:
+        logger.error(f"Error en ronda de SceneReconciler: {exc}", exc_info=True)
+        return {'error': str(exc)}
+
+
+@shared_task
+def admit_held_tasks_task():
+    """
+    Tarea periódica (Celery Beat) que despacha las tareas retenidas
+    
+    Las tareas que superan la concurrencia del plan del usuario quedan en cola
+    con metadata['held']; aquí se envían a Celery a medida que hay huecos.
+    """
+    from core.services.queue import QueueService
+    
+    try:
+        return {'dispatched': QueueService.admit_held_tasks()}
+    except Exception as exc:
+        logger.error(f"Error despachando tareas retenidas: {exc}", exc_info=True)
+        return {'error': str(exc)}
+
+
+@shared_task
+def flush_prompt_template_usage_task():
     """
-    Tarea periódica para verificar estado de generación de imagen
+    Tarea periódica (Celery Beat) que vuelca a PromptTemplate.usage_count
+    los usos de templates acumulados en Redis
     """
+    from core.services.prompt_remix import template_usage
+    
+    try:
+        return {'templates': template_usage.flush()}
+    except Exception as exc:
+        logger.error(f"Error volcando el uso de templates: {exc}", exc_info=True)
+        return {'error': str(exc)}
+
+
+@shared_task(bind=True, max_retries=None)
+def poll_image_status_task(self, task_uuid, image_uuid, user_id=None, provider='higgsfield'):
+    """
+    Consulta el estado de una imagen enviada a un proveedor asíncrono
+    
+    Cada ejecución hace una única consulta. Si la imagen sigue pendiente la
+    tarea se re-programa con self.retry y un countdown adaptado al tiempo típico
+    de render del modelo, de modo que ningún worker queda dormido esperando.
+    """
+    from core.services import ImageGenerationException
+    
     try:
         task = GenerationTask.objects.get(uuid=task_uuid)
         image = Image.objects.get(uuid=image_uuid)
-        
-        # TODO: Implementar polling según servicio
-        
+    except (GenerationTask.DoesNotExist, Image.DoesNotExist):
+        logger.warning(f"[poll_image_status_task] Tarea {task_uuid} o imagen {image_uuid} no encontrada")
+        return {'status': 'failed', 'image_uuid': str(image_uuid)}
+    
+    if task.status in ['completed', 'failed', 'cancelled']:
+        return {'status': task.status, 'image_uuid': str(image_uuid)}
+    
+    user = task.user
+    model_id = (image.config or {}).get('model_id')
+    error_msg = None
+    finished = False
+    
+    try:
+        with GenerationTelemetry.span('poll', **GenerationTelemetry.task_attributes(task)):
+            finished = ImageService().check_image_status(image)
+    except ImageGenerationException as exc:
+        error_msg = str(exc)
     except Exception as exc:
-        logger.error(f"Error en polling de imagen {image_uuid}: {exc}", exc_info=True)
+        # Error transitorio al consultar: se vuelve a intentar en la siguiente consulta
+        logger.warning(f"Error consultando estado de imagen {image_uuid}: {exc}")
+    
+    if finished:
+        task.mark_as_completed()
+        _notify_image_completed(user, image)
+        logger.info(f"Imagen {image_uuid} completada tras {self.request.retries + 1} consultas")
+        return {'status': 'completed', 'image_uuid': str(image_uuid), 'gcs_path': image.gcs_path}
+    
+    if not error_msg:
+        elapsed = (timezone.now() - (task.started_at or task.created_at)).total_seconds()
+        if elapsed <= poll_timeout(provider, model_id):
+            raise self.retry(countdown=next_poll_delay(provider, model_id, self.request.retries + 1))
+        error_msg = f"Timeout esperando respuesta de {provider} ({elapsed:.0f}s)"
+        image.mark_as_error(error_msg)
+    
+    task.mark_as_failed(error_msg)
+    Notification.create_notification(
+        user=user,
+        type='generation_failed',
+        title='Error al generar imagen',
+        message=f'No se pudo generar la imagen "{image.title}": {error_msg[:100]}',
+        metadata={'item_type': 'image', 'item_uuid': str(image_uuid), 'error': error_msg}
+    )
+    return {'status': 'failed', 'error': error_msg, 'image_uuid': str(image_uuid)}
 
 
 @shared_task
@@ -767,6 +1156,18 @@ def cleanup_old_notifications():
     return deleted_count
 
 
+@shared_task
+def cleanup_generation_spans():
+    """
+    Tarea periódica para eliminar spans de telemetría más antiguos que la retención configurada
+    """
+    from django.conf import settings
+    
+    deleted_count = GenerationTelemetry.purge(settings.GENERATION_TELEMETRY_RETENTION_DAYS)
+    logger.info(f"Eliminados {deleted_count} spans de telemetría antiguos")
+    return deleted_count
+
+
 @shared_task
 def check_stuck_tasks():
     """
@@ -784,169 +1185,163 @@ def check_stuck_tasks():
         task.mark_as_failed("Tarea atascada - timeout después de 2 horas")
         logger.warning(f"Tarea {task.uuid} marcada como fallida por timeout")
     
+    # Devolver créditos de reservas cuyas generaciones nunca terminaron
+    from core.services.credits import CreditService
+    refunded = CreditService.refund_stale_reservations()
+    if refunded:
+        logger.warning(f"{refunded} reservas de créditos expiradas reembolsadas")
+    
     return stuck_tasks.count()
 
 
 @shared_task(bind=True, max_retries=2)
-def remove_image_background_task(self, image_uuid, new_image_uuid=None):
+def remove_image_background_task(self, image_uuid, new_image_uuid=None, jobs=None):
     """
     Tarea asíncrona para remover el fondo de una imagen usando rembg con BiRefNet
     
+    Usa la sesión ONNX caliente del proceso y procesa en lote los trabajos
+    pendientes de la cola (ver core/services/bgremover.py). Si otra tarea ya
+    procesó este trabajo dentro de su lote, termina sin hacer nada.
+    
     Args:
         image_uuid: UUID de la imagen original a procesar
         new_image_uuid: UUID de la imagen destino (creada con status='processing')
+        jobs: Trabajos a reintentar (solo en reintentos)
     
     Returns:
         dict con resultado: {'success': True/False, 'new_image_uuid': '...', 'error': '...'}
     """
+    from core.services.bgremover import BackgroundRemovalService
+    
+    owner = self.request.id
+    if jobs is None:
+        jobs = BackgroundRemovalService.claim_batch(image_uuid, new_image_uuid, owner=owner)
+        if not jobs:
+            logger.info(f"Remoción de fondo de {image_uuid} ya procesada en otro lote")
+            return {'success': True, 'new_image_uuid': new_image_uuid, 'batched': True}
+    
+    logger.info(f"Iniciando remoción de fondo de {len(jobs)} imagen(es) (solicitada: {image_uuid})")
     try:
-        import os
-        from io import BytesIO
-        from PIL import Image as PILImage
-        from rembg import new_session, remove
-        
-        # Configurar ONNXRuntime para usar solo CPU (sin CUDA)
-        os.environ['ONNXRUNTIME_EXECUTION_PROVIDERS'] = 'CPUExecutionProvider'
-        os.environ['ORT_CUDA_PATHS'] = ''  # Desactivar CUDA
-        
-        # Configurar Numba para usar TBB (thread-safe)
-        os.environ['NUMBA_THREADING_LAYER'] = 'tbb'
-        
-        # Obtener imagen original
-        image = Image.objects.get(uuid=image_uuid)
-        image_service = ImageService()
-        
-        logger.info(f"Iniciando remoción de fondo para imagen {image_uuid}: {image.title}")
-        
-        # Descargar imagen de GCS
-        image_data = image_service._download_image_from_gcs(image.gcs_path)
-        logger.info(f"Imagen descargada de GCS: {image.gcs_path}")
-        
-        # Procesar con rembg + BiRefNet (PIXEL PERFECT)
-        logger.info("Iniciando sesión BiRefNet...")
-        session = new_session('birefnet-general')
-        
-        output_image = remove(
-            image_data,
-            session=session,
-            alpha_matting=True,
-            alpha_matting_foreground_threshold=240,  # Strict: solo detalles claros
-            alpha_matting_background_threshold=10,   # Strict: solo fondo claro
-            alpha_matting_erode_size=1,              # Limpieza quirúrgica
-            alpha_matting_base_size=4096,            # Máxima resolución
-            post_process_mask=False                  # Preservar detalles microscópicos
-        )
-        logger.info("Fondo removido exitosamente")
-        
-        # Obtener dimensiones
-        pil_image = PILImage.open(BytesIO(output_image))
-        width = pil_image.width
-        height = pil_image.height
-        logger.info(f"Dimensiones de imagen procesada: {width}x{height}")
-        
-        # Obtener o crear la imagen destino
-        if new_image_uuid:
-            # La imagen ya fue creada desde la view con status='processing'
-            new_image = Image.objects.get(uuid=new_image_uuid)
-            logger.info(f"Usando imagen existente: {new_image.uuid}")
+        failures = BackgroundRemovalService.process_batch(jobs)
+    except Exception as exc:
+        # Las tareas de los otros trabajos del lote ya terminaron: no dejarlos en processing
+        logger.error(f"Error inesperado procesando lote de remoción de fondo: {exc}", exc_info=True)
+        for job in jobs:
+            BackgroundRemovalService.fail(job, exc)
+        BackgroundRemovalService.finish_batch(owner)
+        return {'success': False, 'error': str(exc)}
+    
+    # La imagen original no existe: no tiene sentido reintentar
+    retryable = []
+    for job, exc in failures:
+        logger.error(f"Error removiendo fondo de imagen {job['image_uuid']}: {exc}", exc_info=exc)
+        if isinstance(exc, Image.DoesNotExist) or self.request.retries >= self.max_retries:
+            BackgroundRemovalService.fail(job, exc)
         else:
-            # Fallback: crear nueva imagen si no se pasó UUID
-            new_image = Image.objects.create(
-                title=f"{image.title} (Sin Fondo)",
-                type='text_to_image',
-                prompt=f"Versión sin fondo de: {image.prompt}",
-                created_by=image.created_by,
-                project=image.project,
-                width=width,
-                height=height,
-                status='processing'
-            )
-            logger.info(f"Registro de imagen creado: {new_image.uuid}")
-        
-        # Actualizar dimensiones si es necesario
-        new_image.width = width
-        new_image.height = height
-        
-        # Guardar en GCS y marcar como completada
-        gcs_path = image_service._save_generated_image(
-            output_image,
-            project=image.project,
-            image_uuid=str(new_image.uuid)
+            retryable.append(job)
+    
+    # Los trabajos pendientes viajan en los kwargs del reintento
+    BackgroundRemovalService.finish_batch(owner)
+    
+    if retryable:
+        logger.info(f"Reintentando remoción de fondo de {len(retryable)} imagen(es) en 60 segundos (intento {self.request.retries + 1}/{self.max_retries})")
+        # args=() evita que Celery reutilice los args posicionales de la petición original
+        raise self.retry(
+            exc=failures[0][1],
+            countdown=60,
+            args=(),
+            kwargs={'image_uuid': image_uuid, 'new_image_uuid': new_image_uuid, 'jobs': retryable}
         )
-        new_image.gcs_path = gcs_path
-        new_image.status = 'completed'
-        new_image.save(update_fields=['gcs_path', 'status', 'width', 'height'])
-        logger.info(f"Imagen guardada en GCS: {gcs_path}")
-        
-        # Notificar usuario
-        # Construir URL según si la imagen tiene proyecto o no
-        if image.project:
-            action_url = f'/projects/{image.project.uuid}/images/{new_image.uuid}/'
+    
+    own_failure = next((exc for job, exc in failures if job['image_uuid'] == str(image_uuid)), None)
+    if own_failure is not None:
+        return {'success': False, 'error': str(own_failure)}
+    
+    logger.info(f"Tarea completada exitosamente. Lote de {len(jobs)} imagen(es)")
+    return {'success': True, 'new_image_uuid': new_image_uuid, 'batch_size': len(jobs)}
+
+
+@shared_task(bind=True, max_retries=2)
+def generate_media_derivatives_task(self, item_type, item_uuid, gcs_path=None):
+    """
+    Genera los derivados ligeros de un medio (miniaturas, portada y preview, picos)
+    
+    Args:
+        item_type: 'video', 'image' o 'audio' (None para una ruta suelta)
+        item_uuid: UUID del item
+        gcs_path: Ruta del original cuando no hay item (p.ej. preview de un template)
+    """
+    from core.services.derivatives import DerivativeService
+    
+    models_by_type = {'video': Video, 'image': Image, 'audio': Audio}
+    try:
+        if item_type:
+            item = models_by_type[item_type].objects.filter(uuid=item_uuid).first()
+            if not item or item.status != 'completed' or not item.gcs_path:
+                logger.info(f"{item_type} {item_uuid} no disponible para generar derivados")
+                return {'success': False, 'error': 'Item no disponible'}
+            manifest = DerivativeService.generate_for_item(item)
         else:
-            action_url = f'/images/{new_image.uuid}/'
-        
-        Notification.create_notification(
-            user=image.created_by,
-            type='generation_completed',
-            title='Fondo removido',
-            message=f'Se creó versión sin fondo de "{image.title}"',
-            action_url=action_url,
-            action_label='Ver imagen',
-            metadata={'item_type': 'image', 'item_uuid': str(new_image.uuid)}
-        )
-        
-        logger.info(f"Tarea completada exitosamente. Nueva imagen: {new_image.uuid}")
-        return {
-            'success': True,
-            'new_image_uuid': str(new_image.uuid),
-            'title': new_image.title
-        }
-        
-    except Image.DoesNotExist:
-        error_msg = f"Imagen {image_uuid} no encontrada"
-        logger.error(error_msg)
-        
-        # Marcar imagen destino como fallida si existe
-        if new_image_uuid:
-            try:
-                new_image = Image.objects.get(uuid=new_image_uuid)
-                new_image.status = 'error'
-                new_image.save(update_fields=['status'])
-                logger.warning(f"Imagen destino {new_image_uuid} marcada como fallida")
-            except Image.DoesNotExist:
-                pass
-        
-        return {'success': False, 'error': error_msg}
-        
+            kind = DerivativeService.media_kind(gcs_path)
+            if not kind:
+                return {'success': False, 'error': f'Tipo de medio no soportado: {gcs_path}'}
+            manifest = DerivativeService.generate(gcs_path, kind)
+        return {'success': True, 'derivatives': manifest}
     except Exception as exc:
-        logger.error(f"Error removiendo fondo de imagen {image_uuid}: {exc}", exc_info=True)
-        
-        # Marcar imagen destino como fallida si existe
-        if new_image_uuid:
-            try:
-                new_image = Image.objects.get(uuid=new_image_uuid)
-                new_image.status = 'error'
-                new_image.save(update_fields=['status'])
-                logger.warning(f"Imagen destino {new_image_uuid} marcada como fallida")
-            except Image.DoesNotExist:
-                pass
-        
-        # Crear notificación de error
-        try:
-            image = Image.objects.get(uuid=image_uuid)
-            Notification.create_notification(
-                user=image.created_by,
-                type='generation_failed',
-                title='Error al remover fondo',
-                message=f'No se pudo procesar "{image.title}": {str(exc)[:100]}',
-                metadata={'item_type': 'image', 'item_uuid': str(image.uuid)}
-            )
-        except Exception:
-            pass  # Ignorar error si no se puede crear notificación
-        
-        # Reintentar si no se ha alcanzado el máximo
+        logger.error(f"Error generando derivados de {item_type or gcs_path} {item_uuid or ''}: {exc}", exc_info=True)
         if self.request.retries < self.max_retries:
-            logger.info(f"Reintentando remoción de fondo en 60 segundos (intento {self.request.retries + 1}/{self.max_retries})")
-            raise self.retry(exc=exc, countdown=60)
-        
+            raise self.retry(exc=exc, countdown=120)
         return {'success': False, 'error': str(exc)}
+
+
+@shared_task
+def stream_documentation_answer_task(user_id, question, stream_id):
+    """
+    Responde al asistente de documentación en streaming por Channels
+    
+    Los fragmentos del LLM se envían al grupo del usuario agrupados cada
+    RAG_STREAM_FLUSH_SECONDS (no un mensaje por token). El último evento lleva
+    done=True.
+    
+    Args:
+        user_id: Usuario que pregunta
+        question: Pregunta
+        stream_id: ID que el cliente usa para asociar los fragmentos
+    """
+    import time
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+    from django.conf import settings
+    from core.rag.assistant import DocumentationAssistant
+    from core.services.progress_bus import ProgressBus
+    
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return {'status': 'failed', 'error': 'Channels no configurado'}
+    group = ProgressBus.user_group(user_id)
+    flush_seconds = getattr(settings, 'RAG_STREAM_FLUSH_SECONDS', 0.1)
+    
+    def send(**payload):
+        async_to_sync(channel_layer.group_send)(group, {
+            'type': 'assistant_stream',
+            'event': {'stream_id': stream_id, **payload},
+        })
+    
+    buffer = []
+    last_flush = time.monotonic()
+    try:
+        for event in DocumentationAssistant.shared().stream(question):
+            if 'sources' in event:
+                send(sources=event['sources'])
+                continue
+            buffer.append(event['delta'])
+            if time.monotonic() - last_flush >= flush_seconds:
+                send(delta=''.join(buffer))
+                buffer = []
+                last_flush = time.monotonic()
+        send(delta=''.join(buffer), done=True)
+        return {'status': 'completed', 'stream_id': stream_id}
+    except Exception as exc:
+        logger.error(f"Error en streaming del asistente ({stream_id}): {exc}", exc_info=True)
+        send(delta=''.join(buffer), done=True, error=f'Error al procesar tu pregunta: {exc}')
+        return {'status': 'failed', 'error': str(exc)}
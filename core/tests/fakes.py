@@ -0,0 +1,138 @@
+"""
+Dobles de prueba compartidos por los tests de core
+"""
+
+# Caché en memoria para los tests que usan django.core.cache (settings apunta a Redis)
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def _b(value):
+    """Redis devuelve bytes"""
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class FakeRedis:
+    """Subconjunto de redis.Redis que usan los servicios (cadenas, listas y hashes)"""
+
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+        self.hashes = {}
+
+    # Cadenas
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.lists.pop(key, None)
+            self.hashes.pop(key, None)
+
+    def expire(self, key, seconds):
+        return True
+
+    def exists(self, key):
+        return int(key in self.values or key in self.lists or key in self.hashes)
+
+    def rename(self, src, dst):
+        import redis
+
+        for store in (self.values, self.lists, self.hashes):
+            if src in store:
+                store[dst] = store.pop(src)
+                return True
+        raise redis.ResponseError('no such key')
+
+    # Listas
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(_b(value))
+
+    def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if _b(value) in items:
+            items.remove(_b(value))
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, [])[start:end + 1])
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:]
+        return True
+
+    # Hashes
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        values = self.hashes.setdefault(key, {})
+        if field is not None:
+            values[_b(field)] = _b(value)
+        for name, item in (mapping or {}).items():
+            values[_b(name)] = _b(item)
+
+    def hsetnx(self, key, field, value):
+        values = self.hashes.setdefault(key, {})
+        if _b(field) in values:
+            return 0
+        values[_b(field)] = _b(value)
+        return 1
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(_b(field))
+
+    def hmget(self, key, *fields):
+        return [self.hget(key, field) for field in fields]
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hdel(self, key, *fields):
+        values = self.hashes.get(key, {})
+        return sum(1 for field in fields if values.pop(_b(field), None) is not None)
+
+    def hlen(self, key):
+        return len(self.hashes.get(key, {}))
+
+    def hincrby(self, key, field, amount=1):
+        values = self.hashes.setdefault(key, {})
+        values[_b(field)] = _b(int(values.get(_b(field), 0)) + amount)
+        return int(values[_b(field)])
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Encola los comandos y los ejecuta en orden en execute()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append(lambda: method(*args, **kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        results = [command() for command in self.commands]
+        self.commands = []
+        return results
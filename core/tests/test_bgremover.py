@@ -0,0 +1,67 @@
+"""
+Tests de los lotes de eliminación de fondo (reclamo y recuperación en reintentos)
+"""
+import json
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from core.services.bgremover import BATCH_PREFIX, QUEUE_KEY, BackgroundRemovalService, _job
+from core.tests.fakes import FakeRedis
+
+
+@override_settings(BG_REMOVAL_BATCH_SIZE=3)
+class BackgroundRemovalBatchTest(SimpleTestCase):
+    """Tests para el reclamo de lotes y su recuperación en reintentos"""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch('core.services.bgremover._client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _enqueue(self, *image_uuids):
+        for image_uuid in image_uuids:
+            self.redis.rpush(QUEUE_KEY, _job(image_uuid, f'new-{image_uuid}'))
+
+    def test_claim_takes_own_job_and_pending_ones(self):
+        """Test que el lote incluye el trabajo propio y hasta BG_REMOVAL_BATCH_SIZE - 1 pendientes"""
+        self._enqueue('a', 'b', 'c', 'd')
+
+        batch = BackgroundRemovalService.claim_batch('a', 'new-a', owner='task-1')
+
+        self.assertEqual([job['image_uuid'] for job in batch], ['a', 'b', 'c'])
+        self.assertEqual(len(self.redis.lists[QUEUE_KEY]), 1)
+
+    def test_job_claimed_by_other_batch_is_skipped(self):
+        """Test que una tarea cuyo trabajo ya está en otro lote no procesa nada"""
+        self._enqueue('a', 'b')
+        BackgroundRemovalService.claim_batch('a', 'new-a', owner='task-1')
+
+        self.assertEqual(BackgroundRemovalService.claim_batch('b', 'new-b', owner='task-2'), [])
+
+    def test_redelivered_task_recovers_its_batch(self):
+        """Test que la misma tarea re-entregada recupera el lote completo"""
+        self._enqueue('a', 'b', 'c')
+        first = BackgroundRemovalService.claim_batch('a', 'new-a', owner='task-1')
+
+        retried = BackgroundRemovalService.claim_batch('a', 'new-a', owner='task-1')
+
+        self.assertEqual(retried, first)
+        self.assertEqual(len(retried), 3)
+
+    def test_finish_batch_forgets_saved_batch(self):
+        """Test que al terminar el lote deja de estar guardado"""
+        self._enqueue('a')
+        BackgroundRemovalService.claim_batch('a', 'new-a', owner='task-1')
+
+        BackgroundRemovalService.finish_batch('task-1')
+
+        self.assertIsNone(self.redis.get(f'{BATCH_PREFIX}task-1'))
+
+    def test_claim_without_redis_processes_own_job(self):
+        """Test que sin Redis la tarea procesa solo su propio trabajo"""
+        with patch('core.services.bgremover._client', side_effect=ConnectionError('sin redis')):
+            batch = BackgroundRemovalService.claim_batch('a', 'new-a', owner='task-1')
+
+        self.assertEqual(batch, [json.loads(_job('a', 'new-a'))])
@@ -0,0 +1,162 @@
+"""
+Tests de reservas de créditos (reserve/commit/refund) y su cobro al completar
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.models import CreditReservation, ServiceUsage, UserCredits, Video
+from core.services.credits import (
+    CreditService,
+    RESERVATION_ALREADY_COMMITTED,
+    RESERVATION_COMMITTED,
+    RESERVATION_MISSING,
+    RESERVATION_REFUNDED,
+)
+
+User = get_user_model()
+
+
+class CreditReservationTest(TestCase):
+    """Tests para reservar, confirmar y reembolsar créditos"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='creditos', password='test')
+        CreditService.add_credits(self.user, 100)
+
+    def _balance(self):
+        return UserCredits.objects.get(user=self.user).credits
+
+    def _reserve(self, amount):
+        return CreditService.reserve_credits(self.user, amount, 'gemini_veo', 'video_generation')
+
+    def test_reserve_debits_balance(self):
+        """Test que la reserva descuenta el saldo en el momento"""
+        self._reserve(30)
+        self.assertEqual(self._balance(), Decimal('70'))
+
+    def test_commit_is_idempotent(self):
+        """Test que confirmar dos veces la misma reserva no cobra dos veces"""
+        reservation = self._reserve(30)
+
+        self.assertEqual(CreditService.commit_reservation(reservation.uuid), RESERVATION_COMMITTED)
+        self.assertEqual(CreditService.commit_reservation(reservation.uuid), RESERVATION_ALREADY_COMMITTED)
+
+        credits = UserCredits.objects.get(user=self.user)
+        self.assertEqual(credits.credits, Decimal('70'))
+        self.assertEqual(credits.total_spent, Decimal('30'))
+
+    def test_commit_lower_amount_refunds_difference(self):
+        """Test que un coste real menor devuelve la diferencia"""
+        reservation = self._reserve(30)
+
+        CreditService.commit_reservation(reservation.uuid, amount=20)
+
+        credits = UserCredits.objects.get(user=self.user)
+        self.assertEqual(credits.credits, Decimal('80'))
+        self.assertEqual(credits.total_spent, Decimal('20'))
+        self.assertEqual(credits.current_month_usage, Decimal('20'))
+
+    def test_commit_higher_amount_charges_difference(self):
+        """Test que un coste real mayor cobra la diferencia"""
+        reservation = self._reserve(30)
+
+        CreditService.commit_reservation(reservation.uuid, amount=45)
+
+        self.assertEqual(self._balance(), Decimal('55'))
+
+    def test_commit_unpaid_difference_settles_reserved_amount(self):
+        """Test que sin saldo para la diferencia se liquida por lo reservado y se apunta lo impagado"""
+        reservation = self._reserve(90)
+
+        self.assertEqual(CreditService.commit_reservation(reservation.uuid, amount=120), RESERVATION_COMMITTED)
+
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'committed')
+        self.assertEqual(Decimal(reservation.metadata['unpaid_amount']), Decimal('30'))
+        credits = UserCredits.objects.get(user=self.user)
+        self.assertEqual(credits.credits, Decimal('10'))
+        self.assertEqual(credits.total_spent, Decimal('90'))
+
+    def test_refund_restores_balance_once(self):
+        """Test que el reembolso devuelve el saldo una sola vez"""
+        reservation = self._reserve(30)
+
+        self.assertTrue(CreditService.refund_reservation(reservation.uuid))
+        self.assertFalse(CreditService.refund_reservation(reservation.uuid))
+
+        credits = UserCredits.objects.get(user=self.user)
+        self.assertEqual(credits.credits, Decimal('100'))
+        self.assertEqual(credits.current_month_usage, Decimal('0'))
+        self.assertEqual(CreditReservation.objects.get(pk=reservation.pk).status, 'refunded')
+
+    def test_refund_after_commit_is_ignored(self):
+        """Test que una reserva confirmada no se puede reembolsar"""
+        reservation = self._reserve(30)
+        CreditService.commit_reservation(reservation.uuid)
+
+        self.assertFalse(CreditService.refund_reservation(reservation.uuid))
+        self.assertEqual(self._balance(), Decimal('70'))
+
+    def test_commit_reports_refunded_and_missing(self):
+        """Test que confirmar una reserva devuelta o inexistente lo indica sin cobrar"""
+        reservation = self._reserve(30)
+        CreditService.refund_reservation(reservation.uuid)
+
+        self.assertEqual(CreditService.commit_reservation(reservation.uuid), RESERVATION_REFUNDED)
+        self.assertEqual(
+            CreditService.commit_reservation('00000000-0000-0000-0000-000000000000'), RESERVATION_MISSING
+        )
+        self.assertEqual(self._balance(), Decimal('100'))
+
+    def test_commit_lower_amount_of_previous_month_keeps_current_usage(self):
+        """Test que la diferencia devuelta de una reserva del mes anterior no baja el uso de este mes"""
+        reservation = self._reserve(30)
+        CreditReservation.objects.filter(pk=reservation.pk).update(
+            created_at=reservation.created_at.replace(day=1) - timedelta(days=1)
+        )
+        # Uso del mes en curso (tras el reseteo mensual)
+        UserCredits.objects.filter(user=self.user).update(current_month_usage=Decimal('50'))
+
+        CreditService.commit_reservation(reservation.uuid, amount=20)
+
+        credits = UserCredits.objects.get(user=self.user)
+        self.assertEqual(credits.credits, Decimal('80'))
+        self.assertEqual(credits.current_month_usage, Decimal('50'))
+
+
+class VideoCompletionChargeTest(TestCase):
+    """Tests para el cobro de un video cuando varias rutas lo dan por completado"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='videos', password='test')
+        CreditService.add_credits(self.user, 100)
+        reservation = CreditService.reserve_credits(self.user, 40, 'sora', 'video_generation')
+        self.video = Video.objects.create(
+            created_by=self.user, title='Video', type='sora', script='Guión', duration=4,
+            config={'sora_model': 'sora-2'},
+            metadata={'credit_reservation': str(reservation.uuid)},
+        )
+
+    def test_stale_copies_charge_once(self):
+        """Test que dos rutas con copias desfasadas del video (webhook y watcher) cobran una sola vez"""
+        first = Video.objects.get(pk=self.video.pk)
+        second = Video.objects.get(pk=self.video.pk)
+
+        CreditService.deduct_credits_for_video(self.user, first)
+        CreditService.deduct_credits_for_video(self.user, second)
+
+        credits = UserCredits.objects.get(user=self.user)
+        self.assertEqual(credits.credits, Decimal('60'))
+        self.assertEqual(credits.total_spent, Decimal('40'))
+        self.assertEqual(ServiceUsage.objects.filter(user=self.user).count(), 1)
+
+    def test_refunded_reservation_falls_back_to_direct_charge(self):
+        """Test que si la reserva se devolvió (p. ej. expirada) se cobra directamente"""
+        CreditService.refund_reservation(self.video.metadata['credit_reservation'])
+
+        CreditService.deduct_credits_for_video(self.user, self.video)
+
+        self.assertEqual(UserCredits.objects.get(user=self.user).credits, Decimal('60'))
@@ -0,0 +1,125 @@
+"""
+Tests del feed unificado de la biblioteca (LibraryFeed)
+"""
+import base64
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Audio, Image, Script, Video
+from core.services.library_feed import LibraryFeed, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+class LibraryFeedTest(TestCase):
+    """Tests para el orden, la paginación keyset y los conteos del feed"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='biblioteca', password='test')
+        other = User.objects.create_user(username='otro', password='test')
+        now = timezone.now().replace(microsecond=0)
+
+        # Tres items de tipos distintos comparten created_at: desempata el rango del tipo
+        self.newest_image = self._image('Imagen nueva', now + timedelta(minutes=1))
+        self.video = self._video('Video playa', now)
+        self.image = self._image('Imagen playa', now)
+        self.script = Script.objects.create(
+            created_by=self.user, title='Guión', original_script='Texto', created_at=now
+        )
+        self.audio = Audio.objects.create(
+            created_by=self.user, title='Audio', text='Hola', created_at=now - timedelta(minutes=1)
+        )
+        self.oldest_video = self._video('Video antiguo', now - timedelta(minutes=2))
+
+        # Items de otro usuario no aparecen en el feed
+        Video.objects.create(created_by=other, title='Ajeno', type='sora', script='x', created_at=now)
+
+        self.expected = [
+            ('image', self.newest_image.pk),
+            ('script', self.script.pk),
+            ('image', self.image.pk),
+            ('video', self.video.pk),
+            ('audio', self.audio.pk),
+            ('video', self.oldest_video.pk),
+        ]
+
+    def _video(self, title, created_at):
+        return Video.objects.create(
+            created_by=self.user, title=title, type='sora', script='Guión', created_at=created_at
+        )
+
+    def _image(self, title, created_at):
+        return Image.objects.create(
+            created_by=self.user, title=title, type='text_to_image', prompt='Prompt', created_at=created_at
+        )
+
+    @staticmethod
+    def _keys(items):
+        return [(wrapper.type, wrapper.item.pk) for wrapper in items]
+
+    def test_offset_order_across_types(self):
+        """Test que el UNION ALL ordena por fecha, tipo e id"""
+        feed = LibraryFeed(self.user)
+        self.assertEqual(self._keys(feed[0:10]), self.expected)
+
+    def test_keyset_pages_match_offset_order(self):
+        """Test que las páginas keyset recorren el feed sin saltos ni duplicados, también entre empates"""
+        feed = LibraryFeed(self.user)
+        served, cursor = [], None
+        for _ in range(3):
+            items, cursor = feed.page_after(cursor, limit=2)
+            served.extend(self._keys(items))
+
+        self.assertEqual(served, self.expected)
+        self.assertIsNone(cursor)
+
+    def test_keyset_page_with_type_filter(self):
+        """Test que el filtro por tipo se respeta en la paginación keyset"""
+        feed = LibraryFeed(self.user, item_type='video')
+        first, cursor = feed.page_after(None, limit=1)
+        second, last_cursor = feed.page_after(cursor, limit=1)
+
+        self.assertEqual(self._keys(first + second), [('video', self.video.pk), ('video', self.oldest_video.pk)])
+        self.assertIsNone(last_cursor)
+
+    def test_counts(self):
+        """Test que los conteos por tipo salen de una consulta y solo cuentan al usuario"""
+        counts = LibraryFeed(self.user).counts()
+        self.assertEqual(counts, {'video': 2, 'image': 2, 'audio': 1, 'script': 1, 'total': 6})
+
+    def test_counts_with_search(self):
+        """Test que los conteos aplican la búsqueda del feed"""
+        counts = LibraryFeed(self.user, search_query='playa').counts()
+        self.assertEqual(counts, {'video': 1, 'image': 1, 'audio': 0, 'script': 0, 'total': 2})
+
+    def test_cursor_roundtrip(self):
+        """Test que un cursor codificado se decodifica a la misma posición"""
+        created_at = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 2, 15)), (created_at, 2, 15))
+
+    def test_invalid_cursor_is_rejected(self):
+        """Test que un cursor malformado no vuelve a servir la primera página"""
+        feed = LibraryFeed(self.user)
+        with self.assertRaises(ValueError):
+            feed.page_after('no-es-un-cursor', limit=2)
+
+    def test_tampered_cursor_is_rejected(self):
+        """Test que un cursor con un rango de tipo inexistente se rechaza"""
+        raw = f"{timezone.now().isoformat()}|9|1"
+        cursor = base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+        self.assertIsNone(decode_cursor(cursor))
+        with self.assertRaises(ValueError):
+            LibraryFeed(self.user).page_after(cursor, limit=2)
+
+    def test_view_returns_400_for_invalid_cursor(self):
+        """Test que el scroll infinito recibe 400 con un cursor inválido"""
+        # Superusuario: el middleware de login exige el grupo 'usar' al resto
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='test')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('core:library'), {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,99 @@
+"""
+Tests de la caché de remixes de Prompt Templates y del contador de uso por lotes
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core.models import PromptTemplate
+from core.services.prompt_remix import prompt_remix_cache, template_usage
+from core.tests.fakes import FakeRedis, LOCMEM_CACHES
+from core.utils.prompt_templates import apply_prompt_template
+
+User = get_user_model()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PROMPT_REMIX_CACHE_ENABLED=True)
+class PromptRemixCacheTest(TestCase):
+    """Tests para reutilizar remixes y descartarlos cuando cambia el template"""
+
+    def setUp(self):
+        cache.clear()
+        prompt_remix_cache.reset()
+        self.user = User.objects.create_user(username='plantillas', password='test')
+        self.template = PromptTemplate.objects.create(
+            name='Transición', prompt_text='Plano cenital', created_by=self.user
+        )
+
+        self.redis = FakeRedis()
+        template_usage._redis = self.redis
+        self.addCleanup(template_usage.reset)
+
+        patcher = patch(
+            'core.utils.prompt_templates._remix_prompt_with_llm',
+            side_effect=lambda template_text, user_prompt: f'{template_text} | {user_prompt}',
+        )
+        self.remix = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _apply(self, user_prompt='un gato en la playa'):
+        return apply_prompt_template(user_prompt, str(self.template.uuid))
+
+    def test_same_prompt_reuses_remix(self):
+        """Test que el mismo template y prompt (normalizado) no vuelve a llamar al LLM"""
+        first = self._apply('un gato en la playa')
+        second = self._apply('  un gato   en la playa ')
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.remix.call_count, 1)
+
+    def test_editing_template_invalidates_remix(self):
+        """Test que al guardar el template los remixes usan el texto nuevo"""
+        self._apply()
+
+        self.template.prompt_text = 'Plano secuencia'
+        self.template.save()
+
+        self.assertEqual(self._apply(), 'Plano secuencia | un gato en la playa')
+        self.assertEqual(self.remix.call_count, 2)
+
+    def test_deactivated_template_is_not_applied(self):
+        """Test que un template desactivado deja de aplicarse aunque estuviera en caché"""
+        self._apply()
+
+        self.template.is_active = False
+        self.template.save()
+
+        self.assertEqual(self._apply(), 'un gato en la playa')
+
+    def test_deleted_template_is_not_applied(self):
+        """Test que un template borrado deja de aplicarse aunque estuviera en caché"""
+        self._apply()
+
+        self.template.delete()
+
+        self.assertEqual(self._apply(), 'un gato en la playa')
+
+    def test_llm_failure_is_not_cached(self):
+        """Test que la concatenación de respaldo no se cachea y el remix se reintenta"""
+        self.remix.side_effect = RuntimeError('LLM caído')
+        self.assertEqual(self._apply(), 'Plano cenital\n\nun gato en la playa')
+
+        self.remix.side_effect = lambda template_text, user_prompt: 'remix'
+        self.assertEqual(self._apply(), 'remix')
+
+    def test_usage_is_flushed_in_batch(self):
+        """Test que los usos se acumulan en Redis y se vuelcan a usage_count de una vez"""
+        for _ in range(3):
+            self._apply()
+
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.usage_count, 0)
+
+        self.assertEqual(template_usage.flush(), 1)
+        self.assertEqual(template_usage.flush(), 0)
+
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.usage_count, 3)
@@ -0,0 +1,27 @@
+"""
+Tests de los límites de la cola de generación del usuario
+"""
+from django.test import SimpleTestCase
+
+from core.services.queue import QueueService
+
+
+class QueueAdmissionTest(SimpleTestCase):
+    """Tests para la admisión de tareas en la cola del usuario"""
+
+    def test_dispatches_when_below_concurrency(self):
+        """Test que con huecos libres la tarea se despacha"""
+        self.assertFalse(QueueService.admission(active_count=1, running_count=1, concurrency=2, max_queued=10))
+
+    def test_holds_when_concurrency_reached(self):
+        """Test que al llegar a la concurrencia del plan la tarea queda retenida"""
+        self.assertTrue(QueueService.admission(active_count=3, running_count=2, concurrency=2, max_queued=10))
+
+    def test_rejects_when_queue_full(self):
+        """Test que al llegar al máximo de tareas en cola se rechaza"""
+        with self.assertRaises(ValueError):
+            QueueService.admission(active_count=10, running_count=2, concurrency=2, max_queued=10)
+
+    def test_held_tasks_do_not_count_as_running(self):
+        """Test que las tareas retenidas cuentan para el máximo pero no para la concurrencia"""
+        self.assertFalse(QueueService.admission(active_count=8, running_count=1, concurrency=2, max_queued=10))
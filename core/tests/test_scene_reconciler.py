@@ -0,0 +1,79 @@
+"""
+Tests del cobro de escenas completadas por el SceneReconciler
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core.models import CreditReservation, Scene, Script, ServiceUsage, UserCredits
+from core.services.credits import CreditService
+from core.services.scene_reconciler import SKIP_PREFIX, SceneReconciler
+from core.tests.fakes import LOCMEM_CACHES
+
+User = get_user_model()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SceneReconcilerChargeTest(TestCase):
+    """Tests para el cobro idempotente de videos de escena completados"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reconciliador', password='test')
+        CreditService.add_credits(self.user, 100)
+        self.script = Script.objects.create(created_by=self.user, title='Guión', original_script='Texto')
+        self.reconciler = SceneReconciler()
+
+    def _scene(self, ai_service='sora', amount=40):
+        reservation = CreditService.reserve_credits(self.user, amount, ai_service, 'video_generation')
+        scene = Scene.objects.create(
+            script=self.script, scene_id='Escena 1', summary='Resumen', script_text='Texto',
+            duration_sec=4, avatar='no', platform='sora', order=0, ai_service=ai_service,
+            ai_config={'sora_model': 'sora-2'}, video_status='completed',
+            metadata={'credit_reservation': str(reservation.uuid)},
+        )
+        return scene, reservation
+
+    def _balance(self):
+        return UserCredits.objects.get(user=self.user).credits
+
+    def test_completed_scene_is_charged_once(self):
+        """Test que la escena completada confirma su reserva y las rondas siguientes no vuelven a cobrar"""
+        scene, reservation = self._scene()
+
+        self.assertEqual(self.reconciler.charge_completed_videos(), 1)
+        self.assertEqual(self.reconciler.charge_completed_videos(), 0)
+
+        scene.refresh_from_db()
+        reservation.refresh_from_db()
+        self.assertTrue(scene.metadata['credits_charged'])
+        self.assertEqual(reservation.status, 'committed')
+        self.assertEqual(self._balance(), Decimal('60'))
+        self.assertEqual(ServiceUsage.objects.filter(user=self.user).count(), 1)
+
+    def test_reservation_committed_by_other_path_is_not_charged_again(self):
+        """Test que si la vista ya confirmó la reserva (sin marcar la escena) no se cobra otra vez"""
+        scene, reservation = self._scene()
+        CreditService.commit_reservation(reservation.uuid)
+
+        self.assertEqual(self.reconciler.charge_completed_videos(), 1)
+
+        scene.refresh_from_db()
+        self.assertTrue(scene.metadata['credits_charged'])
+        self.assertEqual(self._balance(), Decimal('60'))
+        self.assertIsNone(cache.get(f"{SKIP_PREFIX}credits_charged:{scene.id}"))
+
+    def test_uncomputable_cost_refunds_and_skips(self):
+        """Test que una escena sin coste calculable devuelve la reserva y se aparta un tiempo"""
+        scene, reservation = self._scene(ai_service='kling_desconocido')
+
+        self.assertEqual(self.reconciler.charge_completed_videos(), 0)
+
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'refunded')
+        self.assertEqual(self._balance(), Decimal('100'))
+        self.assertIsNotNone(cache.get(f"{SKIP_PREFIX}credits_charged:{scene.id}"))
+        self.assertNotIn(scene.id, self.reconciler._uncharged_ids('video_status', 'credits_charged'))
+        self.assertEqual(CreditReservation.objects.filter(status='committed').count(), 0)
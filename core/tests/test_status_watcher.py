@@ -0,0 +1,114 @@
+"""
+Tests del vigilante de estado de proveedores y su webhook
+"""
+import json
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import GenerationTask, Notification, Video
+from core.services.status_watcher import PENDING_PREFIX, ProviderStatusWatcher
+from core.tests.fakes import FakeRedis
+
+User = get_user_model()
+
+
+class StatusWatcherWebhookTest(TestCase):
+    """Tests para la comprobación inmediata de un video al recibir el aviso del proveedor"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='webhooks', password='test')
+        self.video = Video.objects.create(
+            created_by=self.user, title='Video', type='sora', script='Guión',
+            status='processing', external_id='video_123',
+        )
+        self.task = GenerationTask.objects.create(
+            user=self.user, task_type='video', item_uuid=self.video.uuid, status='processing'
+        )
+
+        self.redis = FakeRedis()
+        self.watcher = ProviderStatusWatcher()
+        self.watcher._redis = self.redis
+        self.watcher._video_service = Mock()
+
+        # Sin Redis de scheduler ni bus de progreso en los tests
+        patcher = patch.object(GenerationTask, '_dispatch_status_change')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _provider_finishes(self, status):
+        def check_video_status(video):
+            Video.objects.filter(pk=video.pk).update(status=status)
+        self.watcher.video_service.check_video_status.side_effect = check_video_status
+
+    def test_completed_video_is_reported_once(self):
+        """Test que el webhook completa la tarea, notifica y saca el video de la tabla"""
+        self._provider_finishes('completed')
+        self.watcher.register(self.task.uuid, self.video)
+
+        self.assertTrue(self.watcher.handle_webhook('sora', 'video_123'))
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'completed')
+        self.assertEqual(
+            Notification.objects.filter(user=self.user, type='generation_completed').count(), 1
+        )
+        self.assertEqual(self.redis.hlen(f'{PENDING_PREFIX}sora'), 0)
+
+        # Un segundo aviso del mismo trabajo ya no encuentra video en curso
+        self.assertFalse(self.watcher.handle_webhook('sora', 'video_123'))
+        self.assertEqual(self.watcher.video_service.check_video_status.call_count, 1)
+
+    def test_unfinished_video_stays_registered(self):
+        """Test que si el proveedor aún no terminó el video queda en la tabla de pendientes"""
+        self._provider_finishes('processing')
+
+        self.assertTrue(self.watcher.handle_webhook('sora', 'video_123'))
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'processing')
+        self.assertIsNotNone(self.redis.hget(f'{PENDING_PREFIX}sora', str(self.video.uuid)))
+
+    def test_webhook_from_other_provider_is_ignored(self):
+        """Test que el aviso de otro proveedor no consulta el video"""
+        self.assertFalse(self.watcher.handle_webhook('heygen', 'video_123'))
+        self.watcher.video_service.check_video_status.assert_not_called()
+
+    def test_unknown_external_id_is_ignored(self):
+        """Test que un external_id sin video en curso no hace nada"""
+        self.assertFalse(self.watcher.handle_webhook('sora', 'desconocido'))
+
+
+@override_settings(PROVIDER_WEBHOOK_SECRET='secreto')
+class ProviderWebhookViewTest(TestCase):
+    """Tests para la autenticación y el parseo del webhook de proveedores"""
+
+    def _post(self, provider, payload, token='secreto'):
+        url = reverse('core:provider_webhook', args=[provider])
+        return self.client.post(f'{url}?token={token}', json.dumps(payload), content_type='application/json')
+
+    @patch('core.services.status_watcher.status_watcher.handle_webhook', return_value=True)
+    def test_valid_token_processes_job(self, handle_webhook):
+        """Test que con el token correcto se localiza el trabajo en el payload del proveedor"""
+        response = self._post('sora', {'data': {'id': 'video_123'}})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'processed')
+        handle_webhook.assert_called_once_with('sora', 'video_123')
+
+    @patch('core.services.status_watcher.status_watcher.handle_webhook')
+    def test_invalid_token_is_rejected(self, handle_webhook):
+        """Test que sin el token compartido se rechaza el aviso"""
+        response = self._post('sora', {'data': {'id': 'video_123'}}, token='otro')
+
+        self.assertEqual(response.status_code, 403)
+        handle_webhook.assert_not_called()
+
+    @patch('core.services.status_watcher.status_watcher.handle_webhook', side_effect=ConnectionError('sin redis'))
+    def test_processing_error_defers_to_polling(self, handle_webhook):
+        """Test que un error al procesar deja el cambio al polling de respaldo"""
+        response = self._post('kling', {'data': {'task_id': 'abc'}})
+
+        self.assertEqual(response.status_code, 202)
@@ -0,0 +1,98 @@
+"""
+Tests del merge y la paginación de resultados de stock (stock_ranking)
+"""
+from django.test import SimpleTestCase
+
+from core.services import stock_ranking
+
+
+def _result(source, id, url=None, title=''):
+    return {
+        'source': source,
+        'id': id,
+        'title': title,
+        'download_url': url or f'https://{source}.example.com/{id}.jpg',
+    }
+
+
+class StockRankingTest(SimpleTestCase):
+    """Tests para el merge y la paginación de resultados de stock"""
+
+    def test_source_fetch_size_has_minimum(self):
+        """Test que cada fuente pide al menos MIN_SOURCE_FETCH resultados"""
+        self.assertEqual(stock_ranking.source_fetch_size(20, 3), stock_ranking.MIN_SOURCE_FETCH)
+        self.assertEqual(stock_ranking.source_fetch_size(60, 3), 20)
+        self.assertEqual(stock_ranking.source_fetch_size(20, 0), 20)
+
+    def test_fingerprints_ignore_scheme_and_query(self):
+        """Test que la misma URL con otro esquema o parámetros de CDN es duplicado"""
+        a = stock_ranking.fingerprints({'download_url': 'https://cdn.example.com/a.jpg?w=640'})
+        b = stock_ranking.fingerprints({'download_url': 'http://CDN.example.com/a.jpg'})
+        self.assertEqual(a, b)
+
+    def test_fingerprints_do_not_use_title(self):
+        """Test que dos recursos distintos con el mismo título no se deduplican"""
+        a = stock_ranking.fingerprints(_result('pexels', 1, title='Playa'))
+        b = stock_ranking.fingerprints(_result('pexels', 2, title='Playa'))
+        self.assertFalse(set(a) & set(b))
+
+    def test_absorb_marks_exhausted_on_short_page(self):
+        """Test que una página corta del proveedor agota la fuente"""
+        state = stock_ranking.new_cursor_state(['pexels'], fetch_size=10)
+        stock_ranking.absorb_source_page(state, 'pexels', [_result('pexels', i) for i in range(4)])
+
+        cursor = state['sources']['pexels']
+        self.assertTrue(cursor['exhausted'])
+        self.assertEqual(cursor['next_page'], 2)
+        self.assertEqual(cursor['position'], 4)
+
+    def test_absorb_uses_raw_count_of_filtered_page(self):
+        """Test que una página filtrada localmente no agota la fuente si el proveedor devolvió la página completa"""
+        state = stock_ranking.new_cursor_state(['pexels'], fetch_size=10)
+        page = stock_ranking.SourcePage([_result('pexels', i) for i in range(3)], raw_count=10)
+        stock_ranking.absorb_source_page(state, 'pexels', page)
+
+        self.assertFalse(state['sources']['pexels']['exhausted'])
+        self.assertEqual(stock_ranking.sources_needing_fetch(state, per_page=5), ['pexels'])
+
+    def test_build_next_page_deduplicates_across_sources(self):
+        """Test que el mismo recurso en dos fuentes aparece una sola vez"""
+        state = stock_ranking.new_cursor_state(['pexels', 'pixabay'], fetch_size=10)
+        shared = 'https://shared.example.com/a.jpg'
+        stock_ranking.absorb_source_page(state, 'pexels', [_result('pexels', 1, url=shared)], raw_count=10)
+        stock_ranking.absorb_source_page(state, 'pixabay', [_result('pixabay', 9, url=shared)], raw_count=10)
+
+        page = stock_ranking.build_next_page(state, 'playa', per_page=5)
+
+        self.assertEqual(len(page), 1)
+        self.assertEqual(state['sources']['pexels']['buffer'], [])
+        self.assertEqual(state['sources']['pixabay']['buffer'], [])
+
+    def test_pagination_keeps_leftovers_for_next_page(self):
+        """Test que los resultados no servidos quedan en el buffer y no se repiten"""
+        state = stock_ranking.new_cursor_state(['pexels', 'pixabay'], fetch_size=5)
+        stock_ranking.absorb_source_page(state, 'pexels', [_result('pexels', i) for i in range(3)])
+        stock_ranking.absorb_source_page(state, 'pixabay', [_result('pixabay', i) for i in range(3)])
+
+        first = stock_ranking.build_next_page(state, '', per_page=4)
+        second = stock_ranking.build_next_page(state, '', per_page=4)
+
+        self.assertEqual(len(first), 4)
+        self.assertEqual(len(second), 2)
+        served = [(r['source'], r['id']) for r in first + second]
+        self.assertEqual(len(served), len(set(served)))
+        self.assertFalse(stock_ranking.has_more(state))
+        self.assertEqual(stock_ranking.get_page(state, 1), first)
+        self.assertEqual(stock_ranking.get_page(state, 2), second)
+        self.assertIsNone(stock_ranking.get_page(state, 3))
+
+    def test_title_match_breaks_position_ties(self):
+        """Test que a igual posición gana el resultado cuyo título coincide con la query"""
+        state = stock_ranking.new_cursor_state(['pexels', 'pixabay'], fetch_size=10)
+        stock_ranking.absorb_source_page(state, 'pexels', [_result('pexels', 1, title='Montaña')], raw_count=10)
+        stock_ranking.absorb_source_page(state, 'pixabay', [_result('pixabay', 1, title='Playa al atardecer')], raw_count=10)
+
+        page = stock_ranking.build_next_page(state, 'playa', per_page=1)
+
+        self.assertEqual(page[0]['source'], 'pixabay')
+        self.assertTrue(stock_ranking.has_more(state))
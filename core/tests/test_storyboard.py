@@ -0,0 +1,95 @@
+"""
+Tests del reclamo de escenas al lanzar un storyboard completo
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core.models import CreditReservation, Scene, Script, UserCredits
+from core.services import ValidationException
+from core.services.credits import CreditService
+from core.services.storyboard import BATCH_PREFIX, StoryboardBatchService
+from core.tasks import generate_scene_video_task
+from core.tests.fakes import LOCMEM_CACHES
+
+User = get_user_model()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StoryboardClaimTest(TestCase):
+    """Tests para que cada escena pendiente pertenezca a un solo lote"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='storyboard', password='test')
+        CreditService.add_credits(self.user, 200)
+        self.script = Script.objects.create(
+            created_by=self.user, title='Guión', original_script='Texto', enable_audio=False
+        )
+        self.scenes = [
+            Scene.objects.create(
+                script=self.script, scene_id=f'Escena {order + 1}', summary='Resumen',
+                script_text='Texto', duration_sec=4, avatar='no', platform='sora',
+                order=order, ai_service='sora', ai_config={'sora_model': 'sora-2'},
+            )
+            for order in range(2)
+        ]
+
+        # Sin broker ni bus de progreso: el grafo de Celery no se encola de verdad
+        for target in ('celery.chord', 'core.services.storyboard.StoryboardBatchService.publish_progress'):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _balance(self):
+        return UserCredits.objects.get(user=self.user).credits
+
+    def test_second_launch_finds_scenes_claimed(self):
+        """Test que un doble lanzamiento no reserva ni encola las escenas dos veces"""
+        result = StoryboardBatchService.generate_all_scenes(self.script, self.user)
+
+        with self.assertRaises(ValidationException):
+            StoryboardBatchService.generate_all_scenes(self.script, self.user)
+
+        self.assertEqual(sorted(result['scene_ids']), sorted(scene.id for scene in self.scenes))
+        self.assertEqual(self._balance(), Decimal('120'))
+        self.assertEqual(CreditReservation.objects.filter(user=self.user).count(), 2)
+        for scene in Scene.objects.filter(script=self.script):
+            self.assertEqual(scene.metadata['storyboard_batch'], result['batch_id'])
+
+    def test_scenes_of_expired_batch_can_be_claimed_again(self):
+        """Test que las escenas de un lote que ya no existe vuelven a poder lanzarse"""
+        first = StoryboardBatchService.generate_all_scenes(self.script, self.user)
+        cache.delete(f"{BATCH_PREFIX}{first['batch_id']}")
+
+        second = StoryboardBatchService.generate_all_scenes(self.script, self.user)
+
+        self.assertNotEqual(second['batch_id'], first['batch_id'])
+        for scene in Scene.objects.filter(script=self.script):
+            self.assertEqual(scene.metadata['storyboard_batch'], second['batch_id'])
+
+    def test_enqueue_failure_refunds_and_releases_scenes(self):
+        """Test que si no se puede encolar el lote se devuelven las reservas y se liberan las escenas"""
+        with patch('celery.chord') as chord:
+            chord.return_value.apply_async.side_effect = ConnectionError('sin broker')
+            with self.assertRaises(ConnectionError):
+                StoryboardBatchService.generate_all_scenes(self.script, self.user)
+
+        self.assertEqual(self._balance(), Decimal('200'))
+        for scene in Scene.objects.filter(script=self.script):
+            self.assertNotIn('storyboard_batch', scene.metadata)
+            self.assertNotIn('credit_reservation', scene.metadata)
+
+    def test_node_of_superseded_batch_is_skipped(self):
+        """Test que el nodo de un lote anterior no envía una escena reclamada por otro"""
+        scene = self.scenes[0]
+        Scene.objects.filter(pk=scene.pk).update(metadata={'storyboard_batch': 'nuevo'})
+
+        with patch('core.services.SceneService.generate_scene_video') as generate:
+            result = generate_scene_video_task.run(scene.id, 'anterior')
+
+        self.assertEqual(result['status'], 'skipped')
+        generate.assert_not_called()
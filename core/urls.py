@@ -99,6 +99,7 @@ urlpatterns = [
     # Webhooks
     # DEPRECATED: N8nWebhookView está comentado, ya no se usa con LangChain
     # path('webhooks/n8n/', views.N8nWebhookView.as_view(), name='n8n_webhook'),
+    path('webhooks/providers/<str:provider>/', views.ProviderWebhookView.as_view(), name='provider_webhook'),
     
     # Agent Video Flow (con proyecto)
     path('projects/<uuid:project_uuid>/agent/create/', views.AgentCreateView.as_view(), name='agent_create'),
@@ -117,6 +118,7 @@ urlpatterns = [
     
     # Agent Scene Actions
     path('scripts/<int:script_id>/scenes/create/', views.SceneCreateManualView.as_view(), name='scene_create_manual'),
+    path('scripts/<int:script_id>/scenes/generate-all/', views.ScriptGenerateAllScenesView.as_view(), name='script_generate_all_scenes'),
     path('scenes/<int:scene_id>/upload-video/', views.SceneUploadVideoView.as_view(), name='scene_upload_video'),
     path('scenes/<int:scene_id>/upload-custom-image/', views.SceneUploadCustomImageView.as_view(), name='scene_upload_custom_image'),
     path('scenes/<int:scene_id>/generate-ai-image/', views.SceneGenerateAIImageView.as_view(), name='scene_generate_ai_image'),
@@ -179,6 +181,8 @@ urlpatterns = [
     path('assistant/', views.DocumentationAssistantView.as_view(), name='doc_assistant'),
     path('assistant/chat/', views.DocumentationAssistantChatView.as_view(), name='doc_assistant_chat'),
     path('assistant/reindex/', views.DocumentationAssistantReindexView.as_view(), name='doc_assistant_reindex'),
+    path('api/system/provider-pool/', views.ProviderClientPoolStatsView.as_view(), name='provider_pool_stats'),
+    path('api/system/generation-stats/', views.GenerationTelemetryView.as_view(), name='generation_stats'),
     
     # Creation Agent (Chat de Creación)
     path('chat/', views.CreationAgentView.as_view(), name='creation_agent'),
@@ -196,6 +200,7 @@ urlpatterns = [
     # Queues (Tareas de Generación)
     path('queues/', views.QueuesPanelView.as_view(), name='queues_panel'),
     path('queues/active-dropdown/', views.ActiveQueuesDropdownView.as_view(), name='active_queues_dropdown'),
+    path('queues/stats/', views.QueueStatsView.as_view(), name='queue_stats'),
     path('queues/task/<uuid:task_uuid>/', views.QueueTaskDetailView.as_view(), name='queue_task_detail'),
     path('queues/task/<uuid:task_uuid>/cancel/', views.CancelTaskView.as_view(), name='cancel_task'),
     
@@ -5,6 +5,7 @@ import logging
 from typing import Optional
 from core.models import PromptTemplate
 from core.llm.factory import LLMFactory
+from core.services.prompt_remix import prompt_remix_cache, template_usage
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,10 @@ def apply_prompt_template(user_prompt: str, template_id: Optional[str] = None) -
     Siempre usa GPT-4o-mini para combinar y optimizar el template con el prompt del usuario.
     Si el LLM falla, hace fallback a concatenación simple.
     
+    El remix se cachea por template (uuid + versión) y prompt normalizado, y el
+    uso se acumula en Redis (ver core/services/prompt_remix.py): regenerar con
+    el mismo template y prompt no vuelve a llamar al LLM ni escribe en la BD.
+    
     Args:
         user_prompt: Prompt del usuario
         template_id: UUID del template a aplicar (opcional)
@@ -24,41 +29,39 @@ def apply_prompt_template(user_prompt: str, template_id: Optional[str] = None) -
         Prompt final optimizado por LLM o concatenación simple si falla
     """
     if not template_id:
-        logger.info(f"⚠️ PROMPT SIN TEMPLATE - Usando prompt del usuario directamente: {user_prompt[:100]}...")
+        logger.debug(f"Prompt sin template, se usa el del usuario: {user_prompt[:100]}...")
         return user_prompt
     
     try:
-        template = PromptTemplate.objects.get(uuid=template_id, is_active=True)
-        
-        # Log del prompt inicial
-        logger.info("=" * 80)
-        logger.info(f"🎬 APLICANDO TEMPLATE: {template.name} (UUID: {template_id})")
-        logger.info("-" * 80)
-        logger.info(f"📝 TEMPLATE ORIGINAL:\n{template.prompt_text}")
-        logger.info("-" * 80)
-        logger.info(f"👤 PROMPT DEL USUARIO:\n{user_prompt}")
-        logger.info("-" * 80)
-        
-        # SIEMPRE usar LLM remix para combinar template + user prompt
-        try:
-            final_prompt = _remix_prompt_with_llm(template.prompt_text, user_prompt)
-            logger.info(f"✅ PROMPT FINAL (LLM REMIX):\n{final_prompt}")
-            logger.info("=" * 80)
-        except Exception as llm_error:
-            # Fallback seguro: concatenación simple
-            logger.warning(f"⚠️ LLM remix falló para template {template_id}, usando concatenación: {llm_error}")
-            final_prompt = f"{template.prompt_text}\n\n{user_prompt}"
-            logger.info(f"✅ PROMPT FINAL (FALLBACK - CONCATENACIÓN):\n{final_prompt}")
-            logger.info("=" * 80)
-        
-        # Incrementar contador de uso
-        template.increment_usage()
+        template = prompt_remix_cache.template(template_id)
+        if template is None:
+            logger.warning(f"Template no encontrado o inactivo: {template_id}")
+            return user_prompt
+        
+        final_prompt = prompt_remix_cache.get(template, user_prompt)
+        if final_prompt is not None:
+            logger.info(f"🎬 Template {template['name']} ({template_id}) aplicado desde caché")
+        else:
+            logger.info(f"🎬 Aplicando template: {template['name']} (UUID: {template_id})")
+            logger.debug(f"Template original:\n{template['prompt_text']}")
+            logger.debug(f"Prompt del usuario:\n{user_prompt}")
+            
+            # SIEMPRE usar LLM remix para combinar template + user prompt
+            try:
+                final_prompt = _remix_prompt_with_llm(template['prompt_text'], user_prompt)
+                prompt_remix_cache.set(template, user_prompt, final_prompt)
+                logger.debug(f"Prompt final (LLM remix):\n{final_prompt}")
+            except Exception as llm_error:
+                # Fallback seguro: concatenación simple (no se cachea, se reintenta el remix la próxima vez)
+                logger.warning(f"⚠️ LLM remix falló para template {template_id}, usando concatenación: {llm_error}")
+                final_prompt = f"{template['prompt_text']}\n\n{user_prompt}"
+                logger.debug(f"Prompt final (fallback - concatenación):\n{final_prompt}")
+        
+        # Contador de uso: se acumula en Redis y se vuelca periódicamente
+        template_usage.incr(template['uuid'])
         
         return final_prompt
     
-    except PromptTemplate.DoesNotExist:
-        logger.warning(f"Template no encontrado o inactivo: {template_id}")
-        return user_prompt
     except Exception as e:
         logger.error(f"Error aplicando template {template_id}: {e}")
         return user_prompt
@@ -154,7 +157,7 @@ IMPORTANTE:
             raise ValueError("LLM retornó prompt vacío")
         
         logger.debug(f"LLM remix completado. Longitud: {len(final_prompt)} caracteres")
-        logger.info(f"📊 Estadísticas: Template={len(template_text)} chars, User={len(user_prompt)} chars, Final={len(final_prompt)} chars")
+        logger.debug(f"📊 Estadísticas: Template={len(template_text)} chars, User={len(user_prompt)} chars, Final={len(final_prompt)} chars")
         
         return final_prompt
         
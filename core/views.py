@@ -28,15 +28,11 @@ from .forms import CustomUserCreationForm, PendingUserCreationForm, ActivationSe
 from django.db import IntegrityError
 import json
 
-# Lazy import to avoid CI failures (rembg requires onnxruntime)
-def get_remove_image_background_task():
-    from core.tasks import remove_image_background_task
-    return remove_image_background_task
-
 from .models import Project, Video, Image, Audio, Script, Scene, UserCredits, CreditTransaction, ServiceUsage, Notification, GenerationTask, PromptTemplate, ProjectMember
 from .forms import VideoBaseForm, HeyGenAvatarV2Form, HeyGenAvatarIVForm, GeminiVeoVideoForm, SoraVideoForm, GeminiImageForm, AudioForm, ScriptForm
 from .services import ProjectService, VideoService, ImageService, AudioService, APIService, SceneService, VideoCompositionService, ValidationException, ServiceException, ImageGenerationException, InvitationService
 from .services.credits import CreditService, InsufficientCreditsException, RateLimitExceededException
+from .services.derivatives import DerivativeService
 from .ai_services.model_config import get_model_info_for_item
 # N8nService se importa dinámicamente en get_script_service() para compatibilidad
 from django.template.loader import render_to_string
@@ -536,7 +532,6 @@ class DashboardView(ServiceMixin, ListView):
         
         # --- VIDEOS ---
         videos = Video.objects.filter(video_filter).select_related('project').order_by('-created_at')
-        video_service = self.get_video_service()
         for video in videos:
             item_data = {
                 'type': 'video',
@@ -550,17 +545,10 @@ class DashboardView(ServiceMixin, ListView):
                 'detail_url': reverse('core:video_detail', args=[video.uuid]),
                 'delete_url': reverse('core:video_delete', args=[video.uuid]),
             }
-            if video.status == 'completed' and video.gcs_path:
-                try:
-                    video_data = video_service.get_video_with_signed_urls(video)
-                    item_data['signed_url'] = video_data.get('signed_url')
-                except Exception:
-                    pass
             recent_items.append(item_data)
         
         # --- IMÁGENES ---
         images = Image.objects.filter(image_filter).select_related('project').order_by('-created_at')
-        image_service = self.get_image_service()
         for image in images:
             item_data = {
                 'type': 'image',
@@ -574,17 +562,10 @@ class DashboardView(ServiceMixin, ListView):
                 'detail_url': reverse('core:image_detail', args=[image.uuid]),
                 'delete_url': reverse('core:image_delete', args=[image.uuid]),
             }
-            if image.status == 'completed' and image.gcs_path:
-                try:
-                    image_data = image_service.get_image_with_signed_url(image)
-                    item_data['signed_url'] = image_data.get('signed_url')
-                except Exception:
-                    pass
             recent_items.append(item_data)
 
         # --- AUDIOS ---
         audios = Audio.objects.filter(audio_filter).select_related('project').order_by('-created_at')
-        audio_service = self.get_audio_service()
         for audio in audios:
             item_data = {
                 'type': 'audio',
@@ -599,12 +580,6 @@ class DashboardView(ServiceMixin, ListView):
                 'detail_url': reverse('core:audio_detail', args=[audio.uuid]),
                 'delete_url': reverse('core:audio_delete', args=[audio.uuid]),
             }
-            if audio.status == 'completed' and audio.gcs_path:
-                try:
-                    audio_data = audio_service.get_audio_with_signed_url(audio)
-                    item_data['signed_url'] = audio_data.get('signed_url')
-                except Exception:
-                    pass
             recent_items.append(item_data)
 
         # --- SCRIPTS ---
@@ -632,6 +607,17 @@ class DashboardView(ServiceMixin, ListView):
         page_number = self.request.GET.get('page', 1)
         page_obj = paginator.get_page(page_number)
         
+        # Firmar solo los derivados de los items de la página actual, en una sola llamada
+        page_items = list(page_obj)
+        card_urls = DerivativeService.card_urls([
+            item_data['object'] if item_data['type'] != 'script'
+            and item_data['status'] == 'completed'
+            and item_data['object'].gcs_path else None
+            for item_data in page_items
+        ])
+        for item_data, urls in zip(page_items, card_urls):
+            item_data.update(urls)
+        
         context['recent_items'] = page_obj
         context['page_obj'] = page_obj
         
@@ -974,90 +960,50 @@ class ProjectsListView(ServiceMixin, ListView):
 class LibraryView(ServiceMixin, ListView):
     """Vista de biblioteca que muestra todos los items (videos, imágenes, audios, música, scripts)"""
     template_name = 'library/list.html'
+    partial_template_name = 'library/partials/items_page.html'
     context_object_name = 'items'
     paginate_by = 24
     
     def get_queryset(self):
-        """Obtener todos los items del usuario con búsqueda y filtros"""
-        user = self.request.user
-        search_query = self.request.GET.get('q', '').strip()
-        item_type = self.request.GET.get('type', '').strip()
-        
-        # Lista para almacenar todos los items con su tipo
-        all_items = []
-        
-        # Filtrar por tipo si se especifica
-        if item_type == 'video':
-            querysets = [('video', Video.objects.filter(created_by=user))]
-        elif item_type == 'image':
-            querysets = [('image', Image.objects.filter(created_by=user))]
-        elif item_type == 'audio':
-            querysets = [('audio', Audio.objects.filter(created_by=user))]
-        elif item_type == 'script':
-            querysets = [('script', Script.objects.filter(created_by=user))]
-        else:
-            # Todos los tipos mezclados
-            querysets = [
-                ('video', Video.objects.filter(created_by=user)),
-                ('image', Image.objects.filter(created_by=user)),
-                ('audio', Audio.objects.filter(created_by=user)),
-                ('script', Script.objects.filter(created_by=user)),
-            ]
+        """Feed unificado del usuario con búsqueda y filtros (ordenado y paginado en BD)"""
+        from core.services.library_feed import LibraryFeed
         
-        # Aplicar búsqueda y agregar items a la lista
-        for item_type_name, queryset in querysets:
-            if search_query:
-                if item_type_name == 'video':
-                    queryset = queryset.filter(Q(title__icontains=search_query) | Q(script__icontains=search_query))
-                elif item_type_name == 'image':
-                    queryset = queryset.filter(Q(title__icontains=search_query) | Q(prompt__icontains=search_query))
-                elif item_type_name == 'audio':
-                    queryset = queryset.filter(Q(title__icontains=search_query) | Q(text__icontains=search_query))
-                elif item_type_name == 'script':
-                    queryset = queryset.filter(Q(title__icontains=search_query) | Q(original_script__icontains=search_query))
-            
-            # Convertir a lista y agregar tipo
-            for item in queryset:
-                # Crear un objeto wrapper con el tipo
-                item_wrapper = type('ItemWrapper', (), {
-                    'item': item,
-                    'type': item_type_name,
-                    'created_at': item.created_at,
-                    'title': item.title if hasattr(item, 'title') else (item.name if hasattr(item, 'name') else 'Sin título'),
-                    'status': item.status if hasattr(item, 'status') else None,
-                })()
-                all_items.append(item_wrapper)
-        
-        # Ordenar por fecha de creación descendente
-        all_items.sort(key=lambda x: x.created_at, reverse=True)
-        
-        return all_items
+        return LibraryFeed(
+            self.request.user,
+            item_type=self.request.GET.get('type', '').strip(),
+            search_query=self.request.GET.get('q', '').strip(),
+        )
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['show_header'] = True
-        context['search_query'] = self.request.GET.get('q', '')
-        context['selected_type'] = self.request.GET.get('type', '')
-        
-        # Estadísticas por tipo
-        user = self.request.user
-        context['stats'] = {
-            'total': Video.objects.filter(created_by=user).count() + 
-                    Image.objects.filter(created_by=user).count() + 
-                    Audio.objects.filter(created_by=user).count() + 
-                    Script.objects.filter(created_by=user).count(),
-            'videos': Video.objects.filter(created_by=user).count(),
-            'images': Image.objects.filter(created_by=user).count(),
-            'audios': Audio.objects.filter(created_by=user).count(),
-            'scripts': Script.objects.filter(created_by=user).count(),
-        }
+    def get(self, request, *args, **kwargs):
+        # Scroll infinito (HTMX): página keyset a partir del cursor
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                items, next_cursor = self.get_queryset().page_after(cursor, limit=self.paginate_by)
+            except ValueError as e:
+                return HttpResponse(str(e), status=400)
+            return render(request, self.partial_template_name, {
+                'items_with_urls': self._build_items_with_urls(items),
+                'next_cursor': next_cursor,
+                'search_query': request.GET.get('q', ''),
+                'selected_type': request.GET.get('type', ''),
+                'projects': ProjectService.get_user_projects(request.user),
+            })
+        return super().get(request, *args, **kwargs)
+    
+    def _build_items_with_urls(self, items):
+        """Genera URLs firmadas y URLs de detalle para los items de una página"""
+        # Derivados (miniatura, preview, portada) firmados de una vez para toda la página
+        card_urls = DerivativeService.card_urls([
+            w.item if w.type in ('video', 'image', 'audio', 'music')
+            and w.status == 'completed' and getattr(w.item, 'gcs_path', None) else None
+            for w in items
+        ])
         
-        # Generar URLs firmadas y URLs de detalle para los items paginados
-        from core.storage.gcs import gcs_storage
         items_with_urls = []
-        for item_wrapper in context['items']:
+        for item_wrapper, urls in zip(items, card_urls):
             item = item_wrapper.item
-            signed_url = None
+            signed_url = urls['signed_url']
             
             # Generar URL de detalle según el tipo
             if item_wrapper.type == 'video':
@@ -1079,13 +1025,6 @@ class LibraryView(ServiceMixin, ListView):
                 detail_url = '#'
                 delete_url = '#'
             
-            # Generar URL firmada si está completado
-            if item_wrapper.status == 'completed' and hasattr(item, 'gcs_path') and item.gcs_path:
-                try:
-                    signed_url = gcs_storage.get_signed_url(item.gcs_path, expiration=3600)
-                except Exception as e:
-                    logger.error(f"Error al generar URL firmada para {item_wrapper.type} {item.id}: {e}")
-            
             # Para videos, images y audios usar UUID como id; para el resto usar id numérico
             item_id = str(item.uuid) if item_wrapper.type in ('video', 'image', 'audio') else item.id
             
@@ -1097,12 +1036,47 @@ class LibraryView(ServiceMixin, ListView):
                 'created_at': item_wrapper.created_at,
                 'project': item.project if hasattr(item, 'project') else None,
                 'signed_url': signed_url,
+                'poster_url': urls['poster_url'],
+                'peaks_url': urls['peaks_url'],
                 'detail_url': detail_url,
                 'delete_url': delete_url,
                 'audio_background': item.background_gradient if item_wrapper.type == 'audio' else None,
             })
         
-        context['items_with_urls'] = items_with_urls
+        return items_with_urls
+    
+    def get_context_data(self, **kwargs):
+        from core.services.library_feed import LibraryFeed, LIBRARY_TYPES, encode_cursor
+        
+        context = super().get_context_data(**kwargs)
+        context['show_header'] = True
+        context['search_query'] = self.request.GET.get('q', '')
+        context['selected_type'] = self.request.GET.get('type', '')
+        
+        # Estadísticas por tipo (una sola consulta agregada; se reutiliza la
+        # del paginador si no hay filtros)
+        feed = self.object_list
+        if feed.item_type or feed.search_query:
+            counts = LibraryFeed(self.request.user).counts()
+        else:
+            counts = feed.counts()
+        context['stats'] = {
+            'total': counts['total'],
+            'videos': counts['video'],
+            'images': counts['image'],
+            'audios': counts['audio'],
+            'scripts': counts['script'],
+        }
+        
+        items = list(context['items'])
+        context['items_with_urls'] = self._build_items_with_urls(items)
+        
+        # Cursor para continuar con scroll infinito desde el final de esta página
+        page_obj = context.get('page_obj')
+        context['next_cursor'] = None
+        if page_obj and page_obj.has_next() and items:
+            last = items[-1]
+            context['next_cursor'] = encode_cursor(last.created_at, LIBRARY_TYPES.index(last.type), last.item.id)
 
         context['projects'] = ProjectService.get_user_projects(self.request.user)
         
@@ -1791,7 +1765,8 @@ class VideoCreatePartialView(ServiceMixin, FormView):
         """Configuración para Manim Quote"""
         config = {
             'author': request.POST.get('author'),
-            'quality': request.POST.get('quality', 'k'),
+            'quality': request.POST.get('quality', 'h'),
+            'aspect_ratio': request.POST.get('aspect_ratio') or '16:9',
             'container_color': request.POST.get('container_color') or request.POST.get('container_color_text'),
             'text_color': request.POST.get('text_color') or request.POST.get('text_color_text'),
             'font_family': request.POST.get('font_family', 'normal'),
@@ -1907,11 +1882,12 @@ class VideoDeleteView(BreadcrumbMixin, DeleteView):
         except Exception as e:
             logger.error(f"Error al eliminar notificaciones: {e}")
         
-        # Eliminar de GCS si existe
+        # Eliminar de GCS si existe (original y derivados)
         if self.object.gcs_path:
             try:
                 from .storage.gcs import gcs_storage
                 gcs_storage.delete_file(self.object.gcs_path)
+                DerivativeService.delete(self.object)
             except Exception as e:
                 logger.error(f"Error al eliminar archivo: {e}")
         
@@ -2101,6 +2077,19 @@ class VideoStatusView(ServiceMixin, View):
                 'status': video.status
             }, status=400)
         
+        # Con el watcher activo el estado llega por el bus de progreso: servir
+        # el último snapshot en lugar de consultar al proveedor en cada poll
+        from core.services.progress_bus import ProgressBus, ACTIVE_STATES
+        from core.services.status_watcher import is_watcher_enabled
+        snapshot = ProgressBus.get_snapshot('video', video.uuid)
+        if is_watcher_enabled() and snapshot and snapshot['status'] in ACTIVE_STATES:
+            return JsonResponse({
+                'status': video.status,
+                'progress': snapshot.get('progress'),
+                'stage': snapshot.get('stage'),
+                'updated_at': video.updated_at.isoformat()
+            })
+        
         # Consultar estado usando servicio
         video_service = self.get_video_service()
         try:
@@ -2676,13 +2665,14 @@ class LibraryItemsAPIView(ServiceMixin, View):
         
         items_data = []
         total_count = 0
+        # (item_data, item) pendientes de firmar en bloque al final
+        pending_urls = []
         
         try:
             if item_type == 'video':
                 queryset = Video.objects.filter(base_filter).select_related('project').order_by('-created_at')
                 total_count = queryset.count()
                 videos = queryset[offset:offset + limit]
-                video_service = self.get_video_service()
                 for video in videos:
                     # Usar URL del proyecto si hay proyecto específico, sino URL genérica
                     if project:
@@ -2707,18 +2697,13 @@ class LibraryItemsAPIView(ServiceMixin, View):
                     }
                     # Solo generar signed URLs si se pide explícitamente
                     if include_urls and video.status == 'completed' and video.gcs_path:
-                        try:
-                            video_data = video_service.get_video_with_signed_urls(video)
-                            item_data['signed_url'] = video_data.get('signed_url')
-                        except Exception:
-                            pass
+                        pending_urls.append((item_data, video))
                     items_data.append(item_data)
                     
             elif item_type == 'image':
                 queryset = Image.objects.filter(base_filter).select_related('project').order_by('-created_at')
                 total_count = queryset.count()
                 images = queryset[offset:offset + limit]
-                image_service = self.get_image_service()
                 for image in images:
                     # Usar URL del proyecto si hay proyecto específico, sino URL genérica
                     if project:
@@ -2743,18 +2728,13 @@ class LibraryItemsAPIView(ServiceMixin, View):
                     }
                     # Solo generar signed URLs si se pide explícitamente
                     if include_urls and image.status == 'completed' and image.gcs_path:
-                        try:
-                            image_data = image_service.get_image_with_signed_url(image)
-                            item_data['signed_url'] = image_data.get('signed_url')
-                        except Exception:
-                            pass
+                        pending_urls.append((item_data, image))
                     items_data.append(item_data)
                     
             elif item_type == 'audio':
                 queryset = Audio.objects.filter(base_filter).select_related('project').order_by('-created_at')
                 total_count = queryset.count()
                 audios = queryset[offset:offset + limit]
-                audio_service = self.get_audio_service()
                 for audio in audios:
                     # Obtener info del modelo usando el model_id del audio
                     model_id = audio.model_id or 'elevenlabs'  # Default a elevenlabs si no hay model_id
@@ -2784,14 +2764,16 @@ class LibraryItemsAPIView(ServiceMixin, View):
                     }
                     # Solo generar signed URLs si se pide explícitamente
                     if include_urls and audio.status == 'completed' and audio.gcs_path:
-                        try:
-                            audio_data = audio_service.get_audio_with_signed_url(audio)
-                            item_data['signed_url'] = audio_data.get('signed_url')
-                        except Exception:
-                            pass
+                        pending_urls.append((item_data, audio))
                     items_data.append(item_data)
             else:
                 return JsonResponse({'error': 'Tipo no válido'}, status=400)
+            
+            # Firmar los derivados de toda la página de una vez
+            if pending_urls:
+                card_urls = DerivativeService.card_urls([item for _, item in pending_urls])
+                for (item_data, _), urls in zip(pending_urls, card_urls):
+                    item_data.update(urls)
                 
             has_more = (offset + len(items_data)) < total_count
             return JsonResponse({
@@ -3381,7 +3363,8 @@ class CreateItemAPIView(ServiceMixin, View):
         # Para Manim Quote, añadir campos específicos
         if video_type == 'manim_quote':
             config['author'] = settings.get('author') or data.get('author')
-            config['quality'] = settings.get('quality') or data.get('quality', 'k')
+            config['quality'] = settings.get('quality') or data.get('quality', 'h')
+            config['aspect_ratio'] = settings.get('aspect_ratio') or data.get('aspect_ratio') or '16:9'
             config['container_color'] = settings.get('container_color') or data.get('container_color') or '#0066CC'
             config['text_color'] = settings.get('text_color') or data.get('text_color') or '#FFFFFF'
             config['font_family'] = settings.get('font_family') or data.get('font_family') or 'normal'
@@ -4229,11 +4212,12 @@ class ImageDeleteView(BreadcrumbMixin, DeleteView):
         except Exception as e:
             logger.error(f"Error al eliminar notificaciones: {e}")
         
-        # Eliminar de GCS si existe
+        # Eliminar de GCS si existe (original y derivados)
         if self.object.gcs_path:
             try:
                 from .storage.gcs import gcs_storage
                 gcs_storage.delete_file(self.object.gcs_path)
+                DerivativeService.delete(self.object)
             except Exception as e:
                 logger.error(f"Error al eliminar archivo: {e}")
         
@@ -4751,13 +4735,10 @@ class ImageToVideoView(LoginRequiredMixin, ServiceMixin, View):
                     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                     new_gcs_destination = f"projects/{new_video.project.id if new_video.project else 'none'}/videos/{new_video.id}/input_reference_{timestamp}.png"
                     
-                    # Copiar el archivo a la nueva ubicación
-                    old_blob_name = old_path.replace(f"gs://{settings.GCS_BUCKET_NAME}/", "")
-                    new_blob_name = new_gcs_destination.replace(f"gs://{settings.GCS_BUCKET_NAME}/", "")
-                    
-                    old_blob = gcs_storage.bucket.blob(old_blob_name)
-                    new_blob = gcs_storage.bucket.blob(new_blob_name)
-                    new_blob.upload_from_string(old_blob.download_as_bytes(), content_type='image/png')
+                    # Copiar el archivo a la nueva ubicación (copia en servidor, sin descargar)
+                    if not old_path.startswith('gs://'):
+                        old_path = f"gs://{settings.GCS_BUCKET_NAME}/{old_path}"
+                    gcs_storage.copy_from_gcs(old_path, new_gcs_destination)
                     
                     # Actualizar config con la nueva ruta
                     new_gcs_path = f"gs://{settings.GCS_BUCKET_NAME}/{new_gcs_destination}"
@@ -4765,11 +4746,9 @@ class ImageToVideoView(LoginRequiredMixin, ServiceMixin, View):
                     new_video.config = config
                     new_video.save(update_fields=['config'])
                     
-                    # Eliminar archivo temporal
-                    try:
-                        old_blob.delete()
-                    except Exception:
-                        pass  # Ignorar si no se puede eliminar
+                    # Eliminar archivo temporal (delete_file registra el error si falla)
+                    if not gcs_storage.delete_file(old_path):
+                        logger.warning(f"No se pudo eliminar el input_reference temporal {old_path}")
                 except Exception as e:
                     logger.error(f"Error moviendo input_reference para Sora: {e}")
                     # Continuar de todas formas, el path temporal también funciona
@@ -4925,8 +4904,8 @@ class ImageRemoveBackgroundView(LoginRequiredMixin, ServiceMixin, View):
             
             # Encolar tarea de procesamiento
             logger.info(f"Encolando tarea de remove-bg para imagen {image_uuid} -> {new_image.uuid}")
-            remove_bg_task = get_remove_image_background_task()
-            task = remove_bg_task.delay(
+            from core.services.bgremover import BackgroundRemovalService
+            task = BackgroundRemovalService.enqueue(
                 str(image_uuid),
                 str(new_image.uuid)  # Pasar UUID de imagen destino
             )
@@ -5280,11 +5259,12 @@ class AudioDeleteView(BreadcrumbMixin, DeleteView):
         except Exception as e:
             logger.error(f"Error al eliminar notificaciones: {e}")
         
-        # Eliminar de GCS si existe
+        # Eliminar de GCS si existe (original y derivados)
         if self.object.gcs_path:
             try:
                 from .storage.gcs import gcs_storage
                 gcs_storage.delete_file(self.object.gcs_path)
+                DerivativeService.delete(self.object)
             except Exception as e:
                 logger.error(f"Error al eliminar archivo: {e}")
         
@@ -5337,7 +5317,16 @@ class VideoStatusPartialView(View):
         
         video = get_object_or_404(Video, uuid=video_uuid)
         
-        # Siempre consultar estado si el video está procesando y tiene external_id
+        # Si el watcher sigue el video, los cambios llegan por WebSocket (task_progress):
+        # mientras el snapshot siga activo no hay nada que re-renderizar (204 = HTMX no hace swap)
+        if video.status == 'processing':
+            from core.services.progress_bus import ProgressBus, ACTIVE_STATES
+            from core.services.status_watcher import is_watcher_enabled
+            snapshot = ProgressBus.get_snapshot('video', video.uuid)
+            if is_watcher_enabled() and snapshot and snapshot['status'] in ACTIVE_STATES:
+                return HttpResponse(status=204)
+        
+        # Consultar estado si el video está procesando, tiene external_id y no hay snapshot
         if video.status == 'processing':
             if video.external_id:
                 try:
@@ -5843,8 +5832,7 @@ class AgentConfigureView(BreadcrumbMixin, ServiceMixin, View):
                 
                 # Generar URLs firmadas para preview images
                 scenes_with_urls = []
-                for scene in scenes:
-                    scene_data = SceneService().get_scene_with_signed_urls(scene)
+                for scene_data in SceneService().get_scenes_with_signed_urls(scenes):
                     # Serializar ai_config a JSON string para el template
                     if 'scene' in scene_data and scene_data['scene'].ai_config:
                         scene_data['ai_config_json'] = json.dumps(scene_data['scene'].ai_config)
@@ -6022,8 +6010,7 @@ class AgentScenesView(BreadcrumbMixin, ServiceMixin, View):
             
             # Generar URLs firmadas para cada escena
             scenes_with_urls = []
-            for scene in scenes:
-                scene_data = SceneService().get_scene_with_signed_urls(scene)
+            for scene_data in SceneService().get_scenes_with_signed_urls(scenes):
                 # Serializar ai_config a JSON string para el template
                 if 'scene' in scene_data and scene_data['scene'].ai_config:
                     scene_data['ai_config_json'] = json.dumps(scene_data['scene'].ai_config)
@@ -6078,10 +6065,7 @@ class AgentFinalView(BreadcrumbMixin, ServiceMixin, View):
             ).order_by('order')
             
             # Generar URLs firmadas
-            scenes_with_urls = []
-            for scene in scenes:
-                scene_data = SceneService().get_scene_with_signed_urls(scene)
-                scenes_with_urls.append(scene_data)
+            scenes_with_urls = SceneService().get_scenes_with_signed_urls(scenes)
             
             context = {
                 'project': project,
@@ -6098,8 +6082,8 @@ class AgentFinalView(BreadcrumbMixin, ServiceMixin, View):
             return redirect('core:agent_create', project_uuid=project.uuid)
     
     def post(self, request, project_uuid):
-        """Combinar videos de escenas con FFmpeg"""
-        from .services import VideoCompositionService
+        """Encolar la combinación de videos de escenas con FFmpeg"""
+        from .services.queue import QueueService
         from datetime import datetime
         
         project = self.get_project()
@@ -6130,9 +6114,6 @@ class AgentFinalView(BreadcrumbMixin, ServiceMixin, View):
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             output_filename = f"{timestamp}_{video_title.replace(' ', '_')}.mp4"
             
-            composition_service = VideoCompositionService()
-            gcs_path = composition_service.combine_scene_videos(scenes, output_filename)
-            
             # Calcular duración total
             total_duration = sum(scene.duration_sec for scene in scenes)
 
@@ -6164,15 +6145,15 @@ class AgentFinalView(BreadcrumbMixin, ServiceMixin, View):
                 project=project,
                 title=video_title,
                 type=final_video_type,  # Tipo genérico, podría ser mixto
-                status='completed',
+                status='processing',
                 script=f"Video generado por agente con {scenes.count()} escenas",
                 config={
                     'agent_generated': True,
                     'script_id': script.id,
                     'num_scenes': scenes.count(),
-                    'scene_ids': [scene.id for scene in scenes]
+                    'scene_ids': [scene.id for scene in scenes],
+                    'output_filename': output_filename
                 },
-                gcs_path=gcs_path,
                 duration=total_duration,
                 metadata={
                     'scenes': [
@@ -6183,19 +6164,33 @@ class AgentFinalView(BreadcrumbMixin, ServiceMixin, View):
                         }
                         for scene in scenes
                     ]
-                },
-                completed_at=timezone.now()
+                }
             )
             
-            # Asociar video final con el script
-            script.final_video = video
-            script.save(update_fields=['final_video'])
+            # La composición (descarga, FFmpeg y subida) se hace en el worker;
+            # la tarea asocia el video final al script cuando termina
+            try:
+                generation_task = QueueService.enqueue_generation(
+                    item=video,
+                    user=request.user,
+                    task_type='video_compose',
+                    metadata={'script_id': script.id, 'num_scenes': len(video.config['scene_ids'])}
+                )
+            except ValueError as e:
+                # Límite de tareas simultáneas: no dejar un video huérfano en processing
+                video.delete()
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=429)
             
-            logger.info(f"✓ Video final creado: {video.id} (UUID: {video.uuid}) para script {script.id}")
+            logger.info(f"✓ Video final encolado: {video.id} (UUID: {video.uuid}) para script {script.id}")
             
             return JsonResponse({
                 'status': 'success',
-                'message': 'Video combinado exitosamente',
+                'message': 'Video encolado para composición',
+                'queued': True,
+                'task_uuid': str(generation_task.uuid),
                 'video_id': video.id,
                 'video_uuid': str(video.uuid)  # Añadir UUID para redirección correcta
             })
@@ -6292,8 +6287,7 @@ class AgentConfigureStandaloneView(BreadcrumbMixin, ServiceMixin, View):
                 
                 # Generar URLs firmadas para preview images
                 scenes_with_urls = []
-                for scene in scenes:
-                    scene_data = SceneService().get_scene_with_signed_urls(scene)
+                for scene_data in SceneService().get_scenes_with_signed_urls(scenes):
                     # Serializar ai_config a JSON string para el template
                     if 'scene' in scene_data and scene_data['scene'].ai_config:
                         scene_data['ai_config_json'] = json.dumps(scene_data['scene'].ai_config)
@@ -6466,8 +6460,7 @@ class AgentScenesStandaloneView(BreadcrumbMixin, ServiceMixin, View):
             
             # Generar URLs firmadas para cada escena
             scenes_with_urls = []
-            for scene in scenes:
-                scene_data = SceneService().get_scene_with_signed_urls(scene)
+            for scene_data in SceneService().get_scenes_with_signed_urls(scenes):
                 if 'scene' in scene_data and scene_data['scene'].ai_config:
                     scene_data['ai_config_json'] = json.dumps(scene_data['scene'].ai_config)
                 else:
@@ -6518,10 +6511,7 @@ class AgentFinalStandaloneView(BreadcrumbMixin, ServiceMixin, View):
             ).order_by('order')
             
             # Generar URLs firmadas
-            scenes_with_urls = []
-            for scene in scenes:
-                scene_data = SceneService().get_scene_with_signed_urls(scene)
-                scenes_with_urls.append(scene_data)
+            scenes_with_urls = SceneService().get_scenes_with_signed_urls(scenes)
             
             context = {
                 'project': None,  # Sin proyecto
@@ -6538,8 +6528,8 @@ class AgentFinalStandaloneView(BreadcrumbMixin, ServiceMixin, View):
             return redirect('core:agent_create_standalone')
     
     def post(self, request):
-        """Combinar videos de escenas con FFmpeg (sin proyecto)"""
-        from .services import VideoCompositionService
+        """Encolar la combinación de videos de escenas con FFmpeg (sin proyecto)"""
+        from .services.queue import QueueService
         from datetime import datetime
         
         script_id = request.POST.get('script_id')
@@ -6573,9 +6563,6 @@ class AgentFinalStandaloneView(BreadcrumbMixin, ServiceMixin, View):
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             output_filename = f"{timestamp}_{video_title.replace(' ', '_')}.mp4"
             
-            composition_service = VideoCompositionService()
-            gcs_path = composition_service.combine_scene_videos(scenes, output_filename)
-            
             # Calcular duración total
             total_duration = sum(scene.duration_sec for scene in scenes)
 
@@ -6609,15 +6596,15 @@ class AgentFinalStandaloneView(BreadcrumbMixin, ServiceMixin, View):
                 created_by=request.user,
                 title=video_title,
                 type=final_video_type,
-                status='completed',
+                status='processing',
                 script=f"Video generado por agente con {scenes.count()} escenas",
                 config={
                     'agent_generated': True,
                     'script_id': script.id,
                     'num_scenes': scenes.count(),
-                    'scene_ids': [scene.id for scene in scenes]
+                    'scene_ids': [scene.id for scene in scenes],
+                    'output_filename': output_filename
                 },
-                gcs_path=gcs_path,
                 duration=total_duration,
                 metadata={
                     'scenes': [
@@ -6628,19 +6615,33 @@ class AgentFinalStandaloneView(BreadcrumbMixin, ServiceMixin, View):
                         }
                         for scene in scenes
                     ]
-                },
-                completed_at=timezone.now()
+                }
             )
             
-            # Asociar video final con el script
-            script.final_video = video
-            script.save(update_fields=['final_video'])
+            # La composición (descarga, FFmpeg y subida) se hace en el worker;
+            # la tarea asocia el video final al script cuando termina
+            try:
+                generation_task = QueueService.enqueue_generation(
+                    item=video,
+                    user=request.user,
+                    task_type='video_compose',
+                    metadata={'script_id': script.id, 'num_scenes': len(video.config['scene_ids'])}
+                )
+            except ValueError as e:
+                # Límite de tareas simultáneas: no dejar un video huérfano en processing
+                video.delete()
+                return JsonResponse({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=429)
             
-            logger.info(f"✓ Video final creado: {video.id} (UUID: {video.uuid}) para script {script.id}")
+            logger.info(f"✓ Video final encolado: {video.id} (UUID: {video.uuid}) para script {script.id}")
             
             return JsonResponse({
                 'status': 'success',
-                'message': 'Video combinado exitosamente',
+                'message': 'Video encolado para composición',
+                'queued': True,
+                'task_uuid': str(generation_task.uuid),
                 'video_id': video.id,
                 'video_uuid': str(video.uuid)
             })
@@ -6822,88 +6823,85 @@ class SceneGenerateView(ServiceMixin, View):
             }, status=500)
 
 
-class SceneStatusView(View):
-    """Consultar estado de una escena (para polling)"""
+class ScriptGenerateAllScenesView(LoginRequiredMixin, View):
+    """
+    Generar todas las escenas pendientes de un guión en una sola llamada
     
-    def get(self, request, scene_id):
-        from .models import Scene
+    POST reserva los créditos del lote completo y lo encola (ver
+    StoryboardBatchService). GET devuelve el último progreso agregado; en
+    tiempo real llega por WebSocket como item 'storyboard'.
+    """
+    
+    @staticmethod
+    def _has_access(script, user) -> bool:
+        """Acceso por el proyecto del guión, o por autoría si no tiene proyecto"""
+        if script.project:
+            return script.project.has_access(user)
+        return script.created_by_id == user.id
+    
+    def post(self, request, script_id):
+        from core.services.storyboard import StoryboardBatchService
+        
+        script = get_object_or_404(Script.objects.select_related('project'), pk=script_id)
+        if not self._has_access(script, request.user):
+            return JsonResponse({'status': 'error', 'message': 'No tienes acceso a este guión'}, status=403)
         
         try:
-            scene = get_object_or_404(Scene, pk=scene_id)
-            
-            # Si está procesando y tiene external_id, consultar estado
-            if scene.video_status == 'processing' and scene.external_id:
-                try:
-                    scene_service = SceneService()
-                    status_data = scene_service.check_scene_video_status(scene)
-                    
-                    # Refrescar desde BD
-                    scene.refresh_from_db()
-                    
-                except Exception as e:
-                    logger.error(f"Error al consultar estado de escena {scene_id}: {e}")
-            
-            # Si está completada pero no se han cobrado créditos, cobrarlos ahora
-            elif scene.video_status == 'completed' and scene.script.created_by:
-                try:
-                    from core.services.credits import CreditService
-                    # Verificar si ya se cobraron créditos
-                    if not scene.metadata.get('credits_charged'):
-                        logger.info(f"Escena {scene.scene_id} completada pero sin créditos cobrados. Cobrando ahora...")
-                        CreditService.deduct_credits_for_scene_video(scene.script.created_by, scene)
-                        scene.refresh_from_db()  # Refrescar después del cobro
-                except Exception as e:
-                    logger.error(f"Error al verificar/cobrar créditos para escena {scene_id}: {e}")
-            
-            # Verificar también el audio completado
-            if scene.audio_status == 'completed' and scene.script.created_by:
-                try:
-                    from core.services.credits import CreditService
-                    # Verificar si ya se cobraron créditos del audio
-                    if not scene.metadata.get('audio_credits_charged'):
-                        logger.info(f"Audio de escena {scene.scene_id} completado pero sin créditos cobrados. Cobrando ahora...")
-                        # Calcular y cobrar créditos del audio
-                        cost = CreditService.estimate_audio_cost(scene.script_text)
-                        if cost > 0:
-                            CreditService.deduct_credits(
-                                user=scene.script.created_by,
-                                amount=cost,
-                                service_name='elevenlabs',
-                                operation_type='audio_generation',
-                                resource=scene,
-                                metadata={
-                                    'character_count': len(scene.script_text),
-                                    'duration': scene.audio_duration,
-                                    'voice_id': scene.audio_voice_id,
-                                }
-                            )
-                            # Marcar como cobrado en metadata
-                            if not scene.metadata:
-                                scene.metadata = {}
-                            scene.metadata['audio_credits_charged'] = True
-                            scene.save(update_fields=['metadata'])
-                            scene.refresh_from_db()
-                except Exception as e:
-                    logger.error(f"Error al verificar/cobrar créditos de audio para escena {scene_id}: {e}")
-            
-            # Generar URLs firmadas
-            scene_data = SceneService().get_scene_with_signed_urls(scene)
-            
+            batch = StoryboardBatchService.generate_all_scenes(script, request.user)
             return JsonResponse({
                 'status': 'success',
-                'scene_id': scene.id,
-                'video_status': scene.video_status,
-                'audio_status': scene.audio_status,
-                'final_video_status': scene.final_video_status,
-                'preview_status': scene.preview_image_status,
-                'video_url': scene_data.get('video_url'),
-                'audio_url': scene_data.get('audio_url'),
-                'final_video_url': scene_data.get('final_video_url'),
-                'preview_url': scene_data.get('preview_image_url'),
-                'error_message': scene.error_message,
-                'audio_error_message': scene.audio_error_message
+                'message': f"{len(batch['scene_ids'])} escenas enviadas para generación",
+                **batch
             })
+        except (InsufficientCreditsException, RateLimitExceededException, ValidationException) as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"Error al generar escenas del guión {script_id}: {e}", exc_info=True)
+            return JsonResponse({'status': 'error', 'message': f'Error: {str(e)}'}, status=500)
+    
+    def get(self, request, script_id):
+        from core.services.progress_bus import ProgressBus
+        
+        script = get_object_or_404(Script.objects.select_related('project'), pk=script_id)
+        if not self._has_access(script, request.user):
+            return JsonResponse({'status': 'error', 'message': 'No tienes acceso a este guión'}, status=403)
+        
+        return JsonResponse({
+            'status': 'success',
+            'progress': ProgressBus.get_snapshot('storyboard', script.id)
+        })
+
+
+class SceneStatusView(View):
+    """
+    Consultar estado de una escena (para polling)
+    
+    Solo lectura: las consultas al proveedor y el cobro de créditos los hace el
+    SceneReconciler en segundo plano. Responde 304 si el estado no ha cambiado
+    desde el ETag que envía el cliente (el ETag cambia también al volver a
+    firmar las URLs, antes de que caduquen).
+    """
+    
+    def get(self, request, scene_id):
+        from core.services.scene_reconciler import STATE_TTL, scene_state
+        
+        try:
+            state = scene_state(scene_id)
+            if state is None:
+                raise Http404('Escena no encontrada')
+            
+            etag, payload = state
+            quoted_etag = f'"{etag}"'
+            if request.headers.get('If-None-Match') == quoted_etag:
+                response = HttpResponse(status=304)
+            else:
+                response = JsonResponse(payload)
+            response['ETag'] = quoted_etag
+            response['Cache-Control'] = f'private, no-cache, max-age={STATE_TTL}'
+            return response
             
+        except Http404:
+            raise
         except Exception as e:
             return JsonResponse({
                 'status': 'error',
@@ -7258,6 +7256,13 @@ class SceneUpdateConfigView(View):
             
             scene.save()
             
+            # Cancelar la preview especulativa si ya no corresponde y recalcular estimaciones
+            try:
+                from core.services.prefetch import SpeculativePrefetch
+                SpeculativePrefetch.on_scene_changed(scene)
+            except Exception as e:
+                logger.warning(f"No se pudo actualizar la pre-generación de la escena {scene_id}: {e}")
+            
             return JsonResponse({
                 'status': 'success',
                 'message': 'Configuración actualizada',
@@ -7481,35 +7486,24 @@ class SceneVersionsView(View):
             scene = get_object_or_404(Scene, id=scene_id)
             
             # Obtener todas las versiones (la actual y sus ancestros)
-            versions = []
-            
-            # Primero agregar la escena actual
-            scene_service = SceneService()
-            current_data = scene_service.get_scene_with_signed_urls(scene)
-            versions.append({
-                'id': scene.id,
-                'version': scene.version,
-                'created_at': scene.created_at.isoformat(),
-                'video_status': scene.video_status,
-                'is_included': scene.is_included,
-                'video_url': current_data.get('video_url'),
-                'preview_url': current_data.get('preview_url')
-            })
-            
-            # Luego agregar todas las versiones anteriores
+            chain = [scene]
             parent = scene.parent_scene
             while parent:
-                parent_data = scene_service.get_scene_with_signed_urls(parent)
+                chain.append(parent)
+                parent = parent.parent_scene
+            
+            # Firmar las URLs de todas las versiones en una sola llamada
+            versions = []
+            for version, version_data in zip(chain, SceneService().get_scenes_with_signed_urls(chain)):
                 versions.append({
-                    'id': parent.id,
-                    'version': parent.version,
-                    'created_at': parent.created_at.isoformat(),
-                    'video_status': parent.video_status,
-                    'is_included': parent.is_included,
-                    'video_url': parent_data.get('video_url'),
-                    'preview_url': parent_data.get('preview_url')
+                    'id': version.id,
+                    'version': version.version,
+                    'created_at': version.created_at.isoformat(),
+                    'video_status': version.video_status,
+                    'is_included': version.is_included,
+                    'video_url': version_data.get('video_url'),
+                    'preview_url': version_data.get('preview_image_url')
                 })
-                parent = parent.parent_scene
             
             return JsonResponse({
                 'status': 'success',
@@ -7601,6 +7595,67 @@ class SceneVersionsView(View):
 #             return JsonResponse({'error': 'Error interno'}, status=500)
 
 
+# ====================
+# PROVIDER WEBHOOKS
+# ====================
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ProviderWebhookView(View):
+    """
+    Webhook para avisos de finalización de proveedores de video
+    
+    El payload solo se usa para localizar el video por external_id; el estado
+    real se vuelve a consultar al proveedor a través del ProviderStatusWatcher.
+    """
+    
+    # Rutas (dentro del JSON) donde cada proveedor envía el ID de su trabajo
+    EXTERNAL_ID_PATHS = {
+        'heygen': [('event_data', 'video_id'), ('video_id',)],
+        'kling': [('data', 'task_id'), ('task_id',)],
+        'higgsfield': [('request_id',), ('id',)],
+        'sora': [('data', 'id'), ('id',)],
+    }
+    
+    def post(self, request, provider):
+        import hmac
+        from core.services.status_watcher import status_watcher
+        
+        secret = getattr(settings, 'PROVIDER_WEBHOOK_SECRET', '')
+        token = request.GET.get('token') or request.headers.get('X-Webhook-Token', '')
+        if not secret or not hmac.compare_digest(str(token), str(secret)):
+            return JsonResponse({'error': 'No autorizado'}, status=403)
+        
+        if provider not in self.EXTERNAL_ID_PATHS:
+            return JsonResponse({'error': f'Proveedor no soportado: {provider}'}, status=404)
+        
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'JSON inválido'}, status=400)
+        
+        external_id = self._extract_external_id(provider, data)
+        if not external_id:
+            return JsonResponse({'error': 'No se encontró el ID del trabajo'}, status=400)
+        
+        try:
+            found = status_watcher.handle_webhook(provider, str(external_id))
+        except Exception as e:
+            logger.error(f"Error procesando webhook de {provider} ({external_id}): {e}", exc_info=True)
+            # El polling de respaldo recogerá el cambio
+            return JsonResponse({'status': 'deferred'}, status=202)
+        
+        return JsonResponse({'status': 'processed' if found else 'ignored'})
+    
+    def _extract_external_id(self, provider, data):
+        for path in self.EXTERNAL_ID_PATHS[provider]:
+            value = data
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if value:
+                return value
+        return None
+
+
 # ====================
 # FREEPIK API VIEWS
 # ====================
@@ -7815,12 +7870,11 @@ class FreepikSetSceneImageView(View):
                 project_id_str = scene.project.id if scene.project else 'standalone'
                 gcs_path = f"projects/{project_id_str}/scenes/{scene.id}/preview_freepik.jpg"   
                              
-                with open(tmp_path, 'rb') as image_file:
-                    gcs_full_path = gcs_storage.upload_from_bytes(
-                        file_content=image_file.read(),
-                        destination_path=gcs_path,
-                        content_type='image/jpeg'
-                    )
+                gcs_full_path = gcs_storage.upload_file(
+                    tmp_path,
+                    destination_path=gcs_path,
+                    content_type='image/jpeg'
+                )
                 
                 # Actualizar escena
                 scene.preview_image_gcs_path = gcs_full_path
@@ -8990,8 +9044,16 @@ class DocumentationAssistantChatView(LoginRequiredMixin, View):
                 except json.JSONDecodeError:
                     chat_history = []
             
-            # Inicializar asistente
-            assistant = DocumentationAssistant()
+            # Con WebSocket abierto la respuesta llega en streaming por Channels
+            if request.POST.get('stream') == '1':
+                import uuid
+                from .tasks import stream_documentation_answer_task
+                stream_id = uuid.uuid4().hex
+                stream_documentation_answer_task.delay(request.user.id, question, stream_id)
+                return JsonResponse({'stream_id': stream_id, 'question': question}, status=202)
+            
+            # Asistente del proceso (índice y cliente del LLM ya cargados)
+            assistant = DocumentationAssistant.shared()
             
             # Procesar pregunta
             result = assistant.ask(question, chat_history)
@@ -9021,20 +9083,20 @@ class DocumentationAssistantReindexView(LoginRequiredMixin, UserPassesTestMixin,
     
     def post(self, request):
         """Fuerza la re-indexación de la documentación"""
-        from .rag.assistant import DocumentationAssistant
-        from .rag.vector_store import VectorStoreManager
+        from .rag.indexer import IncrementalIndexer, ReindexInProgressError
+        from .rag.retriever import get_shared_index
         
         try:
-            # Eliminar índice anterior
-            vector_store_manager = VectorStoreManager()
-            deleted = vector_store_manager.delete_index()
-            
-            if deleted:
-                logger.info("Índice anterior eliminado")
-            
-            # Crear nuevo índice
-            assistant = DocumentationAssistant(reindex=True)
-            messages.success(request, 'Documentación re-indexada exitosamente desde docs/api')
+            # Solo se embeben los chunks modificados; la nueva generación reemplaza
+            # a la anterior sin cortar el servicio (los procesos la recargan solos)
+            stats = IncrementalIndexer(get_shared_index().manager).run()
+            messages.success(
+                request,
+                f"Documentación re-indexada: {stats['files_changed']} archivos modificados, "
+                f"{stats['chunks_added']} chunks nuevos, {stats['chunks_removed']} eliminados"
+            )
+        except ReindexInProgressError as e:
+            messages.warning(request, str(e))
         except Exception as e:
             logger.error(f"Error al re-indexar: {e}", exc_info=True)
             messages.error(request, f'Error al re-indexar: {str(e)}')
@@ -9042,6 +9104,41 @@ class DocumentationAssistantReindexView(LoginRequiredMixin, UserPassesTestMixin,
         return redirect('core:dashboard')
 
 
+class ProviderClientPoolStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Métricas de utilización del pool de clientes de proveedores (solo staff)"""
+    
+    def test_func(self):
+        return self.request.user.is_staff
+    
+    def get(self, request):
+        from .ai_services.client_pool import client_pool
+        return JsonResponse(client_pool.stats())
+
+
+class GenerationTelemetryView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """p50/p95 de duración y coste de generación por proveedor, modelo y etapa (solo staff)"""
+    
+    def test_func(self):
+        return self.request.user.is_staff
+    
+    def get(self, request):
+        from .monitoring.telemetry import GenerationTelemetry
+        
+        try:
+            days = min(max(int(request.GET.get('days', 7)), 1), 90)
+        except ValueError:
+            days = 7
+        
+        return JsonResponse({
+            'days': days,
+            'stats': GenerationTelemetry.summary(
+                days=days,
+                provider=request.GET.get('provider') or None,
+                stage=request.GET.get('stage') or None,
+            ),
+        })
+
+
 # ====================
 # CREATION AGENT (Chat de Creación)
 # ====================
@@ -9191,7 +9288,6 @@ class StockSearchView(View):
             - use_cache: Usar caché (default: true)
         """
         from core.services.stock_service import StockService
-        from core.services.stock_cache import StockCache
         
         query = request.GET.get('query')
         if not query:
@@ -9271,35 +9367,7 @@ class StockSearchView(View):
             else:
                 sources = available_sources
             
-            # Intentar obtener del caché
-            cached_results = None
-            if use_cache:
-                try:
-                    cache_kwargs = {
-                        'query': query,
-                        'content_type': content_type,
-                        'sources': sources,
-                        'orientation': orientation,
-                        'license_filter': license_filter,
-                        'page': page,
-                        'per_page': per_page
-                    }
-                    if content_type == 'audio':
-                        audio_type = request.GET.get('audio_type', 'all')
-                        cache_kwargs['audio_type'] = audio_type if audio_type in ['music', 'sound_effects', 'all'] else 'all'
-                    cached_results = StockCache.get(**cache_kwargs)
-                except Exception as e:
-                    logger.warning(f"Error al obtener del caché: {e}", exc_info=True)
-            
-            if cached_results:
-                logger.info(f"Stock search cache HIT para '{query}'")
-                return JsonResponse({
-                    'success': True,
-                    'cached': True,
-                    'data': cached_results
-                })
-            
-            # Buscar en las APIs
+            # Buscar en las APIs (en paralelo; cada fuente se cachea por separado)
             if content_type == 'image':
                 results = stock_service.search_images(
                     query=query,
@@ -9307,7 +9375,8 @@ class StockSearchView(View):
                     orientation=orientation,
                     license_filter=license_filter,
                     page=page,
-                    per_page=per_page
+                    per_page=per_page,
+                    use_cache=use_cache
                 )
             elif content_type == 'video':
                 results = stock_service.search_videos(
@@ -9315,7 +9384,8 @@ class StockSearchView(View):
                     sources=sources,
                     orientation=orientation,
                     page=page,
-                    per_page=per_page
+                    per_page=per_page,
+                    use_cache=use_cache
                 )
             else:  # audio
                 audio_type = request.GET.get('audio_type', 'all')  # 'music', 'sound_effects', 'all'
@@ -9325,33 +9395,15 @@ class StockSearchView(View):
                     sources=sources,
                     audio_type=audio_type,
                     page=page,
-                    per_page=per_page
+                    per_page=per_page,
+                    use_cache=use_cache
                 )
             
-            # Guardar en caché
-            if use_cache:
-                try:
-                    cache_kwargs = {
-                        'query': query,
-                        'content_type': content_type,
-                        'results': results,
-                        'sources': sources,
-                        'orientation': orientation,
-                        'license_filter': license_filter,
-                        'page': page,
-                        'per_page': per_page
-                    }
-                    if content_type == 'audio':
-                        cache_kwargs['audio_type'] = audio_type
-                    StockCache.set(**cache_kwargs)
-                except Exception as e:
-                    logger.warning(f"Error al guardar en caché: {e}", exc_info=True)
-            
             logger.info(f"Stock search para '{query}': {results.get('total', 0)} resultados de {len(sources)} fuentes")
             
             return JsonResponse({
                 'success': True,
-                'cached': False,
+                'cached': results.get('from_cache', False),
                 'data': results
             })
             
@@ -9657,7 +9709,7 @@ class ItemDownloadView(LoginRequiredMixin, ServiceMixin, View):
             item_type: 'video', 'image', 'audio'
             item_id: UUID del item
         """
-        from django.http import HttpResponse, Http404
+        from django.http import Http404
         from django.db.models import Q
         import uuid as uuid_module
         
@@ -9720,14 +9772,12 @@ class ItemDownloadView(LoginRequiredMixin, ServiceMixin, View):
             from core.storage.gcs import gcs_storage
             
             blob_name = gcs_path.replace(f"gs://{settings.GCS_BUCKET_NAME}/", "")
-            blob = gcs_storage.bucket.blob(blob_name)
+            # get_blob carga metadata (tamaño, content type) y devuelve None si no existe
+            blob = gcs_storage.bucket.get_blob(blob_name)
             
-            if not blob.exists():
+            if blob is None:
                 raise Http404('El archivo no existe en GCS')
             
-            # Descargar contenido
-            file_content = blob.download_as_bytes()
-            
             # Obtener content type del blob
             content_type = blob.content_type or 'application/octet-stream'
             
@@ -9768,12 +9818,22 @@ class ItemDownloadView(LoginRequiredMixin, ServiceMixin, View):
             if not safe_filename.endswith(extension):
                 safe_filename += extension
             
-            # Crear respuesta con headers de descarga
-            response = HttpResponse(file_content, content_type=content_type)
+            # Enviar el archivo por chunks sin cargarlo entero en memoria
+            reader = blob.open('rb', chunk_size=gcs_storage.CHUNK_SIZE)
+            
+            def stream_chunks():
+                try:
+                    for chunk in iter(lambda: reader.read(gcs_storage.CHUNK_SIZE), b''):
+                        yield chunk
+                finally:
+                    reader.close()
+            
+            response = StreamingHttpResponse(stream_chunks(), content_type=content_type)
             response['Content-Disposition'] = f'attachment; filename="{safe_filename}"'
-            response['Content-Length'] = len(file_content)
+            if blob.size is not None:
+                response['Content-Length'] = blob.size
             
-            logger.info(f"Descarga de {item_type} {item_uuid}: {safe_filename} ({len(file_content)} bytes)")
+            logger.info(f"Descarga de {item_type} {item_uuid}: {safe_filename} ({blob.size} bytes)")
             
             return response
             
@@ -9866,16 +9926,14 @@ class StockDownloadView(LoginRequiredMixin, View):
                 response.raise_for_status()
                 
                 # Leer contenido en chunks para manejar archivos grandes
-                file_bytes = b''
-                for chunk in response.iter_content(chunk_size=8192):
+                file_content = BytesIO()
+                for chunk in response.iter_content(chunk_size=64 * 1024):
                     if chunk:
-                        file_bytes += chunk
+                        file_content.write(chunk)
                         # Limitar tamaño máximo (100MB)
-                        if len(file_bytes) > 100 * 1024 * 1024:
+                        if file_content.tell() > 100 * 1024 * 1024:
                             raise ValueError('Archivo demasiado grande (máximo 100MB)')
                 
-                file_content = BytesIO(file_bytes)
-                
                 # Obtener content-type HTTP
                 http_content_type = response.headers.get('Content-Type', '')
                 
@@ -10005,14 +10063,15 @@ class StockDownloadView(LoginRequiredMixin, View):
                     gcs_path = f"audios/no_project/{audio.uuid}/audio.{file_extension}"
                 
                 file_content.seek(0)
-                gcs_full_path = gcs_storage.upload_from_bytes(
-                    file_content.read(),
+                gcs_full_path = gcs_storage.upload_stream(
+                    file_content,
                     gcs_path,
                     content_type=final_content_type or 'audio/mpeg'
                 )
                 
                 audio.gcs_path = gcs_full_path
                 audio.save()
+                DerivativeService.schedule(item=audio)
                 
                 return JsonResponse({
                     'success': True,
@@ -10044,8 +10103,8 @@ class StockDownloadView(LoginRequiredMixin, View):
                     gcs_path = f"images/{image.uuid}/image.{file_extension}"
                 
                 file_content.seek(0)
-                gcs_full_path = gcs_storage.upload_from_bytes(
-                    file_content.read(),
+                gcs_full_path = gcs_storage.upload_stream(
+                    file_content,
                     gcs_path,
                     content_type=final_content_type or 'image/jpeg'
                 )
@@ -10053,6 +10112,7 @@ class StockDownloadView(LoginRequiredMixin, View):
                 # Guardar el path completo retornado por upload_from_bytes (formato: gs://bucket/path)
                 image.gcs_path = gcs_full_path
                 image.save()
+                DerivativeService.schedule(item=image)
                 
                 return JsonResponse({
                     'success': True,
@@ -10084,8 +10144,8 @@ class StockDownloadView(LoginRequiredMixin, View):
                     gcs_path = f"videos/{video.uuid}/video.{file_extension}"
                 
                 file_content.seek(0)
-                gcs_full_path = gcs_storage.upload_from_bytes(
-                    file_content.read(),
+                gcs_full_path = gcs_storage.upload_stream(
+                    file_content,
                     gcs_path,
                     content_type=final_content_type or 'video/mp4'
                 )
@@ -10093,6 +10153,7 @@ class StockDownloadView(LoginRequiredMixin, View):
                 # Guardar el path completo retornado por upload_from_bytes (formato: gs://bucket/path)
                 video.gcs_path = gcs_full_path
                 video.save()
+                DerivativeService.schedule(item=video)
                 
                 return JsonResponse({
                     'success': True,
@@ -10224,17 +10285,22 @@ class ActiveQueuesDropdownView(LoginRequiredMixin, View):
     """Vista parcial para el dropdown de colas activas (solo queued y processing)"""
     
     def get(self, request):
-        # Solo obtener tareas activas (en cola o procesando)
-        active_tasks = GenerationTask.objects.filter(
-            user=request.user,
-            status__in=['queued', 'processing']
-        ).order_by('-created_at')[:20]  # Limitar a las últimas 20
-        
-        # Contador total
-        active_count = GenerationTask.objects.filter(
-            user=request.user,
-            status__in=['queued', 'processing']
-        ).count()
+        from core.services.progress_bus import ProgressBus
+        
+        # Tareas activas (en cola o procesando) desde el snapshot del bus de progreso;
+        # solo se consulta la BD cuando el snapshot no existe o ha caducado
+        active_tasks = ProgressBus.active_tasks(request.user.id)
+        # El listado está acotado a ACTIVE_LIMIT; el contador es el total real
+        active_count = ProgressBus.active_count(request.user.id)
+        
+        # Espera estimada de las tareas en cola según la carga de su proveedor
+        if any(task['status'] == 'queued' for task in active_tasks):
+            from core.services.scheduler import provider_scheduler
+            stats = provider_scheduler.queue_stats()
+            for task in active_tasks:
+                provider_stats = stats.get(task.get('provider')) if task['status'] == 'queued' else None
+                eta = provider_stats['estimated_wait'] if provider_stats else None
+                task['eta_minutes'] = max(1, round(eta / 60)) if eta else None
         
         return render(request, 'partials/active_queues_dropdown.html', {
             'active_tasks': active_tasks,
@@ -10242,6 +10308,18 @@ class ActiveQueuesDropdownView(LoginRequiredMixin, View):
         })
 
 
+class QueueStatsView(LoginRequiredMixin, View):
+    """Carga y espera estimada por proveedor (JSON)"""
+    
+    def get(self, request):
+        from core.services.scheduler import provider_scheduler
+        
+        return JsonResponse({
+            'status': 'success',
+            'providers': provider_scheduler.queue_stats(),
+        })
+
+
 class QueueTaskDetailView(LoginRequiredMixin, View):
     """Vista para ver detalles de una tarea específica"""
     
@@ -10399,16 +10477,30 @@ class PromptTemplatesAPIView(LoginRequiredMixin, View):
                 for vote in votes:
                     user_votes[str(vote.template.uuid)] = vote.vote_type
             
+            # Previews en GCS: derivados ligeros (miniatura/preview), firmados en una sola llamada
+            preview_paths = {
+                template.pk: DerivativeService.display_paths(gcs_path=template.preview_url)
+                for template in templates
+                if template.preview_url and template.preview_url.startswith('gs://')
+            }
+            signed_previews = {}
+            if preview_paths:
+                try:
+                    from core.storage.gcs import gcs_storage
+                    signed_previews = gcs_storage.get_signed_urls(
+                        [path for paths in preview_paths.values() for path in paths.values() if path],
+                        expiration=3600
+                    )
+                except Exception as e:
+                    logger.warning(f"Error al generar URLs firmadas de previews de templates: {e}")
+            
             for template in templates:
-                # Generar URL firmada si es un gcs_path
                 preview_url = template.preview_url
-                if preview_url and preview_url.startswith('gs://'):
-                    try:
-                        from core.storage.gcs import gcs_storage
-                        preview_url = gcs_storage.get_signed_url(preview_url, expiration=3600)
-                    except Exception as e:
-                        logger.warning(f"Error al generar URL firmada para template {template.uuid}: {e}")
-                        preview_url = None
+                preview_poster_url = None
+                if template.pk in preview_paths:
+                    paths = preview_paths[template.pk]
+                    preview_url = signed_previews.get(paths['display'])
+                    preview_poster_url = signed_previews.get(paths['poster']) if paths['poster'] else None
                 
                 template_dict = {
                     'uuid': str(template.uuid),
@@ -10417,6 +10509,7 @@ class PromptTemplatesAPIView(LoginRequiredMixin, View):
                     'template_type': template.template_type,
                     'recommended_service': template.recommended_service,
                     'preview_url': preview_url,
+                    'preview_poster_url': preview_poster_url,
                     'is_public': template.is_public,
                     'usage_count': template.usage_count,
                     'upvotes': template.upvotes,
@@ -10787,6 +10880,7 @@ class UploadItemView(LoginRequiredMixin, ServiceMixin, View):
             try:
                 item = model_class.objects.create(**item_data)
                 logger.info(f"{file_type.title()} creado: ID={item.id}, usuario={request.user.id}")
+                DerivativeService.schedule(item=item)
                 messages.success(request, f'{file_type.title()} "{uploaded_file.name}" subido correctamente a tu biblioteca.')
                 return redirect('core:library')
             except Exception as db_error:
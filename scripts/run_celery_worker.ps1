@@ -10,6 +10,6 @@ if (Test-Path "venv\Scripts\Activate.ps1") {
 # --pool=threads: Usa threading pool en lugar de multiprocessing
 celery -A atenea worker `
     --loglevel=info `
-    --queues=video_generation,image_generation,audio_generation,scene_processing,default,polling_tasks,maintenance `
+    --queues=video_generation,image_generation,audio_generation,scene_processing,manim_render,default,polling_tasks,maintenance `
     --concurrency=4 `
     --pool=threads
@@ -8,7 +8,7 @@ fi
 
 # Ejecutar worker con todas las colas
 celery -A atenea worker --loglevel=info \
-    --queues=video_generation,image_generation,audio_generation,scene_processing,default,polling_tasks,maintenance \
+    --queues=video_generation,image_generation,audio_generation,scene_processing,manim_render,background_removal,default,polling_tasks,maintenance \
     --concurrency=4
 
 
@@ -9,6 +9,8 @@ class NotificationManager {
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
         this.reconnectDelay = 3000; // 3 segundos
+        this.projectSubscriptions = new Set();
+        this.taskStatuses = {}; // task_uuid -> último estado recibido
         this.settings = {
             sound_volume: 50,
             auto_close_time: {
@@ -51,6 +53,8 @@ class NotificationManager {
             this.ws.onopen = () => {
                 console.log('WebSocket conectado para notificaciones');
                 this.reconnectAttempts = 0;
+                // Restaurar suscripciones de proyecto tras reconectar
+                this.projectSubscriptions.forEach(projectId => this.sendProjectSubscription(projectId));
             };
             
             this.ws.onmessage = (event) => {
@@ -141,25 +145,64 @@ class NotificationManager {
                 htmx.trigger(panelContent, 'refreshNotifications');
             }
             
-        } else if (data.type === 'progress_update') {
-            const progress = data.progress;
-            
-            // Actualizar toast de progreso si existe
-            if (window.toastManager && progress.item_uuid) {
-                // Buscar toast por item_uuid en metadata
-                const toastManagerInstance = document.querySelector('#toast-container')?._x_dataStack?.[0];
-                if (toastManagerInstance) {
-                    const toast = toastManagerInstance.toasts.find(t => 
-                        t.metadata?.item_uuid === progress.item_uuid
-                    );
-                    if (toast) {
-                        toastManagerInstance.updateProgressToast(toast.uuid, progress.progress);
-                    }
+        } else if (data.type === 'task_progress') {
+            this.handleTaskProgress(data.event);
+        } else if (data.type === 'assistant_stream') {
+            window.dispatchEvent(new CustomEvent('assistant-stream', { detail: data.event }));
+        }
+    }
+    
+    handleTaskProgress(event) {
+        // Evento genérico para vistas que muestran progreso (escenas, detalle de video...)
+        window.dispatchEvent(new CustomEvent('task-progress', { detail: event }));
+        
+        // Solo los cambios de estado refrescan las colas activas (no cada porcentaje)
+        if (event.task_uuid && this.taskStatuses[event.task_uuid] !== event.status) {
+            this.taskStatuses[event.task_uuid] = event.status;
+            window.dispatchEvent(new CustomEvent('task-status-changed', { detail: event }));
+        }
+        
+        // Actualizar toast de progreso si existe
+        if (window.toastManager && event.item_uuid) {
+            // Buscar toast por item_uuid en metadata
+            const toastManagerInstance = document.querySelector('#toast-container')?._x_dataStack?.[0];
+            if (toastManagerInstance) {
+                const toast = toastManagerInstance.toasts.find(t => 
+                    t.metadata?.item_uuid === event.item_uuid
+                );
+                if (toast) {
+                    toastManagerInstance.updateProgressToast(toast.uuid, event.progress);
                 }
             }
         }
     }
     
+    subscribeProject(projectId) {
+        // Recibir el progreso de todas las tareas del proyecto (incluidas las de otros miembros)
+        if (!projectId) return;
+        this.projectSubscriptions.add(String(projectId));
+        this.sendProjectSubscription(projectId);
+    }
+    
+    unsubscribeProject(projectId) {
+        this.projectSubscriptions.delete(String(projectId));
+        if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+            this.ws.send(JSON.stringify({
+                type: 'unsubscribe_project',
+                project_id: projectId
+            }));
+        }
+    }
+    
+    sendProjectSubscription(projectId) {
+        if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+            this.ws.send(JSON.stringify({
+                type: 'subscribe_project',
+                project_id: projectId
+            }));
+        }
+    }
+    
     markAsRead(notificationUuid) {
         if (this.ws && this.ws.readyState === WebSocket.OPEN) {
             this.ws.send(JSON.stringify({